@@ -2094,8 +2094,7 @@ async def stream_admin_chat(
                         partial_state["thinking_duration"] = thinking_dur
 
                     if user_messages_to_log and not partial_state["user_messages_logged"]:
-                        for content in user_messages_to_log:
-                            StaffChatLogDB.add_log(staff_account_id, "user", content, thread_id=conversation_id)
+                        StaffChatLogDB.add_logs(staff_account_id, [{"role": "user", "content": content} for content in user_messages_to_log], thread_id=conversation_id)
                         partial_state["user_messages_logged"] = True
 
                     if tool_calls_buffer:
@@ -2137,8 +2136,7 @@ async def stream_admin_chat(
                         continue
 
                     if user_messages_to_log and not partial_state["user_messages_logged"]:
-                        for content in user_messages_to_log:
-                            StaffChatLogDB.add_log(staff_account_id, "user", content, thread_id=conversation_id)
+                        StaffChatLogDB.add_logs(staff_account_id, [{"role": "user", "content": content} for content in user_messages_to_log], thread_id=conversation_id)
                         partial_state["user_messages_logged"] = True
 
                     is_thinking_stopped = (
@@ -2180,8 +2178,9 @@ async def stream_admin_chat(
                         logger.error("Failed to persist user message: %s", e)
 
             try:
-                assistant_text = partial_state.get("assistant_text", "")
-                reasoning_output = partial_state.get("reasoning_output", "")
+                # 流式过程中保存的是累加器，这里才拼接为字符串
+                assistant_text = str(partial_state.get("assistant_text", ""))
+                reasoning_output = str(partial_state.get("reasoning_output", ""))
                 thinking_dur = partial_state.get("thinking_duration")
 
                 if assistant_text or reasoning_output:
@@ -3,6 +3,7 @@ import asyncio
 import json
 import logging
 import time
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 from fastapi import Request
 from fastapi.responses import StreamingResponse
@@ -10,9 +11,10 @@ from openai import AsyncOpenAI
 import httpx
 
 # 导入数据库和认证模块
-from database import ProductDB, CartDB, ChatLogDB, CategoryDB, DeliverySettingsDB, GiftThresholdDB, UserProfileDB, AgentAssignmentDB, get_db_connection, LotteryConfigDB
+from database import ProductDB, CartDB, ChatLogDB, CategoryDB, DeliverySettingsDB, GiftThresholdDB, UserProfileDB, ShoppingRouteDB, LotteryConfigDB, run_in_db_executor
 from auth import get_current_staff_from_cookie, get_current_user_from_cookie
 from config import get_settings, ModelConfig
+from http_clients import LLM_UPSTREAM, get_http_client
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -30,6 +32,76 @@ ai_client = AsyncOpenAI(
 )
 
 
+class StreamTextBuffer:
+    """流式文本累加器：追加为 O(1)，读取时才拼接一次并缓存结果。"""
+
+    __slots__ = ("_parts", "_length")
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._length = 0
+
+    def append(self, text: str) -> None:
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __str__(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+class DeltaCoalescer:
+    """合并连续的同类增量（delta / reasoning），每批网络数据处理完后只发送一帧 SSE。"""
+
+    __slots__ = ("_send", "_kind", "_parts")
+
+    def __init__(self, send) -> None:
+        self._send = send
+        self._kind: Optional[str] = None
+        self._parts: List[str] = []
+
+    async def push(self, kind: str, text: str) -> None:
+        if self._kind is not None and kind != self._kind:
+            await self.flush()
+        self._kind = kind
+        self._parts.append(text)
+
+    async def flush(self) -> None:
+        if not self._parts:
+            return
+        kind, text = self._kind, "".join(self._parts)
+        self._kind = None
+        self._parts = []
+        await self._send(_sse("message", {"type": kind, "delta": text, "role": "assistant"}))
+
+
+async def _iter_sse_lines(response: httpx.Response, deltas: DeltaCoalescer):
+    """逐行读取 SSE 流（换行规则同 str.splitlines），在读取下一批网络数据前发送已合并的增量。"""
+    pending = ""
+    async for chunk in response.aiter_text():
+        text = pending + chunk
+        # 末尾的 \r 可能属于被拆开的 \r\n，留到下一批一起处理
+        cut = len(text) - 1 if text.endswith("\r") else len(text)
+        lines = text[:cut].splitlines(keepends=True)
+        pending = text[cut:]
+        if lines and lines[-1] == lines[-1].splitlines()[0]:
+            pending = lines.pop() + pending
+        for line in lines:
+            yield line.splitlines()[0]
+        await deltas.flush()
+    if pending:
+        yield pending.splitlines()[0] if pending.splitlines() else ""
+    await deltas.flush()
+
+
 class StreamResponseError(RuntimeError):
     """封装流式响应中的异常，保留已生成的部分内容。"""
 
@@ -221,7 +293,6 @@ def resolve_shopping_scope(request: Request, address_id: Optional[str] = None, b
     """根据请求参数和用户资料确定购物范围与归属代理"""
     resolved_address_id = address_id
     resolved_building_id = building_id
-    agent_id: Optional[str] = None
 
     staff = get_current_staff_from_cookie(request)
     if staff and staff.get('type') == 'agent':
@@ -243,51 +314,8 @@ def resolve_shopping_scope(request: Request, address_id: Optional[str] = None, b
             if not resolved_building_id:
                 resolved_building_id = profile.get('building_id')
 
-    # 修复Agent商品权限控制：
-    # 1. 如果选择了具体楼栋，检查该楼栋是否分配给Agent
-    # 2. 如果选择了地址但没有具体楼栋，检查该地址下是否有Agent分配
-    # 3. 只有在明确有Agent分配的情况下，才限制显示Agent商品
-    if resolved_building_id:
-        assignment = AgentAssignmentDB.get_agent_for_building(resolved_building_id)
-        if assignment and assignment.get('agent_id'):
-            # 楼栋被分配给了Agent，显示该Agent的商品
-            agent_id = assignment['agent_id']
-            if not resolved_address_id:
-                resolved_address_id = assignment.get('address_id')
-    elif resolved_address_id:
-        agents = AgentAssignmentDB.get_agent_ids_for_address(resolved_address_id)
-        # 只有当地址下只有一个Agent时，才限制显示该Agent的商品
-        # 如果地址下有多个Agent或没有Agent，则显示Admin商品
-        if len(agents) == 1:
-            agent_id = agents[0]
-        # 如果len(agents) == 0 或 > 1，则agent_id保持为None，显示Admin商品
-
-    # 修改owner_ids逻辑：
-    # - 如果找到了唯一的agent_id，则只显示该Agent的商品
-    # - 如果没有找到agent_id，则显示Admin的商品（统一使用'admin'）
-    if agent_id:
-        owner_ids = [agent_id]
-    else:
-        # 没有找到Agent，显示统一的Admin商品
-        try:
-            # 确认系统中有管理员存在
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM admins WHERE (role = 'super_admin' OR role = 'admin') AND is_active = 1")
-                admin_count = cursor.fetchone()[0]
-                if admin_count > 0:
-                    owner_ids = ['admin']  # 使用统一的'admin'显示所有Admin商品
-                else:
-                    owner_ids = None  # 回退到显示未分配商品
-        except Exception:
-            owner_ids = None  # 出错时回退到显示未分配商品
-
-    return {
-        "agent_id": agent_id,
-        "address_id": resolved_address_id,
-        "building_id": resolved_building_id,
-        "owner_ids": owner_ids
-    }
+    # 归属规则见 ShoppingRouteDB.resolve_owner：楼栋优先；仅选地址时该地址下唯一代理才生效，否则显示管理员商品
+    return ShoppingRouteDB.resolve_owner(resolved_address_id, resolved_building_id)
 
 
 def get_goals_section(user_id: Optional[str] = None) -> str:
@@ -596,7 +624,7 @@ async def stream_model_response(
     tools: List[Dict[str, Any]],
     send,
     client_disconnected: Optional[asyncio.Event] = None,
-    partial_state: Optional[Dict[str, str]] = None
+    partial_state: Optional[Dict[str, Any]] = None
 ) -> Tuple[str, Dict[int, Dict[str, Any]], Optional[str], str, Optional[float]]:
     """
     使用 httpx 直接发起流式 HTTP 请求，在中断时立即关闭连接以节省 token。
@@ -604,7 +632,7 @@ async def stream_model_response(
     
     Args:
         client_disconnected: 用于检测客户端断开连接的事件，如果设置则立即停止生成并关闭HTTP连接
-        partial_state: 用于实时更新已生成的部分内容，以便在中断时保存
+        partial_state: 写入已生成内容的累加器（assistant_text / reasoning_output，用 str() 读取），以便在中断时保存
     """
     # 构建请求 payload
     request_payload: Dict[str, Any] = {
@@ -622,8 +650,14 @@ async def stream_model_response(
     logger.info("Calling model: %s (%s)", model_config.name, model_config.label)
 
     tool_calls_buffer: Dict[int, Dict[str, Any]] = {}
-    assistant_text_parts: List[str] = []
-    reasoning_text_parts: List[str] = []
+    # 累加器追加为 O(1)，只在保存或返回时拼接
+    assistant_buffer = StreamTextBuffer()
+    reasoning_buffer = StreamTextBuffer()
+    if partial_state is not None:
+        partial_state["assistant_text"] = assistant_buffer
+        partial_state["reasoning_output"] = reasoning_buffer
+    # 同一批网络数据中的细碎增量合并为一帧 SSE 发送
+    deltas = DeltaCoalescer(send)
     finish_reason: Optional[str] = None
 
     THINK_START = "<think>"
@@ -646,11 +680,8 @@ async def stream_model_response(
         # 记录thinking开始时间
         if thinking_start_time is None:
             thinking_start_time = time.time()
-        reasoning_text_parts.append(text)
-        # 实时更新部分状态
-        if partial_state is not None:
-            partial_state["reasoning_output"] = "".join(reasoning_text_parts)
-        await send(_sse("message", {"type": "reasoning", "delta": text, "role": "assistant"}))
+        reasoning_buffer.append(text)
+        await deltas.push("reasoning", text)
 
     async def handle_content_delta(text: str) -> None:
         nonlocal content_buffer, think_mode_enabled, in_think_tag
@@ -667,11 +698,8 @@ async def stream_model_response(
                 partial_state["thinking_duration"] = thinking_duration
 
         if not think_mode_possible and THINK_START not in text:
-            assistant_text_parts.append(text)
-            # 实时更新部分状态
-            if partial_state is not None:
-                partial_state["assistant_text"] = "".join(assistant_text_parts)
-            await send(_sse("message", {"type": "delta", "delta": text, "role": "assistant"}))
+            assistant_buffer.append(text)
+            await deltas.push("delta", text)
             return
         if not think_mode_possible and THINK_START in text:
             think_mode_possible = True
@@ -753,22 +781,16 @@ async def stream_model_response(
                     if next_think > 0:
                         segment = content_buffer[:next_think]
                         if segment:
-                            assistant_text_parts.append(segment)
-                            # 实时更新部分状态
-                            if partial_state is not None:
-                                partial_state["assistant_text"] = "".join(assistant_text_parts)
-                            await send(_sse("message", {"type": "delta", "delta": segment, "role": "assistant"}))
+                            assistant_buffer.append(segment)
+                            await deltas.push("delta", segment)
                         content_buffer = content_buffer[next_think + len(THINK_START):]
                         in_think_tag = True
                         continue
 
                 segment = content_buffer
                 if segment:
-                    assistant_text_parts.append(segment)
-                    # 实时更新部分状态
-                    if partial_state is not None:
-                        partial_state["assistant_text"] = "".join(assistant_text_parts)
-                    await send(_sse("message", {"type": "delta", "delta": segment, "role": "assistant"}))
+                    assistant_buffer.append(segment)
+                    await deltas.push("delta", segment)
                 content_buffer = ""
                 break
 
@@ -790,144 +812,150 @@ async def stream_model_response(
                     pass
 
     try:
-        # 使用 httpx.AsyncClient 发起流式请求
-        async with httpx.AsyncClient(timeout=httpx.Timeout(300.0, connect=30.0)) as client:
-            response = await client.send(
-                client.build_request(
-                    "POST",
-                    settings.api_url.rstrip("/") + "/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.api_key}",
-                        "Content-Type": "application/json",
-                        "Accept": "text/event-stream",
-                    },
-                    json=request_payload,
-                ),
-                stream=True,
-            )
+        # 使用共享的 httpx.AsyncClient 发起流式请求，复用到上游的长连接（响应在 finally 中关闭，连接归还连接池）
+        client = get_http_client(LLM_UPSTREAM)
+        response = await client.send(
+            client.build_request(
+                "POST",
+                settings.api_url.rstrip("/") + "/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {settings.api_key}",
+                    "Content-Type": "application/json",
+                    "Accept": "text/event-stream",
+                },
+                json=request_payload,
+            ),
+            stream=True,
+        )
             
-            if response.status_code != 200:
-                error_text = await response.aread()
-                raise RuntimeError(f"API请求失败 (HTTP {response.status_code}): {error_text.decode('utf-8', errors='ignore')}")
+        if response.status_code != 200:
+            error_text = await response.aread()
+            raise RuntimeError(f"API请求失败 (HTTP {response.status_code}): {error_text.decode('utf-8', errors='ignore')}")
 
-            try:
-                # 逐行读取 SSE 流
-                async for line in response.aiter_lines():
-                    # 检查客户端是否断开连接 - 立即关闭 HTTP 连接以节省 token
-                    if client_disconnected and client_disconnected.is_set():
-                        logger.info("Client disconnected; closing HTTP stream immediately")
-                        await _close_response(sync_only=True)
-                        # 计算 thinking_duration
-                        interrupted_thinking_duration = thinking_duration
-                        if thinking_start_time is not None and interrupted_thinking_duration is None:
-                            interrupted_thinking_duration = round(time.time() - thinking_start_time, 2)
-                        # 返回已生成的内容
-                        return (
-                            "".join(assistant_text_parts),
-                            tool_calls_buffer,
-                            "interrupted",
-                            "".join(reasoning_text_parts),
-                            interrupted_thinking_duration
-                        )
+        stream_done = False
+        try:
+            # 逐行读取 SSE 流
+            async for line in _iter_sse_lines(response, deltas):
+                # 检查客户端是否断开连接 - 立即关闭 HTTP 连接以节省 token
+                if client_disconnected and client_disconnected.is_set():
+                    logger.info("Client disconnected; closing HTTP stream immediately")
+                    await _close_response(sync_only=True)
+                    # 计算 thinking_duration
+                    interrupted_thinking_duration = thinking_duration
+                    if thinking_start_time is not None and interrupted_thinking_duration is None:
+                        interrupted_thinking_duration = round(time.time() - thinking_start_time, 2)
+                    # 返回已生成的内容
+                    return (
+                        str(assistant_buffer),
+                        tool_calls_buffer,
+                        "interrupted",
+                        str(reasoning_buffer),
+                        interrupted_thinking_duration
+                    )
                     
-                    # 跳过空行和非数据行
-                    if not line or not line.startswith("data: "):
-                        continue
+                # 跳过空行和非数据行
+                if not line or not line.startswith("data: "):
+                    continue
                     
-                    data_str = line[6:]  # 移除 "data: " 前缀
-                    if data_str == "[DONE]":
-                        break
+                data_str = line[6:]  # 移除 "data: " 前缀
+                if data_str == "[DONE]":
+                    # 读完剩余的响应体再结束，连接才能归还连接池复用
+                    stream_done = True
+                if stream_done:
+                    continue
                     
-                    try:
-                        chunk_dict = json.loads(data_str)
-                    except json.JSONDecodeError:
-                        continue
+                try:
+                    chunk_dict = json.loads(data_str)
+                except json.JSONDecodeError:
+                    continue
 
-                    if "error" in chunk_dict and chunk_dict["error"]:
-                        error_detail = chunk_dict["error"]
-                        if isinstance(error_detail, dict):
-                            message = error_detail.get("message") or json.dumps(error_detail, ensure_ascii=False)
-                        else:
-                            message = str(error_detail)
-                        # 计算thinking_duration
-                        err_thinking_duration = thinking_duration
-                        if thinking_start_time is not None and err_thinking_duration is None:
-                            err_thinking_duration = round(time.time() - thinking_start_time, 2)
-                        raise StreamResponseError(
-                            message,
-                            partial_text="".join(assistant_text_parts),
-                            partial_reasoning="".join(reasoning_text_parts),
-                            tool_calls=tool_calls_buffer,
-                            finish_reason=finish_reason,
-                            retryable=True,
-                            thinking_duration=err_thinking_duration
-                        )
+                if "error" in chunk_dict and chunk_dict["error"]:
+                    error_detail = chunk_dict["error"]
+                    if isinstance(error_detail, dict):
+                        message = error_detail.get("message") or json.dumps(error_detail, ensure_ascii=False)
+                    else:
+                        message = str(error_detail)
+                    # 计算thinking_duration
+                    err_thinking_duration = thinking_duration
+                    if thinking_start_time is not None and err_thinking_duration is None:
+                        err_thinking_duration = round(time.time() - thinking_start_time, 2)
+                    # 先把已合并的增量发给前端，与随后保存的部分内容保持一致
+                    await deltas.flush()
+                    raise StreamResponseError(
+                        message,
+                        partial_text=str(assistant_buffer),
+                        partial_reasoning=str(reasoning_buffer),
+                        tool_calls=tool_calls_buffer,
+                        finish_reason=finish_reason,
+                        retryable=True,
+                        thinking_duration=err_thinking_duration
+                    )
 
-                    choices = chunk_dict.get("choices") or []
-                    for choice in choices:
-                        choice_dict = choice if isinstance(choice, dict) else _coerce_to_dict(choice)
-                        delta_dict = _coerce_to_dict(choice_dict.get("delta"))
-
-                        # 处理 reasoning（思维链）内容
-                        reasoning_piece = delta_dict.get("reasoning")
-                        reasoning_text = _extract_text(reasoning_piece)
-                        if reasoning_text:
-                            await emit_reasoning_chunk(reasoning_text)
-
-                        # 处理 content 内容
-                        content_piece = delta_dict.get("content")
-                        content_text = _extract_text(content_piece)
-                        if content_text:
-                            await handle_content_delta(content_text)
-
-                        # 处理 tool_calls
-                        tool_parts = delta_dict.get("tool_calls") or []
-                        for tool_part in tool_parts:
-                            tool_dict = tool_part if isinstance(tool_part, dict) else _coerce_to_dict(tool_part)
-                            index = tool_dict.get("index", 0)
-                            try:
-                                index = int(index)
-                            except Exception:
-                                index = 0
-
-                            if index not in tool_calls_buffer:
-                                tool_calls_buffer[index] = {
-                                    "id": "",
-                                    "type": tool_dict.get("type") or "function",
-                                    "function": {"name": "", "arguments": "{}"}
-                                }
+                choices = chunk_dict.get("choices") or []
+                for choice in choices:
+                    choice_dict = choice if isinstance(choice, dict) else _coerce_to_dict(choice)
+                    delta_dict = _coerce_to_dict(choice_dict.get("delta"))
+
+                    # 处理 reasoning（思维链）内容
+                    reasoning_piece = delta_dict.get("reasoning")
+                    reasoning_text = _extract_text(reasoning_piece)
+                    if reasoning_text:
+                        await emit_reasoning_chunk(reasoning_text)
+
+                    # 处理 content 内容
+                    content_piece = delta_dict.get("content")
+                    content_text = _extract_text(content_piece)
+                    if content_text:
+                        await handle_content_delta(content_text)
+
+                    # 处理 tool_calls
+                    tool_parts = delta_dict.get("tool_calls") or []
+                    for tool_part in tool_parts:
+                        tool_dict = tool_part if isinstance(tool_part, dict) else _coerce_to_dict(tool_part)
+                        index = tool_dict.get("index", 0)
+                        try:
+                            index = int(index)
+                        except Exception:
+                            index = 0
+
+                        if index not in tool_calls_buffer:
+                            tool_calls_buffer[index] = {
+                                "id": "",
+                                "type": tool_dict.get("type") or "function",
+                                "function": {"name": "", "arguments": "{}"}
+                            }
 
-                            if tool_dict.get("id"):
-                                tool_calls_buffer[index]["id"] = tool_dict["id"]
-
-                            func_dict = _coerce_to_dict(tool_dict.get("function"))
-                            if func_dict.get("name"):
-                                tool_calls_buffer[index]["function"]["name"] = func_dict["name"]
-
-                            arguments_value = func_dict.get("arguments")
-                            if arguments_value is not None:
-                                if isinstance(arguments_value, str):
-                                    arg_text = arguments_value
-                                else:
-                                    try:
-                                        arg_text = json.dumps(arguments_value, ensure_ascii=False)
-                                    except TypeError:
-                                        arg_text = str(arguments_value)
-                                normalized = arg_text.strip()
-                                if normalized in ("", "{}"):
-                                    continue
-                                existing = tool_calls_buffer[index]["function"]["arguments"]
-                                if existing.strip() in ("", "{}"):
-                                    tool_calls_buffer[index]["function"]["arguments"] = arg_text
-                                else:
-                                    tool_calls_buffer[index]["function"]["arguments"] = existing + arg_text
-
-                        # 处理 finish_reason
-                        finish_reason_value = choice_dict.get("finish_reason")
-                        if finish_reason_value:
-                            finish_reason = finish_reason_value
-            finally:
-                await _close_response()
+                        if tool_dict.get("id"):
+                            tool_calls_buffer[index]["id"] = tool_dict["id"]
+
+                        func_dict = _coerce_to_dict(tool_dict.get("function"))
+                        if func_dict.get("name"):
+                            tool_calls_buffer[index]["function"]["name"] = func_dict["name"]
+
+                        arguments_value = func_dict.get("arguments")
+                        if arguments_value is not None:
+                            if isinstance(arguments_value, str):
+                                arg_text = arguments_value
+                            else:
+                                try:
+                                    arg_text = json.dumps(arguments_value, ensure_ascii=False)
+                                except TypeError:
+                                    arg_text = str(arguments_value)
+                            normalized = arg_text.strip()
+                            if normalized in ("", "{}"):
+                                continue
+                            existing = tool_calls_buffer[index]["function"]["arguments"]
+                            if existing.strip() in ("", "{}"):
+                                tool_calls_buffer[index]["function"]["arguments"] = arg_text
+                            else:
+                                tool_calls_buffer[index]["function"]["arguments"] = existing + arg_text
+
+                    # 处理 finish_reason
+                    finish_reason_value = choice_dict.get("finish_reason")
+                    if finish_reason_value:
+                        finish_reason = finish_reason_value
+        finally:
+            await _close_response()
 
     except asyncio.CancelledError as exc:
         await _close_response()
@@ -937,8 +965,8 @@ async def stream_model_response(
             cancel_thinking_duration = round(time.time() - thinking_start_time, 2)
         raise StreamResponseError(
             "模型响应被取消",
-            partial_text="".join(assistant_text_parts),
-            partial_reasoning="".join(reasoning_text_parts),
+            partial_text=str(assistant_buffer),
+            partial_reasoning=str(reasoning_buffer),
             tool_calls=tool_calls_buffer,
             finish_reason=finish_reason or "cancelled",
             retryable=False,
@@ -955,8 +983,8 @@ async def stream_model_response(
             exc_thinking_duration = round(time.time() - thinking_start_time, 2)
         raise StreamResponseError(
             f"响应失败: {exc}",
-            partial_text="".join(assistant_text_parts),
-            partial_reasoning="".join(reasoning_text_parts),
+            partial_text=str(assistant_buffer),
+            partial_reasoning=str(reasoning_buffer),
             tool_calls=tool_calls_buffer,
             finish_reason=finish_reason,
             retryable=True,
@@ -970,7 +998,7 @@ async def stream_model_response(
         if partial_state is not None:
             partial_state["thinking_duration"] = final_thinking_duration
     
-    return "".join(assistant_text_parts), tool_calls_buffer, finish_reason, "".join(reasoning_text_parts), final_thinking_duration
+    return str(assistant_buffer), tool_calls_buffer, finish_reason, str(reasoning_buffer), final_thinking_duration
 
 
 def get_fallback_system_prompt(user_id: Optional[str] = None) -> str:
@@ -1052,6 +1080,10 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
         # 如果没有指定 owner_ids（未登录或没有明确范围），默认返回管理员商品
         if owner_ids is None:
             owner_ids = ['admin']
+
+        # 与商城列表共用同一份商品目录快照（已排序并附带规格）
+        from app.services.catalog import get_catalog_snapshot
+        snapshot = get_catalog_snapshot(owner_ids, include_unassigned=include_unassigned)
         
         # 特殊处理：如果查询词是"热销"，则返回所有热销商品
         def is_hot_query(q: str) -> bool:
@@ -1060,6 +1092,22 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
                 return False
             normalized = q.strip().lower()
             return normalized in ['热销', '热卖', '热门', 'hot', 'popular']
+
+        # 所有普通关键词通过全文索引一次批量检索，结果按相关性（bm25）排序
+        search_terms = [
+            str(q).strip() for q in query_list
+            if str(q or "").strip() and not is_hot_query(str(q).strip())
+        ]
+        ranked_entries = snapshot.search_many(search_terms, show_inactive=show_inactive) if search_terms else {}
+
+        def find_products(q: str) -> List[Dict[str, Any]]:
+            """按查询词从快照中筛选可售商品（根据商城设置过滤下架商品），最多 limit 个。"""
+            if is_hot_query(q):
+                entries = snapshot.select(show_inactive=show_inactive, hot_only=True)
+            else:
+                entries = ranked_entries.get(q, [])
+            products = [entry.product for entry in entries if not entry.product.get("is_not_for_sale")]
+            return products[:limit]
         
         def _relevance_score(prod: Dict[str, Any], q: str, discount_label: Optional[str]) -> int:
             """根据关键词与商品字段的匹配程度计算相关性（0~100）。"""
@@ -1117,36 +1165,9 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
             for q in query_list:
                 q_str = (q or "").strip()
                 if q_str:
-                    # 检查是否为热销商品查询
-                    if is_hot_query(q_str):
-                        # 获取所有热销商品（支持归属隔离）
-                        products = ProductDB.get_all_products(
-                            owner_ids=owner_ids,
-                            include_unassigned=include_unassigned,
-                            hot_only=True
-                        )
-                    else:
-                        # 普通搜索（支持归属隔离）
-                        products = ProductDB.search_products(
-                            q_str,
-                            active_only=False,
-                            owner_ids=owner_ids,
-                            include_unassigned=include_unassigned
-                        )
-                    
-                    # 根据商城设置过滤下架商品
-                    if not show_inactive:
-                        products = [p for p in products if p.get('is_active', 1) != 0]
-                    
-                    products = [p for p in products if not _is_truthy(p.get("is_not_for_sale"))]
-                    
-                    # 限制返回数量
-                    products = products[:limit] if len(products) > limit else products
+                    products = find_products(q_str)
                     
                     # 转换为工具格式
-                    from database import VariantDB
-                    pids = [p["id"] for p in products]
-                    vmap = VariantDB.get_for_products(pids)
                     items = []
                     for product in products:
                         # 应用折扣：以折为单位（10表示不打折）
@@ -1161,7 +1182,7 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
                             discount_label = f"{z_str}折"
                         variants = [
                             {"id": v.get("id"), "name": v.get("name"), "stock": v.get("stock", 0)}
-                            for v in (vmap.get(product["id"], []) or [])
+                            for v in (product.get("variants") or [])
                         ]
                         rel = _relevance_score(product, q_str, discount_label)
                         img_path = product.get("img_path", "")
@@ -1218,34 +1239,8 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
             if not q:
                 return {"ok": True, "query": query_list[0], "count": 0, "items": []}
             
-            # 检查是否为热销商品查询
-            if is_hot_query(q):
-                # 获取所有热销商品（支持归属隔离）
-                products = ProductDB.get_all_products(
-                    owner_ids=owner_ids,
-                    include_unassigned=include_unassigned,
-                    hot_only=True
-                )
-            else:
-                # 普通搜索（支持归属隔离）
-                products = ProductDB.search_products(
-                    q,
-                    active_only=False,
-                    owner_ids=owner_ids,
-                    include_unassigned=include_unassigned
-                )
+            products = find_products(q)
             
-            # 根据商城设置过滤下架商品
-            if not show_inactive:
-                products = [p for p in products if p.get('is_active', 1) != 0]
-
-            products = [p for p in products if not _is_truthy(p.get("is_not_for_sale"))]
-            
-            products = products[:limit] if len(products) > limit else products
-            
-            from database import VariantDB
-            pids = [p["id"] for p in products]
-            vmap = VariantDB.get_for_products(pids)
             items = []
             for product in products:
                 zhe = float(product.get("discount", 10.0) or 10.0)
@@ -1258,7 +1253,7 @@ def search_products_impl(query, limit: int = 10, user_id: Optional[str] = None,
                     discount_label = f"{z_str}折"
                 variants = [
                     {"id": v.get("id"), "name": v.get("name"), "stock": v.get("stock", 0)}
-                    for v in (vmap.get(product["id"], []) or [])
+                    for v in (product.get("variants") or [])
                 ]
                 rel = _relevance_score(product, q, discount_label)
                 img_path = product.get("img_path", "")
@@ -1864,69 +1859,130 @@ def _guess_tool_name_from_result(result_text: str) -> str:
                 return "update_cart"
     return "unknown_tool"
 
-def _load_persisted_tool_calls(user_id: Optional[str], thread_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
-    """从聊天日志中加载最近的工具调用记录，构建 id -> 工具调用信息 的映射。"""
-    if not user_id:
-        return {}
-
-    try:
-        logs = ChatLogDB.get_recent_logs(user_id, limit=200, thread_id=thread_id)
-    except Exception as exc:
-        logger.warning("Failed to load tool call history: %s", exc)
-        return {}
-
-    tool_call_map: Dict[str, Dict[str, Any]] = {}
-    for record in logs:
-        if (record.get("role") or "").lower() != "assistant":
-            continue
-        content = record.get("content")
-        if not content:
-            continue
-        try:
-            payload = json.loads(content)
-        except Exception:
+def _parse_tool_calls(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从助手日志的 JSON 内容中提取规范化的工具调用列表（缺少函数名或 ID 的跳过）。"""
+    tool_calls = payload.get("tool_calls")
+    if not isinstance(tool_calls, list):
+        return []
+    parsed: List[Dict[str, Any]] = []
+    for tc in tool_calls:
+        tc_dict = _coerce_to_dict(tc)
+        fn_dict = _coerce_to_dict(tc_dict.get("function"))
+        fn_name = fn_dict.get("name")
+        if not fn_name:
             continue
-        tool_calls = payload.get("tool_calls")
-        if not isinstance(tool_calls, list):
+        arguments = fn_dict.get("arguments")
+        if arguments is None:
+            arg_text = "{}"
+        elif isinstance(arguments, str):
+            arg_text = arguments.strip() or "{}"
+        else:
+            try:
+                arg_text = json.dumps(arguments, ensure_ascii=False)
+            except TypeError:
+                arg_text = str(arguments)
+        if not isinstance(arg_text, str) or not arg_text.strip():
+            arg_text = "{}"
+
+        tool_call_id = tc_dict.get("id")
+        if not isinstance(tool_call_id, str) or not tool_call_id.strip():
             continue
-        for tc in tool_calls:
-            tc_dict = _coerce_to_dict(tc)
-            fn_dict = _coerce_to_dict(tc_dict.get("function"))
-            fn_name = fn_dict.get("name")
-            if not fn_name:
-                continue
-            arguments = fn_dict.get("arguments")
-            if arguments is None:
-                arg_text = "{}"
-            elif isinstance(arguments, str):
-                arg_text = arguments.strip() or "{}"
-            else:
-                try:
-                    arg_text = json.dumps(arguments, ensure_ascii=False)
-                except TypeError:
-                    arg_text = str(arguments)
-            if not isinstance(arg_text, str) or not arg_text.strip():
-                arg_text = "{}"
 
-            tool_call_id = tc_dict.get("id")
-            if not isinstance(tool_call_id, str) or not tool_call_id.strip():
+        parsed.append({
+            "id": tool_call_id,
+            "type": tc_dict.get("type") or "function",
+            "function": {
+                "name": fn_name,
+                "arguments": arg_text
+            }
+        })
+    return parsed
+
+
+@dataclass
+class ConversationHistory:
+    """单次对话回合使用的持久化历史：只查询一次，助手日志的 JSON 只解析一次。"""
+
+    tool_call_map: Dict[str, Dict[str, Any]]
+    # 已落库的用户消息内容（时间正序）
+    user_contents: List[str]
+    # 助手回复失败的用户消息内容（时间正序）
+    failed_user_contents: List[str]
+
+    @classmethod
+    def from_logs(cls, logs: List[Dict[str, Any]]) -> "ConversationHistory":
+        """logs 为 get_recent_logs 的结果（按时间倒序）。"""
+        tool_call_map: Dict[str, Dict[str, Any]] = {}
+        for record in logs:
+            if (record.get("role") or "").lower() != "assistant":
+                continue
+            content = record.get("content")
+            if not content:
+                continue
+            try:
+                payload = json.loads(content)
+            except Exception:
+                continue
+            if not isinstance(payload, dict):
                 continue
+            for tool_call in _parse_tool_calls(payload):
+                tool_call_map[tool_call["id"]] = tool_call
+
+        user_contents: List[str] = []
+        failed_user_contents: List[str] = []
+        last_user_content: Optional[str] = None
+        last_user_failed = False
+        for record in reversed(logs):  # 转为时间正序
+            role = (record.get("role") or "").lower()
+            if role == "user":
+                last_user_content = record.get("content") or ""
+                last_user_failed = False
+                user_contents.append(last_user_content)
+                continue
+            if role != "assistant" or last_user_content is None or last_user_failed:
+                continue
+            if _is_truthy(record.get("is_error")):
+                failed_user_contents.append(last_user_content)
+                last_user_failed = True
+
+        return cls(
+            tool_call_map=tool_call_map,
+            user_contents=user_contents,
+            failed_user_contents=failed_user_contents,
+        )
+
+    @classmethod
+    def load(cls, user_id: Optional[str], thread_id: Optional[str] = None) -> Optional["ConversationHistory"]:
+        """读取最近 200 条聊天日志；未登录或读取失败时返回 None（跳过基于历史的预处理）。"""
+        if not user_id:
+            return None
+        try:
+            logs = ChatLogDB.get_recent_logs(user_id, limit=200, thread_id=thread_id)
+        except Exception as exc:
+            logger.warning("Failed to load chat history, skipping history-based preprocessing: %s", exc)
+            return None
+        return cls.from_logs(logs)
 
-            tool_call_map[tool_call_id] = {
-                "id": tool_call_id,
-                "type": tc_dict.get("type") or "function",
-                "function": {
-                    "name": fn_name,
-                    "arguments": arg_text
-                }
-            }
-    return tool_call_map
+
+def _load_persisted_tool_calls(
+    user_id: Optional[str],
+    thread_id: Optional[str] = None,
+    history: Optional[ConversationHistory] = None
+) -> Dict[str, Dict[str, Any]]:
+    """从聊天日志中加载最近的工具调用记录，构建 id -> 工具调用信息 的映射。"""
+    if history is None:
+        history = ConversationHistory.load(user_id, thread_id)
+    if history is None:
+        return {}
+    # 调用方会向映射中补充记录，返回副本
+    return dict(history.tool_call_map)
 
 
 def _sanitize_initial_messages(
     messages: List[Dict[str, Any]],
     user_id: Optional[str] = None,
-    thread_id: Optional[str] = None
+    thread_id: Optional[str] = None,
+    history: Optional[ConversationHistory] = None
 ) -> List[Dict[str, Any]]:
     """过滤/规范化前端传入的初始消息，确保满足上游模型的入参要求。
     
@@ -1937,7 +1993,7 @@ def _sanitize_initial_messages(
     sanitized: List[Dict[str, Any]] = []
     pending_tool_call_ids: List[str] = []
     pending_tool_call_info: Dict[str, Dict[str, Any]] = {}
-    persisted_tool_call_map = _load_persisted_tool_calls(user_id, thread_id)
+    persisted_tool_call_map = _load_persisted_tool_calls(user_id, thread_id, history)
     auto_tool_call_counter = 0
     
     def attach_tool_calls_to_last(tool_calls: List[Dict[str, Any]], fallback_content: Optional[str] = None) -> None:
@@ -2112,7 +2168,8 @@ def _sanitize_initial_messages(
 def _prune_unsent_user_messages(
     user_id: Optional[str],
     messages: List[Dict[str, Any]],
-    thread_id: Optional[str] = None
+    thread_id: Optional[str] = None,
+    history: Optional[ConversationHistory] = None
 ) -> List[Dict[str, Any]]:
     """移除历史中已成功落库的用户消息和重复的未发送消息，仅保留最后一条待发送的消息。
     
@@ -2123,18 +2180,13 @@ def _prune_unsent_user_messages(
     if not user_id or not messages:
         return messages
 
-    try:
-        history = ChatLogDB.get_recent_logs(user_id, limit=200, thread_id=thread_id)
-    except Exception as exc:
-        logger.warning("Failed to load chat history, skipping deduplication: %s", exc)
+    if history is None:
+        history = ConversationHistory.load(user_id, thread_id)
+    if history is None:
         return messages
 
-    # 获取已持久化的用户消息内容（按时间顺序）
-    persisted_user_contents: List[str] = []
-    for record in reversed(history):  # 转为时间正序
-        role = (record.get("role") or "").lower()
-        if role == "user":
-            persisted_user_contents.append((record.get("content") or ""))
+    # 已持久化的用户消息内容（按时间顺序）
+    persisted_user_contents = history.user_contents
 
     # 标记哪些消息需要保留
     persisted_index = 0
@@ -2181,51 +2233,19 @@ def _prune_unsent_user_messages(
     return pruned
 
 
-def _collect_failed_user_contents(
-    user_id: Optional[str],
-    thread_id: Optional[str] = None
-) -> List[str]:
-    if not user_id:
-        return []
-    try:
-        history = ChatLogDB.get_recent_logs(user_id, limit=200, thread_id=thread_id)
-    except Exception as exc:
-        logger.warning("Failed to load chat history, skipping failed-turn pruning: %s", exc)
-        return []
-
-    failed_user_contents: List[str] = []
-    last_user_content: Optional[str] = None
-    last_user_failed = False
-
-    for record in reversed(history):  # 转为时间正序
-        role = (record.get("role") or "").lower()
-        if role == "user":
-            last_user_content = record.get("content") or ""
-            last_user_failed = False
-            continue
-        if role != "assistant":
-            continue
-        if last_user_content is None:
-            continue
-        if last_user_failed:
-            continue
-        if _is_truthy(record.get("is_error")):
-            failed_user_contents.append(last_user_content)
-            last_user_failed = True
-
-    return failed_user_contents
-
-
 def _prune_failed_turns(
     user_id: Optional[str],
     messages: List[Dict[str, Any]],
-    thread_id: Optional[str] = None
+    thread_id: Optional[str] = None,
+    history: Optional[ConversationHistory] = None
 ) -> List[Dict[str, Any]]:
     """移除历史中已判定失败的用户回合（对应的用户消息及其后续助手/工具消息）。"""
     if not user_id or not messages:
         return messages
 
-    failed_user_contents = _collect_failed_user_contents(user_id, thread_id)
+    if history is None:
+        history = ConversationHistory.load(user_id, thread_id)
+    failed_user_contents = history.failed_user_contents if history is not None else []
     if not failed_user_contents:
         return messages
 
@@ -2462,9 +2482,11 @@ async def stream_chat(
     """AI聊天流式响应"""
     queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
     user_id = user["id"] if user else None
-    init_messages = _sanitize_initial_messages(init_messages, user_id, conversation_id)
-    init_messages = _prune_failed_turns(user_id, init_messages, conversation_id)
-    init_messages = _prune_unsent_user_messages(user_id, init_messages, conversation_id)
+    # 本回合的历史只查询、解析一次，供以下三步预处理共用
+    history = await run_in_db_executor(ConversationHistory.load, user_id, conversation_id)
+    init_messages = _sanitize_initial_messages(init_messages, user_id, conversation_id, history)
+    init_messages = _prune_failed_turns(user_id, init_messages, conversation_id, history)
+    init_messages = _prune_unsent_user_messages(user_id, init_messages, conversation_id, history)
     model_config = resolve_model_config(selected_model_name)
     
     # 用于跟踪客户端连接状态
@@ -2539,8 +2561,7 @@ async def stream_chat(
                         partial_state["thinking_duration"] = thinking_dur
 
                     if user_id and user_messages_to_log and not partial_state["user_messages_logged"]:
-                        for content in user_messages_to_log:
-                            ChatLogDB.add_log(user_id, "user", content, thread_id=conversation_id)
+                        ChatLogDB.add_logs(user_id, [{"role": "user", "content": content} for content in user_messages_to_log], thread_id=conversation_id)
                         partial_state["user_messages_logged"] = True
 
                     if tool_calls_buffer:
@@ -2599,8 +2620,7 @@ async def stream_chat(
                         continue
                     # 始终保存用户消息（即使没有部分内容）
                     if user_id and user_messages_to_log and not partial_state["user_messages_logged"]:
-                        for content in user_messages_to_log:
-                            ChatLogDB.add_log(user_id, "user", content, thread_id=conversation_id)
+                        ChatLogDB.add_logs(user_id, [{"role": "user", "content": content} for content in user_messages_to_log], thread_id=conversation_id)
                         partial_state["user_messages_logged"] = True
 
                     # 只有在thinking阶段被中断时才标记stopped（有reasoning但没有assistant text）
@@ -2659,8 +2679,9 @@ async def stream_chat(
                 
                 # 始终保存助手消息，即使内容为空
                 try:
-                    assistant_text = partial_state.get("assistant_text", "")
-                    reasoning_output = partial_state.get("reasoning_output", "")
+                    # 流式过程中保存的是累加器，这里才拼接为字符串
+                    assistant_text = str(partial_state.get("assistant_text", ""))
+                    reasoning_output = str(partial_state.get("reasoning_output", ""))
                     thinking_dur = partial_state.get("thinking_duration")
                     
                     if assistant_text or reasoning_output:
@@ -89,7 +89,7 @@ def apply_cors(app: FastAPI) -> Tuple[List[str], bool]:
         allow_credentials=allow_credentials,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["Content-Disposition", "Content-Length", "Content-Type"],
+        expose_headers=["Content-Disposition", "Content-Length", "Content-Type", "ETag"],
     )
     return allow_origins, allow_credentials
 
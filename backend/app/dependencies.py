@@ -9,11 +9,9 @@ from auth import (
     is_super_admin_role,
 )
 from database import (
-    AddressDB,
     AgentAssignmentDB,
-    BuildingDB,
+    ShoppingRouteDB,
     UserProfileDB,
-    get_db_connection,
 )
 
 
@@ -98,7 +96,7 @@ def check_address_and_building(address_id: Optional[str], building_id: Optional[
     if not address_id:
         return result
 
-    address = AddressDB.get_by_id(address_id)
+    address = ShoppingRouteDB.get_address(address_id)
     if not address:
         result.update(
             {
@@ -120,7 +118,7 @@ def check_address_and_building(address_id: Optional[str], building_id: Optional[
         result.update({"reason": "missing_building", "message": "请先选择配送地址"})
         return result
 
-    building = BuildingDB.get_by_id(building_id)
+    building = ShoppingRouteDB.get_building(building_id)
     if not building:
         result.update(
             {
@@ -150,7 +148,6 @@ def resolve_shopping_scope(request: Request, address_id: Optional[str] = None, b
     """根据请求参数和用户资料确定购物范围与归属代理。"""
     resolved_address_id = address_id
     resolved_building_id = building_id
-    agent_id: Optional[str] = None
 
     staff = get_current_staff_from_cookie(request)
     if staff and staff.get("type") == "agent":
@@ -175,39 +172,8 @@ def resolve_shopping_scope(request: Request, address_id: Optional[str] = None, b
     else:
         validation = check_address_and_building(None, None)
 
-    if resolved_building_id:
-        assignment = AgentAssignmentDB.get_agent_for_building(resolved_building_id)
-        if assignment and assignment.get("agent_id"):
-            agent_id = assignment["agent_id"]
-            if not resolved_address_id:
-                resolved_address_id = assignment.get("address_id")
-    elif resolved_address_id:
-        agents = AgentAssignmentDB.get_agent_ids_for_address(resolved_address_id)
-        if len(agents) == 1:
-            agent_id = agents[0]
-
-    if agent_id:
-        owner_ids = [agent_id]
-    else:
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM admins WHERE (role = 'super_admin' OR role = 'admin') AND is_active = 1")
-                admin_count = cursor.fetchone()[0]
-                if admin_count > 0:
-                    owner_ids = ["admin"]
-                else:
-                    owner_ids = None
-        except Exception:
-            owner_ids = None
-
-    result = {
-        "agent_id": agent_id,
-        "address_id": resolved_address_id,
-        "building_id": resolved_building_id,
-        "owner_ids": owner_ids,
-        "address_validation": validation,
-    }
+    result = ShoppingRouteDB.resolve_owner(resolved_address_id, resolved_building_id)
+    result["address_validation"] = validation
     return result
 
 
@@ -12,15 +12,20 @@ from database import (
     OrderDB,
     OrderExportDB,
     cleanup_old_chat_logs,
+    close_all_connections,
     get_db_connection,
+    get_password_hasher,
     init_database,
     migrate_image_paths,
     migrate_agent_image_paths,
     migrate_payment_qr_paths,
+    shutdown_db_executor,
+    shutdown_password_hasher,
 )
 from .context import EXPORTS_DIR, ITEMS_DIR, PUBLIC_DIR, logger
 from .services.captcha import CaptchaService
 from admin_ai_chat import cleanup_temp_uploads
+from http_clients import close_http_clients, start_http_clients
 
 
 settings = get_settings()
@@ -227,6 +232,12 @@ async def run_startup_tasks() -> List[asyncio.Task]:
 
     init_database()
 
+    try:
+        # 预先启动密码哈希进程，避免首批登录请求承担进程启动耗时
+        await asyncio.to_thread(get_password_hasher().warm_up)
+    except Exception as exc:
+        logger.warning("Password hasher warm-up failed: %s", exc)
+
     try:
         CategoryDB.cleanup_orphan_categories()
     except Exception as exc:
@@ -276,6 +287,11 @@ async def run_startup_tasks() -> List[asyncio.Task]:
     except Exception as exc:
         logger.warning("Startup temp upload cleanup failed: %s", exc)
 
+    # 共享的上游 HTTP 客户端（AI 接口、第三方登录接口），在应用关闭时统一释放连接
+    start_http_clients()
+    # 后台预渲染滑块验证码，请求路径直接取用内存中的图片
+    CaptchaService.start_challenge_pool()
+
     maintenance_tasks: List[asyncio.Task] = []
     maintenance_tasks.append(asyncio.create_task(periodic_cleanup(), name="periodic_cleanup"))
     maintenance_tasks.append(asyncio.create_task(expired_unpaid_cleanup(), name="expired_unpaid_cleanup"))
@@ -325,13 +341,13 @@ async def expired_unpaid_cleanup():
 
 
 async def captcha_cleanup():
-    """高频清理验证码生成图片，防止临时文件堆积。"""
+    """定时清理过期的验证码挑战及其内存图片。"""
     while True:
         try:
             await asyncio.sleep(30)
             removed = CaptchaService.cleanup_generated_images()
             if removed:
-                logger.info("Removed %s temporary captcha images", removed)
+                logger.info("Removed %s expired captcha images", removed)
         except Exception as exc:
             logger.error("Captcha image cleanup task failed: %s", exc)
 
@@ -347,3 +363,8 @@ async def app_lifespan(app: FastAPI):
             task.cancel()
         if background_tasks:
             await asyncio.gather(*background_tasks, return_exceptions=True)
+        await close_http_clients()
+        await CaptchaService.stop_challenge_pool()
+        shutdown_db_executor(wait=False)
+        shutdown_password_hasher(wait=False)
+        close_all_connections()
@@ -9,7 +9,7 @@ from auth import (
     get_current_staff_required_from_cookie,
 )
 from config import get_settings
-from database import StaffChatLogDB
+from database import StaffChatLogDB, aio, offload_db, run_in_db_executor
 from ..context import logger
 from ..dependencies import require_agent_with_scope
 from ..schemas import ChatRequest, ChatThreadCreateRequest, ChatThreadUpdateRequest
@@ -80,7 +80,8 @@ def _serialize_staff_message(record: Dict[str, Any]) -> Dict[str, Any]:
 # ===== 模型列表（共用） =====
 
 @router.get("/admin/ai/models")
-async def admin_list_ai_models(request: Request):
+@offload_db
+def admin_list_ai_models(request: Request):
     get_current_staff_required_from_cookie(request)
     configs = get_settings().model_order
     return {
@@ -92,7 +93,8 @@ async def admin_list_ai_models(request: Request):
 
 
 @router.get("/agent/ai/models")
-async def agent_list_ai_models(request: Request):
+@offload_db
+def agent_list_ai_models(request: Request):
     require_agent_with_scope(request)
     configs = get_settings().model_order
     return {
@@ -109,13 +111,13 @@ async def agent_list_ai_models(request: Request):
 async def admin_ai_chat(request_body: ChatRequest, http_request: Request):
     """管理员 AI 聊天接口。"""
     try:
-        staff = get_current_staff_required_from_cookie(http_request)
+        staff = await run_in_db_executor(get_current_staff_required_from_cookie, http_request)
         staff["device_timezone_offset_minutes"] = request_body.timezone_offset_minutes if request_body.timezone_offset_minutes is not None else 0
         staff_account_id = staff.get("id", "")
 
         conversation_id = (request_body.conversation_id or "").strip() or None
         if conversation_id:
-            thread = StaffChatLogDB.get_thread_for_staff(staff_account_id, conversation_id)
+            thread = await aio.StaffChatLogDB.get_thread_for_staff(staff_account_id, conversation_id)
             if not thread:
                 raise HTTPException(status_code=401, detail="无权访问该会话")
 
@@ -141,13 +143,13 @@ async def admin_ai_chat(request_body: ChatRequest, http_request: Request):
 async def agent_ai_chat(request_body: ChatRequest, http_request: Request):
     """代理 AI 聊天接口。"""
     try:
-        agent, _ = require_agent_with_scope(http_request)
+        agent, _ = await run_in_db_executor(require_agent_with_scope, http_request)
         agent["device_timezone_offset_minutes"] = request_body.timezone_offset_minutes if request_body.timezone_offset_minutes is not None else 0
         staff_account_id = agent.get("id", "")
 
         conversation_id = (request_body.conversation_id or "").strip() or None
         if conversation_id:
-            thread = StaffChatLogDB.get_thread_for_staff(staff_account_id, conversation_id)
+            thread = await aio.StaffChatLogDB.get_thread_for_staff(staff_account_id, conversation_id)
             if not thread:
                 raise HTTPException(status_code=401, detail="无权访问该会话")
 
@@ -172,7 +174,8 @@ async def agent_ai_chat(request_body: ChatRequest, http_request: Request):
 # ===== 聊天历史管理 =====
 
 @router.get("/admin/ai/chats")
-async def admin_list_chats(request: Request, limit: int = 100):
+@offload_db
+def admin_list_chats(request: Request, limit: int = 100):
     staff = get_current_staff_required_from_cookie(request)
     try:
         safe_limit = max(1, min(limit, 200))
@@ -184,7 +187,8 @@ async def admin_list_chats(request: Request, limit: int = 100):
 
 
 @router.get("/agent/ai/chats")
-async def agent_list_chats(request: Request, limit: int = 100):
+@offload_db
+def agent_list_chats(request: Request, limit: int = 100):
     agent, _ = require_agent_with_scope(request)
     try:
         safe_limit = max(1, min(limit, 200))
@@ -196,7 +200,8 @@ async def agent_list_chats(request: Request, limit: int = 100):
 
 
 @router.post("/admin/ai/chats")
-async def admin_create_chat(payload: ChatThreadCreateRequest, request: Request):
+@offload_db
+def admin_create_chat(payload: ChatThreadCreateRequest, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         thread = StaffChatLogDB.create_thread(staff["id"], title=payload.title)
@@ -209,7 +214,8 @@ async def admin_create_chat(payload: ChatThreadCreateRequest, request: Request):
 
 
 @router.post("/agent/ai/chats")
-async def agent_create_chat(payload: ChatThreadCreateRequest, request: Request):
+@offload_db
+def agent_create_chat(payload: ChatThreadCreateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     try:
         thread = StaffChatLogDB.create_thread(agent["id"], title=payload.title)
@@ -222,7 +228,8 @@ async def agent_create_chat(payload: ChatThreadCreateRequest, request: Request):
 
 
 @router.get("/admin/ai/chats/{chat_id}")
-async def admin_get_chat(chat_id: str, request: Request):
+@offload_db
+def admin_get_chat(chat_id: str, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         thread = StaffChatLogDB.get_thread_for_staff(staff["id"], chat_id)
@@ -238,7 +245,8 @@ async def admin_get_chat(chat_id: str, request: Request):
 
 
 @router.get("/agent/ai/chats/{chat_id}")
-async def agent_get_chat(chat_id: str, request: Request):
+@offload_db
+def agent_get_chat(chat_id: str, request: Request):
     agent, _ = require_agent_with_scope(request)
     try:
         thread = StaffChatLogDB.get_thread_for_staff(agent["id"], chat_id)
@@ -254,7 +262,8 @@ async def agent_get_chat(chat_id: str, request: Request):
 
 
 @router.patch("/admin/ai/chats/{chat_id}")
-async def admin_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
+@offload_db
+def admin_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         updated = StaffChatLogDB.rename_thread(staff["id"], chat_id, payload.title or "")
@@ -270,7 +279,8 @@ async def admin_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, requ
 
 
 @router.patch("/agent/ai/chats/{chat_id}")
-async def agent_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
+@offload_db
+def agent_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     try:
         updated = StaffChatLogDB.rename_thread(agent["id"], chat_id, payload.title or "")
@@ -290,7 +300,7 @@ async def agent_rename_chat(chat_id: str, payload: ChatThreadUpdateRequest, requ
 @router.post("/admin/ai/upload-image")
 async def admin_upload_image(request: Request, file: UploadFile = File(...)):
     """管理员聊天图片上传。"""
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     try:
         content = await file.read()
         result = handle_admin_image_upload(staff, content)
@@ -307,7 +317,7 @@ async def admin_upload_image(request: Request, file: UploadFile = File(...)):
 @router.post("/agent/ai/upload-image")
 async def agent_upload_image(request: Request, file: UploadFile = File(...)):
     """代理聊天图片上传。"""
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     try:
         content = await file.read()
         result = handle_admin_image_upload(agent, content)
@@ -27,6 +27,9 @@ from database import (
     SalesCycleDB,
     UserProfileDB,
     get_db_connection,
+    offload_db,
+    prepare_password,
+    run_in_db_executor,
 )
 from ..context import PUBLIC_DIR, logger
 from ..dependencies import build_staff_scope, check_address_and_building
@@ -143,7 +146,8 @@ def _cleanup_empty_payment_qr_dirs(file_path: str) -> None:
 
 
 @router.get("/admin/students/search")
-async def admin_search_students(request: Request, q: str = "", limit: int = 20):
+@offload_db
+def admin_search_students(request: Request, q: str = "", limit: int = 20):
     """
     按学号、用户姓名、配送名模糊搜索
     - 管理员可以搜索所有用户
@@ -209,7 +213,8 @@ async def admin_search_students(request: Request, q: str = "", limit: int = 20):
 
 
 @router.get("/admin/agents")
-async def admin_list_agents(request: Request, include_inactive: bool = False):
+@offload_db
+def admin_list_agents(request: Request, include_inactive: bool = False):
     staff = get_current_super_admin_required_from_cookie(request)
     include_disabled = str(include_inactive).lower() in ("1", "true", "yes")
     include_deleted_param = request.query_params.get("include_deleted")
@@ -286,7 +291,8 @@ async def admin_list_agents(request: Request, include_inactive: bool = False):
 
 
 @router.post("/admin/agents")
-async def admin_create_agent(payload: AgentCreateRequest, request: Request):
+@offload_db
+def admin_create_agent(payload: AgentCreateRequest, request: Request):
     staff = get_current_super_admin_required_from_cookie(request)
     try:
         account = payload.account.strip()
@@ -318,7 +324,8 @@ async def admin_create_agent(payload: AgentCreateRequest, request: Request):
 
 
 @router.put("/admin/agents/{agent_id}")
-async def admin_update_agent(agent_id: str, payload: AgentUpdateRequest, request: Request):
+@offload_db
+def admin_update_agent(agent_id: str, payload: AgentUpdateRequest, request: Request):
     staff = get_current_super_admin_required_from_cookie(request)
     try:
         agent = AdminDB.get_admin_by_agent_id(agent_id, include_disabled=True, include_deleted=True)
@@ -342,7 +349,7 @@ async def admin_update_agent(agent_id: str, payload: AgentUpdateRequest, request
         if payload.password:
             if len(payload.password) < 3:
                 return error_response("密码至少3位", 400)
-            update_fields["password"] = payload.password
+            update_fields["password"] = prepare_password(payload.password)
             needs_token_reset = True
         if payload.account:
             new_account = payload.account.strip()
@@ -391,7 +398,8 @@ async def admin_update_agent(agent_id: str, payload: AgentUpdateRequest, request
 
 
 @router.delete("/admin/agents/{agent_id}")
-async def admin_delete_agent(agent_id: str, request: Request):
+@offload_db
+def admin_delete_agent(agent_id: str, request: Request):
     staff = get_current_super_admin_required_from_cookie(request)
     try:
         agent = AdminDB.get_admin_by_agent_id(agent_id, include_disabled=True, include_deleted=True)
@@ -416,7 +424,8 @@ async def admin_delete_agent(agent_id: str, request: Request):
 
 
 @router.get("/admin/payment-qrs")
-async def admin_get_payment_qrs(request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_get_payment_qrs(request: Request, owner_id: Optional[str] = None):
     """管理员获取收款码列表，支持切换归属。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -430,7 +439,8 @@ async def admin_get_payment_qrs(request: Request, owner_id: Optional[str] = None
 
 
 @router.get("/agent/payment-qrs")
-async def agent_get_payment_qrs(request: Request):
+@offload_db
+def agent_get_payment_qrs(request: Request):
     """代理获取自己的收款码列表。"""
     staff = get_current_staff_required_from_cookie(request)
     if staff.get("role") != "agent":
@@ -451,7 +461,7 @@ async def admin_create_payment_qr(
     owner_id: Optional[str] = None,
 ):
     """管理员创建收款码。"""
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     try:
         if not file or not file.filename:
             return error_response("请上传图片文件", 400)
@@ -490,7 +500,7 @@ async def admin_create_payment_qr(
 @router.post("/agent/payment-qrs")
 async def agent_create_payment_qr(request: Request, name: str = Form(...), file: UploadFile = File(...)):
     """代理创建收款码。"""
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     if staff.get("role") != "agent":
         return error_response("权限不足", 403)
     try:
@@ -526,7 +536,8 @@ async def agent_create_payment_qr(request: Request, name: str = Form(...), file:
 
 
 @router.put("/admin/payment-qrs/{qr_id}")
-async def admin_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, request: Request, owner_id: Optional[str] = None):
     """管理员更新收款码。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -547,7 +558,8 @@ async def admin_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, r
 
 
 @router.put("/agent/payment-qrs/{qr_id}")
-async def agent_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, request: Request):
+@offload_db
+def agent_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, request: Request):
     """代理更新收款码。"""
     staff = get_current_staff_required_from_cookie(request)
     if staff.get("role") != "agent":
@@ -568,7 +580,8 @@ async def agent_update_payment_qr(qr_id: str, payload: PaymentQrUpdateRequest, r
 
 
 @router.patch("/admin/payment-qrs/{qr_id}/status")
-async def admin_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusRequest, request: Request, owner_id: Optional[str] = None):
     """管理员更新收款码启用状态。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -587,7 +600,8 @@ async def admin_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusReq
 
 
 @router.patch("/agent/payment-qrs/{qr_id}/status")
-async def agent_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusRequest, request: Request):
+@offload_db
+def agent_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusRequest, request: Request):
     """代理更新收款码启用状态。"""
     staff = get_current_staff_required_from_cookie(request)
     if staff.get("role") != "agent":
@@ -606,7 +620,8 @@ async def agent_update_payment_qr_status(qr_id: str, payload: PaymentQrStatusReq
 
 
 @router.delete("/admin/payment-qrs/{qr_id}")
-async def admin_delete_payment_qr(qr_id: str, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_delete_payment_qr(qr_id: str, request: Request, owner_id: Optional[str] = None):
     """管理员删除收款码。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -633,7 +648,8 @@ async def admin_delete_payment_qr(qr_id: str, request: Request, owner_id: Option
 
 
 @router.delete("/agent/payment-qrs/{qr_id}")
-async def agent_delete_payment_qr(qr_id: str, request: Request):
+@offload_db
+def agent_delete_payment_qr(qr_id: str, request: Request):
     """代理删除收款码。"""
     staff = get_current_staff_required_from_cookie(request)
     if staff.get("role") != "agent":
@@ -660,7 +676,8 @@ async def agent_delete_payment_qr(qr_id: str, request: Request):
 
 
 @router.get("/payment-qr")
-async def get_payment_qr(address_id: str = None, building_id: str = None, request: Request = None):
+@offload_db
+def get_payment_qr(address_id: str = None, building_id: str = None, request: Request = None):
     """根据地址信息获取对应的收款码。"""
     user = get_current_user_from_cookie(request)
     if not user:
@@ -736,7 +753,7 @@ async def get_payment_qr(address_id: str = None, building_id: str = None, reques
 @router.get("/orders/{order_id}/payment-qr")
 async def get_order_payment_qr(order_id: str, request: Request):
     """获取订单对应的收款码。"""
-    user = get_current_user_from_cookie(request)
+    user = await run_in_db_executor(get_current_user_from_cookie, request)
     if not user:
         return error_response("未登录", 401)
 
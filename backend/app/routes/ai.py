@@ -6,7 +6,7 @@ from fastapi import APIRouter, HTTPException, Request
 from ai_chat import stream_chat
 from auth import get_current_user_from_cookie, get_current_user_required_from_cookie
 from config import get_settings
-from database import ChatLogDB
+from database import ChatLogDB, aio, offload_db
 from ..context import logger
 from ..schemas import ChatRequest, ChatThreadCreateRequest, ChatThreadUpdateRequest
 
@@ -77,7 +77,8 @@ def _serialize_chat_message(record: Dict[str, Any]) -> Dict[str, Any]:
 
 
 @router.get("/ai/models")
-async def list_ai_models():
+@offload_db
+def list_ai_models():
     """返回可用模型列表及其能力，用于前端渲染模型选择器。"""
     configs = get_settings().model_order
     result = {
@@ -94,7 +95,8 @@ async def list_ai_models():
 
 
 @router.get("/ai/chats")
-async def list_chat_history(request: Request, limit: int = 100):
+@offload_db
+def list_chat_history(request: Request, limit: int = 100):
     """列出当前用户的聊天会话。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -109,7 +111,8 @@ async def list_chat_history(request: Request, limit: int = 100):
 
 
 @router.post("/ai/chats")
-async def create_chat_history(payload: ChatThreadCreateRequest, request: Request):
+@offload_db
+def create_chat_history(payload: ChatThreadCreateRequest, request: Request):
     """创建新的聊天会话。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -123,7 +126,8 @@ async def create_chat_history(payload: ChatThreadCreateRequest, request: Request
 
 
 @router.get("/ai/chats/{chat_id}")
-async def get_chat_history(chat_id: str, request: Request):
+@offload_db
+def get_chat_history(chat_id: str, request: Request):
     """获取指定聊天会话及其消息。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -140,7 +144,8 @@ async def get_chat_history(chat_id: str, request: Request):
 
 
 @router.patch("/ai/chats/{chat_id}")
-async def rename_chat_history(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
+@offload_db
+def rename_chat_history(chat_id: str, payload: ChatThreadUpdateRequest, request: Request):
     """重命名聊天会话。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -172,7 +177,7 @@ async def ai_chat(request: ChatRequest, http_request: Request):
         if user:
             if not conversation_id:
                 raise HTTPException(status_code=400, detail="缺少会话ID")
-            thread = ChatLogDB.get_thread_for_user(user["id"], conversation_id)
+            thread = await aio.ChatLogDB.get_thread_for_user(user["id"], conversation_id)
             if not thread:
                 raise HTTPException(status_code=401, detail="无权访问该会话")
         else:
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, Response
+from fastapi import APIRouter, HTTPException, Request, Response
 
 from auth import (
     AuthError,
@@ -12,7 +12,7 @@ from auth import (
     set_auth_cookie,
     success_response,
 )
-from database import AdminDB, SalesCycleDB, SettingsDB, UserDB
+from database import AdminDB, SalesCycleDB, SettingsDB, UserDB, offload_db, prepare_password_async, run_in_db_executor
 from ..context import logger
 from ..schemas import (
     AdminLoginRequest,
@@ -70,6 +70,16 @@ async def verify_captcha_challenge(request: Request, payload: CaptchaVerifyReque
         return error_response("验证码验证失败", 500)
 
 
+@router.get("/auth/captcha/image/{challenge_id}/{kind}")
+async def get_captcha_image(challenge_id: str, kind: str):
+    """返回验证码挑战图片（kind 为 bg 或 puzzle）。"""
+    try:
+        content, media_type = await CaptchaService.get_challenge_image(challenge_id, kind)
+    except CaptchaError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.message)
+    return Response(content=content, media_type=media_type, headers={"Cache-Control": "no-store"})
+
+
 @router.post("/auth/captcha/discard")
 async def discard_captcha_challenge(request: Request, payload: CaptchaDiscardRequest):
     """主动废弃验证码挑战并清理相关图片。"""
@@ -96,7 +106,7 @@ async def login(http_request: Request, request: LoginRequest, response: Response
             await CaptchaService.consume_pass_token(http_request, request.captcha_token, scene="login")
 
         try:
-            staff_result = AuthManager.login_admin(request.student_id, request.password)
+            staff_result = await AuthManager.login_admin(request.student_id, request.password)
         except AuthError as exc:
             return error_response(exc.message, exc.status_code)
         if staff_result:
@@ -126,7 +136,7 @@ async def admin_login(http_request: Request, request: AdminLoginRequest, respons
             await CaptchaService.consume_pass_token(http_request, request.captcha_token, scene="login")
 
         try:
-            result = AuthManager.login_admin(request.admin_id, request.password)
+            result = await AuthManager.login_admin(request.admin_id, request.password)
         except AuthError as exc:
             return error_response(exc.message, exc.status_code)
         if not result:
@@ -143,14 +153,16 @@ async def admin_login(http_request: Request, request: AdminLoginRequest, respons
 
 
 @router.post("/auth/logout")
-async def logout(response: Response):
+@offload_db
+def logout(response: Response):
     """用户登出。"""
     clear_auth_cookie(response)
     return success_response("登出成功")
 
 
 @router.get("/auth/me")
-async def get_current_user_info(request: Request):
+@offload_db
+def get_current_user_info(request: Request):
     """获取当前用户信息。"""
     user = get_current_user_from_cookie(request)
     if user:
@@ -164,7 +176,8 @@ async def get_current_user_info(request: Request):
 
 
 @router.post("/auth/refresh")
-async def refresh_token(request: Request, response: Response):
+@offload_db
+def refresh_token(request: Request, response: Response):
     """刷新令牌。"""
     user = get_current_user_from_cookie(request)
     if user:
@@ -189,7 +202,8 @@ async def refresh_token(request: Request, response: Response):
 
 
 @router.get("/auth/registration-status")
-async def get_registration_status():
+@offload_db
+def get_registration_status():
     """获取注册功能是否启用。"""
     try:
         enabled = SettingsDB.get("registration_enabled", "false").lower() == "true"
@@ -215,8 +229,8 @@ async def register_user(http_request: Request, request: RegisterRequest, respons
     try:
         await CaptchaService.consume_pass_token(http_request, request.captcha_token, scene="register")
 
-        enabled = SettingsDB.get("registration_enabled", "false").lower() == "true"
-        if not enabled:
+        enabled = await run_in_db_executor(SettingsDB.get, "registration_enabled", "false")
+        if enabled.lower() != "true":
             return error_response("注册功能未启用", 403)
 
         username = request.username.strip()
@@ -237,16 +251,17 @@ async def register_user(http_request: Request, request: RegisterRequest, respons
         if not (has_letter and has_digit):
             return error_response("密码必须包含数字和字母", 400)
 
-        existing_user = UserDB.get_user(username)
+        existing_user = await run_in_db_executor(UserDB.get_user, username)
         if existing_user:
             return error_response("用户已存在", 400)
 
-        existing_admin = AdminDB.get_admin(username)
+        existing_admin = await run_in_db_executor(AdminDB.get_admin, username)
         if existing_admin:
             return error_response("用户已存在", 400)
 
         display_name = request.nickname.strip() if request.nickname and request.nickname.strip() else username
-        success = UserDB.create_user(username, password, display_name, id_status=2)
+        password_hash = await prepare_password_async(password)
+        success = await run_in_db_executor(UserDB.create_user, username, password_hash, display_name, id_status=2)
         if not success:
             return error_response("注册失败，请稍后重试", 500)
 
@@ -267,7 +282,7 @@ async def register_user(http_request: Request, request: RegisterRequest, respons
 @router.post("/admin/registration-settings")
 async def update_registration_settings(request: Request):
     """管理员更新注册/预约设置。"""
-    _admin = get_current_admin_required_from_cookie(request)
+    _admin = await run_in_db_executor(get_current_admin_required_from_cookie, request)
     try:
         params = request.query_params or {}
         enabled_param = params.get("enabled")
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Request
 
 from auth import error_response, get_current_user_required_from_cookie, success_response
-from database import CartDB, DeliverySettingsDB, LotteryConfigDB, ProductDB, UserDB, VariantDB
+from database import CartDB, DeliverySettingsDB, LotteryConfigDB, ProductDB, UserDB, VariantDB, offload_db
 from ..context import logger
 from ..dependencies import check_address_and_building, get_owner_id_from_scope, resolve_shopping_scope
 from ..schemas import CartUpdateRequest
@@ -13,7 +13,8 @@ router = APIRouter()
 
 
 @router.get("/cart")
-async def get_cart(request: Request):
+@offload_db
+def get_cart(request: Request):
     user = get_current_user_required_from_cookie(request)
 
     try:
@@ -43,14 +44,18 @@ async def get_cart(request: Request):
 
         items_dict = cart_data["items"]
 
-        all_products = ProductDB.get_all_products(owner_ids=owner_ids, include_unassigned=include_unassigned)
-        product_dict = {p["id"]: p for p in all_products}
+        sep = "@@"
+        product_dict = ProductDB.get_many(
+            [str(key).split(sep, 1)[0] for key in items_dict],
+            owner_ids=owner_ids,
+            include_unassigned=include_unassigned,
+        )
+        variant_dict = VariantDB.get_many([str(key).split(sep, 1)[1] for key in items_dict if sep in str(key)])
 
         cart_items = []
         total_quantity = 0
         total_price = 0.0
 
-        sep = "@@"
         for key, quantity in items_dict.items():
             product_id = key
             variant_id = None
@@ -100,7 +105,7 @@ async def get_cart(request: Request):
                     if note_val:
                         item["reservation_note"] = note_val[:120]
                 if variant_id:
-                    variant = VariantDB.get_by_id(variant_id)
+                    variant = variant_dict.get(variant_id)
                     if variant:
                         item["variant_id"] = variant_id
                         item["variant_name"] = variant.get("name")
@@ -150,7 +155,8 @@ async def get_cart(request: Request):
 
 
 @router.post("/cart/update")
-async def update_cart(cart_request: CartUpdateRequest, request: Request):
+@offload_db
+def update_cart(cart_request: CartUpdateRequest, request: Request):
     user = get_current_user_required_from_cookie(request)
 
     try:
@@ -160,12 +166,15 @@ async def update_cart(cart_request: CartUpdateRequest, request: Request):
         owner_ids = scope["owner_ids"]
         include_unassigned = False if owner_ids else True
 
-        accessible_products = ProductDB.get_all_products(owner_ids=owner_ids, include_unassigned=include_unassigned)
-        product_dict = {p["id"]: p for p in accessible_products}
-
         current_cart = CartDB.get_cart(user["id"])
         items = current_cart["items"] if current_cart else {}
 
+        product_dict = ProductDB.get_many(
+            [str(key).split("@@", 1)[0] for key in items] + [cart_request.product_id],
+            owner_ids=owner_ids,
+            include_unassigned=include_unassigned,
+        )
+
         if cart_request.action == "clear":
             items = {}
         elif cart_request.action == "remove" and cart_request.product_id:
@@ -1,50 +1,36 @@
 from typing import Optional
 from fastapi import APIRouter, Request
 
-from auth import error_response, success_response
-from database import CategoryDB, ProductDB, SettingsDB, VariantDB
+from auth import error_response
+from database import offload_db
 from ..context import logger
 from ..dependencies import resolve_shopping_scope
-from ..utils import enrich_product_image_url, is_non_sellable, is_truthy
+from ..services.catalog import get_catalog_snapshot, precomputed_json_response, serialize_fragment, show_inactive_in_shop
+from ..utils import is_truthy
 
 
 router = APIRouter()
 
 
 @router.get("/products")
-async def get_products(request: Request, category: Optional[str] = None, address_id: Optional[str] = None, building_id: Optional[str] = None, hot_only: Optional[str] = None):
-    """获取商品列表。"""
+@offload_db
+def get_products(request: Request, category: Optional[str] = None, address_id: Optional[str] = None, building_id: Optional[str] = None, hot_only: Optional[str] = None):
+    """获取商品列表（基于目录快照，内容未变化时返回 304）。"""
     try:
         scope = resolve_shopping_scope(request, address_id, building_id)
-        owner_ids = scope["owner_ids"]
-        include_unassigned = False
-
-        show_inactive = SettingsDB.get("show_inactive_in_shop", "false") == "true"
-
-        hot_filter = is_truthy(hot_only)
-        if category:
-            products = ProductDB.get_products_by_category(
-                category, owner_ids=owner_ids, include_unassigned=include_unassigned, hot_only=hot_filter
-            )
-        else:
-            products = ProductDB.get_all_products(owner_ids=owner_ids, include_unassigned=include_unassigned, hot_only=hot_filter)
-
-        if not show_inactive:
-            products = [p for p in products if p.get("is_active", 1) != 0]
-
-        product_ids = [p["id"] for p in products]
-        variants_map = VariantDB.get_for_products(product_ids)
-        for p in products:
-            enrich_product_image_url(p)  # Add image_url field
-            vts = variants_map.get(p["id"], [])
-            p["variants"] = vts
-            p["has_variants"] = len(vts) > 0
-            p["is_not_for_sale"] = is_non_sellable(p)
-            if p["has_variants"]:
-                p["total_variant_stock"] = sum(v.get("stock", 0) for v in vts)
-            if p["is_not_for_sale"]:
-                p["stock_display"] = "∞"
-        return success_response("获取商品列表成功", {"products": products, "scope": scope})
+        snapshot = get_catalog_snapshot(scope["owner_ids"], include_unassigned=False)
+        products_json, products_digest = snapshot.view_json(
+            show_inactive=show_inactive_in_shop(),
+            category=category or None,
+            hot_only=is_truthy(hot_only),
+        )
+        scope_json, scope_digest = serialize_fragment(scope)
+        return precomputed_json_response(
+            request,
+            "获取商品列表成功",
+            [("products", products_json), ("scope", scope_json)],
+            [products_digest, scope_digest],
+        )
 
     except Exception as exc:
         logger.error("Failed to fetch products: %s", exc)
@@ -52,34 +38,21 @@ async def get_products(request: Request, category: Optional[str] = None, address
 
 
 @router.get("/products/search")
-async def search_products(request: Request, q: str, address_id: Optional[str] = None, building_id: Optional[str] = None):
+@offload_db
+def search_products(request: Request, q: str, address_id: Optional[str] = None, building_id: Optional[str] = None):
     """搜索商品。"""
     try:
         scope = resolve_shopping_scope(request, address_id, building_id)
-        owner_ids = scope["owner_ids"]
-        include_unassigned = False
-
-        show_inactive = SettingsDB.get("show_inactive_in_shop", "false") == "true"
-
-        products = ProductDB.search_products(q, owner_ids=owner_ids, include_unassigned=include_unassigned)
-
-        if not show_inactive:
-            products = [p for p in products if p.get("is_active", 1) != 0]
-
-        product_ids = [p["id"] for p in products]
-        variants_map = VariantDB.get_for_products(product_ids)
-        for p in products:
-            enrich_product_image_url(p)  # Add image_url field
-            vts = variants_map.get(p["id"], [])
-            p["variants"] = vts
-            p["has_variants"] = len(vts) > 0
-            p["is_not_for_sale"] = is_non_sellable(p)
-            if p["has_variants"]:
-                p["total_variant_stock"] = sum(v.get("stock", 0) for v in vts)
-            if p["is_not_for_sale"]:
-                p["stock_display"] = "∞"
-        return success_response("搜索成功", {"products": products, "query": q, "scope": scope})
-
+        snapshot = get_catalog_snapshot(scope["owner_ids"], include_unassigned=False)
+        products_json, products_digest = snapshot.search_json(q, show_inactive=show_inactive_in_shop())
+        query_json, query_digest = serialize_fragment(q)
+        scope_json, scope_digest = serialize_fragment(scope)
+        return precomputed_json_response(
+            request,
+            "搜索成功",
+            [("products", products_json), ("query", query_json), ("scope", scope_json)],
+            [products_digest, query_digest, scope_digest],
+        )
 
     except Exception as exc:
         logger.error("Failed to search products: %s", exc)
@@ -87,28 +60,20 @@ async def search_products(request: Request, q: str, address_id: Optional[str] =
 
 
 @router.get("/products/categories")
-async def get_categories(request: Request, address_id: Optional[str] = None, building_id: Optional[str] = None):
+@offload_db
+def get_categories(request: Request, address_id: Optional[str] = None, building_id: Optional[str] = None):
     """获取商品分类（只返回有商品的分类）。"""
     try:
         scope = resolve_shopping_scope(request, address_id, building_id)
-        owner_ids = scope["owner_ids"]
-        include_unassigned = False
-
-        show_inactive = SettingsDB.get("show_inactive_in_shop", "false") == "true"
-
-        try:
-            CategoryDB.cleanup_orphan_categories()
-        except Exception:
-            pass
-
-        if show_inactive:
-            categories = CategoryDB.get_categories_with_products(owner_ids=owner_ids, include_unassigned=include_unassigned)
-        else:
-            categories = CategoryDB.get_categories_with_active_products(
-                owner_ids=owner_ids, include_unassigned=include_unassigned
-            )
-
-        return success_response("获取分类成功", {"categories": categories, "scope": scope})
+        snapshot = get_catalog_snapshot(scope["owner_ids"], include_unassigned=False)
+        categories_json, categories_digest = snapshot.categories_json(show_inactive=show_inactive_in_shop())
+        scope_json, scope_digest = serialize_fragment(scope)
+        return precomputed_json_response(
+            request,
+            "获取分类成功",
+            [("categories", categories_json), ("scope", scope_json)],
+            [categories_digest, scope_digest],
+        )
 
     except Exception as exc:
         logger.error("Failed to fetch categories: %s", exc)
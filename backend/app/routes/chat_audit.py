@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Request
 
@@ -7,7 +7,16 @@ from auth import (
     get_current_staff_required_from_cookie,
     success_response,
 )
-from database import AddressDB, AgentAssignmentDB, ChatLogDB, UserDB, UserProfileDB, get_db_connection
+from database import (
+    AddressDB,
+    AgentAssignmentDB,
+    ChatLogDB,
+    ChatUserSummaryDB,
+    UserDB,
+    UserProfileDB,
+    get_db_connection,
+    offload_db,
+)
 from ..context import logger
 from ..dependencies import build_staff_scope
 from .ai import _serialize_chat_thread, _serialize_chat_message
@@ -37,108 +46,45 @@ def _staff_can_access_user(staff: Dict[str, Any], scope: Dict[str, Any], student
 
 
 @router.get("/admin/chat-audit/users")
-async def list_chat_audit_users(request: Request, q: str = "", offset: int = 0, limit: int = 30):
-    """列出有聊天记录的用户，支持搜索和分页。代理仅可见管辖区域用户。"""
+@offload_db
+def list_chat_audit_users(
+    request: Request,
+    q: str = "",
+    offset: int = 0,
+    limit: int = 30,
+    cursor: Optional[str] = None,
+):
+    """列出有聊天记录的用户，按学号或姓名前缀搜索；传入上一页的 next_cursor 时按键集翻页。代理仅可见管辖区域用户。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
         scope = build_staff_scope(staff)
-        like = f"%{q.strip()}%" if q.strip() else "%"
         safe_offset = max(0, offset)
         safe_limit = max(1, min(limit, 100))
-
-        with get_db_connection() as conn:
-            cur = conn.cursor()
-
-            search_condition = "(u.id LIKE ? OR u.name LIKE ? OR up.name LIKE ?)"
-            params: List[Any] = [like, like, like]
-            filters: List[str] = [search_condition]
-
-            if staff.get("type") == "agent":
-                address_ids = [aid for aid in (scope.get("address_ids") or []) if aid]
-                building_ids = [bid for bid in (scope.get("building_ids") or []) if bid]
-                if not address_ids and not building_ids:
-                    return success_response("查询成功", {"users": [], "total": 0, "offset": safe_offset, "limit": safe_limit})
-                coverage_parts: List[str] = []
-                if address_ids:
-                    placeholders = ",".join("?" * len(address_ids))
-                    coverage_parts.append(f"up.address_id IN ({placeholders})")
-                    params.extend(address_ids)
-                if building_ids:
-                    placeholders = ",".join("?" * len(building_ids))
-                    coverage_parts.append(f"up.building_id IN ({placeholders})")
-                    params.extend(building_ids)
-                filters.append("(" + " OR ".join(coverage_parts) + ")")
-
-            where_clause = " AND ".join(filters)
-
-            count_query = f"""
-                SELECT COUNT(DISTINCT u.id)
-                FROM users u
-                LEFT JOIN user_profiles up
-                  ON (up.user_id = u.user_id OR (up.user_id IS NULL AND up.student_id = u.id))
-                INNER JOIN chat_threads ct
-                  ON (ct.user_id = u.user_id OR ct.student_id = u.id)
-                WHERE {where_clause}
-            """
-            cur.execute(count_query, tuple(params))
-            total = cur.fetchone()[0] or 0
-
-            data_query = f"""
-                SELECT
-                    u.id AS student_id,
-                    COALESCE(NULLIF(TRIM(u.name), ''), NULLIF(TRIM(up.name), ''), u.id) AS display_name,
-                    MAX(ct.last_message_at) AS last_chat_at,
-                    COUNT(DISTINCT ct.id) AS thread_count,
-                    up.address_id,
-                    a.name AS address_name
-                FROM users u
-                LEFT JOIN user_profiles up
-                  ON (up.user_id = u.user_id OR (up.user_id IS NULL AND up.student_id = u.id))
-                LEFT JOIN addresses a
-                  ON a.id = up.address_id
-                INNER JOIN chat_threads ct
-                  ON (ct.user_id = u.user_id OR ct.student_id = u.id)
-                WHERE {where_clause}
-                GROUP BY u.id
-                ORDER BY last_chat_at DESC
-                LIMIT ? OFFSET ?
-            """
-            data_params = list(params) + [safe_limit, safe_offset]
-            cur.execute(data_query, tuple(data_params))
-            rows = cur.fetchall() or []
-
-        users = []
-        for row in rows:
-            users.append({
-                "student_id": row["student_id"],
-                "display_name": row["display_name"],
-                "last_chat_at": row["last_chat_at"],
-                "thread_count": row["thread_count"],
-                "address_id": row["address_id"],
-                "address_name": row["address_name"],
-            })
-
-        # Return staff's own address_ids so frontend can expand them by default
-        if staff.get("type") == "agent":
+        is_agent = staff.get("type") == "agent"
+
+        result = ChatUserSummaryDB.list_users(
+            q,
+            cursor=cursor,
+            offset=safe_offset,
+            limit=safe_limit,
+            address_ids=scope.get("address_ids") if is_agent else None,
+            building_ids=scope.get("building_ids") if is_agent else None,
+            restrict_scope=is_agent,
+            # 管理员负责未分配给任何代理的地址，前端据此默认展开这些分组
+            unassigned_address_ids=not is_agent,
+        )
+
+        if is_agent:
             staff_address_ids = scope.get("address_ids") or []
         else:
-            # Admin manages addresses NOT assigned to any agent.
-            # Collect all address_ids from returned users, then subtract agent-managed ones.
-            user_address_ids = {u["address_id"] for u in users if u.get("address_id")}
-            if user_address_ids:
-                with get_db_connection() as conn2:
-                    c2 = conn2.cursor()
-                    c2.execute("SELECT DISTINCT address_id FROM agent_buildings WHERE address_id IS NOT NULL")
-                    agent_managed = {row["address_id"] for row in c2.fetchall() or []}
-                staff_address_ids = [aid for aid in user_address_ids if aid not in agent_managed]
-            else:
-                staff_address_ids = []
+            staff_address_ids = result["unassigned_address_ids"]
 
         return success_response("查询成功", {
-            "users": users,
-            "total": total,
+            "users": result["users"],
+            "total": result["total"],
             "offset": safe_offset,
             "limit": safe_limit,
+            "next_cursor": result["next_cursor"],
             "staff_address_ids": staff_address_ids,
         })
     except Exception as exc:
@@ -147,7 +93,8 @@ async def list_chat_audit_users(request: Request, q: str = "", offset: int = 0,
 
 
 @router.get("/admin/chat-audit/users/{student_id}/threads")
-async def list_user_threads(request: Request, student_id: str, limit: int = 50):
+@offload_db
+def list_user_threads(request: Request, student_id: str, limit: int = 50):
     """获取指定用户的聊天会话列表。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -181,7 +128,8 @@ async def list_user_threads(request: Request, student_id: str, limit: int = 50):
 
 
 @router.get("/admin/chat-audit/threads/{thread_id}/messages")
-async def get_thread_messages(request: Request, thread_id: str, limit: int = 500):
+@offload_db
+def get_thread_messages(request: Request, thread_id: str, limit: int = 500):
     """获取指定聊天会话的消息内容。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -3,7 +3,7 @@ from typing import Optional
 from fastapi import APIRouter, Request
 
 from auth import error_response, get_current_admin_required_from_cookie, get_current_user_required_from_cookie, success_response
-from database import CouponDB
+from database import CouponDB, offload_db
 from ..dependencies import (
     get_owner_id_for_staff,
     get_owner_id_from_scope,
@@ -19,7 +19,8 @@ router = APIRouter()
 
 
 @router.get("/coupons/my")
-async def my_coupons(request: Request):
+@offload_db
+def my_coupons(request: Request):
     """
     获取当前用户可用的优惠券列表。
     仅返回当前配送范围对应代理发放的优惠券。
@@ -37,7 +38,8 @@ async def my_coupons(request: Request):
 
 
 @router.get("/admin/coupons")
-async def admin_list_coupons(request: Request, student_id: Optional[str] = None, owner_id: Optional[str] = None):
+@offload_db
+def admin_list_coupons(request: Request, student_id: Optional[str] = None, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
     try:
@@ -49,7 +51,8 @@ async def admin_list_coupons(request: Request, student_id: Optional[str] = None,
 
 
 @router.get("/agent/coupons")
-async def agent_list_coupons(request: Request, student_id: Optional[str] = None):
+@offload_db
+def agent_list_coupons(request: Request, student_id: Optional[str] = None):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -61,7 +64,8 @@ async def agent_list_coupons(request: Request, student_id: Optional[str] = None)
 
 
 @router.post("/admin/coupons/issue")
-async def admin_issue_coupons(payload: CouponIssueRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_issue_coupons(payload: CouponIssueRequest, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -93,7 +97,8 @@ async def admin_issue_coupons(payload: CouponIssueRequest, request: Request, own
 
 
 @router.post("/agent/coupons/issue")
-async def agent_issue_coupons(payload: CouponIssueRequest, request: Request):
+@offload_db
+def agent_issue_coupons(payload: CouponIssueRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -125,7 +130,8 @@ async def agent_issue_coupons(payload: CouponIssueRequest, request: Request):
 
 
 @router.patch("/admin/coupons/{coupon_id}/revoke")
-async def admin_revoke_coupon(coupon_id: str, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_revoke_coupon(coupon_id: str, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -139,7 +145,8 @@ async def admin_revoke_coupon(coupon_id: str, request: Request, owner_id: Option
 
 
 @router.patch("/agent/coupons/{coupon_id}/revoke")
-async def agent_revoke_coupon(coupon_id: str, request: Request):
+@offload_db
+def agent_revoke_coupon(coupon_id: str, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -153,7 +160,8 @@ async def agent_revoke_coupon(coupon_id: str, request: Request):
 
 
 @router.delete("/admin/coupons/{coupon_id}")
-async def admin_delete_coupon(coupon_id: str, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_delete_coupon(coupon_id: str, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -167,7 +175,8 @@ async def admin_delete_coupon(coupon_id: str, request: Request, owner_id: Option
 
 
 @router.delete("/agent/coupons/{coupon_id}")
-async def agent_delete_coupon(coupon_id: str, request: Request):
+@offload_db
+def agent_delete_coupon(coupon_id: str, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
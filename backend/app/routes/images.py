@@ -1,14 +1,22 @@
 """
 Hash-based image serving route.
 Provides /items/{hash}.webp endpoint that resolves hash to physical path.
+
+Lookups use in-memory indexes (image hash -> path, payment QR filename -> path)
+that are invalidated through cache versions, so serving never queries SQLite per request.
 """
 import mimetypes
 import os
 import re
-from fastapi import APIRouter, HTTPException
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import FileResponse
 
-from database import ImageLookupDB, PaymentQrDB
+from database import ImageLookupDB, PaymentQrDB, VersionedCache, version_token
 from ..context import ITEMS_DIR, PUBLIC_DIR, STATIC_CACHE_MAX_AGE, logger
 
 router = APIRouter(tags=["images"])
@@ -17,6 +25,94 @@ router = APIRouter(tags=["images"])
 HASH_PATTERN = re.compile(r"^([a-f0-9]{12})\.webp$", re.IGNORECASE)
 PAYMENT_FILENAME_PATTERN = re.compile(r"^[0-9A-Za-z._-]+\.(webp|png|jpg|jpeg|gif)$", re.IGNORECASE)
 
+ITEMS_ROOT = os.path.normpath(ITEMS_DIR)
+PAYMENT_QR_ROOT = os.path.normpath(os.path.join(PUBLIC_DIR, "payment-qrs"))
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"
+
+# 不存在的图片短时间内直接返回 404；图片或收款码有写入时随版本号一起失效
+MISSING_CACHE_TTL_SECONDS = 30.0
+MISSING_CACHE_MAX_ENTRIES = 4096
+_missing_lock = threading.Lock()
+_missing_images: "OrderedDict[str, Tuple[float, Tuple]]" = OrderedDict()
+
+# 未登记在数据库中的历史收款码文件：文件名 -> 绝对路径
+_payment_file_index_cache = VersionedCache('payment_qr_files', depends_on=('payment_qrs',), copy_values=False)
+
+
+def _missing_token() -> Tuple:
+    return version_token('image_lookup'), version_token('payment_qrs')
+
+
+def _is_known_missing(key: str) -> bool:
+    with _missing_lock:
+        entry = _missing_images.get(key)
+        if entry is None:
+            return False
+        expires_at, token = entry
+        if expires_at <= time.monotonic() or token != _missing_token():
+            _missing_images.pop(key, None)
+            return False
+        return True
+
+
+def _remember_missing(key: str) -> None:
+    with _missing_lock:
+        _missing_images[key] = (time.monotonic() + MISSING_CACHE_TTL_SECONDS, _missing_token())
+        _missing_images.move_to_end(key)
+        while len(_missing_images) > MISSING_CACHE_MAX_ENTRIES:
+            _missing_images.popitem(last=False)
+
+
+def _not_found(key: str):
+    _remember_missing(key)
+    raise HTTPException(status_code=404, detail="图片不存在")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _stat_etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _image_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None,
+):
+    """返回图片文件；If-None-Match 命中时返回 304。内容哈希可直接作为 ETag，无需访问文件。"""
+    if etag is not None and _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+    if stat_result is None:
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+    if etag is None:
+        etag = _stat_etag(stat_result)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+    return FileResponse(
+        path,
+        media_type=media_type,
+        stat_result=stat_result,
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag},
+    )
+
 
 def _resolve_public_file_path(image_path: str):
     if not image_path:
@@ -39,8 +135,20 @@ def _resolve_public_file_path(image_path: str):
     return target
 
 
+def _payment_file_index() -> Dict[str, str]:
+    def load() -> Dict[str, str]:
+        index: Dict[str, str] = {}
+        if os.path.isdir(PAYMENT_QR_ROOT):
+            for current_root, _, files in os.walk(PAYMENT_QR_ROOT):
+                for name in files:
+                    index.setdefault(name, os.path.normpath(os.path.join(current_root, name)))
+        return index
+
+    return _payment_file_index_cache.get('files', load)
+
+
 @router.get("/payment/{filename}")
-async def serve_payment_qr_by_filename(filename: str):
+def serve_payment_qr_by_filename(filename: str, request: Request):
     """
     Serve payment QR image by filename.
     Frontend only exposes /payment/{filename}, while DB stores absolute web path.
@@ -51,106 +159,91 @@ async def serve_payment_qr_by_filename(filename: str):
     if not PAYMENT_FILENAME_PATTERN.fullmatch(normalized):
         raise HTTPException(status_code=404, detail="图片不存在")
 
+    missing_key = f"payment:{normalized}"
+    if _is_known_missing(missing_key):
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+    candidates = []
     db_image_path = PaymentQrDB.get_image_path_by_filename(normalized)
     if db_image_path:
-        physical_path = _resolve_public_file_path(db_image_path)
-        if physical_path and os.path.exists(physical_path):
-            media_type = mimetypes.guess_type(physical_path)[0] or "image/webp"
-            return FileResponse(
-                physical_path,
-                media_type=media_type,
-                headers={"Cache-Control": f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"},
-            )
-
-    payment_root = os.path.normpath(os.path.join(PUBLIC_DIR, "payment-qrs"))
-    if os.path.isdir(payment_root):
-        for current_root, _, files in os.walk(payment_root):
-            if normalized in files:
-                candidate = os.path.normpath(os.path.join(current_root, normalized))
-                if candidate.startswith(payment_root) and os.path.exists(candidate):
-                    media_type = mimetypes.guess_type(candidate)[0] or "image/webp"
-                    return FileResponse(
-                        candidate,
-                        media_type=media_type,
-                        headers={"Cache-Control": f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"},
-                    )
+        candidates.append(_resolve_public_file_path(db_image_path))
+    candidates.append(_payment_file_index().get(normalized))
 
-    raise HTTPException(status_code=404, detail="图片不存在")
+    for physical_path in candidates:
+        if not physical_path:
+            continue
+        media_type = mimetypes.guess_type(physical_path)[0] or "image/webp"
+        response = _image_response(request, physical_path, media_type)
+        if response is not None:
+            return response
+
+    _not_found(missing_key)
 
 
 @router.get("/items/{image_path:path}")
-async def serve_image(image_path: str):
+def serve_image(image_path: str, request: Request):
     """
     Serve product images by hash or legacy path.
-    
+
     New format: /items/{hash12}.webp
-    The hash is looked up in image_lookup table to find physical path.
-    
+    The hash is resolved through the in-memory image_lookup index; the content hash
+    doubles as a strong ETag so revalidation never touches the file system.
+
     Legacy format: /items/{category}/{filename}.webp
     Falls back to direct file serving for backward compatibility.
     """
+    missing_key = f"items:{image_path}"
+    if _is_known_missing(missing_key):
+        raise HTTPException(status_code=404, detail="图片不存在")
+
     # Try to match hash-based path (e.g., "abc123def456.webp")
     match = HASH_PATTERN.match(image_path)
     if match:
         file_hash = match.group(1)
-        
-        # Look up in database
-        lookup = ImageLookupDB.get_by_hash(file_hash)
-        if lookup:
-            physical_path = os.path.normpath(os.path.join(ITEMS_DIR, lookup["physical_path"]))
-            items_root = os.path.normpath(ITEMS_DIR)
-            
+        etag = f'"{file_hash.lower()}"'
+
+        relative_path = ImageLookupDB.get_physical_path(file_hash)
+        if relative_path:
+            physical_path = os.path.normpath(os.path.join(ITEMS_DIR, relative_path))
+
             # Security check
-            if not physical_path.startswith(items_root):
+            if not physical_path.startswith(ITEMS_ROOT):
                 raise HTTPException(status_code=404, detail="图片不存在")
-            
-            if os.path.exists(physical_path):
-                return FileResponse(
-                    physical_path,
-                    media_type="image/webp",
-                    headers={
-                        "Cache-Control": f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"
-                    }
-                )
-        
+
+            response = _image_response(request, physical_path, "image/webp", etag=etag)
+            if response is not None:
+                return response
+            logger.warning("Image %s is indexed but missing on disk: %s", file_hash, physical_path)
+
         # If hash not in database, try direct physical path lookup
         # (for cases where hash is in the path itself)
         direct_path = os.path.normpath(os.path.join(ITEMS_DIR, image_path))
-        items_root = os.path.normpath(ITEMS_DIR)
-        if direct_path.startswith(items_root) and os.path.exists(direct_path):
-            return FileResponse(
-                direct_path,
-                media_type="image/webp",
-                headers={
-                    "Cache-Control": f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"
-                }
-            )
-        
-        raise HTTPException(status_code=404, detail="图片不存在")
-    
+        if direct_path.startswith(ITEMS_ROOT):
+            try:
+                direct_stat = os.stat(direct_path)
+            except OSError:
+                direct_stat = None
+            if direct_stat is not None:
+                return _image_response(request, direct_path, "image/webp", etag=etag, stat_result=direct_stat)
+
+        _not_found(missing_key)
+
     # Legacy path format (e.g., "饮料/可乐_123.webp")
     # Serve directly from items directory
     file_path = os.path.normpath(os.path.join(ITEMS_DIR, image_path))
-    items_root = os.path.normpath(ITEMS_DIR)
-    
+
     # Security check
-    if not file_path.startswith(items_root):
+    if not file_path.startswith(ITEMS_ROOT):
         raise HTTPException(status_code=404, detail="图片不存在")
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="图片不存在")
-    
+
     # Determine media type
     media_type = "image/webp"
     if file_path.lower().endswith(".png"):
         media_type = "image/png"
     elif file_path.lower().endswith(".jpg") or file_path.lower().endswith(".jpeg"):
         media_type = "image/jpeg"
-    
-    return FileResponse(
-        file_path,
-        media_type=media_type,
-        headers={
-            "Cache-Control": f"public, max-age={STATIC_CACHE_MAX_AGE}, immutable"
-        }
-    )
+
+    response = _image_response(request, file_path, media_type)
+    if response is None:
+        _not_found(missing_key)
+    return response
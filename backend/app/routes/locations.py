@@ -8,7 +8,7 @@ from auth import (
     get_current_staff_required_from_cookie,
     success_response,
 )
-from database import AddressDB, AgentAssignmentDB, BuildingDB
+from database import AddressDB, AgentAssignmentDB, BuildingDB, offload_db
 from ..context import logger
 from ..services.admin import expire_agent_tokens_for_address
 from ..schemas import (
@@ -25,7 +25,8 @@ router = APIRouter()
 
 
 @router.get("/addresses")
-async def get_enabled_addresses():
+@offload_db
+def get_enabled_addresses():
     """获取启用且有启用楼栋的地址列表。"""
     try:
         addrs = AddressDB.get_enabled_addresses_with_buildings()
@@ -40,7 +41,8 @@ async def get_enabled_addresses():
 
 
 @router.get("/admin/addresses")
-async def admin_get_addresses(request: Request):
+@offload_db
+def admin_get_addresses(request: Request):
     """获取全部地址（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -63,7 +65,8 @@ async def admin_get_addresses(request: Request):
 
 
 @router.post("/admin/addresses")
-async def admin_create_address(payload: AddressCreateRequest, request: Request):
+@offload_db
+def admin_create_address(payload: AddressCreateRequest, request: Request):
     """创建地址（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -79,7 +82,8 @@ async def admin_create_address(payload: AddressCreateRequest, request: Request):
 
 
 @router.put("/admin/addresses/{address_id}")
-async def admin_update_address(address_id: str, payload: AddressUpdateRequest, request: Request):
+@offload_db
+def admin_update_address(address_id: str, payload: AddressUpdateRequest, request: Request):
     """更新地址（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -110,7 +114,8 @@ async def admin_update_address(address_id: str, payload: AddressUpdateRequest, r
 
 
 @router.delete("/admin/addresses/{address_id}")
-async def admin_delete_address(address_id: str, request: Request):
+@offload_db
+def admin_delete_address(address_id: str, request: Request):
     """删除地址（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -130,7 +135,8 @@ async def admin_delete_address(address_id: str, request: Request):
 
 
 @router.post("/admin/addresses/reorder")
-async def admin_reorder_addresses(payload: AddressReorderRequest, request: Request):
+@offload_db
+def admin_reorder_addresses(payload: AddressReorderRequest, request: Request):
     """批量重排地址顺序（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -146,7 +152,8 @@ async def admin_reorder_addresses(payload: AddressReorderRequest, request: Reque
 
 
 @router.get("/buildings")
-async def get_enabled_buildings(address_id: Optional[str] = None, address_name: Optional[str] = None):
+@offload_db
+def get_enabled_buildings(address_id: Optional[str] = None, address_name: Optional[str] = None):
     """根据地址获取启用的楼栋，若为空则回退默认“六舍”。"""
     try:
         addr_id = address_id
@@ -177,7 +184,8 @@ async def get_enabled_buildings(address_id: Optional[str] = None, address_name:
 
 
 @router.get("/admin/buildings")
-async def admin_get_buildings(request: Request, address_id: Optional[str] = None):
+@offload_db
+def admin_get_buildings(request: Request, address_id: Optional[str] = None):
     """获取楼栋（可按地址过滤）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -189,7 +197,8 @@ async def admin_get_buildings(request: Request, address_id: Optional[str] = None
 
 
 @router.post("/admin/buildings")
-async def admin_create_building(payload: BuildingCreateRequest, request: Request):
+@offload_db
+def admin_create_building(payload: BuildingCreateRequest, request: Request):
     """创建楼栋（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -208,7 +217,8 @@ async def admin_create_building(payload: BuildingCreateRequest, request: Request
 
 
 @router.put("/admin/buildings/{building_id}")
-async def admin_update_building(building_id: str, payload: BuildingUpdateRequest, request: Request):
+@offload_db
+def admin_update_building(building_id: str, payload: BuildingUpdateRequest, request: Request):
     """更新楼栋（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -228,7 +238,8 @@ async def admin_update_building(building_id: str, payload: BuildingUpdateRequest
 
 
 @router.delete("/admin/buildings/{building_id}")
-async def admin_delete_building(building_id: str, request: Request):
+@offload_db
+def admin_delete_building(building_id: str, request: Request):
     """删除楼栋（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -245,7 +256,8 @@ async def admin_delete_building(building_id: str, request: Request):
 
 
 @router.post("/admin/buildings/reorder")
-async def admin_reorder_buildings(payload: BuildingReorderRequest, request: Request):
+@offload_db
+def admin_reorder_buildings(payload: BuildingReorderRequest, request: Request):
     """对某地址下的楼栋批量重排（管理员）。"""
     _staff = get_current_staff_required_from_cookie(request)
     try:
@@ -10,6 +10,7 @@ from database import (
     LotteryConfigDB,
     LotteryDB,
     get_db_connection,
+    offload_db,
 )
 from ..context import logger
 from ..dependencies import get_owner_id_for_staff, get_owner_id_from_scope, require_agent_with_scope, resolve_shopping_scope
@@ -37,7 +38,8 @@ def _get_payload_fields(payload) -> Dict[str, object]:
 
 
 @router.get("/admin/lottery-config")
-async def admin_get_lottery_config(request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_get_lottery_config(request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
     try:
@@ -50,7 +52,8 @@ async def admin_get_lottery_config(request: Request, owner_id: Optional[str] = N
 
 
 @router.get("/agent/lottery-config")
-async def agent_get_lottery_config(request: Request):
+@offload_db
+def agent_get_lottery_config(request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -63,7 +66,8 @@ async def agent_get_lottery_config(request: Request):
 
 
 @router.put("/admin/lottery-config")
-async def admin_update_lottery_config(payload: LotteryConfigUpdateRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_lottery_config(payload: LotteryConfigUpdateRequest, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -88,7 +92,8 @@ async def admin_update_lottery_config(payload: LotteryConfigUpdateRequest, reque
 
 
 @router.put("/agent/lottery-config")
-async def agent_update_lottery_config(payload: LotteryConfigUpdateRequest, request: Request):
+@offload_db
+def agent_update_lottery_config(payload: LotteryConfigUpdateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -113,7 +118,8 @@ async def agent_update_lottery_config(payload: LotteryConfigUpdateRequest, reque
 
 
 @router.patch("/admin/lottery-config/threshold")
-async def admin_update_lottery_threshold(payload: LotteryThresholdUpdateRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_lottery_threshold(payload: LotteryThresholdUpdateRequest, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -127,7 +133,8 @@ async def admin_update_lottery_threshold(payload: LotteryThresholdUpdateRequest,
 
 
 @router.patch("/agent/lottery-config/threshold")
-async def agent_update_lottery_threshold(payload: LotteryThresholdUpdateRequest, request: Request):
+@offload_db
+def agent_update_lottery_threshold(payload: LotteryThresholdUpdateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -141,7 +148,8 @@ async def agent_update_lottery_threshold(payload: LotteryThresholdUpdateRequest,
 
 
 @router.patch("/admin/lottery-config/enabled")
-async def admin_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -153,7 +161,8 @@ async def admin_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, req
 
 
 @router.patch("/agent/lottery-config/enabled")
-async def agent_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, request: Request):
+@offload_db
+def agent_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -165,7 +174,8 @@ async def agent_update_lottery_enabled(payload: LotteryEnabledUpdateRequest, req
 
 
 @router.get("/admin/auto-gifts")
-async def admin_get_auto_gifts(request: Request):
+@offload_db
+def admin_get_auto_gifts(request: Request):
     admin = get_current_admin_required_from_cookie(request)
     owner_id = get_owner_id_for_staff(admin)
     try:
@@ -177,7 +187,8 @@ async def admin_get_auto_gifts(request: Request):
 
 
 @router.put("/admin/auto-gifts")
-async def admin_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -199,7 +210,8 @@ async def admin_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Reque
 
 
 @router.get("/admin/auto-gifts/search")
-async def admin_search_auto_gift_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
+@offload_db
+def admin_search_auto_gift_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     try:
         owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
@@ -211,7 +223,8 @@ async def admin_search_auto_gift_items(request: Request, query: Optional[str] =
 
 
 @router.get("/agent/auto-gifts")
-async def agent_get_auto_gifts(request: Request):
+@offload_db
+def agent_get_auto_gifts(request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -223,7 +236,8 @@ async def agent_get_auto_gifts(request: Request):
 
 
 @router.put("/agent/auto-gifts")
-async def agent_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Request):
+@offload_db
+def agent_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -245,7 +259,8 @@ async def agent_update_auto_gifts(payload: AutoGiftUpdateRequest, request: Reque
 
 
 @router.get("/agent/auto-gifts/search")
-async def agent_search_auto_gift_items(request: Request, query: Optional[str] = None):
+@offload_db
+def agent_search_auto_gift_items(request: Request, query: Optional[str] = None):
     agent, _ = require_agent_with_scope(request)
     try:
         results = search_inventory_for_selector(query, staff=agent)
@@ -256,7 +271,8 @@ async def agent_search_auto_gift_items(request: Request, query: Optional[str] =
 
 
 @router.get("/auto-gifts")
-async def public_get_auto_gifts():
+@offload_db
+def public_get_auto_gifts():
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -313,7 +329,8 @@ async def public_get_auto_gifts():
 
 
 @router.get("/gift-thresholds")
-async def public_get_gift_thresholds(request: Request):
+@offload_db
+def public_get_gift_thresholds(request: Request):
     try:
         scope = resolve_shopping_scope(request)
         owner_id = get_owner_id_from_scope(scope)
@@ -354,7 +371,8 @@ async def public_get_gift_thresholds(request: Request):
 
 
 @router.get("/delivery-config")
-async def get_delivery_config(request: Request):
+@offload_db
+def get_delivery_config(request: Request):
     try:
         scope = resolve_shopping_scope(request)
         owner_id = get_owner_id_from_scope(scope)
@@ -366,7 +384,8 @@ async def get_delivery_config(request: Request):
 
 
 @router.get("/admin/delivery-settings")
-async def admin_get_delivery_settings(request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_get_delivery_settings(request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
     try:
@@ -378,7 +397,8 @@ async def admin_get_delivery_settings(request: Request, owner_id: Optional[str]
 
 
 @router.post("/admin/delivery-settings")
-async def admin_create_or_update_delivery_settings(payload: DeliverySettingsCreate, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_create_or_update_delivery_settings(payload: DeliverySettingsCreate, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -403,7 +423,8 @@ async def admin_create_or_update_delivery_settings(payload: DeliverySettingsCrea
 
 
 @router.get("/agent/delivery-settings")
-async def agent_get_delivery_settings(request: Request):
+@offload_db
+def agent_get_delivery_settings(request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -415,7 +436,8 @@ async def agent_get_delivery_settings(request: Request):
 
 
 @router.post("/agent/delivery-settings")
-async def agent_create_or_update_delivery_settings(payload: DeliverySettingsCreate, request: Request):
+@offload_db
+def agent_create_or_update_delivery_settings(payload: DeliverySettingsCreate, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -440,7 +462,8 @@ async def agent_create_or_update_delivery_settings(payload: DeliverySettingsCrea
 
 
 @router.post("/admin/lottery-prizes")
-async def admin_create_lottery_prize(payload: LotteryPrizeInput, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_create_lottery_prize(payload: LotteryPrizeInput, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -455,7 +478,8 @@ async def admin_create_lottery_prize(payload: LotteryPrizeInput, request: Reques
 
 
 @router.post("/agent/lottery-prizes")
-async def agent_create_lottery_prize(payload: LotteryPrizeInput, request: Request):
+@offload_db
+def agent_create_lottery_prize(payload: LotteryPrizeInput, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -470,7 +494,8 @@ async def agent_create_lottery_prize(payload: LotteryPrizeInput, request: Reques
 
 
 @router.put("/admin/lottery-prizes/{prize_id}")
-async def admin_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -487,7 +512,8 @@ async def admin_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput,
 
 
 @router.put("/agent/lottery-prizes/{prize_id}")
-async def agent_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput, request: Request):
+@offload_db
+def agent_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -504,7 +530,8 @@ async def agent_update_lottery_prize(prize_id: str, payload: LotteryPrizeInput,
 
 
 @router.delete("/admin/lottery-prizes/{prize_id}")
-async def admin_delete_lottery_prize(prize_id: str, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_delete_lottery_prize(prize_id: str, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -518,7 +545,8 @@ async def admin_delete_lottery_prize(prize_id: str, request: Request, owner_id:
 
 
 @router.delete("/agent/lottery-prizes/{prize_id}")
-async def agent_delete_lottery_prize(prize_id: str, request: Request):
+@offload_db
+def agent_delete_lottery_prize(prize_id: str, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -532,7 +560,8 @@ async def agent_delete_lottery_prize(prize_id: str, request: Request):
 
 
 @router.get("/admin/lottery-prizes/search")
-async def admin_search_lottery_prize_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
+@offload_db
+def admin_search_lottery_prize_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     try:
         owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
@@ -544,7 +573,8 @@ async def admin_search_lottery_prize_items(request: Request, query: Optional[str
 
 
 @router.get("/agent/lottery-prizes/search")
-async def agent_search_lottery_prize_items(request: Request, query: Optional[str] = None):
+@offload_db
+def agent_search_lottery_prize_items(request: Request, query: Optional[str] = None):
     agent, _ = require_agent_with_scope(request)
     try:
         results = search_inventory_for_selector(query, staff=agent)
@@ -555,7 +585,8 @@ async def agent_search_lottery_prize_items(request: Request, query: Optional[str
 
 
 @router.get("/admin/gift-thresholds")
-async def admin_get_gift_thresholds(request: Request, include_inactive: bool = False, owner_id: Optional[str] = None):
+@offload_db
+def admin_get_gift_thresholds(request: Request, include_inactive: bool = False, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id)
     try:
@@ -568,7 +599,8 @@ async def admin_get_gift_thresholds(request: Request, include_inactive: bool = F
 
 
 @router.get("/agent/gift-thresholds")
-async def agent_get_gift_thresholds(request: Request, include_inactive: bool = False):
+@offload_db
+def agent_get_gift_thresholds(request: Request, include_inactive: bool = False):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -581,7 +613,8 @@ async def agent_get_gift_thresholds(request: Request, include_inactive: bool = F
 
 
 @router.post("/admin/gift-thresholds")
-async def admin_create_gift_threshold(payload: GiftThresholdCreate, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_create_gift_threshold(payload: GiftThresholdCreate, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -622,7 +655,8 @@ async def admin_create_gift_threshold(payload: GiftThresholdCreate, request: Req
 
 
 @router.post("/agent/gift-thresholds")
-async def agent_create_gift_threshold(payload: GiftThresholdCreate, request: Request):
+@offload_db
+def agent_create_gift_threshold(payload: GiftThresholdCreate, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -663,7 +697,8 @@ async def agent_create_gift_threshold(payload: GiftThresholdCreate, request: Req
 
 
 @router.put("/admin/gift-thresholds/{threshold_id}")
-async def admin_update_gift_threshold(threshold_id: str, payload: GiftThresholdUpdate, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_update_gift_threshold(threshold_id: str, payload: GiftThresholdUpdate, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -710,7 +745,8 @@ async def admin_update_gift_threshold(threshold_id: str, payload: GiftThresholdU
 
 
 @router.put("/agent/gift-thresholds/{threshold_id}")
-async def agent_update_gift_threshold(threshold_id: str, payload: GiftThresholdUpdate, request: Request):
+@offload_db
+def agent_update_gift_threshold(threshold_id: str, payload: GiftThresholdUpdate, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -757,7 +793,8 @@ async def agent_update_gift_threshold(threshold_id: str, payload: GiftThresholdU
 
 
 @router.delete("/admin/gift-thresholds/{threshold_id}")
-async def admin_delete_gift_threshold(threshold_id: str, request: Request, owner_id: Optional[str] = None):
+@offload_db
+def admin_delete_gift_threshold(threshold_id: str, request: Request, owner_id: Optional[str] = None):
     admin = get_current_admin_required_from_cookie(request)
     owner_id, _ = resolve_single_owner_for_staff(admin, owner_id, allow_deleted=False)
     try:
@@ -771,7 +808,8 @@ async def admin_delete_gift_threshold(threshold_id: str, request: Request, owner
 
 
 @router.delete("/agent/gift-thresholds/{threshold_id}")
-async def agent_delete_gift_threshold(threshold_id: str, request: Request):
+@offload_db
+def agent_delete_gift_threshold(threshold_id: str, request: Request):
     agent, _ = require_agent_with_scope(request)
     owner_id = get_owner_id_for_staff(agent)
     try:
@@ -785,7 +823,8 @@ async def agent_delete_gift_threshold(threshold_id: str, request: Request):
 
 
 @router.get("/admin/gift-thresholds/search")
-async def admin_search_gift_threshold_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
+@offload_db
+def admin_search_gift_threshold_items(request: Request, query: Optional[str] = None, owner_id: Optional[str] = None):
     """搜索满额门槛赠品候选商品（管理员）。"""
     admin = get_current_admin_required_from_cookie(request)
     try:
@@ -798,7 +837,8 @@ async def admin_search_gift_threshold_items(request: Request, query: Optional[st
 
 
 @router.get("/agent/gift-thresholds/search")
-async def agent_search_gift_threshold_items(request: Request, query: Optional[str] = None):
+@offload_db
+def agent_search_gift_threshold_items(request: Request, query: Optional[str] = None):
     """搜索满额门槛赠品候选商品（代理）。"""
     agent, _ = require_agent_with_scope(request)
     try:
@@ -10,18 +10,20 @@ from sse_starlette.sse import EventSourceResponse
 from starlette.responses import FileResponse
 
 from auth import error_response, get_current_staff_required_from_cookie, get_current_user_required_from_cookie, success_response
-from database import AdminDB, AgentStatusDB, CartDB, CouponDB, DeliverySettingsDB, GiftThresholdDB, LotteryConfigDB, LotteryDB, OrderDB, OrderExportDB, ProductDB, RewardDB, SalesCycleDB, SettingsDB, UserProfileDB, VariantDB
+from database import AdminDB, AgentStatusDB, CartDB, CouponDB, DeliverySettingsDB, GiftThresholdDB, LotteryConfigDB, LotteryDB, OrderDB, OrderExportDB, ProductDB, RewardDB, SalesCycleDB, SettingsDB, UserProfileDB, VariantDB, offload_db, run_in_db_executor
 from ..context import EXPORTS_DIR, logger
 from ..dependencies import build_staff_scope, check_address_and_building, get_owner_id_for_staff, get_owner_id_from_scope, require_agent_with_scope, resolve_shopping_scope, staff_can_access_order
 from ..schemas import OrderCreateRequest, OrderDeleteRequest, OrderExportRequest, OrderStatusUpdateRequest, PaymentStatusUpdateRequest
 from ..services.orders import (
+    EXPORT_BATCH_SIZE,
+    OrderExportWriter,
     build_agent_name_map,
     build_export_row,
+    normalize_export_format,
     prepare_export_scope,
     resolve_scope_label,
     resolve_staff_order_scope,
     serialize_export_job,
-    write_export_workbook,
 )
 from ..services.products import normalize_reservation_cutoff
 from ..utils import build_export_filename, convert_sqlite_timestamp_to_unix, format_export_range_label, is_non_sellable, resolve_image_url
@@ -31,7 +33,8 @@ router = APIRouter()
 
 
 @router.post("/orders")
-async def create_order(order_request: OrderCreateRequest, request: Request):
+@offload_db
+def create_order(order_request: OrderCreateRequest, request: Request):
     user = get_current_user_required_from_cookie(request)
 
     try:
@@ -93,8 +96,13 @@ async def create_order(order_request: OrderCreateRequest, request: Request):
             shipping_info["agent_id"] = scope["agent_id"]
 
         items_dict = cart_data["items"]
-        all_products = ProductDB.get_all_products(owner_ids=owner_ids, include_unassigned=include_unassigned)
-        product_dict = {p["id"]: p for p in all_products}
+        sep = "@@"
+        product_dict = ProductDB.get_many(
+            [str(key).split(sep, 1)[0] for key in items_dict],
+            owner_ids=owner_ids,
+            include_unassigned=include_unassigned,
+        )
+        variant_dict = VariantDB.get_many([str(key).split(sep, 1)[1] for key in items_dict if sep in str(key)])
 
         order_items = []
         total_amount = 0.0
@@ -102,7 +110,6 @@ async def create_order(order_request: OrderCreateRequest, request: Request):
         cart_item_count = 0
         all_cart_items_reservation_only = True
 
-        sep = "@@"
         for key, quantity in items_dict.items():
             product_id = key
             variant_id = None
@@ -118,7 +125,7 @@ async def create_order(order_request: OrderCreateRequest, request: Request):
                 unit_price = round(float(product["price"]) * (zhe / 10.0), 2)
 
                 if variant_id:
-                    variant = VariantDB.get_by_id(variant_id)
+                    variant = variant_dict.get(variant_id)
                     if not variant or variant.get("product_id") != product_id:
                         return error_response("规格不存在", 400)
                     if not non_sellable and quantity > int(variant.get("stock", 0)):
@@ -442,7 +449,8 @@ def _enrich_order_items_with_images(order: Dict) -> Dict:
 
 
 @router.get("/orders/my")
-async def get_my_orders(request: Request):
+@offload_db
+def get_my_orders(request: Request):
     user = get_current_user_required_from_cookie(request)
 
     try:
@@ -461,7 +469,8 @@ async def get_my_orders(request: Request):
 
 
 @router.get("/orders/{order_id}")
-async def get_order_detail(order_id: str, request: Request):
+@offload_db
+def get_order_detail(order_id: str, request: Request):
     user = get_current_user_required_from_cookie(request)
 
     try:
@@ -485,7 +494,8 @@ async def get_order_detail(order_id: str, request: Request):
 
 
 @router.get("/admin/orders")
-async def get_all_orders(
+@offload_db
+def get_all_orders(
     request: Request,
     limit: Optional[int] = 20,
     offset: Optional[int] = 0,
@@ -589,7 +599,8 @@ async def get_all_orders(
 
 
 @router.get("/agent/orders")
-async def get_agent_orders(
+@offload_db
+def get_agent_orders(
     request: Request,
     limit: Optional[int] = 20,
     offset: Optional[int] = 0,
@@ -665,6 +676,11 @@ async def get_agent_orders(
         return error_response("获取订单列表失败", 500)
 
 
+async def _load_export_history(owner_id: str, staff_prefix: str) -> List[Dict[str, Any]]:
+    rows = await run_in_db_executor(OrderExportDB.list_jobs_for_owner, owner_id, limit=12)
+    return [serialize_export_job(row, staff_prefix) for row in rows]
+
+
 async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExportRequest, staff_prefix: str):
     start_ms = payload.start_time_ms
     end_ms = payload.end_time_ms
@@ -682,7 +698,9 @@ async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExpor
         exclude_building_ids,
         selected_filter,
         filter_admin_orders,
-    ) = prepare_export_scope(staff, payload.agent_filter if staff.get("type") == "admin" else "self")
+    ) = await run_in_db_executor(
+        prepare_export_scope, staff, payload.agent_filter if staff.get("type") == "admin" else "self"
+    )
 
     if cycle_id:
         owner_type = "agent" if staff.get("type") == "agent" else "admin"
@@ -694,7 +712,7 @@ async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExpor
             if filter_value not in ("", "self", "admin"):
                 owner_type = "agent"
                 owner_id = selected_agent_id or selected_filter
-        cycle_range = SalesCycleDB.resolve_cycle_range(owner_type, owner_id, cycle_id)
+        cycle_range = await run_in_db_executor(SalesCycleDB.resolve_cycle_range, owner_type, owner_id, cycle_id)
         if not cycle_range:
             return error_response("周期不存在", 404)
 
@@ -718,10 +736,9 @@ async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExpor
     if start_ms is not None and end_ms is not None and start_ms > end_ms:
         start_ms, end_ms = end_ms, start_ms
 
-    page_data = OrderDB.get_orders_paginated(
+    total = await run_in_db_executor(
+        OrderDB.count_orders,
         keyword=keyword,
-        limit=1,
-        offset=0,
         agent_id=selected_agent_id,
         address_ids=selected_address_ids,
         building_ids=selected_building_ids,
@@ -732,18 +749,18 @@ async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExpor
         unified_status=unified_status,
         filter_admin_orders=filter_admin_orders,
     )
-    total = int(page_data.get("total") or 0)
     if total <= 0:
         return error_response("当前筛选条件下没有可导出的订单", 400)
 
-    agent_name_map = build_agent_name_map()
+    agent_name_map = await run_in_db_executor(build_agent_name_map)
     scope_label = resolve_scope_label(selected_filter, staff, agent_name_map)
     owner_id = get_owner_id_for_staff(staff)
     if not owner_id:
         return error_response("无法解析归属范围，请重新登录", 401)
-    filename = build_export_filename(start_ms, end_ms)
+    filename = build_export_filename(start_ms, end_ms, normalize_export_format(payload.file_format))
 
-    job = OrderExportDB.create_job(
+    job = await run_in_db_executor(
+        OrderExportDB.create_job,
         owner_id=owner_id,
         role=staff.get("type"),
         agent_filter=selected_filter,
@@ -757,8 +774,7 @@ async def create_export_job_for_staff(staff: Dict[str, Any], payload: OrderExpor
         client_tz_offset=tz_offset,
     )
 
-    history_rows = OrderExportDB.list_jobs_for_owner(owner_id, limit=12)
-    history = [serialize_export_job(entry, staff_prefix) for entry in history_rows]
+    history = await _load_export_history(owner_id, staff_prefix)
 
     return success_response(
         "导出任务已创建",
@@ -779,11 +795,11 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
     owner_id = get_owner_id_for_staff(staff)
     if not owner_id:
         raise HTTPException(status_code=401, detail="无法解析归属范围")
-    job = OrderExportDB.get_job(job_id)
+    job = await run_in_db_executor(OrderExportDB.get_job, job_id)
     if not job or job.get("owner_id") != owner_id:
         raise HTTPException(status_code=404, detail="导出任务不存在")
 
-    agent_name_map = build_agent_name_map()
+    agent_name_map = await run_in_db_executor(build_agent_name_map)
     selected_filter_value = job.get("agent_filter") or "self"
     (
         selected_agent_id,
@@ -793,7 +809,7 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
         exclude_building_ids,
         _resolved_filter,
         filter_admin_orders,
-    ) = prepare_export_scope(staff, selected_filter_value)
+    ) = await run_in_db_executor(prepare_export_scope, staff, selected_filter_value)
 
     unified_status = job.get("status_filter") or None
     keyword = job.get("keyword") or None
@@ -801,11 +817,24 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
     end_ms = job.get("end_time_ms")
     tz_offset = job.get("client_tz_offset")
     is_admin_role = staff.get("type") == "admin"
-    safe_filename = os.path.basename(job.get("filename") or "") or f"{job_id}.xlsx"
+    export_format = normalize_export_format(os.path.splitext(job.get("filename") or "")[1])
+    safe_filename = os.path.basename(job.get("filename") or "") or f"{job_id}.{export_format}"
     file_path = os.path.abspath(os.path.join(EXPORTS_DIR, safe_filename))
     safe_root = os.path.abspath(EXPORTS_DIR)
     if not file_path.startswith(safe_root):
-        file_path = os.path.join(safe_root, f"{job_id}.xlsx")
+        file_path = os.path.join(safe_root, f"{job_id}.{export_format}")
+    order_filters = {
+        "keyword": keyword,
+        "agent_id": selected_agent_id,
+        "address_ids": selected_address_ids,
+        "building_ids": selected_building_ids,
+        "exclude_address_ids": exclude_address_ids,
+        "exclude_building_ids": exclude_building_ids,
+        "start_time_ms": start_ms,
+        "end_time_ms": end_ms,
+        "unified_status": unified_status,
+        "filter_admin_orders": filter_admin_orders,
+    }
 
     def is_expired(expires_at: Optional[str]) -> bool:
         if not expires_at:
@@ -820,15 +849,13 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
         nonlocal job
         try:
             if is_expired(job.get("expires_at")):
-                OrderExportDB.update_job(job_id, status="expired", message="导出链接已过期")
-                history_rows = OrderExportDB.list_jobs_for_owner(owner_id, limit=12)
-                history = [serialize_export_job(entry, staff_prefix) for entry in history_rows]
+                await run_in_db_executor(OrderExportDB.update_job, job_id, status="expired", message="导出链接已过期")
+                history = await _load_export_history(owner_id, staff_prefix)
                 yield {"data": json.dumps({"status": "expired", "message": "导出链接已过期，请重新生成", "history": history, "range_label": format_export_range_label(start_ms, end_ms, tz_offset)})}
                 return
 
             if job.get("status") == "completed" and os.path.exists(file_path):
-                history_rows = OrderExportDB.list_jobs_for_owner(owner_id, limit=12)
-                history = [serialize_export_job(entry, staff_prefix) for entry in history_rows]
+                history = await _load_export_history(owner_id, staff_prefix)
                 final_job = serialize_export_job(job, staff_prefix)
                 final_job.update(
                     {
@@ -843,74 +870,64 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
                 yield {"data": json.dumps(final_job)}
                 return
 
-            OrderExportDB.update_job(job_id, status="running", message="正在准备导出")
+            await run_in_db_executor(OrderExportDB.update_job, job_id, status="running", message="正在准备导出")
             yield {"data": json.dumps({"status": "running", "stage": "准备导出", "progress": 5, "total": job.get("total_count"), "range_label": format_export_range_label(start_ms, end_ms, tz_offset)})}
 
-            exported_rows: List[List[str]] = []
+            total_count = await run_in_db_executor(OrderDB.count_orders, **order_filters)
+            await run_in_db_executor(OrderExportDB.update_job, job_id, total_count=total_count)
+
+            # 先写入临时文件，完成后再替换，避免未写完的文件被当作已完成的导出
+            temp_path = f"{file_path}.part"
+            writer = OrderExportWriter(temp_path, export_format)
             exported_count = 0
-            total_count = 0
-            offset = 0
-            batch_size = 200
             progress = 5
-
-            while True:
-                page_data = OrderDB.get_orders_paginated(
-                    keyword=keyword,
-                    limit=batch_size,
-                    offset=offset,
-                    agent_id=selected_agent_id,
-                    address_ids=selected_address_ids,
-                    building_ids=selected_building_ids,
-                    exclude_address_ids=exclude_address_ids,
-                    exclude_building_ids=exclude_building_ids,
-                    start_time_ms=start_ms,
-                    end_time_ms=end_ms,
-                    unified_status=unified_status,
-                    filter_admin_orders=filter_admin_orders,
-                    allow_large_limit=True,
-                )
-                orders_batch = page_data.get("orders") or []
-                if offset == 0:
-                    total_count = int(page_data.get("total") or 0)
-                    OrderExportDB.update_job(job_id, total_count=total_count)
-
-                if not orders_batch:
-                    break
-
-                for order in orders_batch:
-                    exported_rows.append(build_export_row(order, agent_name_map, staff, is_admin_role, tz_offset))
-
-                exported_count = len(exported_rows)
-                OrderExportDB.update_job(job_id, exported_count=exported_count)
-                progress = 10 if total_count == 0 else min(96, max(10, int(exported_count / max(total_count, 1) * 85)))
-                yield {
-                    "data": json.dumps(
-                        {
-                            "status": "running",
-                            "stage": "正在解析数据",
-                            "progress": progress,
-                            "exported": exported_count,
-                            "total": total_count,
-                            "message": f"正在解析... {exported_count}/{total_count or '未知'}",
-                        }
+            after = None
+            try:
+                while True:
+                    orders_batch, after = await run_in_db_executor(
+                        OrderDB.get_orders_keyset, after, EXPORT_BATCH_SIZE, **order_filters
                     )
-                }
-
-                offset += len(orders_batch)
-                if len(orders_batch) < batch_size:
-                    break
-
-            if exported_count == 0:
-                OrderExportDB.update_job(job_id, status="failed", message="当前筛选无数据")
-                yield {"data": json.dumps({"status": "failed", "message": "当前筛选条件下没有可导出的订单"})}
-                return
-
-            OrderExportDB.update_job(job_id, exported_count=exported_count, message="正在生成文件")
-            yield {"data": json.dumps({"status": "running", "stage": "生成文件", "progress": min(98, max(progress, 90)), "exported": exported_count, "total": total_count})}
-
-            await asyncio.to_thread(write_export_workbook, exported_rows, file_path)
-
-            OrderExportDB.update_job(
+                    if not orders_batch:
+                        break
+
+                    rows = [build_export_row(order, agent_name_map, staff, is_admin_role, tz_offset) for order in orders_batch]
+                    await asyncio.to_thread(writer.write_rows, rows)
+                    exported_count += len(rows)
+
+                    await run_in_db_executor(OrderExportDB.update_job, job_id, exported_count=exported_count)
+                    progress = 10 if total_count == 0 else min(96, max(10, int(exported_count / max(total_count, 1) * 85)))
+                    yield {
+                        "data": json.dumps(
+                            {
+                                "status": "running",
+                                "stage": "正在写入文件",
+                                "progress": progress,
+                                "exported": exported_count,
+                                "total": total_count,
+                                "message": f"正在导出... {exported_count}/{total_count or '未知'}",
+                            }
+                        )
+                    }
+                    if after is None:
+                        break
+
+                if exported_count == 0:
+                    writer.abort()
+                    await run_in_db_executor(OrderExportDB.update_job, job_id, status="failed", message="当前筛选无数据")
+                    yield {"data": json.dumps({"status": "failed", "message": "当前筛选条件下没有可导出的订单"})}
+                    return
+
+                await run_in_db_executor(OrderExportDB.update_job, job_id, exported_count=exported_count, message="正在生成文件")
+                yield {"data": json.dumps({"status": "running", "stage": "生成文件", "progress": min(98, max(progress, 90)), "exported": exported_count, "total": total_count})}
+
+                await asyncio.to_thread(writer.close)
+                os.replace(temp_path, file_path)
+            except BaseException:
+                writer.abort()
+                raise
+
+            await run_in_db_executor(
+                OrderExportDB.update_job,
                 job_id,
                 status="completed",
                 exported_count=exported_count,
@@ -919,9 +936,8 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
                 message="导出完成",
                 filename=os.path.basename(file_path),
             )
-            job = OrderExportDB.get_job(job_id)
-            history_rows = OrderExportDB.list_jobs_for_owner(owner_id, limit=12)
-            history = [serialize_export_job(entry, staff_prefix) for entry in history_rows]
+            job = await run_in_db_executor(OrderExportDB.get_job, job_id)
+            history = await _load_export_history(owner_id, staff_prefix)
             final_job = serialize_export_job(job, staff_prefix)
             final_job.update(
                 {
@@ -936,13 +952,14 @@ async def stream_export_for_staff(request: Request, staff: Dict[str, Any], staff
             yield {"data": json.dumps(final_job)}
         except Exception as exc:
             logger.error("Order export failed (%s): %s", job_id, exc)
-            OrderExportDB.update_job(job_id, status="failed", message=str(exc))
+            await run_in_db_executor(OrderExportDB.update_job, job_id, status="failed", message=str(exc))
             yield {"data": json.dumps({"status": "failed", "message": str(exc) or "导出失败"})}
 
     return EventSourceResponse(event_generator(), ping=15000)
 
 
-async def download_export_for_staff(staff: Dict[str, Any], job_id: str, token: Optional[str]):
+@offload_db
+def download_export_for_staff(staff: Dict[str, Any], job_id: str, token: Optional[str]):
     owner_id = get_owner_id_for_staff(staff)
     if not owner_id:
         raise HTTPException(status_code=401, detail="无法解析归属范围")
@@ -968,10 +985,15 @@ async def download_export_for_staff(staff: Dict[str, Any], job_id: str, token: O
         raise HTTPException(status_code=404, detail="导出文件不存在，请重新导出")
 
     filename = os.path.basename(job.get("filename") or file_path) or f"{job_id}.xlsx"
-    return FileResponse(file_path, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=filename)
+    if normalize_export_format(os.path.splitext(filename)[1]) == "csv":
+        media_type = "text/csv"
+    else:
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return FileResponse(file_path, media_type=media_type, filename=filename)
 
 
-async def get_export_history_for_staff(staff: Dict[str, Any], staff_prefix: str):
+@offload_db
+def get_export_history_for_staff(staff: Dict[str, Any], staff_prefix: str):
     owner_id = get_owner_id_for_staff(staff)
     if not owner_id:
         raise HTTPException(status_code=401, detail="无法解析归属范围")
@@ -982,54 +1004,55 @@ async def get_export_history_for_staff(staff: Dict[str, Any], staff_prefix: str)
 
 @router.post("/admin/orders/export")
 async def admin_create_order_export(request: Request, payload: OrderExportRequest):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await create_export_job_for_staff(staff, payload, "/admin")
 
 
 @router.post("/agent/orders/export")
 async def agent_create_order_export(request: Request, payload: OrderExportRequest):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await create_export_job_for_staff(agent, payload, "/agent")
 
 
 @router.get("/admin/orders/export/stream/{job_id}")
 async def admin_stream_order_export(job_id: str, request: Request):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await stream_export_for_staff(request, staff, "/admin", job_id)
 
 
 @router.get("/agent/orders/export/stream/{job_id}")
 async def agent_stream_order_export(job_id: str, request: Request):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await stream_export_for_staff(request, agent, "/agent", job_id)
 
 
 @router.get("/admin/orders/export/download/{job_id}")
 async def admin_download_order_export(job_id: str, request: Request, token: Optional[str] = None):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await download_export_for_staff(staff, job_id, token)
 
 
 @router.get("/agent/orders/export/download/{job_id}")
 async def agent_download_order_export(job_id: str, request: Request, token: Optional[str] = None):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await download_export_for_staff(agent, job_id, token)
 
 
 @router.get("/admin/orders/export/history")
 async def admin_export_history(request: Request):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await get_export_history_for_staff(staff, "/admin")
 
 
 @router.get("/agent/orders/export/history")
 async def agent_export_history(request: Request):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await get_export_history_for_staff(agent, "/agent")
 
 
 @router.delete("/admin/orders/{order_id}")
-async def admin_delete_orders(order_id: str, request: Request, delete_request: Optional[OrderDeleteRequest] = None):
+@offload_db
+def admin_delete_orders(order_id: str, request: Request, delete_request: Optional[OrderDeleteRequest] = None):
     """删除订单（支持单个或批量）。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -1135,7 +1158,8 @@ async def admin_delete_orders(order_id: str, request: Request, delete_request: O
 
 
 @router.patch("/admin/orders/{order_id}/status")
-async def update_order_status(order_id: str, status_request: OrderStatusUpdateRequest, request: Request):
+@offload_db
+def update_order_status(order_id: str, status_request: OrderStatusUpdateRequest, request: Request):
     """更新订单状态（管理员）。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -1168,7 +1192,8 @@ async def update_order_status(order_id: str, status_request: OrderStatusUpdateRe
 
 
 @router.get("/admin/order-stats")
-async def get_order_statistics(request: Request, agent_id: Optional[str] = None):
+@offload_db
+def get_order_statistics(request: Request, agent_id: Optional[str] = None):
     """获取订单统计信息（管理员）。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
@@ -1210,7 +1235,8 @@ async def get_order_statistics(request: Request, agent_id: Optional[str] = None)
 
 
 @router.get("/admin/dashboard-stats")
-async def get_dashboard_statistics(
+@offload_db
+def get_dashboard_statistics(
     request: Request,
     period: str = "week",
     range_start: Optional[str] = None,
@@ -1279,7 +1305,8 @@ async def get_dashboard_statistics(
 
 
 @router.get("/agent/dashboard-stats")
-async def get_agent_dashboard_statistics(
+@offload_db
+def get_agent_dashboard_statistics(
     request: Request,
     period: str = "week",
     range_start: Optional[str] = None,
@@ -1323,7 +1350,8 @@ async def get_agent_dashboard_statistics(
 
 
 @router.get("/admin/customers")
-async def get_customers_with_purchases(
+@offload_db
+def get_customers_with_purchases(
     request: Request,
     limit: Optional[int] = 5,
     offset: Optional[int] = 0,
@@ -1422,7 +1450,8 @@ async def get_customers_with_purchases(
 
 
 @router.post("/orders/{order_id}/mark-paid")
-async def mark_order_paid_pending(order_id: str, request: Request):
+@offload_db
+def mark_order_paid_pending(order_id: str, request: Request):
     """用户扫码后手动标记为待验证（processing）。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -1454,7 +1483,8 @@ async def mark_order_paid_pending(order_id: str, request: Request):
 
 
 @router.post("/orders/{order_id}/lottery/draw")
-async def draw_lottery(order_id: str, request: Request):
+@offload_db
+def draw_lottery(order_id: str, request: Request):
     """订单点击“已付款”后触发抽奖（订单商品金额满足门槛；每单一次）。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -1605,7 +1635,8 @@ async def draw_lottery(order_id: str, request: Request):
 
 
 @router.get("/rewards/eligible")
-async def get_eligible_rewards(request: Request, owner_id: Optional[str] = None, restrict_owner: Optional[bool] = False):
+@offload_db
+def get_eligible_rewards(request: Request, owner_id: Optional[str] = None, restrict_owner: Optional[bool] = False):
     """获取当前用户可用的抽奖奖品列表。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -1628,7 +1659,8 @@ async def get_eligible_rewards(request: Request, owner_id: Optional[str] = None,
 
 
 @router.patch("/admin/orders/{order_id}/payment-status")
-async def admin_update_payment_status(order_id: str, payload: PaymentStatusUpdateRequest, request: Request):
+@offload_db
+def admin_update_payment_status(order_id: str, payload: PaymentStatusUpdateRequest, request: Request):
     """管理员更新订单支付状态：pending/processing/succeeded/failed。"""
     staff = get_current_staff_required_from_cookie(request)
     try:
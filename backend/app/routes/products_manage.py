@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import List, Optional
 
 from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 
@@ -8,7 +8,7 @@ from auth import (
     get_current_staff_required_from_cookie,
     success_response,
 )
-from database import AdminDB, CategoryDB, OrderDB, ProductDB, UserProfileDB, VariantDB
+from database import AdminDB, CategoryDB, OrderDB, ProductDB, UserProfileDB, VariantDB, offload_db, run_in_db_executor
 from ..context import logger
 from ..dependencies import build_staff_scope, get_owner_id_for_staff, require_agent_with_scope, staff_can_access_product
 from ..schemas import (
@@ -24,11 +24,14 @@ from ..schemas import (
 from ..services.admin import compute_registered_user_count
 from ..services.orders import resolve_staff_order_scope
 from ..services.products import (
+    STOCK_IMPORT_MAX_BYTES,
     build_product_listing_for_staff,
     delete_product_image,
     delete_products_images,
+    handle_bulk_product_update,
     handle_product_creation,
     handle_product_image_update,
+    handle_product_stock_import,
     handle_product_stock_update,
     handle_product_update,
     resolve_owner_filter_for_staff,
@@ -40,7 +43,8 @@ router = APIRouter()
 
 
 @router.get("/admin/products/{product_id}/variants")
-async def list_variants(product_id: str, request: Request):
+@offload_db
+def list_variants(product_id: str, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         product = ProductDB.get_product_by_id(product_id)
@@ -56,12 +60,13 @@ async def list_variants(product_id: str, request: Request):
 
 @router.get("/agent/products/{product_id}/variants")
 async def agent_list_variants(product_id: str, request: Request):
-    require_agent_with_scope(request)
+    await run_in_db_executor(require_agent_with_scope, request)
     return await list_variants(product_id, request)
 
 
 @router.post("/admin/products/{product_id}/variants")
-async def create_variant(product_id: str, payload: VariantCreate, request: Request):
+@offload_db
+def create_variant(product_id: str, payload: VariantCreate, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         product = ProductDB.get_product_by_id(product_id)
@@ -78,12 +83,13 @@ async def create_variant(product_id: str, payload: VariantCreate, request: Reque
 
 @router.post("/agent/products/{product_id}/variants")
 async def agent_create_variant(product_id: str, payload: VariantCreate, request: Request):
-    require_agent_with_scope(request)
+    await run_in_db_executor(require_agent_with_scope, request)
     return await create_variant(product_id, payload, request)
 
 
 @router.put("/admin/variants/{variant_id}")
-async def update_variant(variant_id: str, payload: VariantUpdate, request: Request):
+@offload_db
+def update_variant(variant_id: str, payload: VariantUpdate, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         variant = VariantDB.get_by_id(variant_id)
@@ -103,12 +109,13 @@ async def update_variant(variant_id: str, payload: VariantUpdate, request: Reque
 
 @router.put("/agent/variants/{variant_id}")
 async def agent_update_variant(variant_id: str, payload: VariantUpdate, request: Request):
-    require_agent_with_scope(request)
+    await run_in_db_executor(require_agent_with_scope, request)
     return await update_variant(variant_id, payload, request)
 
 
 @router.delete("/admin/variants/{variant_id}")
-async def delete_variant(variant_id: str, request: Request):
+@offload_db
+def delete_variant(variant_id: str, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         variant = VariantDB.get_by_id(variant_id)
@@ -128,7 +135,7 @@ async def delete_variant(variant_id: str, request: Request):
 
 @router.delete("/agent/variants/{variant_id}")
 async def agent_delete_variant(variant_id: str, request: Request):
-    require_agent_with_scope(request)
+    await run_in_db_executor(require_agent_with_scope, request)
     return await delete_variant(variant_id, request)
 
 
@@ -151,7 +158,7 @@ async def create_product(
     reservation_note: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
 ):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     resolved_owner_id = owner_id
     if not resolved_owner_id:
         resolved_owner_id = request.query_params.get("owner_id")
@@ -199,7 +206,7 @@ async def agent_create_product(
     reservation_note: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
 ):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     agent_owner_id = get_owner_id_for_staff(agent)
     return await handle_product_creation(
         agent,
@@ -222,7 +229,8 @@ async def agent_create_product(
 
 
 @router.get("/admin/products")
-async def admin_list_products(
+@offload_db
+def admin_list_products(
     request: Request, q: Optional[str] = None, category: Optional[str] = None, include_inactive: Optional[bool] = True, owner_id: Optional[str] = None
 ):
     staff = get_current_staff_required_from_cookie(request)
@@ -254,7 +262,8 @@ async def admin_list_products(
 
 
 @router.get("/agent/categories")
-async def agent_get_categories(request: Request):
+@offload_db
+def agent_get_categories(request: Request):
     try:
         agent, scope = require_agent_with_scope(request)
         owner_ids = scope.get("owner_ids")
@@ -275,7 +284,8 @@ async def agent_get_categories(request: Request):
 
 
 @router.get("/agent/products")
-async def agent_list_products(request: Request, q: Optional[str] = None, category: Optional[str] = None, include_inactive: bool = True):
+@offload_db
+def agent_list_products(request: Request, q: Optional[str] = None, category: Optional[str] = None, include_inactive: bool = True):
     agent, scope = require_agent_with_scope(request)
     query = q.strip() if isinstance(q, str) else None
     category_filter = category.strip() if isinstance(category, str) and category.strip() else None
@@ -284,7 +294,8 @@ async def agent_list_products(request: Request, q: Optional[str] = None, categor
 
 
 @router.get("/admin/stats")
-async def get_admin_stats(request: Request, owner_id: Optional[str] = None):
+@offload_db
+def get_admin_stats(request: Request, owner_id: Optional[str] = None):
     staff = get_current_staff_required_from_cookie(request)
 
     try:
@@ -340,7 +351,8 @@ async def get_admin_stats(request: Request, owner_id: Optional[str] = None):
 
 
 @router.get("/admin/users/count")
-async def get_users_count(request: Request, owner_id: Optional[str] = None, agent_id: Optional[str] = None):
+@offload_db
+def get_users_count(request: Request, owner_id: Optional[str] = None, agent_id: Optional[str] = None):
     staff = get_current_staff_required_from_cookie(request)
     try:
         scope = build_staff_scope(staff)
@@ -376,7 +388,8 @@ async def get_users_count(request: Request, owner_id: Optional[str] = None, agen
 
 
 @router.get("/admin/products/{product_id}")
-async def get_product_details(product_id: str, request: Request):
+@offload_db
+def get_product_details(product_id: str, request: Request):
     staff = get_current_staff_required_from_cookie(request)
 
     try:
@@ -403,82 +416,79 @@ async def get_product_details(product_id: str, request: Request):
 
 @router.get("/agent/products/{product_id}")
 async def agent_get_product_details(product_id: str, request: Request):
-    require_agent_with_scope(request)
+    await run_in_db_executor(require_agent_with_scope, request)
     return await get_product_details(product_id, request)
 
 
+# 需注册在 /admin/products/{product_id} 之前，否则会被单商品路由匹配
+@router.put("/admin/products/0")
+async def bulk_update_products(payload: BulkProductUpdateRequest, request: Request):
+    admin = await run_in_db_executor(get_current_admin_required_from_cookie, request)
+    return await handle_bulk_product_update(admin, payload)
+
+
 @router.put("/admin/products/{product_id}")
 async def update_product(product_id: str, product_data: ProductUpdateRequest, request: Request):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await handle_product_update(staff, product_id, product_data)
 
 
 @router.put("/agent/products/{product_id}")
 async def agent_update_product(product_id: str, product_data: ProductUpdateRequest, request: Request):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await handle_product_update(agent, product_id, product_data)
 
 
-@router.put("/admin/products/0")
-async def bulk_update_products(payload: BulkProductUpdateRequest, request: Request):
-    admin = get_current_admin_required_from_cookie(request)
-    try:
-        if not payload.product_ids:
-            return error_response("未提供商品ID", 400)
-
-        update_fields: Dict[str, Any] = {}
-        if payload.discount is not None:
-            try:
-                d = float(payload.discount)
-                if d < 0.5 or d > 10:
-                    return error_response("折扣范围应为0.5~10折", 400)
-                update_fields["discount"] = d
-            except Exception:
-                return error_response("无效的折扣", 400)
-
-        if not update_fields:
-            return error_response("没有可更新的字段", 400)
-
-        updated = 0
-        not_found: List[str] = []
-        blocked: List[str] = []
-        for pid in payload.product_ids:
-            p = ProductDB.get_product_by_id(pid)
-            if not p:
-                not_found.append(pid)
-                continue
-            owner_id = p.get("owner_id")
-            if owner_id and owner_id != "admin" and AdminDB.is_agent_deleted(owner_id):
-                blocked.append(pid)
-                continue
-            ok = ProductDB.update_product(pid, update_fields)
-            if ok:
-                updated += 1
-        return success_response("批量更新完成", {"updated": updated, "not_found": not_found, "blocked": blocked})
-    except Exception as exc:
-        logger.error("Failed to bulk update products: %s", exc)
-        return error_response("批量更新商品失败", 500)
-
-
 @router.put("/admin/products")
 async def bulk_update_products_alt(payload: BulkProductUpdateRequest, request: Request):
     return await bulk_update_products(payload, request)
 
 
+@router.put("/agent/products")
+async def agent_bulk_update_products(payload: BulkProductUpdateRequest, request: Request):
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
+    return await handle_bulk_product_update(agent, payload)
+
+
+async def _read_stock_import_upload(file: UploadFile) -> Optional[bytes]:
+    content = await file.read(STOCK_IMPORT_MAX_BYTES + 1)
+    return None if len(content) > STOCK_IMPORT_MAX_BYTES else content
+
+
+@router.post("/admin/products/stock-import")
+async def import_product_stock(request: Request, file: UploadFile = File(...), dry_run: bool = False):
+    """上传 CSV/XLSX 批量设置库存；dry_run 时只校验并返回逐行结果。"""
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
+    content = await _read_stock_import_upload(file)
+    if content is None:
+        return error_response("导入文件过大", 400)
+    return await handle_product_stock_import(staff, file.filename or "", content, dry_run)
+
+
+@router.post("/agent/products/stock-import")
+async def agent_import_product_stock(request: Request, file: UploadFile = File(...), dry_run: bool = False):
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
+    content = await _read_stock_import_upload(file)
+    if content is None:
+        return error_response("导入文件过大", 400)
+    return await handle_product_stock_import(agent, file.filename or "", content, dry_run)
+
+
 @router.patch("/admin/products/{product_id}/stock")
 async def update_product_stock(product_id: str, stock_data: StockUpdateRequest, request: Request):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await handle_product_stock_update(staff, product_id, stock_data)
 
 
 @router.patch("/agent/products/{product_id}/stock")
 async def agent_update_product_stock(product_id: str, stock_data: StockUpdateRequest, request: Request):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await handle_product_stock_update(agent, product_id, stock_data)
 
 
 @router.delete("/admin/products/{product_id}")
-async def delete_products(product_id: str, request: Request, delete_request: Optional[ProductDeleteRequest] = None):
+@offload_db
+def delete_products(product_id: str, request: Request, delete_request: Optional[ProductDeleteRequest] = None):
     staff = get_current_staff_required_from_cookie(request)
 
     try:
@@ -533,7 +543,8 @@ async def delete_products(product_id: str, request: Request, delete_request: Opt
 
 
 @router.delete("/agent/products/{product_id}")
-async def agent_delete_products(product_id: str, request: Request, delete_request: Optional[ProductDeleteRequest] = None):
+@offload_db
+def agent_delete_products(product_id: str, request: Request, delete_request: Optional[ProductDeleteRequest] = None):
     agent, _ = require_agent_with_scope(request)
 
     if delete_request and delete_request.product_ids:
@@ -562,18 +573,19 @@ async def agent_delete_products(product_id: str, request: Request, delete_reques
 
 @router.post("/admin/products/{product_id}/image")
 async def update_product_image(product_id: str, request: Request, image: Optional[UploadFile] = File(None)):
-    staff = get_current_staff_required_from_cookie(request)
+    staff = await run_in_db_executor(get_current_staff_required_from_cookie, request)
     return await handle_product_image_update(staff, product_id, image)
 
 
 @router.post("/agent/products/{product_id}/image")
 async def agent_update_product_image(product_id: str, request: Request, image: Optional[UploadFile] = File(None)):
-    agent, _ = require_agent_with_scope(request)
+    agent, _ = await run_in_db_executor(require_agent_with_scope, request)
     return await handle_product_image_update(agent, product_id, image)
 
 
 @router.get("/admin/categories")
-async def get_admin_categories(request: Request, owner_id: Optional[str] = None):
+@offload_db
+def get_admin_categories(request: Request, owner_id: Optional[str] = None):
     staff = get_current_staff_required_from_cookie(request)
     try:
         scope = build_staff_scope(staff)
@@ -586,7 +598,8 @@ async def get_admin_categories(request: Request, owner_id: Optional[str] = None)
 
 
 @router.post("/admin/categories")
-async def create_category(request: Request, payload: CategoryCreateRequest):
+@offload_db
+def create_category(request: Request, payload: CategoryCreateRequest):
     staff = get_current_staff_required_from_cookie(request)
     try:
         scope = build_staff_scope(staff)
@@ -607,7 +620,8 @@ async def create_category(request: Request, payload: CategoryCreateRequest):
 
 
 @router.put("/admin/categories/{category_id}")
-async def update_category(category_id: str, payload: CategoryUpdateRequest, request: Request):
+@offload_db
+def update_category(category_id: str, payload: CategoryUpdateRequest, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         category = CategoryDB.get_category(category_id, include_deleted=True)
@@ -637,7 +651,8 @@ async def update_category(category_id: str, payload: CategoryUpdateRequest, requ
 
 
 @router.delete("/admin/categories/{category_id}")
-async def delete_category(category_id: str, request: Request):
+@offload_db
+def delete_category(category_id: str, request: Request):
     staff = get_current_staff_required_from_cookie(request)
     try:
         category = CategoryDB.get_category(category_id, include_deleted=True)
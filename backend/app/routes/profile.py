@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Request
 
 from auth import error_response, get_current_user_required_from_cookie, success_response
-from database import AddressDB, AgentAssignmentDB, BuildingDB, CartDB, UserProfileDB
+from database import AddressDB, AgentAssignmentDB, BuildingDB, CartDB, UserProfileDB, offload_db
 from ..context import logger
 from ..schemas import LocationUpdateRequest
 
@@ -10,7 +10,8 @@ router = APIRouter()
 
 
 @router.get("/profile/shipping")
-async def get_profile_shipping(request: Request):
+@offload_db
+def get_profile_shipping(request: Request):
     """获取用户收货资料。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -22,7 +23,8 @@ async def get_profile_shipping(request: Request):
 
 
 @router.post("/profile/location")
-async def update_profile_location(payload: LocationUpdateRequest, request: Request):
+@offload_db
+def update_profile_location(payload: LocationUpdateRequest, request: Request):
     """更新用户配送地址并清空购物车。"""
     user = get_current_user_required_from_cookie(request)
     try:
@@ -3,7 +3,7 @@ from typing import Optional
 from fastapi import APIRouter, Request
 
 from auth import error_response, get_current_admin_required_from_cookie, success_response
-from database import AdminDB, AgentStatusDB, SalesCycleDB, SettingsDB
+from database import AdminDB, AgentStatusDB, SalesCycleDB, SettingsDB, offload_db
 from ..context import logger
 from ..dependencies import require_agent_with_scope
 
@@ -42,7 +42,8 @@ def _resolve_admin_owner(agent_id: Optional[str]):
 
 
 @router.get("/admin/sales-cycles")
-async def admin_get_sales_cycles(request: Request, agent_id: Optional[str] = None):
+@offload_db
+def admin_get_sales_cycles(request: Request, agent_id: Optional[str] = None):
     _admin = get_current_admin_required_from_cookie(request)
     try:
         owner = _resolve_admin_owner(agent_id)
@@ -64,7 +65,8 @@ async def admin_get_sales_cycles(request: Request, agent_id: Optional[str] = Non
 
 
 @router.post("/admin/sales-cycles/end")
-async def admin_end_sales_cycle(request: Request, agent_id: Optional[str] = None):
+@offload_db
+def admin_end_sales_cycle(request: Request, agent_id: Optional[str] = None):
     _admin = get_current_admin_required_from_cookie(request)
     try:
         owner = _resolve_admin_owner(agent_id)
@@ -107,7 +109,8 @@ async def admin_end_sales_cycle(request: Request, agent_id: Optional[str] = None
 
 
 @router.post("/admin/sales-cycles/cancel-end")
-async def admin_cancel_sales_cycle_end(request: Request, agent_id: Optional[str] = None):
+@offload_db
+def admin_cancel_sales_cycle_end(request: Request, agent_id: Optional[str] = None):
     _admin = get_current_admin_required_from_cookie(request)
     try:
         owner = _resolve_admin_owner(agent_id)
@@ -146,7 +149,8 @@ async def admin_cancel_sales_cycle_end(request: Request, agent_id: Optional[str]
 
 
 @router.post("/admin/sales-cycles/start")
-async def admin_start_sales_cycle(request: Request, agent_id: Optional[str] = None):
+@offload_db
+def admin_start_sales_cycle(request: Request, agent_id: Optional[str] = None):
     _admin = get_current_admin_required_from_cookie(request)
     try:
         owner = _resolve_admin_owner(agent_id)
@@ -171,7 +175,8 @@ async def admin_start_sales_cycle(request: Request, agent_id: Optional[str] = No
 
 
 @router.get("/agent/sales-cycles")
-async def agent_get_sales_cycles(request: Request):
+@offload_db
+def agent_get_sales_cycles(request: Request):
     agent, _scope = require_agent_with_scope(request)
     try:
         payload = _serialize_cycles("agent", agent.get("agent_id"))
@@ -184,7 +189,8 @@ async def agent_get_sales_cycles(request: Request):
 
 
 @router.post("/agent/sales-cycles/end")
-async def agent_end_sales_cycle(request: Request):
+@offload_db
+def agent_end_sales_cycle(request: Request):
     agent, _scope = require_agent_with_scope(request)
     try:
         status = AgentStatusDB.get_agent_status(agent.get("agent_id"))
@@ -210,7 +216,8 @@ async def agent_end_sales_cycle(request: Request):
 
 
 @router.post("/agent/sales-cycles/cancel-end")
-async def agent_cancel_sales_cycle_end(request: Request):
+@offload_db
+def agent_cancel_sales_cycle_end(request: Request):
     agent, _scope = require_agent_with_scope(request)
     try:
         cycle = SalesCycleDB.cancel_end("agent", agent.get("agent_id"))
@@ -238,7 +245,8 @@ async def agent_cancel_sales_cycle_end(request: Request):
 
 
 @router.post("/agent/sales-cycles/start")
-async def agent_start_sales_cycle(request: Request):
+@offload_db
+def agent_start_sales_cycle(request: Request):
     agent, _scope = require_agent_with_scope(request)
     try:
         cycle = SalesCycleDB.start_new_cycle("agent", agent.get("agent_id"))
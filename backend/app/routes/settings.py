@@ -8,7 +8,7 @@ from auth import (
     get_current_agent_from_cookie,
     success_response,
 )
-from database import AgentStatusDB, SalesCycleDB, SettingsDB
+from database import AgentStatusDB, SalesCycleDB, SettingsDB, aio, offload_db, run_in_db_executor
 from ..context import logger
 from ..dependencies import resolve_shopping_scope
 from ..schemas import AgentStatusUpdateRequest, ShopStatusUpdate
@@ -18,7 +18,8 @@ router = APIRouter()
 
 
 @router.get("/admin/shop-settings")
-async def get_shop_settings(request: Request):
+@offload_db
+def get_shop_settings(request: Request):
     """获取商城设置。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -32,12 +33,12 @@ async def get_shop_settings(request: Request):
 @router.put("/admin/shop-settings")
 async def update_shop_settings(request: Request):
     """更新商城设置。"""
-    _admin = get_current_admin_required_from_cookie(request)
+    _admin = await run_in_db_executor(get_current_admin_required_from_cookie, request)
     try:
         body = await request.json()
         show_inactive = body.get("show_inactive_in_shop", False)
 
-        SettingsDB.set("show_inactive_in_shop", "true" if show_inactive else "false")
+        await aio.SettingsDB.set("show_inactive_in_shop", "true" if show_inactive else "false")
         return success_response("商城设置更新成功", {"show_inactive_in_shop": show_inactive})
     except Exception as exc:
         logger.error("Failed to update shop settings: %s", exc)
@@ -45,7 +46,8 @@ async def update_shop_settings(request: Request):
 
 
 @router.get("/admin/chat-settings")
-async def get_chat_settings(request: Request):
+@offload_db
+def get_chat_settings(request: Request):
     """获取聊天保留设置。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -63,12 +65,12 @@ async def get_chat_settings(request: Request):
 @router.put("/admin/chat-settings")
 async def update_chat_settings(request: Request):
     """更新聊天保留设置。0表示永久保留。"""
-    _admin = get_current_admin_required_from_cookie(request)
+    _admin = await run_in_db_executor(get_current_admin_required_from_cookie, request)
     try:
         body = await request.json()
         days = body.get("chat_retention_days", 7)
         days = max(0, int(days))
-        SettingsDB.set("chat_retention_days", str(days))
+        await aio.SettingsDB.set("chat_retention_days", str(days))
         return success_response("聊天设置更新成功", {"chat_retention_days": days})
     except (ValueError, TypeError):
         return error_response("保留天数必须为非负整数", 400)
@@ -78,7 +80,8 @@ async def update_chat_settings(request: Request):
 
 
 @router.get("/shop/status")
-async def get_shop_status():
+@offload_db
+def get_shop_status():
     """获取店铺开关状态。"""
     try:
         is_open = SettingsDB.get("shop_is_open", "1") != "0"
@@ -100,7 +103,8 @@ async def get_shop_status():
 
 
 @router.patch("/admin/shop/status")
-async def update_shop_status(payload: ShopStatusUpdate, request: Request):
+@offload_db
+def update_shop_status(payload: ShopStatusUpdate, request: Request):
     """更新店铺开关（管理员）。"""
     _admin = get_current_admin_required_from_cookie(request)
     try:
@@ -116,7 +120,8 @@ async def update_shop_status(payload: ShopStatusUpdate, request: Request):
 
 
 @router.get("/agent/status")
-async def get_agent_status(request: Request):
+@offload_db
+def get_agent_status(request: Request):
     """获取代理的营业状态。"""
     agent = get_current_agent_from_cookie(request)
     if not agent:
@@ -140,7 +145,8 @@ async def get_agent_status(request: Request):
 
 
 @router.patch("/agent/status")
-async def update_agent_status(payload: AgentStatusUpdateRequest, request: Request):
+@offload_db
+def update_agent_status(payload: AgentStatusUpdateRequest, request: Request):
     """更新代理的营业状态。"""
     agent = get_current_agent_from_cookie(request)
     if not agent:
@@ -169,7 +175,8 @@ async def update_agent_status(payload: AgentStatusUpdateRequest, request: Reques
 
 
 @router.get("/shop/agent-status")
-async def get_user_agent_status(request: Request, address_id: Optional[str] = None, building_id: Optional[str] = None):
+@offload_db
+def get_user_agent_status(request: Request, address_id: Optional[str] = None, building_id: Optional[str] = None):
     """获取用户所属代理的营业状态。"""
     try:
         scope = resolve_shopping_scope(request, address_id, building_id)
@@ -1,11 +1,14 @@
 import mimetypes
 import os
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from starlette.responses import FileResponse
 
-from auth import success_response
+from auth import get_current_admin_required_from_cookie, success_response
+from database import get_cache_stats, get_executor_stats, get_password_hash_stats, get_pool_stats
+from http_clients import get_http_client_stats
 from ..context import PUBLIC_DIR, STATIC_CACHE_MAX_AGE
+from ..services.captcha import CaptchaService
 
 
 router = APIRouter()
@@ -17,6 +20,23 @@ async def health_check():
     return success_response("服务运行正常")
 
 
+@router.get("/admin/system/metrics")
+async def get_runtime_metrics(request: Request):
+    """获取运行时资源指标（数据库连接池、数据库线程池、密码哈希进程池、上游 HTTP 连接池、验证码预渲染池、配置缓存等）。"""
+    _admin = get_current_admin_required_from_cookie(request)
+    return success_response(
+        "获取运行指标成功",
+        {
+            "db_pool": get_pool_stats(),
+            "db_executor": get_executor_stats(),
+            "password_hasher": get_password_hash_stats(),
+            "http_clients": get_http_client_stats(),
+            "captcha_pool": CaptchaService.get_challenge_pool_stats(),
+            "caches": get_cache_stats(),
+        },
+    )
+
+
 @router.get("/logo.{extension}")
 async def serve_logo(extension: str):
     """返回公共目录下的 logo 文件。"""
@@ -112,11 +112,26 @@ class ProductDeleteRequest(BaseModel):
     product_ids: List[str]
 
 
+class BulkProductChange(BaseModel):
+    product_id: str
+    variant_id: Optional[str] = None
+    discount: Optional[float] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    is_active: Optional[bool] = None
+    category: Optional[str] = None
+
+
 class BulkProductUpdateRequest(BaseModel):
-    product_ids: List[str]
+    # product_ids 统一应用下方字段；items 为逐个商品/规格指定的修改，两者可同时使用
+    product_ids: List[str] = []
     discount: Optional[float] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    category: Optional[str] = None
     owner_id: Optional[str] = None
     is_active: Optional[bool] = None
+    items: List[BulkProductChange] = []
 
 
 class AgentCreateRequest(BaseModel):
@@ -164,6 +179,7 @@ class OrderExportRequest(BaseModel):
     agent_filter: Optional[str] = None
     timezone_offset_minutes: Optional[int] = None
     cycle_id: Optional[str] = None
+    file_format: Optional[str] = None  # xlsx（默认）或 csv
 
 
 class AddressCreateRequest(BaseModel):
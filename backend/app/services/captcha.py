@@ -1,6 +1,6 @@
+import base64
 import hashlib
 import json
-import math
 import secrets
 import threading
 import time
@@ -9,11 +9,12 @@ from pathlib import Path
 from typing import Any, Deque, Dict, List, Optional, Tuple
 
 from fastapi import Request
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 
+from captcha_render import SLIDER_HEIGHT, SLIDER_WIDTH
 from config import get_settings
 from database import get_db_connection
 from ..context import PUBLIC_DIR, logger
+from .captcha_pool import CaptchaChallengePool
 
 try:
     import redis.asyncio as redis_async
@@ -34,17 +35,6 @@ LOGIN_ATTEMPT_THRESHOLD = 5
 CHALLENGE_RATE_WINDOW_SECONDS = 120
 CHALLENGE_RATE_LIMIT = 20
 
-SLIDER_WIDTH = 320
-SLIDER_HEIGHT = 160
-PUZZLE_WIDTH = 60
-PUZZLE_SIZE_VARIANCE = 12
-PUZZLE_MIN_WIDTH = 44
-PUZZLE_MAX_WIDTH = 72
-PUZZLE_MIN_MARGIN = 8
-PUZZLE_SHAPES = ("circle", "triangle", "rhombus", "square")
-PUZZLE_ROTATE_MIN_DEG = -32
-PUZZLE_ROTATE_MAX_DEG = 32
-PUZZLE_FREE_ROTATE_SHAPES = {"triangle", "rhombus"}
 OFFSET_TOLERANCE = 6
 MIN_VERIFY_DURATION_MS = 220
 MAX_VERIFY_DURATION_MS = 20000
@@ -60,18 +50,20 @@ CAPTCHA_ROOT_DIR = Path(PUBLIC_DIR) / "captcha"
 CAPTCHA_GENERATED_DIR = CAPTCHA_ROOT_DIR / "generated"
 CAPTCHA_ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
 CAPTCHA_EXCLUDE_PREFIXES = {"puzzle-", "bg-", "slot-", "piece-"}
+# 旧版本把验证码图片写入该目录，启动时清理残留文件
 CAPTCHA_GENERATED_NAME_SUFFIXES = ("-bg.webp", "-puzzle.png")
-CAPTCHA_BG_WEBP_QUALITY = 86
-CAPTCHA_GENERATED_CLEANUP_INTERVAL_SECONDS = 30
-CAPTCHA_GENERATED_MAX_AGE_SECONDS = CHALLENGE_TTL_SECONDS + 30
+CAPTCHA_IMAGE_KINDS = {"bg": "image/webp", "puzzle": "image/png"}
 
 _challenge_store: Dict[str, Dict[str, Any]] = {}
 _attempt_store: Dict[str, Deque[float]] = {}
 _challenge_rate_store: Dict[str, Deque[float]] = {}
 _pass_token_store: Dict[str, Dict[str, Any]] = {}
 _login_captcha_required_store: Dict[str, float] = {}
+_image_store: Dict[str, Dict[str, Any]] = {}
 _store_lock = threading.Lock()
 
+_challenge_pool = CaptchaChallengePool(settings.captcha_pool_size, settings.captcha_render_workers)
+
 
 class CaptchaError(Exception):
     def __init__(self, message: str, status_code: int = 400):
@@ -83,7 +75,6 @@ class CaptchaError(Exception):
 class CaptchaService:
     _redis_client = None
     _redis_lock = threading.Lock()
-    _last_generated_cleanup_at = 0.0
 
     @staticmethod
     def normalize_scene(scene: Optional[str]) -> str:
@@ -122,23 +113,16 @@ class CaptchaService:
             payload = _challenge_store.pop(cid, None)
             if not payload:
                 continue
-            CaptchaService._remove_challenge_files(payload)
+            CaptchaService._remove_challenge_images(payload)
+        expired_images = [cid for cid, entry in _image_store.items() if entry.get("expires_at", 0) <= now]
+        for cid in expired_images:
+            _image_store.pop(cid, None)
 
     @staticmethod
-    def _remove_file(path_value: Optional[str]) -> None:
-        if not path_value:
-            return
-        try:
-            Path(path_value).unlink(missing_ok=True)
-        except Exception:
-            pass
-
-    @classmethod
-    def _remove_challenge_files(cls, payload: Optional[Dict[str, Any]]) -> None:
+    def _remove_challenge_images(payload: Optional[Dict[str, Any]]) -> None:
         if not payload:
             return
-        cls._remove_file(payload.get("bg_path"))
-        cls._remove_file(payload.get("puzzle_path"))
+        _image_store.pop(str(payload.get("challenge_id") or ""), None)
 
     @staticmethod
     def _is_generated_captcha_file(path: Path) -> bool:
@@ -149,37 +133,13 @@ class CaptchaService:
         return any(path.name.endswith(suffix) for suffix in CAPTCHA_GENERATED_NAME_SUFFIXES)
 
     @classmethod
-    def _cleanup_generated_files_locked(cls, now: float, force: bool = False) -> int:
-        if not force and now - cls._last_generated_cleanup_at < CAPTCHA_GENERATED_CLEANUP_INTERVAL_SECONDS:
-            return 0
-        cls._last_generated_cleanup_at = now
-
+    def _remove_legacy_generated_files(cls) -> int:
         if not CAPTCHA_GENERATED_DIR.exists():
             return 0
-
-        active_files: set[str] = set()
-        for payload in _challenge_store.values():
-            for key in ("bg_path", "puzzle_path"):
-                value = str(payload.get(key) or "").strip()
-                if value:
-                    active_files.add(value)
-
         removed = 0
         try:
             for file_path in CAPTCHA_GENERATED_DIR.iterdir():
-                if not cls._is_generated_captcha_file(file_path):
-                    continue
-                full_path = str(file_path)
-                if full_path in active_files:
-                    continue
-                if force:
-                    stale = True
-                else:
-                    try:
-                        stale = (now - file_path.stat().st_mtime) > CAPTCHA_GENERATED_MAX_AGE_SECONDS
-                    except Exception:
-                        stale = True
-                if stale:
+                if cls._is_generated_captcha_file(file_path):
                     file_path.unlink(missing_ok=True)
                     removed += 1
         except Exception:
@@ -188,10 +148,34 @@ class CaptchaService:
 
     @classmethod
     def cleanup_generated_images(cls, force: bool = False) -> int:
+        """清理过期挑战及其内存图片；force 时同时删除旧版本写入磁盘的验证码图片。"""
         now = time.time()
         with _store_lock:
+            before = len(_image_store)
             cls._cleanup_challenges(now)
-            return cls._cleanup_generated_files_locked(now, force=force)
+            removed = before - len(_image_store)
+        if force:
+            removed += cls._remove_legacy_generated_files()
+        return removed
+
+    @staticmethod
+    def _background_sources() -> List[str]:
+        return [str(path) for path in CaptchaService._list_background_candidates()]
+
+    @staticmethod
+    def start_challenge_pool() -> None:
+        """启动验证码预渲染后台任务（应用启动时调用）。"""
+        _challenge_pool.start(CaptchaService._background_sources)
+
+    @staticmethod
+    async def stop_challenge_pool() -> None:
+        await _challenge_pool.stop()
+
+    @staticmethod
+    def get_challenge_pool_stats() -> Dict[str, Any]:
+        with _store_lock:
+            images_in_memory = len(_image_store)
+        return {**_challenge_pool.stats(), "images_in_memory": images_in_memory}
 
     @classmethod
     def _evict_client_challenges_locked(cls, client_key: str, scene: str) -> int:
@@ -205,7 +189,7 @@ class CaptchaService:
             payload = _challenge_store.pop(cid, None)
             if not payload:
                 continue
-            cls._remove_challenge_files(payload)
+            cls._remove_challenge_images(payload)
             removed += 1
         return removed
 
@@ -257,186 +241,6 @@ class CaptchaService:
         except Exception:
             return []
 
-    @staticmethod
-    def _rand_int(min_value: int, max_value: int) -> int:
-        if max_value <= min_value:
-            return int(min_value)
-        return int(min_value + secrets.randbelow(max_value - min_value + 1))
-
-    @staticmethod
-    def _rotate_points(
-        points: List[Tuple[float, float]],
-        angle_deg: float,
-        center: Tuple[float, float],
-    ) -> List[Tuple[float, float]]:
-        radians = math.radians(float(angle_deg))
-        cos_v = math.cos(radians)
-        sin_v = math.sin(radians)
-        cx, cy = center
-        rotated: List[Tuple[float, float]] = []
-        for x, y in points:
-            dx = x - cx
-            dy = y - cy
-            rx = cx + dx * cos_v - dy * sin_v
-            ry = cy + dx * sin_v + dy * cos_v
-            rotated.append((rx, ry))
-        return rotated
-
-    @classmethod
-    def _build_shape_assets(
-        cls,
-        shape: str,
-        piece_size: int,
-        rotation_deg: float,
-    ) -> Tuple[Image.Image, Image.Image]:
-        mask = Image.new("L", (piece_size, piece_size), 0)
-        border = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
-        draw_mask = ImageDraw.Draw(mask)
-        draw_border = ImageDraw.Draw(border)
-
-        line_width = max(2, int(round(piece_size * 0.06)))
-        inset = max(line_width + 1, int(round(piece_size * 0.10)))
-        center = (piece_size / 2.0, piece_size / 2.0)
-        half = max(4.0, (piece_size - 2.0 * inset) / 2.0)
-        border_color = (255, 255, 255, 175)
-
-        if shape == "circle":
-            bounds = (
-                float(inset),
-                float(inset),
-                float(piece_size - inset),
-                float(piece_size - inset),
-            )
-            draw_mask.ellipse(bounds, fill=255)
-            draw_border.ellipse(bounds, outline=border_color, width=line_width)
-            return mask, border
-
-        if shape == "triangle":
-            raw_points = [
-                (center[0], center[1] - half),
-                (center[0] + half * 0.92, center[1] + half * 0.80),
-                (center[0] - half * 0.92, center[1] + half * 0.80),
-            ]
-        elif shape == "rhombus":
-            raw_points = [
-                (center[0], center[1] - half * 0.76),
-                (center[0] + half, center[1]),
-                (center[0], center[1] + half * 0.76),
-                (center[0] - half, center[1]),
-            ]
-        else:
-            raw_points = [
-                (center[0] - half, center[1] - half),
-                (center[0] + half, center[1] - half),
-                (center[0] + half, center[1] + half),
-                (center[0] - half, center[1] + half),
-            ]
-
-        rotated = cls._rotate_points(raw_points, rotation_deg, center)
-        draw_mask.polygon(rotated, fill=255)
-        draw_border.polygon(rotated, outline=border_color, width=line_width)
-        return mask, border
-
-    @classmethod
-    def _build_piece_profile(cls) -> Dict[str, Any]:
-        size_delta = cls._rand_int(-PUZZLE_SIZE_VARIANCE, PUZZLE_SIZE_VARIANCE)
-        puzzle_width = max(PUZZLE_MIN_WIDTH, min(PUZZLE_MAX_WIDTH, PUZZLE_WIDTH + size_delta))
-
-        shape = secrets.choice(PUZZLE_SHAPES)
-        shape_angle = cls._rand_int(0, 359) if shape in PUZZLE_FREE_ROTATE_SHAPES else 0
-        base_rotation = cls._rand_int(PUZZLE_ROTATE_MIN_DEG, PUZZLE_ROTATE_MAX_DEG)
-        rotation_deg = float((shape_angle + base_rotation) % 360)
-
-        min_x = PUZZLE_MIN_MARGIN
-        max_x = max(min_x, SLIDER_WIDTH - puzzle_width - PUZZLE_MIN_MARGIN)
-        min_y = PUZZLE_MIN_MARGIN
-        max_y = max(min_y, SLIDER_HEIGHT - puzzle_width - PUZZLE_MIN_MARGIN)
-
-        expected_x = cls._rand_int(min_x, max_x)
-        expected_y = cls._rand_int(min_y, max_y)
-
-        return {
-            "puzzle_width": int(puzzle_width),
-            "shape": shape,
-            "rotation_deg": rotation_deg,
-            "expected_x": int(expected_x),
-            "expected_y": int(expected_y),
-        }
-
-    @classmethod
-    def _render_captcha_images(cls, source_path: Path, challenge_id: str, profile: Dict[str, Any]) -> Dict[str, str]:
-        CAPTCHA_GENERATED_DIR.mkdir(parents=True, exist_ok=True)
-        bg_file = CAPTCHA_GENERATED_DIR / f"{challenge_id}-bg.webp"
-        puzzle_file = CAPTCHA_GENERATED_DIR / f"{challenge_id}-puzzle.png"
-
-        piece_size = int(profile["puzzle_width"])
-        expected_x = int(profile["expected_x"])
-        expected_y = int(profile["expected_y"])
-        shape = str(profile["shape"])
-        rotation_deg = float(profile["rotation_deg"])
-
-        with Image.open(source_path) as image:
-            base = image.convert("RGB").resize((SLIDER_WIDTH, SLIDER_HEIGHT), Image.Resampling.LANCZOS)
-            shape_mask, shape_border = cls._build_shape_assets(shape, piece_size, rotation_deg)
-            puzzle_piece_crop = base.crop(
-                (
-                    expected_x,
-                    expected_y,
-                    expected_x + piece_size,
-                    expected_y + piece_size,
-                )
-            ).convert("RGBA")
-
-            puzzle_strip = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
-            puzzle_alpha = Image.new("L", (piece_size, SLIDER_HEIGHT), 0)
-            puzzle_strip.paste(puzzle_piece_crop, (0, expected_y))
-            puzzle_alpha.paste(shape_mask, (0, expected_y))
-            puzzle_strip.putalpha(puzzle_alpha)
-
-            # 给拼图加一点对比度，避免在浅色图上不明显
-            puzzle_strip = ImageEnhance.Contrast(puzzle_strip).enhance(1.15)
-            border_alpha = shape_border.getchannel("A")
-            glow_radius = max(1, int(round(piece_size * 0.08)))
-            glow_alpha = border_alpha.filter(ImageFilter.GaussianBlur(radius=glow_radius)).point(
-                lambda value: int(value * 0.52)
-            )
-
-            piece_glow_tile = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
-            piece_glow_tile.putalpha(glow_alpha)
-            piece_glow_canvas = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
-            piece_glow_canvas.paste(piece_glow_tile, (0, expected_y), piece_glow_tile)
-            puzzle_strip.alpha_composite(piece_glow_canvas)
-
-            piece_border_canvas = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
-            piece_border_canvas.paste(shape_border, (0, expected_y), shape_border)
-            puzzle_strip.alpha_composite(piece_border_canvas)
-
-            shaded_bg = base.copy().convert("RGBA")
-            slot_glow = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
-            slot_glow.putalpha(glow_alpha)
-            shaded_bg.alpha_composite(slot_glow, (expected_x, expected_y))
-
-            slot_overlay = Image.new("RGBA", (piece_size, piece_size), (24, 24, 24, 0))
-            slot_alpha = shape_mask.point(lambda value: int(value * 0.36))
-            slot_overlay.putalpha(slot_alpha)
-            shaded_bg.alpha_composite(slot_overlay, (expected_x, expected_y))
-            shaded_bg.alpha_composite(shape_border, (expected_x, expected_y))
-
-            shaded_bg.convert("RGB").save(
-                bg_file,
-                format="WEBP",
-                quality=CAPTCHA_BG_WEBP_QUALITY,
-                method=6,
-            )
-            puzzle_strip.save(puzzle_file, format="PNG", optimize=True)
-
-        return {
-            "bg_path": str(bg_file),
-            "puzzle_path": str(puzzle_file),
-            "bg_url": f"/public/captcha/generated/{bg_file.name}",
-            "puzzle_url": f"/public/captcha/generated/{puzzle_file.name}",
-        }
-
     @classmethod
     async def _enforce_challenge_rate_limit(cls, client_key: str) -> None:
         count_after: Optional[int] = None
@@ -483,8 +287,8 @@ class CaptchaService:
             raise CaptchaError("验证码背景图片不存在，请先上传到 public/captcha/", 500)
 
         selected_image = secrets.choice(candidates)
-        profile = cls._build_piece_profile()
-        rendered = cls._render_captcha_images(selected_image, challenge_id, profile)
+        rendered = await _challenge_pool.acquire(str(selected_image))
+        profile = rendered["profile"]
 
         challenge = {
             "challenge_id": challenge_id,
@@ -495,13 +299,10 @@ class CaptchaService:
             "puzzle_width": int(profile["puzzle_width"]),
             "shape": profile["shape"],
             "rotation_deg": float(profile["rotation_deg"]),
-            "bg_url": rendered["bg_url"],
-            "puzzle_url": rendered["puzzle_url"],
-            "bg_path": rendered["bg_path"],
-            "puzzle_path": rendered["puzzle_path"],
             "created_at": now,
             "expires_at": expires_at,
         }
+        images = {"bg": rendered["bg"], "puzzle": rendered["puzzle"]}
 
         stored_in_redis = False
         try:
@@ -512,12 +313,18 @@ class CaptchaService:
             pipeline = redis_client.pipeline()
             pipeline.setex(challenge_key, CHALLENGE_TTL_SECONDS, json.dumps(challenge))
             pipeline.setex(scene_key, CHALLENGE_TTL_SECONDS, challenge_id)
+            # 多进程部署时图片请求可能落到其他进程，图片随挑战一起写入 Redis
+            pipeline.setex(
+                cls._challenge_image_key(challenge_id),
+                CHALLENGE_TTL_SECONDS,
+                json.dumps({kind: base64.b64encode(data).decode("ascii") for kind, data in images.items()}),
+            )
             await pipeline.execute()
             stored_in_redis = True
 
             if old_challenge_id and old_challenge_id != challenge_id:
                 old_payload = await cls._pop_challenge_from_redis(str(old_challenge_id))
-                cls._remove_challenge_files(old_payload)
+                cls._remove_challenge_images(old_payload)
         except CaptchaError as exc:
             logger.warning(f"Redis unavailable, captcha challenge storage downgraded to memory: {exc.message}")
         except RedisError as exc:
@@ -530,7 +337,7 @@ class CaptchaService:
             cls._evict_client_challenges_locked(client_key, scene_value)
             if not stored_in_redis:
                 _challenge_store[challenge_id] = challenge
-            cls._cleanup_generated_files_locked(now)
+            _image_store[challenge_id] = {**images, "expires_at": expires_at}
 
         return {
             "challenge_id": challenge_id,
@@ -542,8 +349,8 @@ class CaptchaService:
                 "puzzle_width": int(profile["puzzle_width"]),
                 "min_duration_ms": MIN_VERIFY_DURATION_MS,
             },
-            "bg_url": rendered["bg_url"],
-            "puzzle_url": rendered["puzzle_url"],
+            "bg_url": f"/auth/captcha/image/{challenge_id}/bg",
+            "puzzle_url": f"/auth/captcha/image/{challenge_id}/puzzle",
         }
 
     @classmethod
@@ -783,6 +590,10 @@ class CaptchaService:
     def _challenge_key(challenge_id: str) -> str:
         return f"captcha:challenge:{challenge_id}"
 
+    @staticmethod
+    def _challenge_image_key(challenge_id: str) -> str:
+        return f"captcha:challenge:image:{challenge_id}"
+
     @staticmethod
     def _challenge_client_scene_key(client_key: str, scene: str) -> str:
         return f"captcha:challenge:client:{client_key}:{scene}"
@@ -824,6 +635,7 @@ class CaptchaService:
             pipeline.delete(challenge_key)
             result = await pipeline.execute()
             payload_raw = result[0] if result else None
+        await redis_client.delete(cls._challenge_image_key(challenge_id))
         payload = cls._deserialize_payload(payload_raw)
         if payload:
             client_key = str(payload.get("client_key") or "").strip()
@@ -848,7 +660,7 @@ class CaptchaService:
         client_key = str(challenge.get("client_key") or "").strip()
         scene = str(challenge.get("scene") or "").strip()
         if challenge_id:
-            await redis_client.delete(cls._challenge_key(challenge_id))
+            await redis_client.delete(cls._challenge_key(challenge_id), cls._challenge_image_key(challenge_id))
         if client_key and scene:
             scene_key = cls._challenge_client_scene_key(client_key, scene)
             current_id = await redis_client.get(scene_key)
@@ -901,6 +713,34 @@ class CaptchaService:
             cls._set_pass_token_fallback(token, payload)
         return token
 
+    @classmethod
+    async def get_challenge_image(cls, challenge_id: str, kind: str) -> Tuple[bytes, str]:
+        """返回挑战图片 (内容, MIME 类型)：优先本进程内存，其次 Redis。"""
+        media_type = CAPTCHA_IMAGE_KINDS.get(kind)
+        token = str(challenge_id or "").strip()
+        if not media_type or not token:
+            raise CaptchaError("验证码图片不存在", 404)
+
+        now = time.time()
+        with _store_lock:
+            entry = _image_store.get(token)
+            if entry and entry.get("expires_at", 0) > now:
+                return entry[kind], media_type
+
+        payload = None
+        try:
+            redis_client = await cls._get_redis()
+            payload = cls._deserialize_payload(await redis_client.get(cls._challenge_image_key(token)))
+        except CaptchaError as exc:
+            logger.warning(f"Redis unavailable, captcha image read downgraded to memory: {exc.message}")
+        except RedisError as exc:
+            logger.warning(f"Redis connection error, captcha image read downgraded to memory: {exc}")
+        except Exception as exc:
+            logger.warning(f"Failed to read captcha image from Redis: {exc}")
+        if not payload or not payload.get(kind):
+            raise CaptchaError("验证码图片不存在或已过期", 404)
+        return base64.b64decode(payload[kind]), media_type
+
     @classmethod
     async def verify_challenge_and_issue_token(
         cls,
@@ -931,14 +771,11 @@ class CaptchaService:
             with _store_lock:
                 cls._cleanup_challenges(now)
                 challenge = _challenge_store.pop(challenge_id, None)
-                cls._cleanup_generated_files_locked(now)
 
         if not challenge:
             raise CaptchaError("验证码已失效，请刷新后重试", 410)
 
-        cls._remove_challenge_files(challenge)
-        with _store_lock:
-            cls._cleanup_generated_files_locked(now)
+        cls._remove_challenge_images(challenge)
 
         expected_scene = cls.normalize_scene(scene or challenge.get("scene"))
         if challenge.get("scene") != expected_scene:
@@ -1059,15 +896,13 @@ class CaptchaService:
 
             with _store_lock:
                 _challenge_store.pop(token, None)
-                cls._cleanup_generated_files_locked(now)
-            cls._remove_challenge_files(challenge)
+            cls._remove_challenge_images(challenge)
             return True
 
         with _store_lock:
             cls._cleanup_challenges(now)
             challenge = _challenge_store.get(token)
             if not challenge:
-                cls._cleanup_generated_files_locked(now)
                 return False
 
             expected_scene = cls.normalize_scene(scene or challenge.get("scene"))
@@ -1077,6 +912,5 @@ class CaptchaService:
                 raise CaptchaError("验证码客户端不匹配，请重新验证", 403)
 
             payload = _challenge_store.pop(token, None)
-            cls._remove_challenge_files(payload)
-            cls._cleanup_generated_files_locked(now)
+            cls._remove_challenge_images(payload)
             return payload is not None
@@ -0,0 +1,189 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from captcha_render import render_challenge
+
+from ..context import logger
+
+REFILL_INTERVAL_SECONDS = 5.0
+
+
+class CaptchaChallengePool:
+    """按背景图预渲染滑块验证码挑战，保存在内存中供请求直接取用。
+
+    渲染在独立进程中进行；每次取出后唤醒后台任务补齐到 per_image 个。
+    池为空时（冷启动或突发流量）仍在进程池中即时渲染，不占用事件循环。
+    """
+
+    def __init__(self, per_image: int, max_workers: int):
+        self.per_image = max(0, int(per_image))
+        self.max_workers = max(1, int(max_workers))
+        self.mode = "process"
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+        self._ready: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._pending: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "rendered": 0,
+            "failed": 0,
+            "render_ms_total": 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                try:
+                    # 与密码哈希进程池一致，使用 spawn 避免在多线程服务进程中 fork
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                except Exception as exc:
+                    logger.warning("Captcha render process pool unavailable, falling back to threads: %s", exc)
+                    self.mode = "thread"
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="captcha-render")
+            return self._executor
+
+    def _fallback_to_threads(self, reason: BaseException) -> None:
+        with self._lock:
+            if self.mode == "thread":
+                return
+            logger.warning("Captcha render process pool broken, falling back to threads: %s", reason)
+            self.mode = "thread"
+            broken, self._executor = self._executor, ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="captcha-render"
+            )
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, source_path: str) -> Dict[str, Any]:
+        """在渲染进程中生成一个挑战（profile 与图片字节）。"""
+        started = time.perf_counter()
+        try:
+            rendered = await asyncio.wrap_future(self._get_executor().submit(render_challenge, source_path))
+        except BrokenProcessPool as exc:
+            self._fallback_to_threads(exc)
+            rendered = await asyncio.wrap_future(self._get_executor().submit(render_challenge, source_path))
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        with self._lock:
+            self._stats["rendered"] += 1
+            self._stats["render_ms_total"] += (time.perf_counter() - started) * 1000.0
+        return rendered
+
+    def take(self, source_path: str) -> Optional[Dict[str, Any]]:
+        """取出一个预渲染挑战，优先使用指定背景图，其次库存最多的背景图；全部为空时返回 None。"""
+        with self._lock:
+            queue = self._ready.get(source_path)
+            if not queue:
+                queue = max(self._ready.values(), key=len, default=None)
+            rendered = queue.popleft() if queue else None
+            self._stats["hits" if rendered is not None else "misses"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return rendered
+
+    async def acquire(self, source_path: str) -> Dict[str, Any]:
+        rendered = self.take(source_path)
+        if rendered is not None:
+            return rendered
+        return await self.render(source_path)
+
+    async def _render_into_pool(self, source_path: str) -> None:
+        try:
+            rendered = await self.render(source_path)
+        except Exception as exc:
+            logger.warning("Failed to pre-render captcha for %s: %s", source_path, exc)
+            return
+        finally:
+            with self._lock:
+                self._pending[source_path] = max(0, self._pending.get(source_path, 0) - 1)
+        with self._lock:
+            queue = self._ready.get(source_path)
+            if queue is not None:
+                queue.append(rendered)
+
+    async def refill(self, sources: List[str]) -> int:
+        """把每张背景图的库存补齐到 per_image，返回本次提交的渲染数量。"""
+        jobs: List[str] = []
+        with self._lock:
+            for removed in set(self._ready) - set(sources):
+                self._ready.pop(removed, None)
+            for source_path in sources:
+                queue = self._ready.setdefault(source_path, deque())
+                missing = self.per_image - len(queue) - self._pending.get(source_path, 0)
+                if missing > 0:
+                    self._pending[source_path] = self._pending.get(source_path, 0) + missing
+                    jobs.extend([source_path] * missing)
+        if jobs:
+            await asyncio.gather(*(self._render_into_pool(source_path) for source_path in jobs))
+        return len(jobs)
+
+    async def _run(self, list_sources: Callable[[], List[str]]) -> None:
+        while True:
+            try:
+                self._wakeup.clear()
+                await self.refill(list_sources())
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Captcha pre-render task failed: %s", exc)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=REFILL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, list_sources: Callable[[], List[str]]) -> None:
+        """在当前事件循环中启动后台补充任务（per_image 为 0 时不预渲染）。"""
+        if self.per_image <= 0:
+            return
+        if self._task is not None:
+            if not self._task.done() and self._task.get_loop() is asyncio.get_running_loop():
+                return
+            # 上一次启动所在的事件循环已结束（例如测试中多次启动应用），在当前循环中重新启动
+            self._task.cancel()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(list_sources), name="captcha_prerender")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        self._wakeup = None
+        if task is not None:
+            task.cancel()
+            if task.get_loop() is asyncio.get_running_loop():
+                await asyncio.gather(task, return_exceptions=True)
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._ready.clear()
+            self._pending.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rendered = int(self._stats["rendered"])
+            return {
+                "mode": self.mode,
+                "per_image": self.per_image,
+                "max_workers": self.max_workers,
+                "images": len(self._ready),
+                "ready": sum(len(queue) for queue in self._ready.values()),
+                "pending": sum(self._pending.values()),
+                "hits": int(self._stats["hits"]),
+                "misses": int(self._stats["misses"]),
+                "rendered": rendered,
+                "failed": int(self._stats["failed"]),
+                "render_ms_avg": round(self._stats["render_ms_total"] / rendered, 3) if rendered else 0.0,
+            }
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+from database import CategoryDB, ProductDB, SettingsDB, VariantDB, VersionedCache
+from ..utils import enrich_product_image_url, is_non_sellable
+
+# 商品目录快照依赖 catalog 命名空间：商品、规格、库存、分类变化都会使其失效
+_snapshot_cache = VersionedCache("catalog_snapshot", depends_on=("catalog",), copy_values=False)
+# 每个归属范围最近一次构建的快照，重建时复用未变化商品的已处理结果；按最近使用淘汰
+LAST_SNAPSHOTS_MAX_ENTRIES = 256
+_last_snapshots: "OrderedDict[Tuple[Any, ...], CatalogSnapshot]" = OrderedDict()
+_last_snapshots_lock = threading.Lock()
+
+_JSON_SEPARATORS = (",", ":")
+
+
+def _dumps(value: Any) -> str:
+    # 与 FastAPI 默认 JSONResponse 的编码参数保持一致
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=_JSON_SEPARATORS)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """快照中的单个商品：已附带规格、图片地址与总库存，并预先序列化。"""
+
+    product: Dict[str, Any]
+    raw: Dict[str, Any]
+    raw_variants: Tuple[Tuple[Tuple[str, Any], ...], ...]
+    json: str
+
+    @property
+    def is_active(self) -> bool:
+        return self.product.get("is_active", 1) != 0
+
+    @property
+    def is_hot(self) -> bool:
+        return ProductDB._is_hot_product(self.product)
+
+
+@dataclass
+class CatalogSnapshot:
+    """某一归属范围的只读商品目录快照（已按展示顺序排序）。"""
+
+    entries: Tuple[CatalogEntry, ...]
+    by_id: Dict[str, CatalogEntry]
+    categories: Tuple[Dict[str, Any], ...]
+    owner_ids: Optional[Tuple[str, ...]]
+    include_unassigned: bool
+    _views: Dict[Tuple[Any, ...], Tuple[str, str]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def select(
+        self,
+        *,
+        show_inactive: bool,
+        category: Optional[str] = None,
+        hot_only: bool = False,
+        include_non_sellable: bool = True,
+    ) -> List[CatalogEntry]:
+        selected: List[CatalogEntry] = []
+        for entry in self.entries:
+            if not show_inactive and not entry.is_active:
+                continue
+            if category is not None and entry.product.get("category") != category:
+                continue
+            if hot_only and not entry.is_hot:
+                continue
+            if not include_non_sellable and entry.product.get("is_not_for_sale"):
+                continue
+            selected.append(entry)
+        return selected
+
+    def search_many(self, queries: Sequence[str], *, show_inactive: bool) -> Dict[str, List[CatalogEntry]]:
+        """批量检索（全文索引一次查询），每个关键词的结果按相关性排序。"""
+        ranked = ProductDB.search_ranked(
+            list(queries),
+            list(self.owner_ids) if self.owner_ids is not None else None,
+            self.include_unassigned,
+        )
+        results: Dict[str, List[CatalogEntry]] = {}
+        for term, product_ids in ranked.items():
+            entries = [self.by_id[pid] for pid in product_ids if pid in self.by_id]
+            results[term] = [entry for entry in entries if show_inactive or entry.is_active]
+        return results
+
+    def search(self, query: str, *, show_inactive: bool) -> List[CatalogEntry]:
+        term = (query or "").strip()
+        if not term:
+            return self.select(show_inactive=show_inactive)
+        return self.search_many([term], show_inactive=show_inactive).get(term, [])
+
+    def search_json(self, query: str, *, show_inactive: bool) -> Tuple[str, str]:
+        entries = self.search(query, show_inactive=show_inactive)
+        products_json = "[" + ",".join(entry.json for entry in entries) + "]"
+        return products_json, _digest(products_json)
+
+    def view_json(self, *, show_inactive: bool, category: Optional[str] = None, hot_only: bool = False) -> Tuple[str, str]:
+        """返回列表视图的 (商品数组 JSON, 摘要)，同一快照内只序列化一次。"""
+        key = ("list", show_inactive, category, hot_only)
+        with self._lock:
+            cached = self._views.get(key)
+        if cached is not None:
+            return cached
+        entries = self.select(show_inactive=show_inactive, category=category, hot_only=hot_only)
+        products_json = "[" + ",".join(entry.json for entry in entries) + "]"
+        result = (products_json, _digest(products_json))
+        with self._lock:
+            self._views[key] = result
+        return result
+
+    def categories_json(self, *, show_inactive: bool) -> Tuple[str, str]:
+        key = ("categories", show_inactive)
+        with self._lock:
+            cached = self._views.get(key)
+        if cached is not None:
+            return cached
+        names = {
+            entry.product.get("category")
+            for entry in self.entries
+            if show_inactive or int(entry.raw.get("is_active") or 0) == 1
+        }
+        categories_json = _dumps([category for category in self.categories if category.get("name") in names])
+        result = (categories_json, _digest(categories_json))
+        with self._lock:
+            self._views[key] = result
+        return result
+
+
+def _variant_signature(variants: Sequence[Dict[str, Any]]) -> Tuple[Tuple[Tuple[str, Any], ...], ...]:
+    return tuple(tuple(sorted(variant.items())) for variant in variants)
+
+
+def _build_entry(raw: Dict[str, Any], variants: List[Dict[str, Any]]) -> CatalogEntry:
+    product = dict(raw)
+    enrich_product_image_url(product)
+    product["variants"] = variants
+    product["has_variants"] = len(variants) > 0
+    product["is_not_for_sale"] = is_non_sellable(product)
+    if product["has_variants"]:
+        product["total_variant_stock"] = sum(v.get("stock", 0) for v in variants)
+    if product["is_not_for_sale"]:
+        product["stock_display"] = "∞"
+    return CatalogEntry(
+        product=product,
+        raw=raw,
+        raw_variants=_variant_signature(variants),
+        json=_dumps(product),
+    )
+
+
+def _build_snapshot(key: Tuple[Any, ...], owner_ids: Optional[List[str]], include_unassigned: bool) -> CatalogSnapshot:
+    rows = ProductDB.get_all_products(owner_ids=owner_ids, include_unassigned=include_unassigned)
+    variants_map = VariantDB.get_for_products([row["id"] for row in rows])
+
+    with _last_snapshots_lock:
+        previous = _last_snapshots.get(key)
+
+    entries: List[CatalogEntry] = []
+    for row in rows:
+        variants = variants_map.get(row["id"], [])
+        old = previous.by_id.get(row["id"]) if previous else None
+        if old is not None and old.raw == row and old.raw_variants == _variant_signature(variants):
+            entries.append(old)
+        else:
+            entries.append(_build_entry(row, variants))
+
+    snapshot = CatalogSnapshot(
+        entries=tuple(entries),
+        by_id={entry.product["id"]: entry for entry in entries},
+        categories=tuple(CategoryDB.get_all_categories()),
+        owner_ids=key[0],
+        include_unassigned=key[1],
+    )
+    with _last_snapshots_lock:
+        _last_snapshots[key] = snapshot
+        _last_snapshots.move_to_end(key)
+        while len(_last_snapshots) > LAST_SNAPSHOTS_MAX_ENTRIES:
+            _last_snapshots.popitem(last=False)
+    return snapshot
+
+
+def get_catalog_snapshot(owner_ids: Optional[List[str]], include_unassigned: bool = False) -> CatalogSnapshot:
+    """获取（必要时重建）指定归属范围的商品目录快照，返回对象只读，调用方不得修改。"""
+    normalized = None if owner_ids is None else tuple(sorted({oid for oid in owner_ids if oid}))
+    key = (normalized, bool(include_unassigned))
+    return _snapshot_cache.get(key, lambda: _build_snapshot(key, owner_ids, include_unassigned))
+
+
+def show_inactive_in_shop() -> bool:
+    return SettingsDB.get("show_inactive_in_shop", "false") == "true"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def precomputed_json_response(
+    request: Request,
+    message: str,
+    fragments: Sequence[Tuple[str, str]],
+    digests: Sequence[str],
+) -> Response:
+    """拼接预序列化的 data 字段生成与 success_response 相同结构的响应，并附带强 ETag。
+
+    ``fragments`` 为 (字段名, 已序列化 JSON) 列表；``digests`` 决定 ETag，客户端携带
+    相同 If-None-Match 时直接返回 304。
+    """
+    etag = '"' + _digest("|".join([message, *digests]))[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    data = ",".join(f"{_dumps(name)}:{value}" for name, value in fragments)
+    body = f'{{"success":true,"message":{_dumps(message)},"data":{{{data}}},"code":200}}'
+    return Response(content=body.encode("utf-8"), media_type="application/json", headers=headers)
+
+
+def serialize_fragment(value: Any) -> Tuple[str, str]:
+    """序列化随请求变化的小字段（如 scope），返回 (JSON, 摘要)。"""
+    text = _dumps(jsonable_encoder(value))
+    return text, _digest(text)
+
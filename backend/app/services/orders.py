@@ -1,3 +1,5 @@
+import csv
+import os
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Set, Tuple
 
@@ -441,24 +443,88 @@ def build_export_row(
     ]
 
 
-def write_export_workbook(rows: List[List[str]], file_path: str) -> None:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "订单导出"
-    header = ["订单号", "归属", "用户名", "电话", "地址", "详细地址", "订单金额", "订单信息", "订单状态", "创建时间"]
-    ws.append(header)
-    for row in rows:
-        ws.append(row)
-
-    for col_idx, column_cells in enumerate(ws.columns, start=1):
+EXPORT_HEADER = ["订单号", "归属", "用户名", "电话", "地址", "详细地址", "订单金额", "订单信息", "订单状态", "创建时间"]
+EXPORT_FORMATS = ("xlsx", "csv")
+# 导出时每批读取与写入的订单数
+EXPORT_BATCH_SIZE = 500
+
+
+def normalize_export_format(value: Optional[str]) -> str:
+    fmt = (value or "").strip().lower().lstrip(".")
+    return fmt if fmt in EXPORT_FORMATS else "xlsx"
+
+
+class OrderExportWriter:
+    """边读边写导出文件：xlsx 使用 openpyxl 只写模式，csv 逐行写出，内存占用与总行数无关。
+
+    只写模式需在写入首行前确定列宽，因此先缓冲首批数据估算列宽，之后直接落盘。
+    """
+
+    def __init__(self, file_path: str, file_format: str = "xlsx", width_sample_rows: int = EXPORT_BATCH_SIZE):
+        self.file_path = file_path
+        self.file_format = normalize_export_format(file_format)
+        self.width_sample_rows = max(1, width_sample_rows)
+        self.row_count = 0
+        self._pending: List[List[str]] = []
+        self._started = False
+        self._csv_file = None
+        self._csv_writer = None
+        self._workbook = None
+        self._sheet = None
+
+    def _start(self) -> None:
+        if self.file_format == "csv":
+            # 带 BOM 便于 Excel 正确识别中文
+            self._csv_file = open(self.file_path, "w", encoding="utf-8-sig", newline="")
+            self._csv_writer = csv.writer(self._csv_file)
+            self._csv_writer.writerow(EXPORT_HEADER)
+        else:
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet("订单导出")
+            for col_idx, header_text in enumerate(EXPORT_HEADER, start=1):
+                max_len = max([len(header_text)] + [len(str(row[col_idx - 1] or "")) for row in self._pending])
+                self._sheet.column_dimensions[get_column_letter(col_idx)].width = min(max(max_len + 4, 12), 50)
+            self._sheet.append(EXPORT_HEADER)
+        self._started = True
+        pending, self._pending = self._pending, []
+        self._write(pending)
+
+    def _write(self, rows: List[List[str]]) -> None:
+        if self._csv_writer is not None:
+            self._csv_writer.writerows(rows)
+        else:
+            for row in rows:
+                self._sheet.append(row)
+
+    def write_rows(self, rows: List[List[str]]) -> None:
+        self.row_count += len(rows)
+        if self._started:
+            self._write(rows)
+            return
+        self._pending.extend(rows)
+        if len(self._pending) >= self.width_sample_rows:
+            self._start()
+
+    def close(self) -> None:
+        if not self._started:
+            self._start()
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        elif self._workbook is not None:
+            self._workbook.save(self.file_path)
+            self._workbook = None
+
+    def abort(self) -> None:
+        """放弃写入并删除未完成的文件。"""
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        self._workbook = None
         try:
-            max_len = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column_cells)
-        except ValueError:
-            max_len = 0
-        adjusted_width = min(max(max_len + 4, 12), 50)
-        ws.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
-
-    wb.save(file_path)
+            os.remove(self.file_path)
+        except OSError:
+            pass
 
 
 def prepare_export_scope(
@@ -1,14 +1,16 @@
+import csv
 import hashlib
 import io
 import os
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from fastapi import HTTPException, UploadFile
+from openpyxl import load_workbook
 from PIL import Image
 
 from auth import error_response, is_super_admin_role, success_response
-from database import AdminDB, CartDB, ImageLookupDB, ProductDB, VariantDB
+from database import AdminDB, CartDB, ImageLookupDB, ProductDB, VariantDB, offload_db
 from ..context import ITEMS_DIR, logger
 from ..dependencies import build_staff_scope, get_owner_id_for_staff, staff_can_access_product
 from ..utils import enrich_product_image_url, is_non_sellable
@@ -337,7 +339,8 @@ async def handle_product_creation(
         return error_response("创建商品失败", 500)
 
 
-async def handle_product_update(staff: Dict[str, Any], product_id: str, payload: Any) -> Dict[str, Any]:
+@offload_db
+def handle_product_update(staff: Dict[str, Any], product_id: str, payload: Any) -> Dict[str, Any]:
     try:
         existing_product = ensure_product_accessible(staff, product_id)
     except HTTPException as exc:
@@ -597,7 +600,8 @@ def resolve_single_owner_for_staff(
     return fallback_owner, normalized_filter
 
 
-async def handle_product_stock_update(staff: Dict[str, Any], product_id: str, stock_data: Any) -> Dict[str, Any]:
+@offload_db
+def handle_product_stock_update(staff: Dict[str, Any], product_id: str, stock_data: Any) -> Dict[str, Any]:
     try:
         ensure_product_accessible(staff, product_id)
     except HTTPException as exc:
@@ -624,6 +628,286 @@ async def handle_product_stock_update(staff: Dict[str, Any], product_id: str, st
     return success_response("库存更新成功", {"new_stock": stock_data.stock})
 
 
+# 批量修改与库存导入单次最多处理的行数，以及导入文件的大小上限
+BULK_PRODUCT_MAX_ROWS = 2000
+STOCK_IMPORT_MAX_BYTES = 2 * 1024 * 1024
+
+# 导入文件表头（不区分大小写）到字段的映射
+_STOCK_IMPORT_COLUMNS = {
+    "product_id": "product_id",
+    "商品id": "product_id",
+    "商品编号": "product_id",
+    "variant_id": "variant_id",
+    "规格id": "variant_id",
+    "规格编号": "variant_id",
+    "stock": "stock",
+    "库存": "stock",
+}
+
+
+def _bulk_result(change: Dict[str, Any], status: str, message: str = "") -> Dict[str, Any]:
+    return {
+        "row": change.get("row"),
+        "product_id": change.get("product_id"),
+        "variant_id": change.get("variant_id"),
+        "status": status,
+        "message": message,
+    }
+
+
+def _normalize_bulk_fields(change: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """校验并整理单行的修改字段，返回 (字段, 错误信息)。"""
+    fields: Dict[str, Any] = {}
+    try:
+        if change.get("discount") is not None:
+            discount = float(change["discount"])
+            if discount < 0.5 or discount > 10:
+                return {}, "折扣范围应为0.5~10折"
+            fields["discount"] = discount
+        if change.get("price") is not None:
+            price = float(change["price"])
+            if price < 0:
+                return {}, "价格不能为负数"
+            fields["price"] = price
+        if change.get("stock") is not None:
+            stock = change["stock"]
+            if isinstance(stock, float) and not stock.is_integer():
+                return {}, "库存必须为整数"
+            stock = int(stock)
+            if stock < 0:
+                return {}, "库存不能为负数"
+            fields["stock"] = stock
+    except (TypeError, ValueError):
+        return {}, "数值格式无效"
+    if change.get("category") is not None:
+        category = str(change["category"]).strip()
+        if not category:
+            return {}, "分类不能为空"
+        fields["category"] = category
+    if change.get("is_active") is not None:
+        fields["is_active"] = 1 if change["is_active"] else 0
+    if not fields:
+        return {}, "没有可更新的字段"
+    return fields, None
+
+
+def apply_bulk_product_changes(
+    staff: Dict[str, Any],
+    changes: List[Dict[str, Any]],
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """一次校验全部修改行，再把通过校验的行在单个事务中批量写入。
+
+    商品与规格各用一条 IN 查询读取，已删除代理按 owner 只查一次；规格行只能修改库存，
+    已启用规格的商品须按规格修改库存。同一商品/规格重复出现时只采用第一行。
+    dry_run 为 True 时只返回校验结果，不写入。
+    """
+    product_ids = [change.get("product_id") for change in changes]
+    products = ProductDB.get_many(product_ids)
+    variants = VariantDB.get_many([change.get("variant_id") for change in changes])
+    stock_product_ids = [
+        change.get("product_id") for change in changes
+        if change.get("stock") is not None and not change.get("variant_id")
+    ]
+    products_with_variants = set(VariantDB.get_for_products(list(dict.fromkeys(stock_product_ids))))
+    deleted_owners: Dict[str, bool] = {}
+
+    results: List[Dict[str, Any]] = []
+    product_updates: List[Tuple[str, Dict[str, Any]]] = []
+    variant_stocks: List[Tuple[str, int]] = []
+    deactivated: List[str] = []
+    seen: Dict[Tuple[str, Optional[str]], Any] = {}
+
+    for change in changes:
+        product_id = change.get("product_id")
+        variant_id = change.get("variant_id") or None
+        product = products.get(product_id)
+        if not product:
+            results.append(_bulk_result(change, "not_found", "商品不存在"))
+            continue
+        if not staff_can_access_product(staff, product):
+            results.append(_bulk_result(change, "forbidden", "无权操作该商品"))
+            continue
+        owner_id = product.get("owner_id")
+        if staff.get("type") == "admin" and owner_id and owner_id != "admin":
+            if owner_id not in deleted_owners:
+                deleted_owners[owner_id] = AdminDB.is_agent_deleted(owner_id)
+            if deleted_owners[owner_id]:
+                results.append(_bulk_result(change, "blocked", "代理已删除，无法更新该商品"))
+                continue
+        key = (product_id, variant_id)
+        if key in seen:
+            results.append(_bulk_result(change, "invalid", f"与第 {seen[key]} 行重复"))
+            continue
+        seen[key] = change.get("row")
+
+        fields, error = _normalize_bulk_fields(change)
+        if not error and variant_id:
+            variant = variants.get(variant_id)
+            if not variant or variant.get("product_id") != product_id:
+                error = "规格不存在或不属于该商品"
+            elif set(fields) != {"stock"}:
+                error = "规格行只能修改库存"
+        elif not error and "stock" in fields and product_id in products_with_variants:
+            error = "该商品已启用规格，请按规格修改库存"
+        if error:
+            results.append(_bulk_result(change, "invalid", error))
+            continue
+
+        if variant_id:
+            variant_stocks.append((variant_id, fields["stock"]))
+        else:
+            product_updates.append((product_id, fields))
+            if fields.get("is_active") == 0 and int(product.get("is_active", 1) or 0) == 1:
+                deactivated.append(product_id)
+        results.append(_bulk_result(change, "valid" if dry_run else "updated"))
+
+    if not dry_run and (product_updates or variant_stocks):
+        ProductDB.bulk_update(product_updates, variant_stocks)
+        if deactivated:
+            try:
+                removed = CartDB.remove_products_from_all_carts(deactivated)
+                logger.info("Bulk update deactivated %s products and cleaned %s carts", len(deactivated), removed)
+            except Exception as exc:
+                logger.warning("Failed to remove deactivated products from carts: %s", exc)
+
+    accepted = len(product_updates) + len(variant_stocks)
+    return {
+        "updated": 0 if dry_run else accepted,
+        "valid": accepted,
+        "failed": len(results) - accepted,
+        "not_found": [r["product_id"] for r in results if r["status"] == "not_found"],
+        "blocked": [r["product_id"] for r in results if r["status"] == "blocked"],
+        "results": results,
+    }
+
+
+@offload_db
+def handle_bulk_product_update(staff: Dict[str, Any], payload: Any) -> Dict[str, Any]:
+    shared = {
+        field: getattr(payload, field, None)
+        for field in ("discount", "price", "stock", "category", "is_active")
+        if getattr(payload, field, None) is not None
+    }
+    changes: List[Dict[str, Any]] = []
+    if shared:
+        changes.extend({"product_id": pid, **shared} for pid in dict.fromkeys(payload.product_ids or []) if pid)
+    for item in payload.items or []:
+        changes.append(item.model_dump(exclude_none=True))
+    for index, change in enumerate(changes, start=1):
+        change["row"] = index
+
+    if not changes:
+        if payload.product_ids and not shared:
+            return error_response("没有可更新的字段", 400)
+        return error_response("未提供商品ID", 400)
+    if len(changes) > BULK_PRODUCT_MAX_ROWS:
+        return error_response(f"单次最多修改 {BULK_PRODUCT_MAX_ROWS} 个商品或规格", 400)
+
+    try:
+        result = apply_bulk_product_changes(staff, changes)
+    except Exception as exc:
+        logger.error("Failed to bulk update products: %s", exc)
+        return error_response("批量更新商品失败", 500)
+    return success_response("批量更新完成", result)
+
+
+def _import_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _collect_stock_import_rows(raw_rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """逐行读取表头与数据行：跳过空行，超过 BULK_PRODUCT_MAX_ROWS 时立即抛出 ValueError。"""
+    columns: Optional[List[Optional[str]]] = None
+    rows: List[Dict[str, Any]] = []
+    for offset, raw in enumerate(raw_rows, start=1):
+        cells = [_import_cell(v) for v in raw]
+        if not any(cells):
+            continue
+        if columns is None:
+            columns = [_STOCK_IMPORT_COLUMNS.get(cell.lower()) for cell in cells]
+            missing = [name for name in ("product_id", "stock") if name not in columns]
+            if missing:
+                raise ValueError(f"缺少必需的列：{', '.join(missing)}")
+            continue
+        values = {
+            column: cells[i] if i < len(cells) else ""
+            for i, column in enumerate(columns)
+            if column
+        }
+        if not any(values.values()):
+            continue
+        row: Dict[str, Any] = {"row": offset, "product_id": values.get("product_id"), "variant_id": values.get("variant_id") or None}
+        stock_text = values.get("stock", "")
+        try:
+            row["stock"] = float(stock_text) if stock_text else None
+        except ValueError:
+            row["stock"] = stock_text
+        rows.append(row)
+        if len(rows) > BULK_PRODUCT_MAX_ROWS:
+            raise ValueError(f"单次最多导入 {BULK_PRODUCT_MAX_ROWS} 行")
+    if columns is None:
+        raise ValueError("导入文件为空")
+    return rows
+
+
+def _read_stock_import_rows(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """解析库存导入文件（CSV 或 XLSX），返回带行号的修改行；表头或格式不正确时抛出 ValueError。"""
+    if (filename or "").lower().endswith(".xlsx"):
+        try:
+            workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        except Exception as exc:
+            raise ValueError("无法读取 XLSX 文件") from exc
+        try:
+            # 压缩后很小的表格也可能声明大量行，按行迭代而不是整表读入内存
+            return _collect_stock_import_rows(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Excel 在中文系统下另存的 CSV 通常为 GBK 编码
+        text = content.decode("gb18030", errors="replace")
+    return _collect_stock_import_rows(csv.reader(io.StringIO(text)))
+
+
+@offload_db
+def handle_product_stock_import(staff: Dict[str, Any], filename: str, content: bytes, dry_run: bool = False) -> Dict[str, Any]:
+    """按 CSV/XLSX 文件批量设置商品或规格库存（列：product_id/商品ID、variant_id/规格ID、stock/库存）。"""
+    try:
+        rows = _read_stock_import_rows(filename, content)
+    except ValueError as exc:
+        return error_response(str(exc), 400)
+    if not rows:
+        return error_response("导入文件中没有数据行", 400)
+
+    for row in rows:
+        if not row.get("product_id"):
+            row["invalid"] = "缺少商品ID"
+        elif row.get("stock") is None:
+            row["invalid"] = "缺少库存"
+        elif isinstance(row["stock"], str):
+            row["invalid"] = "库存必须为整数"
+    invalid = [_bulk_result(row, "invalid", row["invalid"]) for row in rows if row.get("invalid")]
+    valid_rows = [row for row in rows if not row.get("invalid")]
+
+    try:
+        result = apply_bulk_product_changes(staff, valid_rows, dry_run=dry_run)
+    except Exception as exc:
+        logger.error("Failed to import product stock: %s", exc)
+        return error_response("导入库存失败", 500)
+
+    result["results"] = sorted(result["results"] + invalid, key=lambda r: r.get("row") or 0)
+    result["failed"] += len(invalid)
+    result["dry_run"] = bool(dry_run)
+    return success_response("库存校验完成" if dry_run else "库存导入完成", result)
+
+
 __all__ = [
     "resolve_owner_id_for_staff",
     "ensure_product_accessible",
@@ -638,5 +922,8 @@ __all__ = [
     "resolve_owner_filter_for_staff",
     "resolve_single_owner_for_staff",
     "handle_product_stock_update",
+    "apply_bulk_product_changes",
+    "handle_bulk_product_update",
+    "handle_product_stock_import",
     "staff_can_access_product",
 ]
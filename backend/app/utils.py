@@ -76,12 +76,12 @@ def format_export_range_label(start_ms: Optional[float], end_ms: Optional[float]
     return start_label or end_label or "全部时间"
 
 
-def build_export_filename(start_ms: Optional[float], end_ms: Optional[float]) -> str:
+def build_export_filename(start_ms: Optional[float], end_ms: Optional[float], extension: str = "xlsx") -> str:
     """根据时间范围生成导出文件名。"""
     start_part = format_device_time_ms(start_ms, None, "%Y%m%d") if start_ms is not None else "all"
     end_part = format_device_time_ms(end_ms, None, "%Y%m%d") if end_ms is not None else "all"
     timestamp_part = datetime.now().strftime("%Y%m%dT%H%M%S")
-    return f"orders_{start_part}-{end_part}_{timestamp_part}.xlsx"
+    return f"orders_{start_part}-{end_part}_{timestamp_part}.{extension}"
 
 
 def resolve_image_url(img_path: Optional[str]) -> str:
@@ -7,8 +7,9 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import UserDB, AdminDB, AddressDB, AgentAssignmentDB, BuildingDB
+from database import UserDB, AdminDB, AddressDB, AgentAssignmentDB, BuildingDB, VersionedCache, prepare_password_async, run_in_db_executor
 from config import get_settings
+from http_clients import LOGIN_UPSTREAM, get_http_client
 
 # 配置
 settings = get_settings()
@@ -22,6 +23,15 @@ LOGIN_API = settings.login_api
 logger = logging.getLogger(__name__)
 security = HTTPBearer(auto_error=False)
 
+# 已校验的工作人员身份，按 (账号, 身份类型, 令牌版本) 缓存；
+# 账号、令牌版本、代理楼栋分配或地址/楼栋状态变化时立即失效
+_principal_cache = VersionedCache(
+    "principals",
+    depends_on=("admins", "agent_assignments", "locations"),
+    ttl=settings.principal_cache_ttl_seconds,
+)
+_MISSING = object()
+
 
 class AuthError(Exception):
     def __init__(self, message: str, status_code: int = 400):
@@ -78,134 +88,131 @@ class AuthManager:
                 "password": password
             }
             
-            # 配置httpx客户端以正确处理压缩响应
-            async with httpx.AsyncClient(
-                 timeout=10.0,
-                 follow_redirects=True  # 跟随重定向
-             ) as client:
-                response = await client.post(
-                    LOGIN_API,
-                    json=payload,
-                    headers=headers
-                )
+            # 复用共享的登录接口客户端（长连接池，跟随重定向，10 秒超时）
+            client = get_http_client(LOGIN_UPSTREAM)
+            response = await client.post(
+                LOGIN_API,
+                json=payload,
+                headers=headers
+            )
                 
-                if response.status_code == 200:
-                    try:
-                        # 获取原始响应内容
-                        raw_content = response.content
-                        response_headers = response.headers
-
-                        # 检查是否为压缩响应
-                        content_encoding = response_headers.get('content-encoding', '').lower()
+            if response.status_code == 200:
+                try:
+                    # 获取原始响应内容
+                    raw_content = response.content
+                    response_headers = response.headers
+
+                    # 检查是否为压缩响应
+                    content_encoding = response_headers.get('content-encoding', '').lower()
                         
-                        # 处理压缩内容 - 优先尝试解压缩
-                        if content_encoding in ['gzip', 'deflate', 'br']:
-                            decompression_success = False
-                            try:
-                                if content_encoding == 'gzip':
-                                    import gzip
-                                    decompressed_content = gzip.decompress(raw_content)
-                                    decompression_success = True
+                    # 处理压缩内容 - 优先尝试解压缩
+                    if content_encoding in ['gzip', 'deflate', 'br']:
+                        decompression_success = False
+                        try:
+                            if content_encoding == 'gzip':
+                                import gzip
+                                decompressed_content = gzip.decompress(raw_content)
+                                decompression_success = True
                                     
-                                elif content_encoding == 'deflate':
-                                    import zlib
-                                    decompressed_content = zlib.decompress(raw_content)
-                                    decompression_success = True
+                            elif content_encoding == 'deflate':
+                                import zlib
+                                decompressed_content = zlib.decompress(raw_content)
+                                decompression_success = True
                                     
-                                elif content_encoding == 'br':
-                                    try:
-                                        import brotli
-                                        decompressed_content = brotli.decompress(raw_content)
-                                        decompression_success = True
-                                    except ImportError:
-                                        logger.error("Brotli package is missing; install it with: pip install brotli")
+                            elif content_encoding == 'br':
+                                try:
+                                    import brotli
+                                    decompressed_content = brotli.decompress(raw_content)
+                                    decompression_success = True
+                                except ImportError:
+                                    logger.error("Brotli package is missing; install it with: pip install brotli")
                                 
-                                if decompression_success:
-                                    raw_content = decompressed_content
+                            if decompression_success:
+                                raw_content = decompressed_content
                                 
-                            except Exception as decompress_error:
-                                logger.warning("Response decompression failed: %s", decompress_error)
+                        except Exception as decompress_error:
+                            logger.warning("Response decompression failed: %s", decompress_error)
                                 
-                                # 检查原始数据是否看起来像未压缩的JSON
-                                if (len(raw_content) > 0 and 
-                                    raw_content[0:1] in [b'{', b'['] and 
-                                    raw_content[-1:] in [b'}', b']']):
-                                    logger.info("Raw response looks like uncompressed JSON; upstream may be misconfigured")
-                                else:
-                                    logger.error("Raw response is not valid JSON")
-                        
-                        # 不再对未声明编码的内容进行启发式解压，交由 httpx/default 处理
-                        
-                        # 现在尝试解码为文本
-                        try:
-                            # 首先尝试以UTF-8解码
-                            response_text = raw_content.decode('utf-8')
-                        except UnicodeDecodeError:
-                            # 如果UTF-8失败，尝试其他编码
-                            logger.warning("UTF-8 decoding failed, trying fallback encodings")
-                            
-                            # 尝试常见的中文编码
-                            for encoding in ['gb2312', 'gbk', 'big5', 'latin-1']:
-                                try:
-                                    response_text = raw_content.decode(encoding)
-                                    break
-                                except UnicodeDecodeError:
-                                    continue
+                            # 检查原始数据是否看起来像未压缩的JSON
+                            if (len(raw_content) > 0 and 
+                                raw_content[0:1] in [b'{', b'['] and 
+                                raw_content[-1:] in [b'}', b']']):
+                                logger.info("Raw response looks like uncompressed JSON; upstream may be misconfigured")
                             else:
-                                # 所有编码都失败，使用错误替换模式
-                                response_text = raw_content.decode('utf-8', errors='replace')
-                                logger.warning("Decoded response using replacement characters")
+                                logger.error("Raw response is not valid JSON")
                         
-                        # 检查响应内容是否为空或损坏
-                        if not response_text.strip():
-                            logger.error("Login API returned an empty response")
-                            return None
+                    # 不再对未声明编码的内容进行启发式解压，交由 httpx/default 处理
                         
-                        # 尝试解析JSON
-                        try:
-                            import json
-                            data = json.loads(response_text)
-                        except json.JSONDecodeError as e:
-                            logger.error("Failed to parse login API JSON: %s", e)
-                            return None
-                        
-                        # 检查API返回的success字段
-                        if data.get("success") and data.get("code") == 200:
-                            # 成功登录，提取用户信息
-                            user_data = data.get("data", {})
-                            return {
-                                "student_id": student_id,
-                                "name": user_data.get("name", "未知用户"),
-                                "verified": True,
-                                "account_id": user_data.get("accountId", ""),
-                                "avatar_url": user_data.get("avatarUrl", ""),
-                                "id_number": user_data.get("idNumber")
-                            }
-                        else:
-                            # 登录失败（账号密码错误等）
-                            error_msg = data.get("msg") or data.get("message") or "Login failed"
-                            logger.warning(
-                                "Login API rejected credentials for %s: %s (status=%s)",
-                                student_id,
-                                error_msg,
-                                response.status_code,
-                            )
-                            return None
+                    # 现在尝试解码为文本
+                    try:
+                        # 首先尝试以UTF-8解码
+                        response_text = raw_content.decode('utf-8')
+                    except UnicodeDecodeError:
+                        # 如果UTF-8失败，尝试其他编码
+                        logger.warning("UTF-8 decoding failed, trying fallback encodings")
                             
-                    except Exception as decode_error:
-                        logger.error("Failed to process login API response: %s", decode_error)
+                        # 尝试常见的中文编码
+                        for encoding in ['gb2312', 'gbk', 'big5', 'latin-1']:
+                            try:
+                                response_text = raw_content.decode(encoding)
+                                break
+                            except UnicodeDecodeError:
+                                continue
+                        else:
+                            # 所有编码都失败，使用错误替换模式
+                            response_text = raw_content.decode('utf-8', errors='replace')
+                            logger.warning("Decoded response using replacement characters")
+                        
+                    # 检查响应内容是否为空或损坏
+                    if not response_text.strip():
+                        logger.error("Login API returned an empty response")
                         return None
                         
-                elif response.status_code == 401:
-                    logger.warning("Login API returned 401 for %s", student_id)
-                    return None
-                else:
-                    logger.error("Unexpected login API status: %s", response.status_code)
+                    # 尝试解析JSON
                     try:
-                        logger.error("Login API error response: %s", response.text[:200])
-                    except Exception:
-                        logger.error("Failed to decode login API error response")
+                        import json
+                        data = json.loads(response_text)
+                    except json.JSONDecodeError as e:
+                        logger.error("Failed to parse login API JSON: %s", e)
+                        return None
+                        
+                    # 检查API返回的success字段
+                    if data.get("success") and data.get("code") == 200:
+                        # 成功登录，提取用户信息
+                        user_data = data.get("data", {})
+                        return {
+                            "student_id": student_id,
+                            "name": user_data.get("name", "未知用户"),
+                            "verified": True,
+                            "account_id": user_data.get("accountId", ""),
+                            "avatar_url": user_data.get("avatarUrl", ""),
+                            "id_number": user_data.get("idNumber")
+                        }
+                    else:
+                        # 登录失败（账号密码错误等）
+                        error_msg = data.get("msg") or data.get("message") or "Login failed"
+                        logger.warning(
+                            "Login API rejected credentials for %s: %s (status=%s)",
+                            student_id,
+                            error_msg,
+                            response.status_code,
+                        )
+                        return None
+                            
+                except Exception as decode_error:
+                    logger.error("Failed to process login API response: %s", decode_error)
                     return None
+                        
+            elif response.status_code == 401:
+                logger.warning("Login API returned 401 for %s", student_id)
+                return None
+            else:
+                logger.error("Unexpected login API status: %s", response.status_code)
+                try:
+                    logger.error("Login API error response: %s", response.text[:200])
+                except Exception:
+                    logger.error("Failed to decode login API error response")
+                return None
                     
         except httpx.TimeoutException:
             logger.error("Login API timeout")
@@ -224,11 +231,13 @@ class AuthManager:
             return text or None
 
         # 1. 首先检查本地数据库中是否存在用户
-        local_user = UserDB.get_user(student_id)
+        local_user = await run_in_db_executor(UserDB.get_user, student_id)
         id_status = UserDB.normalize_id_status(local_user.get('id_status') if local_user else None)
         api_result: Optional[Dict[str, Any]] = None
-        # 使用 verify_user 验证密码（支持加密密码）
-        is_local_password_valid = bool(UserDB.verify_user(student_id, password))
+        # 使用 verify_user_async 验证密码（支持加密密码，bcrypt 在进程池中计算），复用已查到的记录
+        is_local_password_valid = bool(local_user) and bool(
+            await UserDB.verify_user_async(student_id, password, user=local_user)
+        )
 
         async def _ensure_identity(current_user: Optional[Dict[str, Any]], payload: Optional[Dict[str, Any]]) -> int:
             """仅在状态为0时尝试获取身份证号"""
@@ -244,7 +253,7 @@ class AuthManager:
 
             id_number_value = _clean_id_number(active_payload.get('id_number') if active_payload else None) if active_payload else None
             new_status = 1 if id_number_value else 2
-            UserDB.update_user_identity(student_id, id_number_value, new_status)
+            await run_in_db_executor(UserDB.update_user_identity, student_id, id_number_value, new_status)
             return new_status
         
         if local_user and is_local_password_valid:
@@ -252,7 +261,7 @@ class AuthManager:
             if id_status == 0:
                 # 老数据：本地密码正确，但需要获取身份证号
                 id_status = await _ensure_identity(local_user, None)
-                local_user = UserDB.get_user(student_id)
+                local_user = await run_in_db_executor(UserDB.get_user, student_id)
         else:
             # 本地密码不匹配或用户不存在，尝试第三方API验证
             logger.info("User %s requires third-party API verification", student_id)
@@ -264,32 +273,35 @@ class AuthManager:
             # 远端成功后，首次登录/凭据失效：无论原状态为何都重新写入身份证状态
             id_number_value = _clean_id_number(api_result.get('id_number'))
             new_status = 1 if id_number_value else 2
-            UserDB.update_user_identity(student_id, id_number_value, new_status)
+            await run_in_db_executor(UserDB.update_user_identity, student_id, id_number_value, new_status)
             id_status = new_status
         
         # 3. 第三方验证成功，更新或创建本地用户记录
         if local_user:
             if not is_local_password_valid and api_result:
                 logger.info("Updating local password for %s", student_id)
-                UserDB.update_user_password(student_id, password)
+                hashed_password = await prepare_password_async(password)
+                await run_in_db_executor(UserDB.update_user_password, student_id, hashed_password)
                 if local_user['name'] != api_result['name']:
-                    UserDB.update_user_name(student_id, api_result['name'])
+                    await run_in_db_executor(UserDB.update_user_name, student_id, api_result['name'])
 
                 # 凭据失效后走远端，按远端结果更新身份证状态（不论原状态为何）
                 id_number_value = _clean_id_number(api_result.get('id_number')) if api_result else None
                 new_status = 1 if id_number_value else 2
-                UserDB.update_user_identity(student_id, id_number_value, new_status)
+                await run_in_db_executor(UserDB.update_user_identity, student_id, id_number_value, new_status)
                 id_status = new_status
 
-            local_user = UserDB.get_user(student_id)
+            local_user = await run_in_db_executor(UserDB.get_user, student_id)
         else:
             # 用户不存在，创建新用户
             logger.info("Creating new user %s", student_id)
             id_number_value = _clean_id_number(api_result.get('id_number') if api_result else None)
             create_status = 1 if id_number_value else 2
-            success = UserDB.create_user(
+            hashed_password = await prepare_password_async(password)
+            success = await run_in_db_executor(
+                UserDB.create_user,
                 student_id=student_id,
-                password=password,
+                password=hashed_password,
                 name=api_result['name'] if api_result else student_id,
                 id_number=id_number_value,
                 id_status=create_status
@@ -297,7 +309,7 @@ class AuthManager:
             if not success:
                 logger.error("Failed to create user %s", student_id)
                 return None
-            local_user = UserDB.get_user(student_id)
+            local_user = await run_in_db_executor(UserDB.get_user, student_id)
         
         # 4. 生成JWT令牌
         def _format_created_at(value: Any) -> Any:
@@ -339,9 +351,9 @@ class AuthManager:
         }
     
     @staticmethod
-    def login_admin(admin_id: str, password: str) -> Optional[Dict[str, Any]]:
+    async def login_admin(admin_id: str, password: str) -> Optional[Dict[str, Any]]:
         """管理员/代理登录"""
-        admin = AdminDB.verify_admin(admin_id, password)
+        admin = await AdminDB.verify_admin_async(admin_id, password)
         if not admin:
             return None
 
@@ -349,7 +361,7 @@ class AuthManager:
         account_type = 'admin' if role in ('admin', 'super_admin') else 'agent'
 
         if account_type == 'agent':
-            assignments = AgentAssignmentDB.get_buildings_for_agent(admin.get('agent_id'))
+            assignments = await run_in_db_executor(AgentAssignmentDB.get_buildings_for_agent, admin.get('agent_id'))
             if not assignments:
                 raise AuthError("地址不存在，请联系管理员")
             has_valid_assignment = False
@@ -490,7 +502,16 @@ def _load_staff_from_payload(payload: Optional[Dict[str, Any]]) -> Optional[Dict
     admin_id = payload.get("sub")
     if not admin_id:
         return None
+    try:
+        token_version_payload = int(payload.get('token_version', 0) or 0)
+    except Exception:
+        token_version_payload = 0
+
+    key = (admin_id, staff_type, token_version_payload)
+    return _principal_cache.get(key, lambda: _resolve_staff(admin_id, staff_type, token_version_payload))
 
+
+def _resolve_staff(admin_id: str, staff_type: str, token_version_payload: int) -> Optional[Dict[str, Any]]:
     admin = AdminDB.get_admin(admin_id, include_disabled=True)
     if not admin:
         return None
@@ -509,10 +530,6 @@ def _load_staff_from_payload(payload: Optional[Dict[str, Any]]) -> Optional[Dict
         token_version_db = int(admin.get('token_version', 0) or 0)
     except Exception:
         token_version_db = 0
-    try:
-        token_version_payload = int(payload.get('token_version', 0) or 0)
-    except Exception:
-        token_version_payload = 0
 
     if token_version_db != token_version_payload:
         return None
@@ -547,13 +564,22 @@ def _load_staff_from_payload(payload: Optional[Dict[str, Any]]) -> Optional[Dict
         "created_at": admin.get('created_at')
     }
 
-def get_current_user_from_cookie(request: Request) -> Optional[Dict[str, Any]]:
-    """从Cookie获取当前用户"""
+def _get_request_payload(request: Request) -> Optional[Dict[str, Any]]:
+    """解析 Cookie 中的令牌，同一请求内只解码一次。"""
     token = get_token_from_cookie(request)
     if not token:
         return None
-    
+    cached = getattr(request.state, "auth_payload", _MISSING)
+    if cached is not _MISSING and cached[0] == token:
+        return cached[1]
     payload = AuthManager.verify_token(token)
+    request.state.auth_payload = (token, payload)
+    return payload
+
+
+def get_current_user_from_cookie(request: Request) -> Optional[Dict[str, Any]]:
+    """从Cookie获取当前用户"""
+    payload = _get_request_payload(request)
     if not payload or payload.get("type") != "user":
         return None
     
@@ -565,24 +591,21 @@ def get_current_user_from_cookie(request: Request) -> Optional[Dict[str, Any]]:
 
 def get_current_admin_from_cookie(request: Request) -> Optional[Dict[str, Any]]:
     """从Cookie获取当前管理员"""
-    token = get_token_from_cookie(request)
-    if not token:
-        return None
-
-    payload = AuthManager.verify_token(token)
-    staff = _load_staff_from_payload(payload)
+    staff = get_current_staff_from_cookie(request)
     if not staff or staff.get('type') != 'admin':
         return None
     return staff
 
 def get_current_staff_from_cookie(request: Request) -> Optional[Dict[str, Any]]:
-    """从Cookie获取当前工作人员（管理员/代理）"""
-    token = get_token_from_cookie(request)
-    if not token:
+    """从Cookie获取当前工作人员（管理员/代理），同一请求内只解析一次。"""
+    payload = _get_request_payload(request)
+    if not payload:
         return None
-
-    payload = AuthManager.verify_token(token)
-    return _load_staff_from_payload(payload)
+    cached = getattr(request.state, "staff_principal", _MISSING)
+    if cached is _MISSING or cached[0] is not payload:
+        cached = (payload, _load_staff_from_payload(payload))
+        request.state.staff_principal = cached
+    return dict(cached[1]) if cached[1] else None
 
 def get_current_admin_required_from_cookie(request: Request) -> Dict[str, Any]:
     """从Cookie获取当前管理员（必需）"""
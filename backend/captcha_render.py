@@ -0,0 +1,203 @@
+# /backend/captcha_render.py
+"""滑块验证码图片渲染。
+
+只依赖 Pillow，供验证码预渲染进程池的工作进程导入（不加载应用与数据库模块）。
+"""
+
+import io
+import math
+import secrets
+from typing import Any, Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+SLIDER_WIDTH = 320
+SLIDER_HEIGHT = 160
+PUZZLE_WIDTH = 60
+PUZZLE_SIZE_VARIANCE = 12
+PUZZLE_MIN_WIDTH = 44
+PUZZLE_MAX_WIDTH = 72
+PUZZLE_MIN_MARGIN = 8
+PUZZLE_SHAPES = ("circle", "triangle", "rhombus", "square")
+PUZZLE_ROTATE_MIN_DEG = -32
+PUZZLE_ROTATE_MAX_DEG = 32
+PUZZLE_FREE_ROTATE_SHAPES = {"triangle", "rhombus"}
+CAPTCHA_BG_WEBP_QUALITY = 86
+
+
+def _rand_int(min_value: int, max_value: int) -> int:
+    if max_value <= min_value:
+        return int(min_value)
+    return int(min_value + secrets.randbelow(max_value - min_value + 1))
+
+
+def _rotate_points(
+    points: List[Tuple[float, float]],
+    angle_deg: float,
+    center: Tuple[float, float],
+) -> List[Tuple[float, float]]:
+    radians = math.radians(float(angle_deg))
+    cos_v = math.cos(radians)
+    sin_v = math.sin(radians)
+    cx, cy = center
+    rotated: List[Tuple[float, float]] = []
+    for x, y in points:
+        dx = x - cx
+        dy = y - cy
+        rx = cx + dx * cos_v - dy * sin_v
+        ry = cy + dx * sin_v + dy * cos_v
+        rotated.append((rx, ry))
+    return rotated
+
+
+def _build_shape_assets(
+    shape: str,
+    piece_size: int,
+    rotation_deg: float,
+) -> Tuple[Image.Image, Image.Image]:
+    mask = Image.new("L", (piece_size, piece_size), 0)
+    border = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
+    draw_mask = ImageDraw.Draw(mask)
+    draw_border = ImageDraw.Draw(border)
+
+    line_width = max(2, int(round(piece_size * 0.06)))
+    inset = max(line_width + 1, int(round(piece_size * 0.10)))
+    center = (piece_size / 2.0, piece_size / 2.0)
+    half = max(4.0, (piece_size - 2.0 * inset) / 2.0)
+    border_color = (255, 255, 255, 175)
+
+    if shape == "circle":
+        bounds = (
+            float(inset),
+            float(inset),
+            float(piece_size - inset),
+            float(piece_size - inset),
+        )
+        draw_mask.ellipse(bounds, fill=255)
+        draw_border.ellipse(bounds, outline=border_color, width=line_width)
+        return mask, border
+
+    if shape == "triangle":
+        raw_points = [
+            (center[0], center[1] - half),
+            (center[0] + half * 0.92, center[1] + half * 0.80),
+            (center[0] - half * 0.92, center[1] + half * 0.80),
+        ]
+    elif shape == "rhombus":
+        raw_points = [
+            (center[0], center[1] - half * 0.76),
+            (center[0] + half, center[1]),
+            (center[0], center[1] + half * 0.76),
+            (center[0] - half, center[1]),
+        ]
+    else:
+        raw_points = [
+            (center[0] - half, center[1] - half),
+            (center[0] + half, center[1] - half),
+            (center[0] + half, center[1] + half),
+            (center[0] - half, center[1] + half),
+        ]
+
+    rotated = _rotate_points(raw_points, rotation_deg, center)
+    draw_mask.polygon(rotated, fill=255)
+    draw_border.polygon(rotated, outline=border_color, width=line_width)
+    return mask, border
+
+
+def build_piece_profile() -> Dict[str, Any]:
+    size_delta = _rand_int(-PUZZLE_SIZE_VARIANCE, PUZZLE_SIZE_VARIANCE)
+    puzzle_width = max(PUZZLE_MIN_WIDTH, min(PUZZLE_MAX_WIDTH, PUZZLE_WIDTH + size_delta))
+
+    shape = secrets.choice(PUZZLE_SHAPES)
+    shape_angle = _rand_int(0, 359) if shape in PUZZLE_FREE_ROTATE_SHAPES else 0
+    base_rotation = _rand_int(PUZZLE_ROTATE_MIN_DEG, PUZZLE_ROTATE_MAX_DEG)
+    rotation_deg = float((shape_angle + base_rotation) % 360)
+
+    min_x = PUZZLE_MIN_MARGIN
+    max_x = max(min_x, SLIDER_WIDTH - puzzle_width - PUZZLE_MIN_MARGIN)
+    min_y = PUZZLE_MIN_MARGIN
+    max_y = max(min_y, SLIDER_HEIGHT - puzzle_width - PUZZLE_MIN_MARGIN)
+
+    expected_x = _rand_int(min_x, max_x)
+    expected_y = _rand_int(min_y, max_y)
+
+    return {
+        "puzzle_width": int(puzzle_width),
+        "shape": shape,
+        "rotation_deg": rotation_deg,
+        "expected_x": int(expected_x),
+        "expected_y": int(expected_y),
+    }
+
+
+def render_challenge(source_path: str) -> Dict[str, Any]:
+    """随机生成拼图参数并渲染背景图（WEBP）与拼图条（PNG），返回 profile 与两张图片的字节。"""
+    profile = build_piece_profile()
+    piece_size = int(profile["puzzle_width"])
+    expected_x = int(profile["expected_x"])
+    expected_y = int(profile["expected_y"])
+    shape = str(profile["shape"])
+    rotation_deg = float(profile["rotation_deg"])
+
+    with Image.open(source_path) as image:
+        base = image.convert("RGB").resize((SLIDER_WIDTH, SLIDER_HEIGHT), Image.Resampling.LANCZOS)
+        shape_mask, shape_border = _build_shape_assets(shape, piece_size, rotation_deg)
+        puzzle_piece_crop = base.crop(
+            (
+                expected_x,
+                expected_y,
+                expected_x + piece_size,
+                expected_y + piece_size,
+            )
+        ).convert("RGBA")
+
+        puzzle_strip = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
+        puzzle_alpha = Image.new("L", (piece_size, SLIDER_HEIGHT), 0)
+        puzzle_strip.paste(puzzle_piece_crop, (0, expected_y))
+        puzzle_alpha.paste(shape_mask, (0, expected_y))
+        puzzle_strip.putalpha(puzzle_alpha)
+
+        # 给拼图加一点对比度，避免在浅色图上不明显
+        puzzle_strip = ImageEnhance.Contrast(puzzle_strip).enhance(1.15)
+        border_alpha = shape_border.getchannel("A")
+        glow_radius = max(1, int(round(piece_size * 0.08)))
+        glow_alpha = border_alpha.filter(ImageFilter.GaussianBlur(radius=glow_radius)).point(
+            lambda value: int(value * 0.52)
+        )
+
+        piece_glow_tile = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
+        piece_glow_tile.putalpha(glow_alpha)
+        piece_glow_canvas = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
+        piece_glow_canvas.paste(piece_glow_tile, (0, expected_y), piece_glow_tile)
+        puzzle_strip.alpha_composite(piece_glow_canvas)
+
+        piece_border_canvas = Image.new("RGBA", (piece_size, SLIDER_HEIGHT), (255, 255, 255, 0))
+        piece_border_canvas.paste(shape_border, (0, expected_y), shape_border)
+        puzzle_strip.alpha_composite(piece_border_canvas)
+
+        shaded_bg = base.copy().convert("RGBA")
+        slot_glow = Image.new("RGBA", (piece_size, piece_size), (255, 255, 255, 0))
+        slot_glow.putalpha(glow_alpha)
+        shaded_bg.alpha_composite(slot_glow, (expected_x, expected_y))
+
+        slot_overlay = Image.new("RGBA", (piece_size, piece_size), (24, 24, 24, 0))
+        slot_alpha = shape_mask.point(lambda value: int(value * 0.36))
+        slot_overlay.putalpha(slot_alpha)
+        shaded_bg.alpha_composite(slot_overlay, (expected_x, expected_y))
+        shaded_bg.alpha_composite(shape_border, (expected_x, expected_y))
+
+        bg_buffer = io.BytesIO()
+        shaded_bg.convert("RGB").save(
+            bg_buffer,
+            format="WEBP",
+            quality=CAPTCHA_BG_WEBP_QUALITY,
+            method=6,
+        )
+        puzzle_buffer = io.BytesIO()
+        puzzle_strip.save(puzzle_buffer, format="PNG", optimize=True)
+
+    return {
+        "profile": profile,
+        "bg": bg_buffer.getvalue(),
+        "puzzle": puzzle_buffer.getvalue(),
+    }
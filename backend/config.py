@@ -175,6 +175,22 @@ class Settings:
     api_url: str
     model_order: List[ModelConfig]
     enable_password_hash: bool
+    db_pool_size: int = 8
+    db_pool_timeout: float = 5.0
+    db_busy_timeout_ms: int = 5000
+    db_mmap_size: int = 256 * 1024 * 1024
+    db_statement_cache_size: int = 256
+    config_cache_ttl_seconds: int = 300
+    cache_sync_interval_ms: int = 1000
+    principal_cache_ttl_seconds: int = 30
+    password_hash_rounds: int = 12
+    password_hash_workers: int = 2
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry_seconds: float = 60.0
+    llm_http2: bool = False
+    captcha_pool_size: int = 4
+    captcha_render_workers: int = 1
 
 
 @lru_cache()
@@ -269,6 +285,33 @@ def get_settings() -> Settings:
 
     # 密码加密开关（默认启用）
     enable_password_hash = _as_bool(_strip_quotes(os.getenv("ENABLE_PASSWORD_HASH")), True)
+    # bcrypt 成本因子（4-31），修改后旧密码在下次登录成功时按新成本重新哈希
+    password_hash_rounds = min(31, max(4, _as_int(_strip_quotes(os.getenv("PASSWORD_HASH_ROUNDS")), 12)))
+    # 密码哈希进程数，即同时进行的 bcrypt 计算上限
+    default_hash_workers = max(1, min(4, (os.cpu_count() or 2) // 2))
+    password_hash_workers = max(1, _as_int(_strip_quotes(os.getenv("PASSWORD_HASH_WORKERS")), default_hash_workers))
+
+    # 上游 HTTP 连接池（AI 模型接口、第三方登录接口各自独立）
+    http_max_connections = max(1, _as_int(_strip_quotes(os.getenv("HTTP_MAX_CONNECTIONS")), 20))
+    http_max_keepalive_connections = max(0, _as_int(_strip_quotes(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS")), 10))
+    http_keepalive_expiry_seconds = float(max(0, _as_int(_strip_quotes(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS")), 60)))
+    llm_http2 = _as_bool(_strip_quotes(os.getenv("LLM_HTTP2")), False)
+
+    # 滑块验证码预渲染池：每张背景图预先渲染的挑战数量与渲染进程数
+    captcha_pool_size = max(0, _as_int(_strip_quotes(os.getenv("CAPTCHA_POOL_SIZE")), 4))
+    captcha_render_workers = max(1, _as_int(_strip_quotes(os.getenv("CAPTCHA_RENDER_WORKERS")), 1))
+
+    # SQLite 连接池配置
+    db_pool_size = max(1, _as_int(_strip_quotes(os.getenv("DB_POOL_SIZE")), 8))
+    db_pool_timeout = max(0, _as_int(_strip_quotes(os.getenv("DB_POOL_TIMEOUT_MS")), 5000)) / 1000.0
+    db_busy_timeout_ms = max(0, _as_int(_strip_quotes(os.getenv("DB_BUSY_TIMEOUT_MS")), 5000))
+    db_mmap_size = max(0, _as_int(_strip_quotes(os.getenv("DB_MMAP_SIZE")), 256 * 1024 * 1024))
+    db_statement_cache_size = max(0, _as_int(_strip_quotes(os.getenv("DB_STATEMENT_CACHE_SIZE")), 256))
+
+    # 进程内配置缓存
+    config_cache_ttl_seconds = max(0, _as_int(_strip_quotes(os.getenv("CONFIG_CACHE_TTL_SECONDS")), 300))
+    cache_sync_interval_ms = max(0, _as_int(_strip_quotes(os.getenv("CACHE_SYNC_INTERVAL_MS")), 1000))
+    principal_cache_ttl_seconds = max(0, _as_int(_strip_quotes(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS")), 30))
 
     return Settings(
         env=env_value,
@@ -291,6 +334,22 @@ def get_settings() -> Settings:
         api_url=api_url,
         model_order=model_order,
         enable_password_hash=enable_password_hash,
+        password_hash_rounds=password_hash_rounds,
+        password_hash_workers=password_hash_workers,
+        http_max_connections=http_max_connections,
+        http_max_keepalive_connections=http_max_keepalive_connections,
+        http_keepalive_expiry_seconds=http_keepalive_expiry_seconds,
+        llm_http2=llm_http2,
+        captcha_pool_size=captcha_pool_size,
+        captcha_render_workers=captcha_render_workers,
+        db_pool_size=db_pool_size,
+        db_pool_timeout=db_pool_timeout,
+        db_busy_timeout_ms=db_busy_timeout_ms,
+        db_mmap_size=db_mmap_size,
+        db_statement_cache_size=db_statement_cache_size,
+        config_cache_ttl_seconds=config_cache_ttl_seconds,
+        cache_sync_interval_ms=cache_sync_interval_ms,
+        principal_cache_ttl_seconds=principal_cache_ttl_seconds,
     )
 
 
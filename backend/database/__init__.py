@@ -1,10 +1,34 @@
+import sys
+
 from .config import DB_PATH, logger, settings
-from .security import hash_password, verify_password, is_password_hashed
+from .security import (
+    hash_password,
+    verify_password,
+    is_password_hashed,
+    password_needs_rehash,
+    prepare_password,
+    prepare_password_async,
+    hash_passwords,
+    get_password_hash_stats,
+    get_password_hasher,
+    shutdown_password_hasher,
+)
 from .migrations import (
     ensure_table_columns,
     auto_migrate_database,
     ensure_user_id_schema,
     ensure_admin_accounts,
+    ensure_product_search_index,
+    ensure_order_time_index,
+    ensure_order_search_index,
+    backfill_order_items,
+    ensure_sales_rollup,
+    ensure_chat_schema,
+    ensure_chat_user_summary,
+    ensure_staff_chat_schema,
+    SCHEMA_VERSION,
+    get_schema_version,
+    schema_is_current,
     migrate_user_profile_addresses,
     migrate_chat_threads,
     migrate_passwords_to_hash,
@@ -13,17 +37,28 @@ from .migrations import (
     migrate_payment_qr_paths,
     ImageLookupDB,
 )
-from .connection import get_db_connection, safe_execute_with_migration
+from .connection import close_all_connections, get_db_connection, get_pool_stats, safe_execute_with_migration
 from .bootstrap import init_database
+from .cache import VersionedCache, bump_cache_version, get_cache_stats, version_token
+from .executor import (
+    AsyncDBProxy,
+    get_executor_stats,
+    offload_db,
+    run_in_db_executor,
+    shutdown_db_executor,
+)
 from .chat import ChatLogDB, cleanup_old_chat_logs
+from .chat_summary import ChatUserSummaryDB
 from .staff_chat import StaffChatLogDB
 from .users import UserDB, UserProfileDB
 from .products import ProductDB, VariantDB, CategoryDB
 from .cart import CartDB
-from .locations import AddressDB, BuildingDB
+from .locations import AddressDB, BuildingDB, ShoppingRouteDB
 from .admins import AdminDB, AgentAssignmentDB, AgentDeletionDB, AgentStatusDB, PaymentQrDB
 from .settings_db import SettingsDB
 from .sales_cycles import SalesCycleDB
+from .sales_rollup import SalesRollupDB
+from .inventory import InventoryDB
 from .orders import OrderDB, OrderExportDB
 from .promotions import (
     LotteryConfigDB,
@@ -35,6 +70,9 @@ from .promotions import (
     GiftThresholdDB,
 )
 
+# 异步外观：在数据库线程池中调用任意 *DB 方法，例如 ``await aio.ProductDB.get_product_by_id(pid)``
+aio = AsyncDBProxy(sys.modules[__name__])
+
 __all__ = [
     "DB_PATH",
     "logger",
@@ -42,10 +80,28 @@ __all__ = [
     "hash_password",
     "verify_password",
     "is_password_hashed",
+    "password_needs_rehash",
+    "prepare_password",
+    "prepare_password_async",
+    "hash_passwords",
+    "get_password_hash_stats",
+    "get_password_hasher",
+    "shutdown_password_hasher",
     "ensure_table_columns",
     "auto_migrate_database",
     "ensure_user_id_schema",
     "ensure_admin_accounts",
+    "ensure_product_search_index",
+    "ensure_order_time_index",
+    "ensure_order_search_index",
+    "backfill_order_items",
+    "ensure_sales_rollup",
+    "ensure_chat_schema",
+    "ensure_chat_user_summary",
+    "ensure_staff_chat_schema",
+    "SCHEMA_VERSION",
+    "get_schema_version",
+    "schema_is_current",
     "migrate_user_profile_addresses",
     "migrate_chat_threads",
     "migrate_passwords_to_hash",
@@ -54,10 +110,23 @@ __all__ = [
     "migrate_payment_qr_paths",
     "ImageLookupDB",
     "get_db_connection",
+    "get_pool_stats",
+    "close_all_connections",
     "safe_execute_with_migration",
     "init_database",
+    "VersionedCache",
+    "bump_cache_version",
+    "get_cache_stats",
+    "version_token",
+    "aio",
+    "AsyncDBProxy",
+    "get_executor_stats",
+    "offload_db",
+    "run_in_db_executor",
+    "shutdown_db_executor",
     "ChatLogDB",
     "cleanup_old_chat_logs",
+    "ChatUserSummaryDB",
     "StaffChatLogDB",
     "UserDB",
     "UserProfileDB",
@@ -66,14 +135,17 @@ __all__ = [
     "CategoryDB",
     "SettingsDB",
     "SalesCycleDB",
+    "SalesRollupDB",
     "CartDB",
     "AddressDB",
     "BuildingDB",
+    "ShoppingRouteDB",
     "AdminDB",
     "AgentAssignmentDB",
     "AgentDeletionDB",
     "AgentStatusDB",
     "PaymentQrDB",
+    "InventoryDB",
     "OrderDB",
     "OrderExportDB",
     "LotteryConfigDB",
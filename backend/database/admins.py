@@ -4,9 +4,25 @@ import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Set
 
+from .cache import VersionedCache, bump_cache_version
 from .config import logger, settings
 from .connection import get_db_connection, safe_execute_with_migration
-from .security import hash_password, is_password_hashed, verify_password
+from .executor import run_in_db_executor
+from .security import (
+    hash_password_async,
+    is_password_hashed,
+    password_needs_rehash,
+    prepare_password,
+    verify_password_async,
+    verify_password_pooled,
+)
+
+# 代理负责的楼栋列表，鉴权与范围计算每次请求都会用到；楼栋/地址启用状态变化同样使其失效
+_agent_buildings_cache = VersionedCache(
+    'agent_assignments', depends_on=('locations',), ttl=settings.principal_cache_ttl_seconds
+)
+# /payment/{filename} 按文件名查找收款码路径
+_payment_qr_path_cache = VersionedCache('payment_qrs', copy_values=False)
 
 
 class AdminDB:
@@ -65,10 +81,13 @@ class AdminDB:
                         (candidate, agent_id),
                     )
                 conn.commit()
-                return candidate if cursor.rowcount > 0 else None
+                archived = candidate if cursor.rowcount > 0 else None
             except Exception as exc:
                 logger.error("Failed to archive agent account: %s", exc)
                 return None
+        # 先归还连接再更新缓存版本，避免持有连接时再从连接池取连接
+        bump_cache_version('admins')
+        return archived
 
     @staticmethod
     def verify_admin(admin_id: str, password: str) -> Optional[Dict]:
@@ -82,16 +101,13 @@ class AdminDB:
 
         if settings.enable_password_hash:
             if is_password_hashed(stored_password):
-                if verify_password(password, stored_password):
+                if verify_password_pooled(password, stored_password):
+                    if password_needs_rehash(stored_password):
+                        AdminDB._upgrade_password(admin_id, prepare_password(password))
                     return admin
             else:
                 if stored_password == password:
-                    try:
-                        hashed = hash_password(password)
-                        AdminDB.update_admin_password(admin_id, hashed)
-                        logger.info("Admin password auto-upgraded to hash format: %s", admin_id)
-                    except Exception as exc:
-                        logger.error("Failed to auto-upgrade admin password for %s: %s", admin_id, exc)
+                    AdminDB._upgrade_password(admin_id, prepare_password(password))
                     return admin
         else:
             if stored_password == password:
@@ -99,6 +115,44 @@ class AdminDB:
 
         return None
 
+    @staticmethod
+    async def verify_admin_async(admin_id: str, password: str) -> Optional[Dict]:
+        """异步校验管理员密码：查询与回写走数据库线程池，bcrypt 计算交给密码哈希进程池。"""
+        admin = await run_in_db_executor(AdminDB.get_admin, admin_id)
+        if not admin:
+            return None
+
+        stored_password = admin.get('password')
+        if not stored_password:
+            return None
+
+        if settings.enable_password_hash:
+            if is_password_hashed(stored_password):
+                if await verify_password_async(password, stored_password):
+                    if password_needs_rehash(stored_password):
+                        hashed = await hash_password_async(password)
+                        await run_in_db_executor(AdminDB._upgrade_password, admin_id, hashed)
+                    return admin
+            else:
+                if stored_password == password:
+                    hashed = await hash_password_async(password)
+                    await run_in_db_executor(AdminDB._upgrade_password, admin_id, hashed)
+                    return admin
+        else:
+            if stored_password == password:
+                return admin
+
+        return None
+
+    @staticmethod
+    def _upgrade_password(admin_id: str, hashed: str) -> None:
+        """登录成功后回写明文密码的哈希或按当前成本重新哈希的结果，失败不影响登录。"""
+        try:
+            AdminDB.update_admin_password(admin_id, hashed)
+            logger.info("Admin password hash upgraded: %s", admin_id)
+        except Exception as exc:
+            logger.error("Failed to auto-upgrade admin password for %s: %s", admin_id, exc)
+
     @staticmethod
     def get_admin(
         admin_id: str,
@@ -228,8 +282,7 @@ class AdminDB:
 
     @staticmethod
     def create_admin(admin_id: str, password: str, name: str, role: str = 'agent', payment_qr_path: Optional[str] = None) -> bool:
-        if settings.enable_password_hash and not is_password_hashed(password):
-            password = hash_password(password)
+        password = prepare_password(password)
 
         with get_db_connection() as conn:
             try:
@@ -247,9 +300,10 @@ class AdminDB:
                     VALUES (?, ?, ?, ?, ?, ?, 1)
                 ''', (admin_id, agent_id, password, name, role, payment_qr_path), 'admins')
                 conn.commit()
-                return True
             except Exception:
                 return False
+        bump_cache_version('admins')
+        return True
 
     @staticmethod
     def update_admin(admin_id: str, **fields) -> bool:
@@ -273,10 +327,12 @@ class AdminDB:
             try:
                 cursor = safe_execute_with_migration(conn, f"UPDATE admins SET {', '.join(updates)} WHERE id = ?", tuple(params), 'admins')
                 conn.commit()
-                return cursor.rowcount > 0
+                success = cursor.rowcount > 0
             except Exception as exc:
                 logger.error("Failed to update admin info: %s", exc)
                 return False
+        bump_cache_version('admins')
+        return success
 
     @staticmethod
     def update_agent_account(agent_id: str, new_account: str) -> bool:
@@ -293,10 +349,12 @@ class AdminDB:
                     (new_account, agent_id)
                 )
                 conn.commit()
-                return cursor.rowcount > 0
+                success = cursor.rowcount > 0
             except Exception as exc:
                 logger.error("Failed to update agent account: %s", exc)
                 return False
+        bump_cache_version('admins')
+        return success
 
     @staticmethod
     def update_admin_password(admin_id: str, new_password: str) -> bool:
@@ -309,10 +367,11 @@ class AdminDB:
                 )
                 success = cursor.rowcount > 0
                 conn.commit()
-                return success
             except Exception as exc:
                 logger.error("Failed to update admin password: %s", exc)
                 return False
+        bump_cache_version('admins')
+        return success
 
     @staticmethod
     def bump_token_version(admin_id: str) -> bool:
@@ -330,10 +389,12 @@ class AdminDB:
                     (admin_id,)
                 )
                 conn.commit()
-                return cursor.rowcount > 0
+                success = cursor.rowcount > 0
             except Exception as exc:
                 logger.error("Failed to bump admin token_version: %s", exc)
                 return False
+        bump_cache_version('admins')
+        return success
 
     @staticmethod
     def soft_delete_admin(admin_id: str) -> bool:
@@ -400,16 +461,21 @@ class AgentAssignmentDB:
                         VALUES (?, ?, ?, ?)
                     ''', (assignment_id, agent_id, address_id, bid))
                 conn.commit()
-                return True
             except Exception as exc:
                 logger.error("Failed to update agent buildings: %s", exc)
                 conn.rollback()
                 return False
+        bump_cache_version('agent_assignments')
+        return True
 
     @staticmethod
     def get_buildings_for_agent(agent_id: str) -> List[Dict[str, Any]]:
         if not agent_id:
             return []
+        return _agent_buildings_cache.get(agent_id, lambda: AgentAssignmentDB._load_buildings_for_agent(agent_id))
+
+    @staticmethod
+    def _load_buildings_for_agent(agent_id: str) -> List[Dict[str, Any]]:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -818,29 +884,33 @@ class PaymentQrDB:
             )
             return cursor.fetchone() is not None
 
+    @staticmethod
+    def get_image_path_index() -> Dict[str, str]:
+        """文件名 → image_path 的索引（进程内缓存，收款码变更后失效）；同名时取最近更新的记录。"""
+        def load() -> Dict[str, str]:
+            with get_db_connection() as conn:
+                rows = conn.execute(
+                    '''
+                    SELECT image_path
+                    FROM payment_qr_codes
+                    WHERE image_path IS NOT NULL AND image_path != ''
+                    ORDER BY updated_at ASC, created_at ASC
+                    '''
+                ).fetchall()
+            index: Dict[str, str] = {}
+            for row in rows:
+                image_path = row[0]
+                if '/' in image_path:
+                    index[image_path.rsplit('/', 1)[1]] = image_path
+            return index
+
+        return _payment_qr_path_cache.get('by_filename', load)
+
     @staticmethod
     def get_image_path_by_filename(filename: str) -> Optional[str]:
         if not filename:
             return None
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                SELECT image_path
-                FROM payment_qr_codes
-                WHERE image_path LIKE ?
-                ORDER BY updated_at DESC, created_at DESC
-                LIMIT 1
-                ''',
-                (f"%/{filename}",),
-            )
-            row = cursor.fetchone()
-            if not row:
-                return None
-            try:
-                return row["image_path"]
-            except Exception:
-                return row[0]
+        return PaymentQrDB.get_image_path_index().get(filename)
 
     @staticmethod
     def create_payment_qr(owner_id: str, owner_type: str, name: str, image_path: str) -> str:
@@ -853,7 +923,8 @@ class PaymentQrDB:
                 VALUES (?, ?, ?, ?, ?, 1)
             ''', (qr_id, owner_id, owner_type, name, image_path))
             conn.commit()
-            return qr_id
+        bump_cache_version('payment_qrs')
+        return qr_id
 
     @staticmethod
     def get_payment_qrs(owner_id: str, owner_type: str, include_disabled: bool = False) -> List[Dict[str, Any]]:
@@ -922,7 +993,10 @@ class PaymentQrDB:
             ''', params)
 
             conn.commit()
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+        if updated and image_path is not None:
+            bump_cache_version('payment_qrs')
+        return updated
 
     @staticmethod
     def update_payment_qr_status(qr_id: str, is_enabled: bool) -> bool:
@@ -944,7 +1018,10 @@ class PaymentQrDB:
             cursor.execute('DELETE FROM payment_qr_codes WHERE id = ?', (qr_id,))
 
             conn.commit()
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+        if deleted:
+            bump_cache_version('payment_qrs')
+        return deleted
 
     @staticmethod
     def ensure_at_least_one_enabled(owner_id: str, owner_type: str) -> bool:
@@ -3,11 +3,21 @@ import sqlite3
 import time
 
 from . import config
+from .connection import close_all_connections, create_connection
 from .migrations import (
     ensure_table_columns,
     auto_migrate_database,
     migrate_chat_threads,
+    ensure_chat_schema,
+    ensure_chat_user_summary,
+    ensure_staff_chat_schema,
+    mark_schema_current,
     ensure_admin_accounts,
+    ensure_product_search_index,
+    ensure_order_time_index,
+    ensure_order_search_index,
+    backfill_order_items,
+    ensure_sales_rollup,
     migrate_user_profile_addresses,
     migrate_passwords_to_hash,
 )
@@ -15,6 +25,7 @@ from .migrations import (
 def init_database():
     """初始化数据库表结构。"""
     if config.settings.db_reset and not config._DB_WAS_RESET:
+        close_all_connections()
         if os.path.exists(config.DB_PATH):
             try:
                 os.remove(config.DB_PATH)
@@ -22,9 +33,17 @@ def init_database():
             except OSError as exc:
                 config.logger.error("Failed to delete database file: %s", exc)
                 raise
+        for suffix in ("-wal", "-shm"):
+            sidecar = f"{config.DB_PATH}{suffix}"
+            if os.path.exists(sidecar):
+                try:
+                    os.remove(sidecar)
+                except OSError as exc:
+                    config.logger.warning("Failed to delete database sidecar file %s: %s", sidecar, exc)
         config._DB_WAS_RESET = True
 
-    conn = sqlite3.connect(config.DB_PATH)
+    conn = create_connection(config.DB_PATH)
+    conn.row_factory = None
     cursor = conn.cursor()
 
     try:
@@ -155,6 +174,59 @@ def init_database():
             )
         ''')
 
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_items (
+                order_id TEXT NOT NULL,
+                line_no INTEGER NOT NULL,
+                product_id TEXT,
+                variant_id TEXT,
+                name TEXT,
+                variant_name TEXT,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                unit_price REAL,
+                subtotal REAL,
+                is_lottery INTEGER NOT NULL DEFAULT 0,
+                is_auto_gift INTEGER NOT NULL DEFAULT 0,
+                is_gift INTEGER NOT NULL DEFAULT 0,
+                is_non_sellable INTEGER NOT NULL DEFAULT 0,
+                lottery_unit_price REAL,
+                stock_product_id TEXT,
+                stock_variant_id TEXT,
+                stock_label TEXT,
+                PRIMARY KEY (order_id, line_no)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_rollup (
+                bucket_hour TEXT NOT NULL,
+                agent_id TEXT,
+                address_id TEXT,
+                building_id TEXT,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                discount_amount REAL NOT NULL DEFAULT 0,
+                lottery_cost REAL NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_product_rollup (
+                bucket_hour TEXT NOT NULL,
+                agent_id TEXT,
+                address_id TEXT,
+                building_id TEXT,
+                product_id TEXT,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                lottery_quantity INTEGER NOT NULL DEFAULT 0,
+                priced_amount REAL NOT NULL DEFAULT 0,
+                unpriced_quantity INTEGER NOT NULL DEFAULT 0,
+                sold_quantity INTEGER NOT NULL DEFAULT 0,
+                sold_revenue REAL NOT NULL DEFAULT 0,
+                sold_name TEXT
+            )
+        ''')
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS order_exports (
                 id TEXT PRIMARY KEY,
@@ -314,10 +386,11 @@ def init_database():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_categories_name ON categories(name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_student_id ON orders(student_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_payment_status ON orders(payment_status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_rollup_bucket ON sales_rollup(bucket_hour)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_product_rollup_bucket ON sales_product_rollup(bucket_hour)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_addresses_enabled ON addresses(enabled)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_addresses_sort ON addresses(sort_order)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_buildings_address ON buildings(address_id)')
@@ -449,6 +522,17 @@ def init_database():
         except Exception:
             pass
 
+        try:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS cache_versions (
+                    namespace TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        except Exception:
+            pass
+
         try:
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS coupons (
@@ -697,13 +781,23 @@ def init_database():
         except sqlite3.OperationalError:
             pass
 
+        schema_migrated = False
         try:
             auto_migrate_database(conn)
             migrate_chat_threads(conn)
+            ensure_chat_schema(conn)
+            ensure_staff_chat_schema(conn)
+            ensure_order_time_index(conn)
+            schema_migrated = True
             config.logger.info("Automatic database migration completed")
         except Exception as exc:
             config.logger.warning("Automatic database migration failed: %s", exc)
 
+        backfill_order_items(conn)
+        ensure_sales_rollup(conn)
+        ensure_product_search_index(conn)
+        ensure_order_search_index(conn)
+
         try:
             cursor = conn.cursor()
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_logs_thread_id ON chat_logs(thread_id)')
@@ -714,6 +808,9 @@ def init_database():
 
         ensure_admin_accounts(conn)
         conn.commit()
+        # 迁移全部成功才登记结构版本；失败时运行时仍按旧方式逐次检查结构
+        if schema_migrated:
+            mark_schema_current(conn)
         config.logger.info("Database schema initialization completed")
 
         try:
@@ -793,6 +890,9 @@ def init_database():
         except Exception as exc:
             config.logger.warning("User profile address migration failed: %s", exc)
 
+        # 依赖会话归档与配送地址迁移的结果，放在两者之后
+        ensure_chat_user_summary(conn)
+
     except Exception as exc:
         config.logger.error("Database initialization failed: %s", exc)
         conn.rollback()
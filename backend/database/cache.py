@@ -0,0 +1,140 @@
+import copy
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .config import logger, settings
+from .connection import get_db_connection
+
+_MISSING = object()
+
+_versions_lock = threading.Lock()
+# 数据库中 cache_versions 表记录的版本号（跨进程共享）
+_remote_versions: Dict[str, int] = {}
+# 本进程内的失效代数，写操作后立即生效，不依赖下一次同步
+_local_generations: Dict[str, int] = {}
+_synced_at = 0.0
+
+_registry: List["VersionedCache"] = []
+
+
+def _sync_remote_versions(force: bool = False) -> None:
+    """按间隔从 cache_versions 表同步版本号，使其他 worker 的写入在短时间内可见。"""
+    global _synced_at
+    interval = settings.cache_sync_interval_ms / 1000.0
+    now = time.monotonic()
+    if not force and now - _synced_at < interval:
+        return
+    with _versions_lock:
+        if not force and now - _synced_at < interval:
+            return
+        _synced_at = now
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute('SELECT namespace, version FROM cache_versions').fetchall()
+    except sqlite3.OperationalError:
+        return
+    except Exception as exc:
+        logger.warning("Failed to sync cache versions: %s", exc)
+        return
+    with _versions_lock:
+        for row in rows:
+            _remote_versions[row[0]] = int(row[1] or 0)
+
+
+def version_token(namespace: str) -> Tuple[int, int]:
+    _sync_remote_versions()
+    return _remote_versions.get(namespace, 0), _local_generations.get(namespace, 0)
+
+
+def bump_cache_version(*namespaces: str) -> None:
+    """使指定命名空间的缓存失效，需在数据写入提交之后调用。
+
+    本进程内的缓存立即失效；版本号同时写入 cache_versions 表，
+    其他 worker 在下一次同步时发现版本变化后丢弃旧条目。
+    """
+    if not namespaces:
+        return
+    try:
+        with get_db_connection() as conn:
+            conn.executemany(
+                'INSERT INTO cache_versions (namespace, version, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP) '
+                'ON CONFLICT(namespace) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP',
+                [(namespace,) for namespace in namespaces]
+            )
+            conn.commit()
+    except Exception as exc:
+        logger.warning("Failed to bump cache version for %s: %s", namespaces, exc)
+    finally:
+        with _versions_lock:
+            for namespace in namespaces:
+                _local_generations[namespace] = _local_generations.get(namespace, 0) + 1
+
+
+class VersionedCache:
+    """进程内读穿缓存：条目在 TTL 内且依赖的命名空间版本未变化时直接命中。"""
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        depends_on: Iterable[str] = (),
+        ttl: Optional[float] = None,
+        copy_values: bool = True,
+    ):
+        self.namespace = namespace
+        self.namespaces = (namespace, *[ns for ns in depends_on if ns != namespace])
+        self.ttl = float(ttl if ttl is not None else settings.config_cache_ttl_seconds)
+        self.copy_values = copy_values
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Any, Tuple[Tuple[int, int], ...], float]] = {}
+        self._hits = 0
+        self._misses = 0
+        _registry.append(self)
+
+    def _token(self) -> Tuple[Tuple[int, int], ...]:
+        return tuple(version_token(ns) for ns in self.namespaces)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        token = self._token()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] == token and entry[2] > now:
+                self._hits += 1
+                value = entry[0]
+                return copy.deepcopy(value) if self.copy_values else value
+            self._misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (value, token, now + self.ttl)
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """仅在本进程内丢弃指定键的条目。"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "namespace": self.namespace,
+                "depends_on": list(self.namespaces[1:]),
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            }
+
+
+def get_cache_stats() -> List[Dict[str, Any]]:
+    """返回所有读穿缓存的命中统计。"""
+    return [cache.stats() for cache in _registry]
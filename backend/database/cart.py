@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from .config import logger
 from .connection import get_db_connection
@@ -104,6 +104,14 @@ class CartDB:
 
     @staticmethod
     def remove_product_from_all_carts(product_id: str) -> int:
+        return CartDB.remove_products_from_all_carts([product_id])
+
+    @staticmethod
+    def remove_products_from_all_carts(product_ids: List[str]) -> int:
+        """从所有购物车中移除指定商品（含其规格），只扫描一遍购物车，返回被修改的购物车数。"""
+        targets = {pid for pid in product_ids if pid}
+        if not targets:
+            return 0
         removed_count = 0
         sep = '@@'
         with get_db_connection() as conn:
@@ -124,7 +132,7 @@ class CartDB:
                     new_items = {}
                     for key, qty in items.items():
                         base_pid = key.split(sep, 1)[0] if isinstance(key, str) else key
-                        if base_pid == product_id:
+                        if base_pid in targets:
                             changed = True
                             continue
                         new_items[key] = qty
@@ -3,9 +3,10 @@ import json
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+from .chat_summary import ChatUserSummaryDB
 from .config import logger
 from .connection import get_db_connection
-from .migrations import ensure_table_columns
+from .migrations import ensure_chat_schema, schema_is_current
 from .settings_db import SettingsDB
 from .users import UserDB
 
@@ -13,52 +14,9 @@ from .users import UserDB
 class ChatLogDB:
     @staticmethod
     def _ensure_chat_schema(conn):
-        """确保聊天相关的表结构与索引存在。"""
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='chat_logs'")
-        table_exists = cursor.fetchone() is not None
-
-        if table_exists:
-            try:
-                ensure_table_columns(conn, 'chat_logs', {
-                    'thread_id': 'TEXT',
-                    'tool_call_id': 'TEXT',
-                    'thinking_content': 'TEXT',
-                    'thinking_duration': 'REAL',
-                    'is_thinking_stopped': 'INTEGER DEFAULT 0',
-                    'is_error': 'INTEGER DEFAULT 0'
-                })
-            except Exception as exc:
-                logger.warning("Failed to ensure chat_logs schema: %s", exc)
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_threads (
-                id TEXT PRIMARY KEY,
-                student_id TEXT,
-                user_id INTEGER,
-                title TEXT,
-                first_message_preview TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_archived INTEGER DEFAULT 0,
-                metadata TEXT,
-                FOREIGN KEY (student_id) REFERENCES users (id),
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_user_id ON chat_threads(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_student_id ON chat_threads(student_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_last_active ON chat_threads(last_message_at DESC)')
-
-        if table_exists:
-            try:
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_logs_thread_id ON chat_logs(thread_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_logs_tool_call_id ON chat_logs(tool_call_id)')
-            except Exception as exc:
-                logger.warning("Failed to create chat_logs indexes: %s", exc)
-
-        conn.commit()
+        """确保聊天相关的表结构与索引存在；启动时已登记结构版本则直接返回，不执行 DDL。"""
+        if not schema_is_current(conn):
+            ensure_chat_schema(conn)
 
     PREVIEW_LIMIT = 8
 
@@ -117,6 +75,7 @@ class ChatLogDB:
                 INSERT INTO chat_threads (id, student_id, user_id, title)
                 VALUES (?, ?, ?, ?)
             ''', (thread_id, user_ref['student_id'], user_ref['user_id'], normalized_title))
+            ChatUserSummaryDB.refresh_users(cursor, [user_ref['student_id']])
             conn.commit()
         return ChatLogDB.get_thread_for_user(user_identifier, thread_id)
 
@@ -194,19 +153,12 @@ class ChatLogDB:
             return [dict(row) for row in cursor.fetchall()]
 
     @staticmethod
-    def add_log(
-        user_identifier: Optional[Union[str, int]],
+    def _prepare_log_entry(
         role: str,
         content: str,
-        thread_id: Optional[str] = None,
-        tool_call_id: Optional[str] = None,
         thinking_content: Optional[str] = None,
-        thinking_duration: Optional[float] = None,
-        is_thinking_stopped: bool = False,
-        is_error: bool = False
-    ):
-        user_ref = ChatLogDB._resolve_user_identifier(user_identifier)
-
+    ) -> Tuple[str, Optional[str]]:
+        """返回 (写入的 content, thinking_content)。"""
         # 如果content是JSON格式且role是assistant，尝试提取thinking信息
         actual_content = content
         if role == "assistant" and content and content.strip():
@@ -222,50 +174,94 @@ class ChatLogDB:
             except (json.JSONDecodeError, ValueError):
                 # 不是JSON格式，保持原样
                 pass
+        return actual_content, thinking_content
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            ChatLogDB._ensure_chat_schema(conn)
-            if thread_id:
-                if not user_ref:
-                    raise ValueError("需要登录才能写入指定会话")
-                if not ChatLogDB._fetch_thread_for_user(cursor, thread_id, user_ref):
-                    raise ValueError("会话不存在或无权限访问")
+    @staticmethod
+    def add_log(
+        user_identifier: Optional[Union[str, int]],
+        role: str,
+        content: str,
+        thread_id: Optional[str] = None,
+        tool_call_id: Optional[str] = None,
+        thinking_content: Optional[str] = None,
+        thinking_duration: Optional[float] = None,
+        is_thinking_stopped: bool = False,
+        is_error: bool = False
+    ):
+        ChatLogDB.add_logs(user_identifier, [{
+            "role": role,
+            "content": content,
+            "tool_call_id": tool_call_id,
+            "thinking_content": thinking_content,
+            "thinking_duration": thinking_duration,
+            "is_thinking_stopped": is_thinking_stopped,
+            "is_error": is_error,
+        }], thread_id=thread_id)
 
-            cursor.execute('''
-                INSERT INTO chat_logs (student_id, user_id, thread_id, tool_call_id, role, content, thinking_content, thinking_duration, is_thinking_stopped, is_error)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_ref['student_id'] if user_ref else None,
-                user_ref['user_id'] if user_ref else None,
+    @staticmethod
+    def add_logs(
+        user_identifier: Optional[Union[str, int]],
+        entries: List[Dict[str, Any]],
+        thread_id: Optional[str] = None,
+    ):
+        """在一个事务中写入多条聊天记录，并用一条 UPDATE 完成会话归属校验、活跃时间与预览更新。
+
+        entries 中每项的键与 add_log 的参数一致（role、content 必填）。
+        """
+        if not entries:
+            return
+        user_ref = ChatLogDB._resolve_user_identifier(user_identifier)
+        student_id = user_ref['student_id'] if user_ref else None
+        user_id = user_ref['user_id'] if user_ref else None
+
+        rows = []
+        preview = None
+        for entry in entries:
+            role = entry["role"]
+            content = entry.get("content")
+            actual_content, thinking_content = ChatLogDB._prepare_log_entry(
+                role, content, entry.get("thinking_content")
+            )
+            if preview is None and role == 'user':
+                preview = ChatLogDB._normalize_preview(content)
+            rows.append((
+                student_id,
+                user_id,
                 thread_id,
-                tool_call_id,
+                entry.get("tool_call_id"),
                 role,
                 actual_content,
                 thinking_content,
-                thinking_duration,
-                1 if is_thinking_stopped else 0,
-                1 if is_error else 0
+                entry.get("thinking_duration"),
+                1 if entry.get("is_thinking_stopped") else 0,
+                1 if entry.get("is_error") else 0
             ))
 
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            ChatLogDB._ensure_chat_schema(conn)
             if thread_id:
-                cursor.execute('''
+                if not user_ref:
+                    raise ValueError("需要登录才能写入指定会话")
+                clause, params = ChatLogDB._owner_clause(user_ref)
+                cursor.execute(f'''
                     UPDATE chat_threads
                     SET updated_at = CURRENT_TIMESTAMP,
-                        last_message_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (thread_id,))
-                if role == 'user':
-                    preview = ChatLogDB._normalize_preview(content)
-                    if preview:
-                        cursor.execute('''
-                            UPDATE chat_threads
-                            SET first_message_preview = CASE
-                                WHEN first_message_preview IS NULL OR TRIM(first_message_preview) = '' THEN ?
-                                ELSE first_message_preview
-                            END
-                            WHERE id = ?
-                        ''', (preview, thread_id))
+                        last_message_at = CURRENT_TIMESTAMP,
+                        first_message_preview = CASE
+                            WHEN ? IS NOT NULL AND (first_message_preview IS NULL OR TRIM(first_message_preview) = '') THEN ?
+                            ELSE first_message_preview
+                        END
+                    WHERE id = ? AND {clause}
+                ''', (preview, preview, thread_id, *params))
+                if cursor.rowcount == 0:
+                    raise ValueError("会话不存在或无权限访问")
+                ChatUserSummaryDB.touch_thread(cursor, thread_id, student_id)
+
+            cursor.executemany('''
+                INSERT INTO chat_logs (student_id, user_id, thread_id, tool_call_id, role, content, thinking_content, thinking_duration, is_thinking_stopped, is_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
             conn.commit()
 
     @staticmethod
@@ -354,6 +350,8 @@ def cleanup_old_chat_logs():
         deleted_threads = cursor.rowcount or 0
 
         conn.commit()
+        if deleted_threads:
+            ChatUserSummaryDB.rebuild(conn)
         logger.info("Chat cleanup removed %s expired logs and %s expired threads", deleted_logs, deleted_threads)
         return {
             "deleted_logs": deleted_logs,
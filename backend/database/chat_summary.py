@@ -0,0 +1,198 @@
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import logger
+from .connection import get_db_connection
+
+# 按用户汇总的聊天目录行：会话数、最近聊天时间与配送资料中的地址/楼栋，供聊天审计列表分页与搜索
+_SUMMARY_COLUMNS = (
+    'student_id, user_id, display_name, address_id, building_id, thread_count, last_chat_at, updated_at'
+)
+
+# 会话按 user_id 或 student_id 归属用户（与 ChatLogDB._owner_clause 一致），两个条件各走一个索引；
+# 配送资料优先按 user_id 关联，旧记录退回 student_id
+_SUMMARY_SELECT = '''
+    SELECT u.id,
+           u.user_id,
+           COALESCE(NULLIF(TRIM(u.name), ''), NULLIF(TRIM(up.name), ''), u.id),
+           up.address_id,
+           up.building_id,
+           (SELECT COUNT(*) FROM chat_threads ct
+             WHERE ct.user_id = u.user_id OR ct.student_id = u.id),
+           COALESCE(
+               (SELECT MAX(COALESCE(ct.last_message_at, ct.created_at)) FROM chat_threads ct
+                 WHERE ct.user_id = u.user_id OR ct.student_id = u.id),
+               ''
+           ),
+           CURRENT_TIMESTAMP
+    FROM users u
+    LEFT JOIN user_profiles up ON up.rowid = COALESCE(
+        (SELECT rowid FROM user_profiles WHERE user_id = u.user_id),
+        (SELECT rowid FROM user_profiles WHERE student_id = u.id AND user_id IS NULL)
+    )
+    WHERE EXISTS (
+        SELECT 1 FROM chat_threads ct WHERE ct.user_id = u.user_id OR ct.student_id = u.id
+    ) {users}
+'''
+
+# 游标格式：'<last_chat_at>|<student_id>'，时间字符串中不含分隔符
+_CURSOR_SEPARATOR = '|'
+
+
+def _prefix_bounds(prefix: str, fold_ascii: bool = False) -> Tuple[str, str]:
+    """前缀匹配换算为可走索引的半开区间 [prefix, upper)；fold_ascii 对应 NOCASE 列，只折叠 ASCII 大写。"""
+    if fold_ascii:
+        prefix = ''.join(ch.lower() if 'A' <= ch <= 'Z' else ch for ch in prefix)
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _decode_cursor(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not value or _CURSOR_SEPARATOR not in value:
+        return None
+    last_chat_at, student_id = value.split(_CURSOR_SEPARATOR, 1)
+    return (last_chat_at, student_id) if student_id else None
+
+
+class ChatUserSummaryDB:
+    """聊天审计用户目录：每位有会话的用户一行，随会话写入与资料修改同步维护。"""
+
+    @staticmethod
+    def refresh_users(cursor: sqlite3.Cursor, student_ids: Iterable[Optional[str]]) -> None:
+        """在调用方事务中按原始会话与资料重算指定用户的汇总行（没有会话的用户被移除）。"""
+        ids = [sid for sid in dict.fromkeys(student_ids) if sid]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'DELETE FROM chat_user_summary WHERE student_id IN ({placeholders})', chunk)
+            cursor.execute(
+                f'INSERT INTO chat_user_summary ({_SUMMARY_COLUMNS}) '
+                + _SUMMARY_SELECT.format(users=f'AND u.id IN ({placeholders})'),
+                chunk,
+            )
+
+    @staticmethod
+    def touch_thread(cursor: sqlite3.Cursor, thread_id: str, student_id: Optional[str]) -> None:
+        """会话写入新消息后，把该会话的最近活跃时间同步为用户的最近聊天时间；汇总行缺失时补建。"""
+        if not student_id:
+            return
+        cursor.execute(
+            '''
+            UPDATE chat_user_summary
+            SET last_chat_at = MAX(last_chat_at, COALESCE(
+                    (SELECT last_message_at FROM chat_threads WHERE id = ?), last_chat_at)),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE student_id = ?
+            ''',
+            (thread_id, student_id),
+        )
+        if cursor.rowcount == 0:
+            ChatUserSummaryDB.refresh_users(cursor, [student_id])
+
+    @staticmethod
+    def rebuild(conn: Optional[sqlite3.Connection] = None) -> int:
+        """按全部会话重建汇总表，返回用户数。"""
+        if conn is None:
+            with get_db_connection() as own_conn:
+                return ChatUserSummaryDB.rebuild(own_conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('DELETE FROM chat_user_summary')
+            cursor.execute(f'INSERT INTO chat_user_summary ({_SUMMARY_COLUMNS}) ' + _SUMMARY_SELECT.format(users=''))
+            cursor.execute('SELECT COUNT(*) FROM chat_user_summary')
+            rows = cursor.fetchone()[0] or 0
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Chat user summary rebuilt: %s users", rows)
+        return rows
+
+    @staticmethod
+    def list_users(
+        keyword: str = '',
+        *,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 30,
+        address_ids: Optional[Sequence[str]] = None,
+        building_ids: Optional[Sequence[str]] = None,
+        restrict_scope: bool = False,
+        unassigned_address_ids: bool = False,
+    ) -> Dict[str, Any]:
+        """按最近聊天时间倒序列出用户。
+
+        keyword 按学号或显示名前缀匹配；传入 cursor（上一页的 next_cursor）时按键集翻页，否则退回 offset。
+        restrict_scope 为 True 时只返回地址或楼栋在给定范围内的用户；
+        unassigned_address_ids 为 True 时额外返回本页用户中未分配给任何代理的地址 ID。
+        """
+        filters: List[str] = []
+        params: List[Any] = []
+
+        keyword = (keyword or '').strip()
+        if keyword:
+            id_low, id_high = _prefix_bounds(keyword)
+            name_low, name_high = _prefix_bounds(keyword, fold_ascii=True)
+            filters.append(
+                '((s.student_id >= ? AND s.student_id < ?) OR (s.display_name >= ? AND s.display_name < ?))'
+            )
+            params.extend([id_low, id_high, name_low, name_high])
+
+        if restrict_scope:
+            coverage: List[str] = []
+            address_ids = [aid for aid in (address_ids or []) if aid]
+            building_ids = [bid for bid in (building_ids or []) if bid]
+            if address_ids:
+                coverage.append(f"s.address_id IN ({','.join('?' * len(address_ids))})")
+                params.extend(address_ids)
+            if building_ids:
+                coverage.append(f"s.building_id IN ({','.join('?' * len(building_ids))})")
+                params.extend(building_ids)
+            if not coverage:
+                return {'users': [], 'total': 0, 'next_cursor': None, 'unassigned_address_ids': []}
+            filters.append('(' + ' OR '.join(coverage) + ')')
+
+        where_clause = ' AND '.join(filters) if filters else '1=1'
+        page_filters = where_clause
+        page_params = list(params)
+        position = _decode_cursor(cursor)
+        if position:
+            page_filters += ' AND (s.last_chat_at, s.student_id) < (?, ?)'
+            page_params.extend(position)
+            offset = 0
+
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f'SELECT COUNT(*) FROM chat_user_summary s WHERE {where_clause}', params)
+            total = cur.fetchone()[0] or 0
+
+            cur.execute(
+                f'''
+                SELECT s.student_id, s.display_name, s.thread_count, s.address_id, s.last_chat_at,
+                       a.name AS address_name
+                FROM chat_user_summary s
+                LEFT JOIN addresses a ON a.id = s.address_id
+                WHERE {page_filters}
+                ORDER BY s.last_chat_at DESC, s.student_id DESC
+                LIMIT ? OFFSET ?
+                ''',
+                (*page_params, limit, max(0, offset)),
+            )
+            users = [dict(row) for row in cur.fetchall()]
+
+            unassigned: List[str] = []
+            page_addresses = list(dict.fromkeys(u['address_id'] for u in users if u.get('address_id')))
+            if unassigned_address_ids and page_addresses:
+                placeholders = ','.join('?' * len(page_addresses))
+                cur.execute(
+                    f'SELECT DISTINCT address_id FROM agent_buildings WHERE address_id IN ({placeholders})',
+                    page_addresses,
+                )
+                agent_managed = {row[0] for row in cur.fetchall()}
+                unassigned = [aid for aid in page_addresses if aid not in agent_managed]
+
+        next_cursor = None
+        if len(users) == limit:
+            next_cursor = f"{users[-1]['last_chat_at']}{_CURSOR_SEPARATOR}{users[-1]['student_id']}"
+        for user in users:
+            user['last_chat_at'] = user['last_chat_at'] or None
+        return {'users': users, 'total': total, 'next_cursor': next_cursor, 'unassigned_address_ids': unassigned}
@@ -1,15 +1,232 @@
+import os
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from typing import Any, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-from .config import DB_PATH, logger
+from .config import DB_PATH, logger, settings
+
+
+def create_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """新建一个已应用 WAL 等性能参数的 SQLite 连接（不经过连接池）。"""
+    busy_timeout_ms = settings.db_busy_timeout_ms
+    conn = sqlite3.connect(
+        db_path or DB_PATH,
+        timeout=busy_timeout_ms / 1000.0,
+        check_same_thread=False,
+        cached_statements=settings.db_statement_cache_size,
+    )
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        conn.execute(f'PRAGMA mmap_size={int(settings.db_mmap_size)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+    except sqlite3.DatabaseError as exc:
+        logger.warning("Failed to apply SQLite connection pragmas: %s", exc)
+    return conn
+
+
+class ConnectionPool:
+    """进程内的 SQLite 连接池。
+
+    空闲连接按 LIFO 复用，每个连接保留自己的预编译语句缓存；池满时最多等待
+    ``timeout`` 秒，超时后临时新建一个用完即关的溢出连接，避免嵌套取连接时死锁。
+    """
+
+    def __init__(self, db_path: str, max_size: int, timeout: float):
+        self.db_path = db_path
+        self.max_size = max(1, int(max_size))
+        self.timeout = max(0.0, float(timeout))
+        self._cond = threading.Condition(threading.Lock())
+        self._idle: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+        self._opened = 0
+        self._in_use = 0
+        self._overflow_in_use = 0
+        self._closed = False
+        self._stats: Dict[str, float] = {
+            "acquired": 0,
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "overflows": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "discarded": 0,
+        }
+
+    def _reset_after_fork(self) -> None:
+        # 子进程不能复用父进程打开的连接，直接丢弃引用即可
+        self._idle = []
+        self._opened = 0
+        self._in_use = 0
+        self._overflow_in_use = 0
+        self._pid = os.getpid()
+
+    def acquire(self) -> Tuple[sqlite3.Connection, bool]:
+        """取出一个连接，返回 (连接, 是否归属连接池)。"""
+        create_pooled = False
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+            self._stats["acquired"] += 1
+            if self._idle:
+                self._stats["hits"] += 1
+                self._in_use += 1
+                return self._idle.pop(), True
+            if self._opened < self.max_size:
+                self._opened += 1
+                self._in_use += 1
+                self._stats["misses"] += 1
+                create_pooled = True
+            else:
+                self._stats["waits"] += 1
+                started = time.perf_counter()
+                deadline = started + self.timeout
+                while not self._idle:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                waited_ms = (time.perf_counter() - started) * 1000.0
+                self._stats["wait_ms_total"] += waited_ms
+                if waited_ms > self._stats["wait_ms_max"]:
+                    self._stats["wait_ms_max"] = waited_ms
+                if self._idle:
+                    self._stats["hits"] += 1
+                    self._in_use += 1
+                    return self._idle.pop(), True
+                self._stats["overflows"] += 1
+                self._overflow_in_use += 1
+
+        if create_pooled:
+            try:
+                return create_connection(self.db_path), True
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        logger.warning(
+            "SQLite connection pool exhausted after %.0fms (size=%s); opening overflow connection",
+            self.timeout * 1000.0,
+            self.max_size,
+        )
+        try:
+            return create_connection(self.db_path), False
+        except Exception:
+            with self._cond:
+                self._overflow_in_use -= 1
+            raise
+
+    def release(self, conn: sqlite3.Connection, pooled: bool) -> None:
+        """归还连接；未提交的事务会被回滚，保持与“用完即关”一致的语义。"""
+        reusable = pooled
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as exc:
+            logger.warning("Discarding SQLite connection after reset failure: %s", exc)
+            reusable = False
+
+        with self._cond:
+            if not pooled:
+                self._overflow_in_use -= 1
+            elif self._pid != os.getpid():
+                reusable = False
+            else:
+                self._in_use -= 1
+                if reusable and not self._closed:
+                    self._idle.append(conn)
+                    self._cond.notify()
+                    return
+                self._opened -= 1
+                self._stats["discarded"] += 1
+                self._cond.notify()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self) -> int:
+        """关闭全部空闲连接，正在使用的连接会在归还时关闭。"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._closed = True
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            acquired = int(self._stats["acquired"])
+            hits = int(self._stats["hits"])
+            waits = int(self._stats["waits"])
+            return {
+                "max_size": self.max_size,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "overflow_in_use": self._overflow_in_use,
+                "acquired": acquired,
+                "hits": hits,
+                "misses": int(self._stats["misses"]),
+                "hit_rate": round(hits / acquired, 4) if acquired else 0.0,
+                "waits": waits,
+                "overflows": int(self._stats["overflows"]),
+                "discarded": int(self._stats["discarded"]),
+                "wait_ms_total": round(self._stats["wait_ms_total"], 3),
+                "wait_ms_avg": round(self._stats["wait_ms_total"] / waits, 3) if waits else 0.0,
+                "wait_ms_max": round(self._stats["wait_ms_max"], 3),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    """获取（必要时创建）当前进程的连接池。"""
+    global _pool
+    pool = _pool
+    if pool is not None:
+        return pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DB_PATH, settings.db_pool_size, settings.db_pool_timeout)
+        return _pool
+
+
+def close_all_connections() -> int:
+    """关闭并丢弃当前连接池，下次取连接时会重新建立。"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return 0
+    return pool.close_all()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """返回连接池命中/等待等运行指标。"""
+    return get_connection_pool().stats()
 
 
 @contextmanager
 def get_db_connection():
     """获取数据库连接的上下文管理器。"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    pool = get_connection_pool()
+    conn, pooled = pool.acquire()
     try:
         yield conn
     except Exception as exc:
@@ -17,12 +234,14 @@ def get_db_connection():
         logger.error("Database operation failed: %s", exc)
         raise
     finally:
-        conn.close()
+        pool.release(conn, pooled)
 
 
 def safe_execute_with_migration(conn, sql: str, params: Tuple[Any, ...] = (), table_name: Optional[str] = None):
     """
     安全执行SQL，如果遇到列不存在的错误，会尝试自动迁移后重新执行。
+
+    启动迁移已登记结构版本时不再在请求中执行迁移，直接抛出原错误。
     """
     cursor = conn.cursor()
     try:
@@ -31,10 +250,13 @@ def safe_execute_with_migration(conn, sql: str, params: Tuple[Any, ...] = (), ta
     except sqlite3.OperationalError as exc:
         error_msg = str(exc).lower()
         if 'no such column' in error_msg or 'has no column named' in error_msg:
+            from .migrations import auto_migrate_database, schema_is_current
+
+            if schema_is_current(conn):
+                logger.error("Missing-column error on a current schema: %s", exc)
+                raise exc
             logger.warning("Detected missing-column error: %s", exc)
             try:
-                from .migrations import auto_migrate_database
-
                 auto_migrate_database(conn)
                 cursor.execute(sql, params)
                 logger.info("SQL retried successfully after auto-migration")
@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .config import settings
+
+
+class DBExecutor:
+    """专用于阻塞型数据库调用的有界线程池，线程数与连接池大小一致。"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "queue_ms_total": 0.0,
+            "queue_ms_max": 0.0,
+            "run_ms_total": 0.0,
+            "run_ms_max": 0.0,
+        }
+
+    def _invoke(self, submitted_at: float, ctx: contextvars.Context, func: Callable[..., Any], args, kwargs) -> Any:
+        started = time.perf_counter()
+        queue_ms = (started - submitted_at) * 1000.0
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._stats["queue_ms_total"] += queue_ms
+            if queue_ms > self._stats["queue_ms_max"]:
+                self._stats["queue_ms_max"] = queue_ms
+        failed = False
+        try:
+            return ctx.run(func, *args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            run_ms = (time.perf_counter() - started) * 1000.0
+            with self._lock:
+                self._running -= 1
+                self._stats["failed" if failed else "completed"] += 1
+                self._stats["run_ms_total"] += run_ms
+                if run_ms > self._stats["run_ms_max"]:
+                    self._stats["run_ms_max"] = run_ms
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在数据库线程池中执行同步函数并等待结果。"""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        with self._lock:
+            self._queued += 1
+            self._stats["submitted"] += 1
+            depth = self._queued
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        submitted_at = time.perf_counter()
+        try:
+            future = loop.run_in_executor(self._executor, self._invoke, submitted_at, ctx, func, args, kwargs)
+        except RuntimeError:
+            with self._lock:
+                self._queued -= 1
+            raise
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = int(self._stats["completed"] + self._stats["failed"])
+            started = finished + self._running
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "saturation": round((self._running + self._queued) / self.max_workers, 3),
+                "submitted": int(self._stats["submitted"]),
+                "completed": int(self._stats["completed"]),
+                "failed": int(self._stats["failed"]),
+                "max_queue_depth": int(self._stats["max_queue_depth"]),
+                "queue_ms_avg": round(self._stats["queue_ms_total"] / started, 3) if started else 0.0,
+                "queue_ms_max": round(self._stats["queue_ms_max"], 3),
+                "run_ms_avg": round(self._stats["run_ms_total"] / finished, 3) if finished else 0.0,
+                "run_ms_max": round(self._stats["run_ms_max"], 3),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_executor: Optional[DBExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> DBExecutor:
+    """获取（必要时创建）当前进程的数据库线程池。"""
+    global _executor
+    executor = _executor
+    if executor is not None:
+        return executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DBExecutor(settings.db_pool_size)
+        return _executor
+
+
+def shutdown_db_executor(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def get_executor_stats() -> Dict[str, Any]:
+    """返回数据库线程池的排队深度与耗时指标。"""
+    return get_db_executor().stats()
+
+
+async def run_in_db_executor(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """将阻塞的数据库调用移出事件循环执行。"""
+    return await get_db_executor().run(func, *args, **kwargs)
+
+
+def offload_db(func: Callable[..., Any]) -> Callable[..., Any]:
+    """把同步路由处理函数包装为在数据库线程池中执行的协程。
+
+    保留原函数签名，FastAPI 仍按原参数解析依赖。
+    """
+    if inspect.iscoroutinefunction(func):
+        raise TypeError(f"{func.__qualname__} is already a coroutine function")
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_in_db_executor(func, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncDBProxy:
+    """数据库包的异步外观：``await aio.OrderDB.get_order_by_id(order_id)``。
+
+    类属性会继续被包装，可调用对象返回在数据库线程池中执行的协程，其余属性原样返回。
+    """
+
+    __slots__ = ("_target",)
+
+    def __init__(self, target: Any):
+        self._target = target
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if inspect.isclass(attr):
+            return AsyncDBProxy(attr)
+        if callable(attr):
+            @functools.wraps(attr)
+            async def call(*args: Any, **kwargs: Any) -> Any:
+                return await run_in_db_executor(attr, *args, **kwargs)
+
+            return call
+        return attr
+
+    def __repr__(self) -> str:
+        return f"AsyncDBProxy({self._target!r})"
+
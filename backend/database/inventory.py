@@ -0,0 +1,154 @@
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from .config import logger
+
+# 库存目标：('product' | 'variant', 商品或规格 ID) -> {'quantity', 'label', 'optional_missing'}
+InventoryTargets = Dict[Tuple[str, str], Dict[str, Any]]
+# 一次库存变动：(目标类型, 目标 ID, 数量)
+InventoryChange = Tuple[str, str, int]
+
+_TABLES = (('variant', 'product_variants'), ('product', 'products'))
+
+
+def _changes(targets: InventoryTargets) -> List[InventoryChange]:
+    changes: List[InventoryChange] = []
+    for (target_type, target_id), meta in targets.items():
+        quantity = int(meta.get('quantity') or 0)
+        if quantity > 0:
+            changes.append((target_type, target_id, quantity))
+    return changes
+
+
+def _execute_batch(cursor: sqlite3.Cursor, changes: List[InventoryChange], *, restore: bool) -> int:
+    """每张表一次 executemany，返回实际更新的行数。扣减带 stock >= 数量 条件，不足的行不会被修改。"""
+    if restore:
+        sql = 'UPDATE {table} SET stock = COALESCE(stock, 0) + ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?'
+    else:
+        sql = 'UPDATE {table} SET stock = stock - ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND stock >= ?'
+    updated = 0
+    for target_type, table in _TABLES:
+        params = [
+            (quantity, target_id) if restore else (quantity, target_id, quantity)
+            for kind, target_id, quantity in changes
+            if kind == target_type
+        ]
+        if params:
+            cursor.executemany(sql.format(table=table), params)
+            updated += cursor.rowcount
+    return updated
+
+
+def _load_stocks(cursor: sqlite3.Cursor, changes: List[InventoryChange]) -> Dict[Tuple[str, str], int]:
+    stocks: Dict[Tuple[str, str], int] = {}
+    for target_type, table in _TABLES:
+        target_ids = [target_id for kind, target_id, _quantity in changes if kind == target_type]
+        if not target_ids:
+            continue
+        placeholders = ','.join('?' * len(target_ids))
+        cursor.execute(f'SELECT id, stock FROM {table} WHERE id IN ({placeholders})', target_ids)
+        for row in cursor.fetchall():
+            try:
+                stocks[(target_type, row['id'])] = int(row['stock'] or 0)
+            except Exception:
+                stocks[(target_type, row['id'])] = 0
+    return stocks
+
+
+class InventoryDB:
+    """库存引擎：以条件 UPDATE 原子扣减/回补库存，不再先读库存再写回绝对值。"""
+
+    @staticmethod
+    def begin_immediate(conn: sqlite3.Connection) -> None:
+        """开启 BEGIN IMMEDIATE 事务（已在事务中时不重复开启），使读取订单状态到写入库存之间不被其他写入方插入。"""
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+
+    @staticmethod
+    def deduct(
+        cursor: sqlite3.Cursor,
+        order_id: str,
+        targets: InventoryTargets,
+    ) -> Tuple[List[str], List[InventoryChange]]:
+        """按订单扣减库存，全部成功或全部不扣。
+
+        先整批执行条件扣减；实际更新行数少于目标数时回滚到保存点，再查询库存逐项给出原因。
+        已删除的抽奖/赠品商品跳过后重试一次。返回 (缺货说明, 已扣减的变动)。
+        """
+        changes = _changes(targets)
+        if not changes:
+            return [], []
+        InventoryDB.begin_immediate(cursor.connection)
+
+        for _attempt in range(2):
+            cursor.execute('SAVEPOINT inventory_deduct')
+            if _execute_batch(cursor, changes, restore=False) == len(changes):
+                cursor.execute('RELEASE inventory_deduct')
+                return [], changes
+            cursor.execute('ROLLBACK TO inventory_deduct')
+            cursor.execute('RELEASE inventory_deduct')
+
+            stocks = _load_stocks(cursor, changes)
+            missing_items: List[str] = []
+            remaining: List[InventoryChange] = []
+            for target_type, target_id, quantity in changes:
+                meta = targets[(target_type, target_id)]
+                label = str(meta.get('label') or target_id)
+                key = (target_type, target_id)
+                if key not in stocks:
+                    if meta.get('optional_missing'):
+                        logger.info(
+                            "Order %s optional item missing, skip inventory deduct: %s (%s)",
+                            order_id,
+                            label,
+                            target_id,
+                        )
+                        continue
+                    missing_items.append(f"{label} 库存数据缺失")
+                elif stocks[key] < quantity:
+                    missing_items.append(f"{label} 库存不足(剩余 {stocks[key]}, 需要 {quantity})")
+                remaining.append((target_type, target_id, quantity))
+            if missing_items:
+                return list(dict.fromkeys(missing_items)), []
+            if not remaining:
+                return [], []
+            changes = remaining
+
+        # 调用方未持有写锁时库存可能在两次尝试之间被并发修改
+        logger.warning("Order %s inventory changed concurrently during deduct", order_id)
+        return ["库存已变化，请重试"], []
+
+    @staticmethod
+    def restore(
+        cursor: sqlite3.Cursor,
+        order_id: str,
+        targets: InventoryTargets,
+    ) -> Tuple[List[str], List[InventoryChange]]:
+        """按订单回补库存。已不存在的商品/规格无法回补：抽奖/赠品仅记录日志，其余返回缺失说明。"""
+        changes = _changes(targets)
+        if not changes:
+            return [], []
+        InventoryDB.begin_immediate(cursor.connection)
+
+        if _execute_batch(cursor, changes, restore=True) == len(changes):
+            return [], changes
+
+        stocks = _load_stocks(cursor, changes)
+        missing_items: List[str] = []
+        applied: List[InventoryChange] = []
+        for target_type, target_id, quantity in changes:
+            if (target_type, target_id) in stocks:
+                applied.append((target_type, target_id, quantity))
+                continue
+            meta = targets[(target_type, target_id)]
+            label = str(meta.get('label') or target_id)
+            if meta.get('optional_missing'):
+                logger.info(
+                    "Order %s optional item missing, skip inventory restore: %s (%s)",
+                    order_id,
+                    label,
+                    target_id,
+                )
+                continue
+            missing_items.append(f"{label} 库存数据缺失")
+        return list(dict.fromkeys(missing_items)), applied
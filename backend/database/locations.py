@@ -1,5 +1,6 @@
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
+from .cache import VersionedCache, bump_cache_version
 from .config import logger
 from .connection import get_db_connection
 
@@ -65,9 +66,10 @@ class AddressDB:
                     VALUES (?, ?, ?, ?)
                 ''', (address_id, name, 1 if enabled else 0, sort_order))
                 conn.commit()
-                return address_id
             except Exception:
                 return ""
+        bump_cache_version('locations')
+        return address_id
 
     @staticmethod
     def update_address(address_id: str, name: Optional[str] = None, enabled: Optional[bool] = None, sort_order: Optional[int] = None) -> bool:
@@ -93,9 +95,10 @@ class AddressDB:
                 cursor.execute(sql, values)
                 ok = cursor.rowcount > 0
                 conn.commit()
-                return ok
             except Exception:
                 return False
+        bump_cache_version('locations')
+        return ok
 
     @staticmethod
     def delete_address(address_id: str) -> bool:
@@ -107,11 +110,12 @@ class AddressDB:
                 cursor.execute('DELETE FROM addresses WHERE id = ?', (address_id,))
                 ok = cursor.rowcount > 0
                 conn.commit()
-                return ok
             except Exception as exc:
                 logger.error("Failed to delete address: %s", exc)
                 conn.rollback()
                 return False
+        bump_cache_version('locations')
+        return ok
 
     @staticmethod
     def reorder(address_ids: List[str]) -> bool:
@@ -124,11 +128,12 @@ class AddressDB:
                         (idx, aid)
                     )
                 conn.commit()
-                return True
             except Exception as exc:
                 logger.error("Failed to reorder addresses: %s", exc)
                 conn.rollback()
                 return False
+        bump_cache_version('locations')
+        return True
 
 
 class BuildingDB:
@@ -185,9 +190,10 @@ class BuildingDB:
                     VALUES (?, ?, ?, ?, ?)
                 ''', (building_id, address_id, name, 1 if enabled else 0, sort_order))
                 conn.commit()
-                return building_id
             except Exception:
                 return ""
+        bump_cache_version('locations')
+        return building_id
 
     @staticmethod
     def update_building(building_id: str, name: Optional[str] = None, enabled: Optional[bool] = None, sort_order: Optional[int] = None) -> bool:
@@ -213,9 +219,10 @@ class BuildingDB:
                 cursor.execute(sql, values)
                 ok = cursor.rowcount > 0
                 conn.commit()
-                return ok
             except Exception:
                 return False
+        bump_cache_version('locations')
+        return ok
 
     @staticmethod
     def delete_building(building_id: str) -> bool:
@@ -224,7 +231,8 @@ class BuildingDB:
             cursor.execute('DELETE FROM buildings WHERE id = ?', (building_id,))
             ok = cursor.rowcount > 0
             conn.commit()
-            return ok
+        bump_cache_version('locations')
+        return ok
 
     @staticmethod
     def reorder(address_id: str, building_ids: List[str]) -> bool:
@@ -237,8 +245,107 @@ class BuildingDB:
                         (idx, bid, address_id)
                     )
                 conn.commit()
-                return True
             except Exception as exc:
                 logger.error("Failed to reorder buildings: %s", exc)
                 conn.rollback()
                 return False
+        bump_cache_version('locations')
+        return True
+
+
+# 购物范围路由表：地址/楼栋状态、楼栋→代理、地址→代理及是否存在启用的管理员，
+# 整体加载一次，地址、楼栋、代理分配或账号变化后重建
+_routing_cache = VersionedCache(
+    'shopping_routes', depends_on=('locations', 'agent_assignments', 'admins'), copy_values=False
+)
+
+
+class ShoppingRouteDB:
+    """按地址/楼栋解析归属代理，所有查询都在内存路由表上完成。"""
+
+    @staticmethod
+    def _load_table() -> Dict[str, Any]:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM addresses')
+            addresses = {row['id']: dict(row) for row in cursor.fetchall()}
+            cursor.execute('SELECT * FROM buildings')
+            buildings = {row['id']: dict(row) for row in cursor.fetchall()}
+            cursor.execute('''
+                SELECT ab.agent_id, ab.address_id, ab.building_id, a.is_active, a.deleted_at
+                FROM agent_buildings ab
+                JOIN admins a ON a.agent_id = ab.agent_id
+                JOIN buildings b ON b.id = ab.building_id
+            ''')
+            building_agents: Dict[str, Dict[str, Any]] = {}
+            for row in cursor.fetchall():
+                try:
+                    inactive = int(row['is_active'] or 1) != 1
+                except Exception:
+                    inactive = False
+                if inactive or row['deleted_at']:
+                    continue
+                building_agents[row['building_id']] = {
+                    'agent_id': row['agent_id'],
+                    'address_id': row['address_id'],
+                }
+            cursor.execute('SELECT DISTINCT address_id, agent_id FROM agent_buildings')
+            address_agents: Dict[str, List[str]] = {}
+            for row in cursor.fetchall():
+                if row['address_id'] and row['agent_id']:
+                    address_agents.setdefault(row['address_id'], []).append(row['agent_id'])
+            cursor.execute("SELECT COUNT(*) FROM admins WHERE (role = 'super_admin' OR role = 'admin') AND is_active = 1")
+            has_active_admin = (cursor.fetchone()[0] or 0) > 0
+        return {
+            'addresses': addresses,
+            'buildings': buildings,
+            'building_agents': building_agents,
+            'address_agents': address_agents,
+            'has_active_admin': has_active_admin,
+        }
+
+    @staticmethod
+    def get_table() -> Dict[str, Any]:
+        """返回只读路由表，调用方不得修改。"""
+        return _routing_cache.get('all', ShoppingRouteDB._load_table)
+
+    @staticmethod
+    def get_address(address_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        row = ShoppingRouteDB.get_table()['addresses'].get(address_id) if address_id else None
+        return dict(row) if row else None
+
+    @staticmethod
+    def get_building(building_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        row = ShoppingRouteDB.get_table()['buildings'].get(building_id) if building_id else None
+        return dict(row) if row else None
+
+    @staticmethod
+    def resolve_owner(address_id: Optional[str], building_id: Optional[str]) -> Dict[str, Any]:
+        """确定归属代理与可见商品范围，返回 agent_id、address_id、building_id 与 owner_ids。
+
+        选择了楼栋时以楼栋分配的代理为准；只选择地址时，仅当该地址下恰好只有一个代理才归属该代理，
+        否则展示管理员商品（系统中没有启用的管理员时回退为 None）。
+        """
+        table = ShoppingRouteDB.get_table()
+        agent_id: Optional[str] = None
+        if building_id:
+            assignment = table['building_agents'].get(building_id)
+            if assignment:
+                agent_id = assignment['agent_id']
+                if not address_id:
+                    address_id = assignment['address_id']
+        elif address_id:
+            agents = table['address_agents'].get(address_id) or []
+            if len(agents) == 1:
+                agent_id = agents[0]
+
+        if agent_id:
+            owner_ids = [agent_id]
+        else:
+            owner_ids = ['admin'] if table['has_active_admin'] else None
+        return {
+            'agent_id': agent_id,
+            'address_id': address_id,
+            'building_id': building_id,
+            'owner_ids': owner_ids,
+        }
@@ -13,9 +13,10 @@ from typing import Any, Dict, List, Optional, Set
 
 from PIL import Image, UnidentifiedImageError
 
+from .cache import VersionedCache, bump_cache_version
 from .config import logger, settings
 from .connection import get_db_connection
-from .security import hash_password, is_password_hashed
+from .security import hash_passwords, is_password_hashed
 
 
 def ensure_table_columns(conn, table_name: str, required_columns: Dict[str, str]) -> None:
@@ -381,10 +382,13 @@ def ensure_agent_id_schema(conn) -> Dict[str, str]:
 def ensure_admin_accounts(conn) -> None:
     """Ensure administrator accounts defined in configuration exist and stay active."""
     cursor = conn.cursor()
-    for account in settings.admin_accounts:
-        password = account.password
-        if settings.enable_password_hash and not is_password_hashed(password):
-            password = hash_password(password)
+    passwords = [account.password for account in settings.admin_accounts]
+    if settings.enable_password_hash:
+        # 多个账号的哈希在进程池中并行计算
+        pending = [index for index, password in enumerate(passwords) if not is_password_hashed(password)]
+        for index, hashed in zip(pending, hash_passwords([passwords[index] for index in pending])):
+            passwords[index] = hashed
+    for account, password in zip(settings.admin_accounts, passwords):
 
         cursor.execute(
             '''
@@ -656,6 +660,434 @@ def migrate_chat_threads(conn):
         logger.error("Chat migration failed: %s", exc)
 
 
+ORDER_ITEMS_BACKFILL_KEY = 'order_items_backfill_rowid'
+ORDER_ITEMS_BACKFILL_DONE = 'done'
+
+
+def backfill_order_items(conn, batch_size: int = 500) -> int:
+    """
+    把历史订单的 items JSON 分批展开到 order_items 表。
+
+    按 orders.rowid 递增处理，每批与进度游标（settings 表）在同一事务中提交，
+    中途中断后下次启动从上次位置继续；全部完成后记为 done，之后启动直接跳过。
+    新订单由 OrderDB.create_order / set_order_items 同步写入，与回填重叠时按订单整体重写。
+    """
+    from .orders import OrderDB
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT value FROM settings WHERE key = ?', (ORDER_ITEMS_BACKFILL_KEY,))
+        row = cursor.fetchone()
+    except sqlite3.OperationalError as exc:
+        logger.warning("Order items backfill skipped: %s", exc)
+        return 0
+    progress = row[0] if row else None
+    if progress == ORDER_ITEMS_BACKFILL_DONE:
+        return 0
+    try:
+        last_rowid = int(progress or 0)
+    except (TypeError, ValueError):
+        last_rowid = 0
+
+    migrated = 0
+    try:
+        while True:
+            cursor.execute(
+                'SELECT rowid, id, items FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for rowid, order_id, items_payload in rows:
+                try:
+                    items = json.loads(items_payload or '[]')
+                except (TypeError, ValueError):
+                    items = []
+                OrderDB._replace_order_items(cursor, order_id, items)
+                last_rowid = rowid
+            cursor.execute(
+                'INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value',
+                (ORDER_ITEMS_BACKFILL_KEY, str(last_rowid))
+            )
+            conn.commit()
+            migrated += len(rows)
+        cursor.execute(
+            'INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value',
+            (ORDER_ITEMS_BACKFILL_KEY, ORDER_ITEMS_BACKFILL_DONE)
+        )
+        conn.commit()
+    except Exception as exc:
+        conn.rollback()
+        logger.error("Order items backfill stopped at rowid %s: %s", last_rowid, exc)
+        return migrated
+
+    if migrated:
+        logger.info("Backfilled order_items for %s orders", migrated)
+    return migrated
+
+
+SALES_ROLLUP_VERSION_KEY = 'sales_rollup_version'
+SALES_ROLLUP_VERSION = '1'
+
+
+def ensure_sales_rollup(conn) -> bool:
+    """
+    首次启用（或汇总口径版本变化）时按全部订单重建 sales_rollup / sales_product_rollup。
+
+    之后由订单写入路径在同一事务中按小时桶增量维护；需要人工修复时可运行
+    scripts/rebuild_sales_rollup.py。依赖 order_items，需在其回填之后调用。
+    """
+    from .sales_rollup import SalesRollupDB
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT value FROM settings WHERE key = ?', (SALES_ROLLUP_VERSION_KEY,))
+        row = cursor.fetchone()
+        if row and row[0] == SALES_ROLLUP_VERSION:
+            return False
+        SalesRollupDB.rebuild(conn)
+        cursor.execute(
+            'INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value',
+            (SALES_ROLLUP_VERSION_KEY, SALES_ROLLUP_VERSION)
+        )
+        conn.commit()
+        return True
+    except Exception as exc:
+        conn.rollback()
+        logger.error("Failed to build sales rollup: %s", exc)
+        return False
+
+
+def ensure_product_search_index(conn) -> bool:
+    """
+    创建商品全文检索索引（FTS5 trigram 分词，支持中文子串），由触发器随 products 同步。
+
+    索引以 products 为外部内容表、按 rowid 关联，启动时整体重建一次以保证与商品表一致；
+    当前 SQLite 不支持 FTS5 时返回 False，搜索自动退回 LIKE 匹配。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, category, description,
+                content='products', content_rowid='rowid',
+                tokenize='trigram'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, name, category, description)
+                VALUES (new.rowid, new.name, new.category, new.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, category, description)
+                VALUES ('delete', old.rowid, old.name, old.category, old.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, category, description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, category, description)
+                VALUES ('delete', old.rowid, old.name, old.category, old.description);
+                INSERT INTO products_fts(rowid, name, category, description)
+                VALUES (new.rowid, new.name, new.category, new.description);
+            END
+        ''')
+        cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        logger.warning("FTS5 product search index unavailable, falling back to LIKE search: %s", exc)
+        return False
+
+
+def _order_search_values(ref: str) -> str:
+    """orders_fts 各列取值的 SQL：订单号、学号、用户ID，以及收货信息中的姓名、电话与地址。"""
+    def field(key: str) -> str:
+        return f"CASE WHEN json_valid({ref}.shipping_info) THEN json_extract({ref}.shipping_info, '$.{key}') END"
+
+    address = " || ' ' || ".join(
+        f"COALESCE({field(key)}, '')" for key in ('dormitory', 'building', 'room', 'full_address')
+    )
+    return (
+        f"{ref}.id, {ref}.student_id, CAST({ref}.user_id AS TEXT), "
+        f"{field('name')}, {field('phone')}, TRIM({address})"
+    )
+
+
+def ensure_order_search_index(conn) -> bool:
+    """
+    创建订单全文检索索引 orders_fts（FTS5 trigram 分词），供订单列表与导出的关键词搜索使用。
+
+    收货信息以 JSON 存储，索引列由触发器在订单写入、修改、删除时同步展开；
+    索引行数与订单数不一致时（首次启用或曾在不支持 FTS5 的环境中写入）整体重建。
+    当前 SQLite 不支持 FTS5 时返回 False，搜索退回 LIKE 匹配。
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+                order_id, student_id, user_id, name, phone, address,
+                tokenize='trigram'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS orders_fts_ai AFTER INSERT ON orders BEGIN
+                INSERT INTO orders_fts(rowid, order_id, student_id, user_id, name, phone, address)
+                SELECT new.rowid, {_order_search_values('new')};
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS orders_fts_ad AFTER DELETE ON orders BEGIN
+                DELETE FROM orders_fts WHERE rowid = old.rowid;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS orders_fts_au AFTER UPDATE OF id, student_id, user_id, shipping_info ON orders BEGIN
+                DELETE FROM orders_fts WHERE rowid = old.rowid;
+                INSERT INTO orders_fts(rowid, order_id, student_id, user_id, name, phone, address)
+                SELECT new.rowid, {_order_search_values('new')};
+            END
+        ''')
+        indexed = cursor.execute('SELECT COUNT(*) FROM orders_fts').fetchone()[0]
+        total = cursor.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+        if indexed != total:
+            cursor.execute('DELETE FROM orders_fts')
+            cursor.execute(f'''
+                INSERT INTO orders_fts(rowid, order_id, student_id, user_id, name, phone, address)
+                SELECT o.rowid, {_order_search_values('o')} FROM orders o
+            ''')
+            logger.info("Rebuilt order search index for %s orders", total)
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        conn.rollback()
+        logger.warning("FTS5 order search index unavailable, falling back to LIKE search: %s", exc)
+        return False
+
+
+# orders 上配合 created_at_ms 范围过滤的索引：(索引名, 前导列)，前导列为 None 时为单列索引
+ORDER_TIME_INDEXES = (
+    ('idx_orders_created_at_ms', None),
+    ('idx_orders_agent_created', 'agent_id'),
+    ('idx_orders_building_created', 'building_id'),
+    ('idx_orders_address_created', 'address_id'),
+    ('idx_orders_payment_created', 'payment_status'),
+    ('idx_orders_student_created', 'student_id'),
+)
+# 前导列相同、已被上面复合索引覆盖的旧单列索引
+_SUPERSEDED_ORDER_INDEXES = (
+    'idx_orders_agent',
+    'idx_orders_building',
+    'idx_orders_address',
+    'idx_orders_payment_status',
+    'idx_orders_student_id',
+)
+
+
+def ensure_order_time_index(conn) -> int:
+    """
+    为 orders 维护整数毫秒时间戳 created_at_ms 及其复合索引，返回本次回填的订单数。
+
+    对 created_at 套用 datetime() 的过滤无法使用索引，查询改为比较 created_at_ms 与参数换算出的常量。
+    新订单由触发器在插入（或修改 created_at）时写入，历史订单在此一次性回填。
+    """
+    from .orders import epoch_ms_sql
+
+    ensure_table_columns(conn, 'orders', {'created_at_ms': 'INTEGER'})
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS orders_created_at_ms_ai AFTER INSERT ON orders
+            WHEN new.created_at_ms IS NULL BEGIN
+                UPDATE orders SET created_at_ms = {epoch_ms_sql('new.created_at')} WHERE rowid = new.rowid;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS orders_created_at_ms_au AFTER UPDATE OF created_at ON orders BEGIN
+                UPDATE orders SET created_at_ms = {epoch_ms_sql('new.created_at')} WHERE rowid = new.rowid;
+            END
+        ''')
+        cursor.execute(
+            f"UPDATE orders SET created_at_ms = {epoch_ms_sql('created_at')} "
+            "WHERE created_at_ms IS NULL AND created_at IS NOT NULL"
+        )
+        backfilled = max(cursor.rowcount, 0)
+        for index_name, leading_column in ORDER_TIME_INDEXES:
+            columns = f'{leading_column}, created_at_ms' if leading_column else 'created_at_ms'
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON orders({columns})')
+        for index_name in _SUPERSEDED_ORDER_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+        conn.commit()
+    except sqlite3.OperationalError as exc:
+        conn.rollback()
+        logger.error("Failed to build order time index: %s", exc)
+        raise
+    if backfilled:
+        logger.info("Backfilled created_at_ms for %s orders", backfilled)
+    return backfilled
+
+
+def ensure_chat_user_summary(conn) -> int:
+    """
+    启动时按全部会话重建聊天审计用户目录 chat_user_summary，返回用户数。
+
+    运行期间由会话创建、消息写入与资料修改在同一事务中按用户增量维护；
+    启动迁移（旧聊天记录归档为会话、配送地址迁移等）不经过这些写路径，因此每次启动整体重建一次。
+    """
+    from .chat_summary import ChatUserSummaryDB
+
+    try:
+        return ChatUserSummaryDB.rebuild(conn)
+    except Exception as exc:
+        logger.error("Failed to build chat user summary: %s", exc)
+        return 0
+
+
+# 数据库结构版本（PRAGMA user_version）。init_database 完成全部建表与迁移后写入；
+# 新增表、列或索引时递增此值，运行时写路径据此跳过结构检查。
+SCHEMA_VERSION = 4
+
+_schema_current = False
+
+
+def get_schema_version(conn) -> int:
+    row = conn.execute('PRAGMA user_version').fetchone()
+    return int(row[0]) if row else 0
+
+
+def mark_schema_current(conn) -> None:
+    """在启动迁移成功后登记结构版本，之后本进程的读写路径不再执行 DDL。"""
+    global _schema_current
+    conn.execute(f'PRAGMA user_version = {int(SCHEMA_VERSION)}')
+    conn.commit()
+    _schema_current = True
+
+
+def schema_is_current(conn) -> bool:
+    """数据库结构是否已由 init_database 升级到当前版本（每个进程只读取一次版本号）。"""
+    global _schema_current
+    if _schema_current:
+        return True
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        _schema_current = True
+    return _schema_current
+
+
+def ensure_chat_schema(conn) -> None:
+    """确保用户聊天相关的表结构与索引存在。"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='chat_logs'")
+    table_exists = cursor.fetchone() is not None
+
+    if table_exists:
+        try:
+            ensure_table_columns(conn, 'chat_logs', {
+                'thread_id': 'TEXT',
+                'tool_call_id': 'TEXT',
+                'thinking_content': 'TEXT',
+                'thinking_duration': 'REAL',
+                'is_thinking_stopped': 'INTEGER DEFAULT 0',
+                'is_error': 'INTEGER DEFAULT 0'
+            })
+        except Exception as exc:
+            logger.warning("Failed to ensure chat_logs schema: %s", exc)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_threads (
+            id TEXT PRIMARY KEY,
+            student_id TEXT,
+            user_id INTEGER,
+            title TEXT,
+            first_message_preview TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_archived INTEGER DEFAULT 0,
+            metadata TEXT,
+            FOREIGN KEY (student_id) REFERENCES users (id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_user_id ON chat_threads(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_student_id ON chat_threads(student_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_threads_last_active ON chat_threads(last_message_at DESC)')
+
+    # 聊天审计用户目录，由 ChatUserSummaryDB 维护；显示名按 NOCASE 排序以支持不区分大小写的前缀搜索
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_user_summary (
+            student_id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            display_name TEXT COLLATE NOCASE,
+            address_id TEXT,
+            building_id TEXT,
+            thread_count INTEGER NOT NULL DEFAULT 0,
+            last_chat_at TEXT NOT NULL DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_user_summary_recent ON chat_user_summary(last_chat_at, student_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_user_summary_name ON chat_user_summary(display_name)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_chat_user_summary_address ON chat_user_summary(address_id, last_chat_at)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_chat_user_summary_building ON chat_user_summary(building_id, last_chat_at)'
+    )
+
+    if table_exists:
+        try:
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_logs_thread_id ON chat_logs(thread_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_logs_tool_call_id ON chat_logs(tool_call_id)')
+        except Exception as exc:
+            logger.warning("Failed to create chat_logs indexes: %s", exc)
+
+    conn.commit()
+
+
+def ensure_staff_chat_schema(conn) -> None:
+    """确保工作人员聊天相关的表结构存在。"""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS staff_chat_threads (
+            id TEXT PRIMARY KEY,
+            staff_account_id TEXT NOT NULL,
+            title TEXT,
+            first_message_preview TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_archived INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_threads_account ON staff_chat_threads(staff_account_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_threads_last ON staff_chat_threads(last_message_at DESC)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS staff_chat_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            staff_account_id TEXT NOT NULL,
+            thread_id TEXT,
+            tool_call_id TEXT,
+            role TEXT NOT NULL,
+            content TEXT,
+            thinking_content TEXT,
+            thinking_duration REAL,
+            is_thinking_stopped INTEGER DEFAULT 0,
+            is_error INTEGER DEFAULT 0,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_account ON staff_chat_logs(staff_account_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_thread ON staff_chat_logs(thread_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_tool_call ON staff_chat_logs(tool_call_id)')
+
+    conn.commit()
+
+
 def auto_migrate_database(conn) -> None:
     """
     自动迁移数据库结构，确保所有必需的列都存在。
@@ -764,9 +1196,6 @@ def auto_migrate_database(conn) -> None:
     cursor = conn.cursor()
     try:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_owner ON products(owner_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_agent ON orders(agent_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_address ON orders(address_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_building ON orders(building_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_profiles_address ON user_profiles(address_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_profiles_building ON user_profiles(building_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_profiles_agent ON user_profiles(agent_id)')
@@ -856,18 +1285,16 @@ def migrate_passwords_to_hash():
         cursor = conn.cursor()
         try:
             cursor.execute('SELECT id, password FROM users')
-            users = cursor.fetchall()
+            pending = [(row[0], row[1]) for row in cursor.fetchall() if row[1] and not is_password_hashed(row[1])]
             user_migrated_count = 0
-            for row in users:
-                user_id, password = row
-                if password and not is_password_hashed(password):
-                    try:
-                        hashed = hash_password(password)
-                        cursor.execute('UPDATE users SET password = ? WHERE id = ?', (hashed, user_id))
-                        user_migrated_count += 1
-                        logger.info("Migrated user password to hash format: %s", user_id)
-                    except Exception as exc:
-                        logger.error("Failed to migrate user password for %s: %s", user_id, exc)
+            hashed_list = hash_passwords([password for _, password in pending])
+            for (user_id, _), hashed in zip(pending, hashed_list):
+                try:
+                    cursor.execute('UPDATE users SET password = ? WHERE id = ?', (hashed, user_id))
+                    user_migrated_count += 1
+                    logger.info("Migrated user password to hash format: %s", user_id)
+                except Exception as exc:
+                    logger.error("Failed to migrate user password for %s: %s", user_id, exc)
 
             if user_migrated_count > 0:
                 conn.commit()
@@ -880,18 +1307,16 @@ def migrate_passwords_to_hash():
 
         try:
             cursor.execute('SELECT id, password FROM admins')
-            admins = cursor.fetchall()
+            pending = [(row[0], row[1]) for row in cursor.fetchall() if row[1] and not is_password_hashed(row[1])]
             admin_migrated_count = 0
-            for row in admins:
-                admin_id, password = row
-                if password and not is_password_hashed(password):
-                    try:
-                        hashed = hash_password(password)
-                        cursor.execute('UPDATE admins SET password = ? WHERE id = ?', (hashed, admin_id))
-                        admin_migrated_count += 1
-                        logger.info("Migrated admin/agent password to hash format: %s", admin_id)
-                    except Exception as exc:
-                        logger.error("Failed to migrate admin password for %s: %s", admin_id, exc)
+            hashed_list = hash_passwords([password for _, password in pending])
+            for (admin_id, _), hashed in zip(pending, hashed_list):
+                try:
+                    cursor.execute('UPDATE admins SET password = ? WHERE id = ?', (hashed, admin_id))
+                    admin_migrated_count += 1
+                    logger.info("Migrated admin/agent password to hash format: %s", admin_id)
+                except Exception as exc:
+                    logger.error("Failed to migrate admin password for %s: %s", admin_id, exc)
 
             if admin_migrated_count > 0:
                 conn.commit()
@@ -1139,6 +1564,8 @@ def migrate_payment_qr_paths(public_dir: str) -> None:
                 logger.warning("Payment QR migration failed id=%s path=%s error=%s", qr_id, old_image_path, exc)
 
         conn.commit()
+    if migrated_count:
+        bump_cache_version('payment_qrs')
 
     logger.info(
         "Payment QR migration completed: %s migrated, %s skipped, %s failed",
@@ -1296,6 +1723,10 @@ def migrate_image_paths(items_dir: str) -> None:
         except Exception as exc:
             logger.warning("Failed to clean empty category directories: %s", exc)
 
+    # 先归还连接再更新缓存版本，避免持有连接时再从连接池取连接
+    if migrated_count:
+        bump_cache_version('image_lookup')
+
     logger.info(
         "商品图片路径迁移完成: 成功 %s 个, 跳过 %s 个, 失败 %s 个",
         migrated_count, skipped_count, failed_count
@@ -1344,6 +1775,7 @@ def migrate_agent_image_paths(items_dir: str) -> None:
                 (f"items/{account_id}/", f"items/{agent_id}/", f"items/{account_id}/%"),
             )
         conn.commit()
+    bump_cache_version('image_lookup')
 
     items_root = os.path.normpath(items_dir)
     for account_id, agent_id in mapping.items():
@@ -1391,9 +1823,27 @@ def _cleanup_empty_category_dirs(items_dir: str) -> None:
                 pass
 
 
+_image_lookup_cache = VersionedCache('image_lookup', copy_values=False)
+
+
 class ImageLookupDB:
     """图片哈希查找表的数据库操作。"""
 
+    @staticmethod
+    def get_path_index() -> Dict[str, str]:
+        """哈希 → 物理路径的全量索引（进程内缓存，写入后失效）。哈希按内容计算，条目不会原地变化。"""
+        def load() -> Dict[str, str]:
+            with get_db_connection() as conn:
+                rows = conn.execute("SELECT hash, physical_path FROM image_lookup").fetchall()
+            return {row[0]: row[1] for row in rows if row[1]}
+
+        return _image_lookup_cache.get('paths', load)
+
+    @staticmethod
+    def get_physical_path(hash_value: str) -> Optional[str]:
+        """从内存索引中查找图片物理路径（相对 items 目录）。"""
+        return ImageLookupDB.get_path_index().get(hash_value)
+
     @staticmethod
     def get_by_hash(hash_value: str) -> Optional[Dict]:
         """根据哈希值查找图片物理路径。"""
@@ -1424,10 +1874,11 @@ class ImageLookupDB:
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
                 """, (hash_value, physical_path, product_id))
                 conn.commit()
-                return True
             except sqlite3.IntegrityError:
                 # 哈希冲突，记录已存在
                 return False
+        bump_cache_version('image_lookup')
+        return True
 
     @staticmethod
     def delete_by_hash(hash_value: str) -> bool:
@@ -1437,7 +1888,9 @@ class ImageLookupDB:
             cursor.execute("DELETE FROM image_lookup WHERE hash = ?", (hash_value,))
             deleted = cursor.rowcount > 0
             conn.commit()
-            return deleted
+        if deleted:
+            bump_cache_version('image_lookup')
+        return deleted
 
     @staticmethod
     def delete_by_product(product_id: str) -> int:
@@ -1447,4 +1900,6 @@ class ImageLookupDB:
             cursor.execute("DELETE FROM image_lookup WHERE product_id = ?", (product_id,))
             count = cursor.rowcount
             conn.commit()
-            return count
+        if count:
+            bump_cache_version('image_lookup')
+        return count
@@ -5,10 +5,34 @@ import uuid
 from datetime import datetime, timedelta, date
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+from .cache import bump_cache_version
 from .config import logger
 from .connection import get_db_connection
+from .inventory import InventoryDB
+from .products import _fts_phrase, _like_pattern
+from .sales_rollup import SalesRollupDB
 from .users import UserDB
 
+_EPOCH = datetime(1970, 1, 1)
+
+# 订单关键词搜索：trigram 分词至少需要 3 个字符，更短的关键词对索引列逐列 LIKE
+_ORDER_SEARCH_MIN_TERM_LENGTH = 3
+_ORDER_SEARCH_COLUMNS = ('order_id', 'student_id', 'user_id', 'name', 'phone', 'address')
+_order_search_ready = False
+
+
+def epoch_ms_sql(expr: str) -> str:
+    """把 SQLite 日期表达式换算为毫秒时间戳，与 orders.created_at_ms 的维护方式一致。
+
+    时间过滤一律比较 created_at_ms 与参数换算出的常量，以便走索引；对列套用 datetime() 则无法使用索引。
+    """
+    return f"CAST(ROUND((julianday({expr}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def _epoch_ms(value: datetime) -> int:
+    """UTC 朴素时间 → 毫秒时间戳。"""
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
 
 class OrderDB:
     @staticmethod
@@ -66,6 +90,44 @@ class OrderDB:
         connector = ' OR '
         return '(' + connector.join(clauses) + ')', params
 
+    @staticmethod
+    def _order_search_available(cursor: sqlite3.Cursor) -> bool:
+        """orders_fts 是否已由启动迁移创建（存在后本进程不再检查）。"""
+        global _order_search_ready
+        if not _order_search_ready:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_fts'")
+            _order_search_ready = cursor.fetchone() is not None
+        return _order_search_ready
+
+    @staticmethod
+    def _build_keyword_filter(keyword: str, cursor: sqlite3.Cursor) -> Tuple[str, List[Any]]:
+        """订单关键词条件：订单号、学号、用户ID、收货人姓名/电话/地址走 orders_fts，顾客昵称查 users 表。
+
+        cursor 为调用方的游标，仅在本进程尚未确认 orders_fts 存在时用于检查。
+        """
+        pattern = _like_pattern(keyword)
+        customer_clause = "o.student_id IN (SELECT id FROM users WHERE name LIKE ? ESCAPE '\\')"
+        if not OrderDB._order_search_available(cursor):
+            return (
+                "("
+                "o.id LIKE ? ESCAPE '\\' OR "
+                "CAST(o.user_id AS TEXT) LIKE ? ESCAPE '\\' OR "
+                "o.student_id LIKE ? ESCAPE '\\' OR "
+                "o.shipping_info LIKE ? ESCAPE '\\' OR "
+                f"{customer_clause}"
+                ")"
+            ), [pattern, pattern, pattern, pattern, pattern]
+        if len(keyword) >= _ORDER_SEARCH_MIN_TERM_LENGTH:
+            return (
+                f"(o.rowid IN (SELECT rowid FROM orders_fts WHERE orders_fts MATCH ?) OR {customer_clause})",
+                [_fts_phrase(keyword), pattern],
+            )
+        column_clause = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in _ORDER_SEARCH_COLUMNS)
+        return (
+            f"(o.rowid IN (SELECT rowid FROM orders_fts WHERE {column_clause}) OR {customer_clause})",
+            [pattern] * len(_ORDER_SEARCH_COLUMNS) + [pattern],
+        )
+
     @staticmethod
     def _resolve_user_identifier(user_identifier: Union[str, int]) -> Optional[Dict[str, Any]]:
         if isinstance(user_identifier, int):
@@ -144,6 +206,7 @@ class OrderDB:
                 1 if is_reservation else 0,
                 reservation_reason
             ))
+            OrderDB._replace_order_items(cursor, order_id, items)
             conn.commit()
             return order_id
 
@@ -160,8 +223,12 @@ class OrderDB:
                 SET items = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (payload, order_id))
+            updated = cursor.rowcount > 0
+            if updated:
+                OrderDB._replace_order_items(cursor, order_id, json.loads(payload))
+                SalesRollupDB.refresh_orders(cursor, [order_id])
             conn.commit()
-            return cursor.rowcount > 0
+            return updated
 
     @staticmethod
     def update_payment_status(order_id: str, payment_status: str, payment_intent_id: str = None) -> bool:
@@ -179,8 +246,11 @@ class OrderDB:
                     SET payment_status = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (payment_status, order_id))
+            updated = cursor.rowcount > 0
+            if updated:
+                SalesRollupDB.refresh_orders(cursor, [order_id])
             conn.commit()
-            return cursor.rowcount > 0
+            return updated
 
     @staticmethod
     def _format_item_label(base_name: str, variant_name: Optional[str] = None) -> str:
@@ -212,6 +282,86 @@ class OrderDB:
             or '赠品' in str(item.get('category', ''))
         )
 
+    @staticmethod
+    def _build_order_item_rows(order_id: str, items: Any) -> List[Tuple[Any, ...]]:
+        """把订单明细展开为 order_items 行；非字典条目跳过，行号保留其在原列表中的位置。"""
+        def _to_float(value: Any) -> Optional[float]:
+            try:
+                return float(value) if value is not None and value != '' else None
+            except (TypeError, ValueError):
+                return None
+
+        def _to_int(value: Any) -> int:
+            try:
+                return int(value or 0)
+            except (TypeError, ValueError):
+                number = _to_float(value)
+                return int(number) if number is not None else 0
+
+        rows: List[Tuple[Any, ...]] = []
+        if not isinstance(items, list):
+            return rows
+        for line_no, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            is_lottery = bool(item.get('is_lottery'))
+            product_id = item.get('product_id')
+            variant_id = item.get('variant_id')
+            # 库存目标与 _aggregate_inventory_items 的解析规则一致
+            stock_product_id = product_id
+            stock_variant_id = variant_id
+            if is_lottery:
+                stock_product_id = item.get('lottery_product_id') or product_id
+                stock_variant_id = item.get('lottery_variant_id') or variant_id
+            item_name = (
+                item.get('name')
+                or item.get('lottery_product_name')
+                or item.get('auto_gift_product_name')
+                or str(stock_product_id)
+            )
+            label_variant = (
+                item.get('variant_name')
+                or item.get('lottery_variant_name')
+                or item.get('auto_gift_variant_name')
+            )
+            rows.append((
+                order_id,
+                line_no,
+                str(product_id) if product_id is not None else None,
+                str(variant_id) if variant_id else None,
+                item.get('name'),
+                item.get('variant_name'),
+                _to_int(item.get('quantity')),
+                _to_float(item.get('price')),
+                _to_float(item.get('subtotal')),
+                1 if is_lottery else 0,
+                1 if item.get('is_auto_gift') else 0,
+                1 if OrderDB._is_gift_item(item) else 0,
+                1 if OrderDB._is_non_sellable_item(item) else 0,
+                _to_float(item.get('lottery_unit_price')),
+                str(stock_product_id) if stock_product_id else None,
+                str(stock_variant_id) if stock_variant_id else None,
+                OrderDB._format_item_label(item_name, label_variant if stock_variant_id else None),
+            ))
+        return rows
+
+    @staticmethod
+    def _replace_order_items(cursor: sqlite3.Cursor, order_id: str, items: Any) -> None:
+        """在调用方事务中重写订单的规范化明细。"""
+        cursor.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
+        rows = OrderDB._build_order_item_rows(order_id, items)
+        if rows:
+            cursor.executemany(
+                '''
+                INSERT INTO order_items (
+                    order_id, line_no, product_id, variant_id, name, variant_name, quantity,
+                    unit_price, subtotal, is_lottery, is_auto_gift, is_gift, is_non_sellable,
+                    lottery_unit_price, stock_product_id, stock_variant_id, stock_label
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                rows,
+            )
+
     @staticmethod
     def _compute_unified_status(payment_status: Optional[str], order_status: Optional[str]) -> str:
         ps = str(payment_status or '').strip()
@@ -242,13 +392,7 @@ class OrderDB:
         )
 
     @staticmethod
-    def _collect_inventory_adjustments(
-        cursor: sqlite3.Cursor,
-        order_id: str,
-        items: List[Any],
-        *,
-        restore: bool = False
-    ) -> Tuple[List[str], List[Tuple[str, str, int]]]:
+    def _aggregate_inventory_items(order_id: str, items: List[Any]) -> Dict[Tuple[str, str], Dict[str, Any]]:
         aggregated: Dict[Tuple[str, str], Dict[str, Any]] = {}
 
         for raw_item in (items or []):
@@ -310,67 +454,57 @@ class OrderDB:
             if not (is_lottery_item or is_gift_item):
                 entry['optional_missing'] = False
 
-        missing_items: List[str] = []
-        adjustments: List[Tuple[str, str, int]] = []
+        return aggregated
 
-        for (target_type, target_id), meta in aggregated.items():
-            quantity = int(meta.get('quantity') or 0)
-            if quantity <= 0:
-                continue
-
-            optional_missing = bool(meta.get('optional_missing'))
-            label = str(meta.get('label') or target_id)
-
-            if target_type == 'variant':
-                cursor.execute('SELECT stock FROM product_variants WHERE id = ?', (target_id,))
-            else:
-                cursor.execute('SELECT stock FROM products WHERE id = ?', (target_id,))
-            row = cursor.fetchone()
-
-            if not row:
-                if optional_missing:
-                    action_name = 'restore' if restore else 'deduct'
-                    logger.info(
-                        "Order %s optional item missing, skip inventory %s: %s (%s)",
-                        order_id,
-                        action_name,
-                        label,
-                        target_id,
-                    )
-                    continue
-                missing_items.append(f"{label} 库存数据缺失")
-                continue
+    @staticmethod
+    def _load_inventory_targets(cursor: sqlite3.Cursor, order_id: str) -> Optional[Dict[Tuple[str, str], Dict[str, Any]]]:
+        """从 order_items 按库存目标聚合订单数量；订单尚无规范化明细时返回 None。"""
+        cursor.execute('SELECT 1 FROM order_items WHERE order_id = ? LIMIT 1', (order_id,))
+        if cursor.fetchone() is None:
+            return None
+        # MIN(line_no) 使裸列 stock_label 取自该目标的第一条明细，与逐条聚合时的标签一致
+        cursor.execute('''
+            SELECT
+                CASE WHEN stock_variant_id IS NOT NULL THEN 'variant' ELSE 'product' END AS target_type,
+                COALESCE(stock_variant_id, stock_product_id) AS target_id,
+                SUM(quantity) AS quantity,
+                SUM(CASE WHEN is_lottery = 1 OR is_gift = 1 THEN 0 ELSE 1 END) = 0 AS optional_missing,
+                MIN(line_no) AS first_line,
+                stock_label
+            FROM order_items
+            WHERE order_id = ?
+              AND is_non_sellable = 0
+              AND quantity > 0
+              AND stock_product_id IS NOT NULL
+            GROUP BY target_type, target_id
+            ORDER BY first_line
+        ''', (order_id,))
+        aggregated: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in cursor.fetchall():
+            aggregated[(row['target_type'], row['target_id'])] = {
+                'quantity': int(row['quantity'] or 0),
+                'label': row['stock_label'],
+                'optional_missing': bool(row['optional_missing']),
+            }
+        return aggregated
 
+    @staticmethod
+    def _load_order_inventory_targets(
+        cursor: sqlite3.Cursor,
+        order_id: str,
+        items_payload: Optional[str],
+    ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """按已落库订单的 order_items 聚合库存目标；缺少规范化明细时回退解析 items JSON。"""
+        aggregated = OrderDB._load_inventory_targets(cursor, order_id)
+        if aggregated is None:
             try:
-                current_stock = int(row['stock'] or 0)
+                items = json.loads(items_payload or '[]')
             except Exception:
-                current_stock = 0
-
-            if restore:
-                new_stock = current_stock + quantity
-            else:
-                if current_stock < quantity:
-                    missing_items.append(f"{label} 库存不足(剩余 {current_stock}, 需要 {quantity})")
-                    continue
-                new_stock = current_stock - quantity
-
-            adjustments.append((target_type, target_id, new_stock))
-
-        return list(dict.fromkeys(missing_items)), adjustments
-
-    @staticmethod
-    def _apply_inventory_adjustments(cursor: sqlite3.Cursor, adjustments: List[Tuple[str, str, int]]) -> None:
-        for target_type, target_id, new_stock in adjustments:
-            if target_type == 'variant':
-                cursor.execute(
-                    'UPDATE product_variants SET stock = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-                    (new_stock, target_id),
-                )
-            else:
-                cursor.execute(
-                    'UPDATE products SET stock = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-                    (new_stock, target_id),
-                )
+                items = []
+            if not isinstance(items, list):
+                items = []
+            aggregated = OrderDB._aggregate_inventory_items(order_id, items)
+        return aggregated
 
     @staticmethod
     def _sync_inventory_on_status_transition(
@@ -380,6 +514,8 @@ class OrderDB:
         next_order_status: Optional[str] = None,
     ) -> Tuple[bool, List[str], Dict[str, Any]]:
         with get_db_connection() as conn:
+            # 写锁覆盖读取订单状态到写回库存的全过程，并发的状态变更不会重复扣减或回补
+            InventoryDB.begin_immediate(conn)
             cursor = conn.cursor()
             try:
                 cursor.execute(
@@ -416,13 +552,6 @@ class OrderDB:
             except Exception:
                 stock_deducted = False
 
-            try:
-                items = json.loads(order_data.get('items') or '[]')
-            except Exception:
-                items = []
-            if not isinstance(items, list):
-                items = []
-
             should_deduct = (
                 not stock_deducted
                 and current_unified_status == '待确认'
@@ -434,11 +563,10 @@ class OrderDB:
             next_stock_deducted = 1 if stock_deducted else 0
 
             if should_deduct:
-                missing_items, adjustments = OrderDB._collect_inventory_adjustments(
+                missing_items, _changes = InventoryDB.deduct(
                     cursor,
                     order_id,
-                    items,
-                    restore=False,
+                    OrderDB._load_order_inventory_targets(cursor, order_id, order_data.get('items')),
                 )
                 if missing_items:
                     conn.rollback()
@@ -448,15 +576,13 @@ class OrderDB:
                         'after_unified_status': target_unified_status,
                         'stock_deducted': next_stock_deducted,
                     }
-                OrderDB._apply_inventory_adjustments(cursor, adjustments)
                 next_stock_deducted = 1
                 inventory_action = 'deduct'
             elif should_restore:
-                missing_items, adjustments = OrderDB._collect_inventory_adjustments(
+                missing_items, _changes = InventoryDB.restore(
                     cursor,
                     order_id,
-                    items,
-                    restore=True,
+                    OrderDB._load_order_inventory_targets(cursor, order_id, order_data.get('items')),
                 )
                 if missing_items:
                     logger.warning(
@@ -464,7 +590,6 @@ class OrderDB:
                         order_id,
                         "；".join(missing_items),
                     )
-                OrderDB._apply_inventory_adjustments(cursor, adjustments)
                 next_stock_deducted = 0
                 inventory_action = 'restore'
 
@@ -487,13 +612,18 @@ class OrderDB:
                 f"UPDATE orders SET {', '.join(update_fields)} WHERE id = ?",
                 params,
             )
+            SalesRollupDB.refresh_orders(cursor, [order_id])
             conn.commit()
-            return True, [], {
-                'inventory_action': inventory_action,
-                'before_unified_status': current_unified_status,
-                'after_unified_status': target_unified_status,
-                'stock_deducted': next_stock_deducted,
-            }
+
+        # 先归还连接再更新缓存版本，避免持有连接时再从连接池取连接
+        if inventory_action != 'none':
+            bump_cache_version('catalog')
+        return True, [], {
+            'inventory_action': inventory_action,
+            'before_unified_status': current_unified_status,
+            'after_unified_status': target_unified_status,
+            'stock_deducted': next_stock_deducted,
+        }
 
     @staticmethod
     def update_payment_status_with_inventory(order_id: str, payment_status: str) -> Tuple[bool, List[str]]:
@@ -544,6 +674,7 @@ class OrderDB:
         logger.info("Starting stock restoration for order: %s", order_id)
 
         with get_db_connection() as conn:
+            InventoryDB.begin_immediate(conn)
             cursor = conn.cursor()
             try:
                 cursor.execute('SELECT items, stock_deducted, payment_status FROM orders WHERE id = ?', (order_id,))
@@ -566,18 +697,10 @@ class OrderDB:
                 logger.info("Order %s has no deducted stock, skip restore", order_id)
                 return True
 
-            try:
-                items = json.loads(order_data.get('items') or '[]')
-            except Exception:
-                items = []
-            if not isinstance(items, list):
-                items = []
-
-            missing_items, adjustments = OrderDB._collect_inventory_adjustments(
+            missing_items, changes = InventoryDB.restore(
                 cursor,
                 order_id,
-                items,
-                restore=True,
+                OrderDB._load_order_inventory_targets(cursor, order_id, order_data.get('items')),
             )
             if missing_items:
                 logger.warning(
@@ -585,15 +708,17 @@ class OrderDB:
                     order_id,
                     "；".join(missing_items),
                 )
-            OrderDB._apply_inventory_adjustments(cursor, adjustments)
             cursor.execute(
                 'UPDATE orders SET stock_deducted = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                 (order_id,),
             )
 
             conn.commit()
-            logger.info("Stock restoration completed for order %s", order_id)
-            return len(missing_items) == 0
+
+        if changes:
+            bump_cache_version('catalog')
+        logger.info("Stock restoration completed for order %s", order_id)
+        return len(missing_items) == 0
 
     @staticmethod
     def restore_stock_from_items_snapshot(order_id: str, items: Any) -> bool:
@@ -611,11 +736,10 @@ class OrderDB:
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            missing_items, adjustments = OrderDB._collect_inventory_adjustments(
+            missing_items, changes = InventoryDB.restore(
                 cursor,
                 order_id,
-                parsed_items,
-                restore=True,
+                OrderDB._aggregate_inventory_items(order_id, parsed_items),
             )
             if missing_items:
                 logger.warning(
@@ -623,9 +747,11 @@ class OrderDB:
                     order_id,
                     "；".join(missing_items),
                 )
-            OrderDB._apply_inventory_adjustments(cursor, adjustments)
             conn.commit()
-            return len(missing_items) == 0
+
+        if changes:
+            bump_cache_version('catalog')
+        return len(missing_items) == 0
 
     @staticmethod
     def get_order_by_id(order_id: str) -> Optional[Dict]:
@@ -662,6 +788,116 @@ class OrderDB:
                 orders.append(order)
             return orders
 
+    @staticmethod
+    def _build_order_list_filter(
+        cursor: sqlite3.Cursor,
+        order_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        keyword: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        address_ids: Optional[List[str]] = None,
+        building_ids: Optional[List[str]] = None,
+        exclude_address_ids: Optional[List[str]] = None,
+        exclude_building_ids: Optional[List[str]] = None,
+        start_time_ms: Optional[float] = None,
+        end_time_ms: Optional[float] = None,
+        cycle_start: Optional[str] = None,
+        cycle_end: Optional[str] = None,
+        unified_status: Optional[str] = None,
+        filter_admin_orders: bool = False
+    ) -> Tuple[List[str], List[Any]]:
+        """构造订单列表/导出共用的筛选条件（订单表别名为 o，条件不依赖其他表的连接）。
+
+        cursor 为调用方已持有连接的游标，关键词筛选借用它检查全文索引，不再另取连接。
+        """
+        params: List[Any] = []
+        where_sql: List[str] = []
+        order_id_text = (order_id or '').strip()
+        user_id_text = (user_id or '').strip()
+        keyword_text = (keyword or '').strip()
+
+        if order_id_text and not keyword_text:
+            where_sql.append('o.id LIKE ?')
+            params.append(f'%{order_id_text}%')
+
+        if user_id_text:
+            try:
+                uid_int = int(user_id_text)
+                where_sql.append('o.user_id = ?')
+                params.append(uid_int)
+            except (ValueError, TypeError):
+                where_sql.append('o.student_id = ?')
+                params.append(user_id_text)
+
+        if keyword_text:
+            keyword_clause, keyword_params = OrderDB._build_keyword_filter(keyword_text, cursor)
+            where_sql.append(keyword_clause)
+            params.extend(keyword_params)
+
+        scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, filter_admin_orders=filter_admin_orders)
+        if scope_clause:
+            where_sql.append(scope_clause)
+            params.extend(scope_params)
+
+        excluded_addresses = [aid for aid in (exclude_address_ids or []) if aid]
+        excluded_buildings = [bid for bid in (exclude_building_ids or []) if bid]
+
+        if excluded_buildings:
+            placeholders = ','.join('?' * len(excluded_buildings))
+            where_sql.append(f'(o.building_id IS NULL OR o.building_id NOT IN ({placeholders}))')
+            params.extend(excluded_buildings)
+        if excluded_addresses:
+            placeholders = ','.join('?' * len(excluded_addresses))
+            where_sql.append(f'(o.address_id IS NULL OR o.address_id NOT IN ({placeholders}))')
+            params.extend(excluded_addresses)
+        if excluded_buildings or excluded_addresses:
+            where_sql.append('(o.agent_id IS NULL OR o.agent_id = "")')
+
+        normalized_start: Optional[float] = None
+        normalized_end: Optional[float] = None
+        try:
+            if start_time_ms is not None:
+                normalized_start = float(start_time_ms) / 1000.0
+        except Exception:
+            normalized_start = None
+        try:
+            if end_time_ms is not None:
+                normalized_end = float(end_time_ms) / 1000.0
+        except Exception:
+            normalized_end = None
+
+        # created_at 精确到秒，边界同样取整到秒
+        if normalized_start is not None:
+            where_sql.append('o.created_at_ms >= ?')
+            params.append(int(normalized_start // 1) * 1000)
+
+        if normalized_end is not None:
+            where_sql.append('o.created_at_ms <= ?')
+            params.append(int(normalized_end // 1) * 1000)
+
+        if cycle_start:
+            where_sql.append(f"o.created_at_ms >= {epoch_ms_sql('?')}")
+            params.append(cycle_start)
+        if cycle_end:
+            where_sql.append(f"o.created_at_ms <= {epoch_ms_sql('?')}")
+            params.append(cycle_end)
+
+        if unified_status:
+            where_sql.append(
+                "("
+                "CASE "
+                "WHEN (o.payment_status IS NULL OR TRIM(o.payment_status) = '') AND (o.status IS NULL OR TRIM(o.status) = '') THEN '未付款' "
+                "WHEN o.status = 'cancelled' THEN '已取消' "
+                "WHEN o.payment_status = 'processing' THEN '待确认' "
+                "WHEN o.payment_status IS NULL OR o.payment_status != 'succeeded' THEN '未付款' "
+                "WHEN o.status = 'shipped' THEN '配送中' "
+                "WHEN o.status = 'delivered' THEN '已完成' "
+                "ELSE '待配送' "
+                "END) = ?"
+            )
+            params.append(unified_status)
+        return where_sql, params
+
     @staticmethod
     def get_orders_paginated(
         order_id: Optional[str] = None,
@@ -700,109 +936,26 @@ class OrderDB:
         with get_db_connection() as conn:
             cursor = conn.cursor()
 
-            params: List[Any] = []
-            where_sql: List[str] = []
-            order_id_text = (order_id or '').strip()
-            user_id_text = (user_id or '').strip()
-            keyword_text = (keyword or '').strip()
-
-            if order_id_text and not keyword_text:
-                where_sql.append('o.id LIKE ?')
-                params.append(f'%{order_id_text}%')
-
-            if user_id_text:
-                try:
-                    uid_int = int(user_id_text)
-                    where_sql.append('o.user_id = ?')
-                    params.append(uid_int)
-                except (ValueError, TypeError):
-                    where_sql.append('o.student_id = ?')
-                    params.append(user_id_text)
-
-            if keyword_text:
-                like_value = f'%{keyword_text}%'
-                where_sql.append(
-                    '('
-                    'o.id LIKE ? OR '
-                    'COALESCE(o.user_id, "") LIKE ? OR '
-                    'COALESCE(o.student_id, "") LIKE ? OR '
-                    'LOWER(COALESCE(u.name, "")) LIKE LOWER(?) OR '
-                    'LOWER(COALESCE(o.shipping_info, "")) LIKE LOWER(?)'
-                    ')'
-                )
-                params.extend([like_value, like_value, like_value, like_value, like_value])
-
-            scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, filter_admin_orders=filter_admin_orders)
-            if scope_clause:
-                where_sql.append(scope_clause)
-                params.extend(scope_params)
-
-            excluded_addresses = [aid for aid in (exclude_address_ids or []) if aid]
-            excluded_buildings = [bid for bid in (exclude_building_ids or []) if bid]
-
-            if excluded_buildings:
-                placeholders = ','.join('?' * len(excluded_buildings))
-                where_sql.append(f'(o.building_id IS NULL OR o.building_id NOT IN ({placeholders}))')
-                params.extend(excluded_buildings)
-            if excluded_addresses:
-                placeholders = ','.join('?' * len(excluded_addresses))
-                where_sql.append(f'(o.address_id IS NULL OR o.address_id NOT IN ({placeholders}))')
-                params.extend(excluded_addresses)
-            if excluded_buildings or excluded_addresses:
-                where_sql.append('(o.agent_id IS NULL OR o.agent_id = "")')
-
-            normalized_start: Optional[float] = None
-            normalized_end: Optional[float] = None
-            try:
-                if start_time_ms is not None:
-                    normalized_start = float(start_time_ms) / 1000.0
-            except Exception:
-                normalized_start = None
-            try:
-                if end_time_ms is not None:
-                    normalized_end = float(end_time_ms) / 1000.0
-            except Exception:
-                normalized_end = None
-
-            if normalized_start is not None:
-                start_dt = datetime.utcfromtimestamp(normalized_start)
-                where_sql.append('datetime(o.created_at) >= datetime(?)')
-                params.append(start_dt.strftime("%Y-%m-%d %H:%M:%S"))
-
-            if normalized_end is not None:
-                end_dt = datetime.utcfromtimestamp(normalized_end)
-                where_sql.append('datetime(o.created_at) <= datetime(?)')
-                params.append(end_dt.strftime("%Y-%m-%d %H:%M:%S"))
-
-            if cycle_start:
-                where_sql.append('datetime(o.created_at) >= datetime(?)')
-                params.append(cycle_start)
-            if cycle_end:
-                where_sql.append('datetime(o.created_at) <= datetime(?)')
-                params.append(cycle_end)
-
-            if unified_status:
-                where_sql.append(
-                    "("
-                    "CASE "
-                    "WHEN (o.payment_status IS NULL OR TRIM(o.payment_status) = '') AND (o.status IS NULL OR TRIM(o.status) = '') THEN '未付款' "
-                    "WHEN o.status = 'cancelled' THEN '已取消' "
-                    "WHEN o.payment_status = 'processing' THEN '待确认' "
-                    "WHEN o.payment_status IS NULL OR o.payment_status != 'succeeded' THEN '未付款' "
-                    "WHEN o.status = 'shipped' THEN '配送中' "
-                    "WHEN o.status = 'delivered' THEN '已完成' "
-                    "ELSE '待配送' "
-                    "END) = ?"
-                )
-                params.append(unified_status)
+            where_sql, params = OrderDB._build_order_list_filter(
+                cursor,
+                order_id=order_id,
+                user_id=user_id,
+                keyword=keyword,
+                agent_id=agent_id,
+                address_ids=address_ids,
+                building_ids=building_ids,
+                exclude_address_ids=exclude_address_ids,
+                exclude_building_ids=exclude_building_ids,
+                start_time_ms=start_time_ms,
+                end_time_ms=end_time_ms,
+                cycle_start=cycle_start,
+                cycle_end=cycle_end,
+                unified_status=unified_status,
+                filter_admin_orders=filter_admin_orders,
+            )
             where_clause = (' WHERE ' + ' AND '.join(where_sql)) if where_sql else ''
 
-            cursor.execute(
-                f'''SELECT COUNT(*) FROM orders o
-                    LEFT JOIN users u ON o.student_id = u.id
-                    {where_clause}''',
-                params
-            )
+            cursor.execute(f'SELECT COUNT(*) FROM orders o {where_clause}', params)
             total = cursor.fetchone()[0] or 0
 
             query_sql = f'''
@@ -814,8 +967,8 @@ class OrderDB:
                         FROM orders o2
                         WHERE o2.student_id = o.student_id
                           AND (
-                            datetime(o2.created_at) < datetime(o.created_at)
-                            OR (datetime(o2.created_at) = datetime(o.created_at) AND o2.id <= o.id)
+                            o2.created_at_ms < o.created_at_ms
+                            OR (o2.created_at_ms = o.created_at_ms AND o2.id <= o.id)
                           )
                     ) AS customer_order_index
                 FROM orders o
@@ -841,6 +994,64 @@ class OrderDB:
 
             return {'orders': orders, 'total': total}
 
+    @staticmethod
+    def count_orders(**filters: Any) -> int:
+        """统计符合列表筛选条件的订单数，参数同 _build_order_list_filter。"""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            where_sql, params = OrderDB._build_order_list_filter(cursor, **filters)
+            where_clause = (' WHERE ' + ' AND '.join(where_sql)) if where_sql else ''
+            cursor.execute(f'SELECT COUNT(*) FROM orders o {where_clause}', params)
+            return int(cursor.fetchone()[0] or 0)
+
+    @staticmethod
+    def get_orders_keyset(
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 500,
+        **filters: Any
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """按 (created_at, id) 倒序做键集分页，用于导出等需要遍历全部结果的场景。
+
+        ``after`` 为上一页返回的游标，首次传 None；返回 (订单列表, 下一页游标)，
+        没有更多数据时游标为 None。筛选参数同 _build_order_list_filter。
+        """
+        limit = max(1, int(limit or 500))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            where_sql, params = OrderDB._build_order_list_filter(cursor, **filters)
+            if after:
+                where_sql.append('(o.created_at < ? OR (o.created_at = ? AND o.id < ?))')
+                params.extend([after[0], after[0], after[1]])
+            where_clause = (' WHERE ' + ' AND '.join(where_sql)) if where_sql else ''
+            cursor.execute(f'''
+                SELECT o.*, u.name AS customer_name
+                FROM orders o
+                LEFT JOIN users u ON o.student_id = u.id
+                {where_clause}
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT ?
+            ''', params + [limit])
+            rows = cursor.fetchall()
+
+        orders: List[Dict[str, Any]] = []
+        for row in rows:
+            order = dict(row)
+            try:
+                order['shipping_info'] = json.loads(order['shipping_info'])
+            except Exception:
+                pass
+            try:
+                order['items'] = json.loads(order['items'])
+            except Exception:
+                pass
+            orders.append(order)
+
+        next_after = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_after = (last['created_at'], last['id'])
+        return orders, next_after
+
     @staticmethod
     def get_orders_by_student(user_identifier: Union[str, int]) -> List[Dict]:
         user_ref = OrderDB._resolve_user_identifier(user_identifier)
@@ -859,8 +1070,8 @@ class OrderDB:
                             FROM orders o2
                             WHERE o2.student_id = o.student_id
                               AND (
-                                datetime(o2.created_at) < datetime(o.created_at)
-                                OR (datetime(o2.created_at) = datetime(o.created_at) AND o2.id <= o.id)
+                                o2.created_at_ms < o.created_at_ms
+                                OR (o2.created_at_ms = o.created_at_ms AND o2.id <= o.id)
                               )
                         ) AS customer_order_index
                     FROM orders o
@@ -914,8 +1125,11 @@ class OrderDB:
     def delete_order(order_id: str) -> bool:
         with get_db_connection() as conn:
             cursor = conn.cursor()
+            hours = SalesRollupDB.order_hours(cursor, [order_id])
             cursor.execute('DELETE FROM orders WHERE id = ?', (order_id,))
             ok = cursor.rowcount > 0
+            cursor.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
+            SalesRollupDB.refresh_hours(cursor, hours)
             conn.commit()
             return ok
 
@@ -932,8 +1146,12 @@ class OrderDB:
                 existing_ids = [row[0] for row in cursor.fetchall()]
                 if not existing_ids:
                     return {"success": False, "deleted_count": 0, "message": "没有找到要删除的订单"}
-                cursor.execute(f'DELETE FROM orders WHERE id IN ({placeholders})', existing_ids)
+                hours = SalesRollupDB.order_hours(cursor, existing_ids)
+                existing_placeholders = ','.join('?' * len(existing_ids))
+                cursor.execute(f'DELETE FROM orders WHERE id IN ({existing_placeholders})', existing_ids)
                 deleted_count = cursor.rowcount or 0
+                cursor.execute(f'DELETE FROM order_items WHERE order_id IN ({existing_placeholders})', existing_ids)
+                SalesRollupDB.refresh_hours(cursor, hours)
                 conn.commit()
                 return {
                     "success": True,
@@ -952,6 +1170,9 @@ class OrderDB:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM orders')
             deleted = cursor.rowcount
+            cursor.execute('DELETE FROM order_items')
+            cursor.execute('DELETE FROM sales_rollup')
+            cursor.execute('DELETE FROM sales_product_rollup')
             conn.commit()
             return deleted or 0
 
@@ -969,16 +1190,16 @@ class OrderDB:
             filters: List[str] = [OrderDB._revenue_filter_clause()]
             params: List[Any] = []
 
-            scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, filter_admin_orders=filter_admin_orders)
+            scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, table_alias='orders', filter_admin_orders=filter_admin_orders)
             if scope_clause:
                 filters.append(scope_clause)
                 params.extend(scope_params)
 
             if start_time:
-                filters.append('datetime(created_at) >= datetime(?)')
+                filters.append(f"created_at_ms >= {epoch_ms_sql('?')}")
                 params.append(start_time)
             if end_time:
-                filters.append('datetime(created_at) <= datetime(?)')
+                filters.append(f"created_at_ms <= {epoch_ms_sql('?')}")
                 params.append(end_time)
 
             where_clause = 'WHERE ' + ' AND '.join(filters) if filters else ''
@@ -1039,20 +1260,26 @@ class OrderDB:
             cursor = conn.cursor()
             try:
                 # 先查询将要删除的订单（用于返还被锁定的优惠券）
-                cursor.execute('''
+                cutoff = epoch_ms_sql("'now', ?")
+                cursor.execute(f'''
                     SELECT id, coupon_id, discount_amount FROM orders
                     WHERE payment_status IN ('pending','failed')
-                      AND datetime(created_at) <= datetime('now', ?)
+                      AND created_at_ms <= {cutoff}
                 ''', (f'-{int(expire_minutes)} minutes',))
                 rows = cursor.fetchall() or []
                 ids = [r[0] for r in rows]
                 # 执行删除
-                cursor.execute('''
+                cursor.execute(f'''
                     DELETE FROM orders
                     WHERE payment_status IN ('pending','failed')
-                      AND datetime(created_at) <= datetime('now', ?)
+                      AND created_at_ms <= {cutoff}
                 ''', (f'-{int(expire_minutes)} minutes',))
                 deleted = cursor.rowcount or 0
+                if ids:
+                    for start in range(0, len(ids), 500):
+                        chunk = ids[start:start + 500]
+                        placeholders = ','.join('?' * len(chunk))
+                        cursor.execute(f'DELETE FROM order_items WHERE order_id IN ({placeholders})', chunk)
                 conn.commit()
                 # 返还优惠券
                 try:
@@ -1111,10 +1338,10 @@ class OrderDB:
                 if excluded_buildings or excluded_addresses:
                     clauses.append(f'({alias}.agent_id IS NULL OR {alias}.agent_id = "")')
                 if cycle_start:
-                    clauses.append(f'datetime({alias}.created_at) >= datetime(?)')
+                    clauses.append(f"{alias}.created_at_ms >= {epoch_ms_sql('?')}")
                     params.append(cycle_start)
                 if cycle_end:
-                    clauses.append(f'datetime({alias}.created_at) <= datetime(?)')
+                    clauses.append(f"{alias}.created_at_ms <= {epoch_ms_sql('?')}")
                     params.append(cycle_end)
                 if extra_clause:
                     clauses.append(extra_clause)
@@ -1148,11 +1375,14 @@ class OrderDB:
                         today_date = datetime.fromisoformat(reference_end.replace("T", " ")).strftime("%Y-%m-%d")
                     except Exception:
                         today_date = None
+            # 本地日期的起止换算回 UTC 后按 created_at_ms 范围过滤
+            day_anchor = '?' if today_date else "'now'"
+            day_start = epoch_ms_sql(f"{day_anchor}, 'localtime', 'start of day', 'utc'")
+            day_end = epoch_ms_sql(f"{day_anchor}, 'localtime', 'start of day', '+1 day', 'utc'")
+            today_clause = f"created_at_ms >= {day_start} AND created_at_ms < {day_end}"
             if today_date:
-                today_clause = "date(created_at, 'localtime') = date(?, 'localtime')"
-                where_clause, params = build_where(today_clause, [today_date])
+                where_clause, params = build_where(today_clause, [today_date, today_date])
             else:
-                today_clause = "date(created_at, 'localtime') = date('now', 'localtime')"
                 where_clause, params = build_where(today_clause)
             cursor.execute(f'''SELECT COUNT(*) FROM orders{where_clause}''', params)
             today_orders = cursor.fetchone()[0]
@@ -1178,15 +1408,43 @@ class OrderDB:
 
     @staticmethod
     def get_today_stats(agent_id: Optional[str] = None, address_ids: Optional[List[str]] = None, building_ids: Optional[List[str]] = None, filter_admin_orders: bool = False) -> Dict[str, Any]:
-        today = datetime.now().strftime("%Y-%m-%d")
-        return OrderDB.get_sales_summary(
-            start_time=f"{today} 00:00:00",
-            end_time=f"{today} 23:59:59",
-            agent_id=agent_id,
-            address_ids=address_ids,
-            building_ids=building_ids,
-            filter_admin_orders=filter_admin_orders
-        )
+        """今日销售概览，与 get_sales_summary 口径一致；金额与订单数读取 sales_rollup。"""
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = today_start + timedelta(days=1) - timedelta(seconds=1)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            rollup_scope_clause, rollup_scope_params = OrderDB._build_scope_filter(
+                agent_id, address_ids, building_ids, table_alias='r', filter_admin_orders=filter_admin_orders
+            )
+            totals = SalesRollupDB.period_totals(
+                cursor,
+                today_start,
+                today_end,
+                scope_clause=rollup_scope_clause,
+                scope_params=rollup_scope_params,
+            ).get(None, {})
+
+            # 去重顾客数无法按小时累加，直接按 created_at_ms 索引范围统计当日订单
+            scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, filter_admin_orders=filter_admin_orders)
+            cursor.execute(f'''
+                SELECT COUNT(DISTINCT o.student_id)
+                FROM orders o
+                WHERE {OrderDB._revenue_filter_clause('o')}
+                  AND o.created_at_ms >= ? AND o.created_at_ms < ?
+                  {'AND ' + scope_clause if scope_clause else ''}
+            ''', [
+                _epoch_ms(today_start),
+                _epoch_ms(today_start + timedelta(days=1)),
+                *scope_params,
+            ])
+            customer_count = cursor.fetchone()[0] or 0
+
+            return {
+                'order_count': int(totals.get('orders', 0)),
+                'total_amount': round(float(totals.get('revenue', 0.0)), 2),
+                'customer_count': customer_count,
+                'discount_total': round(float(totals.get('discount', 0.0)), 2)
+            }
 
     @staticmethod
     def get_profit_summary(days: int = 7, agent_id: Optional[str] = None, address_ids: Optional[List[str]] = None, building_ids: Optional[List[str]] = None, filter_admin_orders: bool = False) -> Dict[str, Any]:
@@ -1204,37 +1462,30 @@ class OrderDB:
         with get_db_connection() as conn:
             cursor = conn.cursor()
 
-            filters = [OrderDB._revenue_filter_clause('o')]
-            params: List[Any] = []
-
             scope_clause, scope_params = OrderDB._build_scope_filter(agent_id, address_ids, building_ids, filter_admin_orders=filter_admin_orders)
-            if scope_clause:
-                filters.append(scope_clause)
-                params.extend(scope_params)
-
-            filters.append('datetime(o.created_at) BETWEEN datetime(?) AND datetime(?)')
-            params.extend([start_str, end_str])
+            rollup_scope_clause, rollup_scope_params = OrderDB._build_scope_filter(
+                agent_id, address_ids, building_ids, table_alias='r', filter_admin_orders=filter_admin_orders
+            )
 
-            where_clause = 'WHERE ' + ' AND '.join(filters)
+            def rollup_range(range_start: str, range_end: str) -> Tuple[datetime, datetime]:
+                return (
+                    datetime.strptime(range_start, "%Y-%m-%d %H:%M:%S"),
+                    datetime.strptime(range_end, "%Y-%m-%d %H:%M:%S"),
+                )
 
-            cursor.execute(f'''
-                SELECT date(o.created_at) as date, COUNT(*) as order_count, SUM(o.total_amount) as total_amount,
-                       SUM(COALESCE(p.cost, 0)) as total_cost
-                FROM orders o
-                LEFT JOIN (
-                    SELECT op.order_id, SUM(COALESCE(p.cost, 0) * (op.quantity)) as cost
-                    FROM (
-                        SELECT o.id as order_id, json_extract(value, '$.product_id') as product_id,
-                               json_extract(value, '$.quantity') * 1.0 as quantity
-                        FROM orders o, json_each(o.items)
-                    ) op
-                    LEFT JOIN products p ON op.product_id = p.id
-                    GROUP BY op.order_id
-                ) p ON o.id = p.order_id
-                {where_clause}
-                GROUP BY date(o.created_at)
-                ORDER BY date(o.created_at) ASC
-            ''', params)
+            # 按日读取 sales_rollup；此处成本口径为所有明细均按商品成本计
+            daily_totals = SalesRollupDB.period_totals(
+                cursor,
+                *rollup_range(start_str, end_str),
+                scope_clause=rollup_scope_clause,
+                scope_params=rollup_scope_params,
+                group='day',
+            )
+            raw_data = {
+                key: {'total_amount': value['revenue'], 'total_cost': value['item_cost'], 'order_count': value['orders']}
+                for key, value in daily_totals.items()
+                if key
+            }
 
             date_cursor = start_date
             date_labels = []
@@ -1242,8 +1493,6 @@ class OrderDB:
             profit_data = []
             order_counts = []
 
-            raw_data = {row['date']: row for row in cursor.fetchall()}
-
             while date_cursor <= end_date:
                 date_str = date_cursor.strftime("%Y-%m-%d")
                 date_labels.append(date_str)
@@ -1302,30 +1551,15 @@ class OrderDB:
             prev_start_str = prev_start.strftime("%Y-%m-%d 00:00:00")
             prev_end_str = prev_end.strftime("%Y-%m-%d 23:59:59")
 
-            cursor.execute(f'''
-                SELECT
-                    SUM(o.total_amount) as total_amount,
-                    SUM(COALESCE(p.cost, 0)) as total_cost,
-                    COUNT(*) as total_orders
-                FROM orders o
-                LEFT JOIN (
-                    SELECT op.order_id, SUM(COALESCE(prod.cost, 0) * (op.quantity)) as cost
-                    FROM (
-                        SELECT o.id as order_id, json_extract(value, '$.product_id') as product_id,
-                               json_extract(value, '$.quantity') * 1.0 as quantity
-                        FROM orders o, json_each(o.items)
-                    ) op
-                    LEFT JOIN products prod ON op.product_id = prod.id
-                    GROUP BY op.order_id
-                ) p ON o.id = p.order_id
-                WHERE {OrderDB._revenue_filter_clause('o')}
-                  AND datetime(o.created_at) BETWEEN datetime(?) AND datetime(?)
-                  {'AND ' + scope_clause if scope_clause else ''}
-            ''', [prev_start_str, prev_end_str, *scope_params])
-            prev_row = cursor.fetchone() or {}
-            prev_period_revenue = float(prev_row.get('total_amount') or 0.0) if hasattr(prev_row, 'get') else float(prev_row[0] or 0.0 if len(prev_row) > 0 else 0.0)
-            prev_period_cost = float(prev_row.get('total_cost') or 0.0) if hasattr(prev_row, 'get') else float(prev_row[1] or 0.0 if len(prev_row) > 1 else 0.0)
-            prev_period_orders = int(prev_row.get('total_orders') or 0) if hasattr(prev_row, 'get') else int(prev_row[2] or 0 if len(prev_row) > 2 else 0)
+            prev_totals = SalesRollupDB.period_totals(
+                cursor,
+                *rollup_range(prev_start_str, prev_end_str),
+                scope_clause=rollup_scope_clause,
+                scope_params=rollup_scope_params,
+            ).get(None, {})
+            prev_period_revenue = float(prev_totals.get('revenue', 0.0))
+            prev_period_cost = float(prev_totals.get('item_cost', 0.0))
+            prev_period_orders = int(prev_totals.get('orders', 0))
             prev_period_profit = prev_period_revenue - prev_period_cost
 
             def calc_growth(current: float, previous: float) -> float:
@@ -1337,58 +1571,40 @@ class OrderDB:
             profit_growth = calc_growth(current_period_profit, prev_period_profit)
             orders_growth = calc_growth(current_period_orders, prev_period_orders)
 
-            cursor.execute(f'''
-                SELECT
-                    p.id as product_id,
-                    p.name as product_name,
-                    SUM(COALESCE(json_extract(value, '$.quantity') * 1.0, 0)) as qty,
-                    SUM(COALESCE(json_extract(value, '$.quantity') * 1.0, 0) * COALESCE(json_extract(value, '$.price') * 1.0, p.price, 0)) as amount
-                FROM orders o, json_each(o.items)
-                JOIN products p ON json_extract(value, '$.product_id') = p.id
-                {where_clause}
-                GROUP BY p.id, p.name
-                ORDER BY qty DESC, amount DESC
-                LIMIT 10
-            ''', params)
-            current_top_rows = cursor.fetchall() or []
-
-            # 计算上一周期的销售情况，用于趋势对比
+            # 按商品汇总（仅统计仍存在的商品），金额优先使用下单时单价，缺失时按当前售价
             def _product_stats(start_ts: str, end_ts: str) -> Dict[str, Dict[str, Any]]:
-                filters_ps: List[str] = ["o.payment_status = 'succeeded'"]
-                params_ps: List[Any] = []
-                if scope_clause:
-                    filters_ps.append(scope_clause)
-                    params_ps.extend(scope_params)
-                filters_ps.append('datetime(o.created_at) BETWEEN datetime(?) AND datetime(?)')
-                params_ps.extend([start_ts, end_ts])
-                where_ps = 'WHERE ' + ' AND '.join(filters_ps)
-                cursor.execute(f'''
-                    SELECT
-                        p.id as product_id,
-                        p.name as product_name,
-                        SUM(COALESCE(json_extract(value, '$.quantity') * 1.0, 0)) as qty,
-                        SUM(COALESCE(json_extract(value, '$.quantity') * 1.0, 0) * COALESCE(json_extract(value, '$.price') * 1.0, p.price, 0)) as amount
-                    FROM orders o, json_each(o.items)
-                    JOIN products p ON json_extract(value, '$.product_id') = p.id
-                    {where_ps}
-                    GROUP BY p.id, p.name
-                ''', params_ps)
                 res: Dict[str, Dict[str, Any]] = {}
-                for r in cursor.fetchall() or []:
+                for r in SalesRollupDB.product_totals(
+                    cursor,
+                    *rollup_range(start_ts, end_ts),
+                    scope_clause=rollup_scope_clause,
+                    scope_params=rollup_scope_params,
+                ):
+                    if r['current_id'] is None:
+                        continue
                     res[str(r['product_id'])] = {
-                        'name': r['product_name'],
-                        'qty': float(r['qty'] or 0),
-                        'amount': float(r['amount'] or 0.0),
+                        'product_id': r['product_id'],
+                        'name': r['current_name'],
+                        'qty': float(r['quantity'] or 0),
+                        'amount': float(r['priced_amount'] or 0.0)
+                        + float(r['unpriced_quantity'] or 0) * float(r['current_price'] or 0.0),
                     }
                 return res
 
+            current_stats = _product_stats(start_str, end_str)
+            current_top_rows = sorted(
+                current_stats.values(),
+                key=lambda item: (item['qty'], item['amount']),
+                reverse=True,
+            )[:10]
+
+            # 计算上一周期的销售情况，用于趋势对比
             prev_start = (start_date - timedelta(days=days)).strftime("%Y-%m-%d 00:00:00")
             prev_end = (end_date - timedelta(days=days)).strftime("%Y-%m-%d 23:59:59")
             prev_stats = _product_stats(prev_start, prev_end)
 
             top_products = []
-            for row in current_top_rows:
-                item = dict(row)
+            for item in current_top_rows:
                 pid = str(item.get('product_id'))
                 qty = float(item.get('qty') or 0)
                 amount = round(float(item.get('amount') or 0), 2)
@@ -1396,7 +1612,7 @@ class OrderDB:
                 change = round(qty - prev_qty, 2)
                 top_products.append({
                     'product_id': pid,
-                    'name': item.get('product_name'),
+                    'name': item.get('name'),
                     'sold': qty,
                     'value': amount,
                     'change': change,
@@ -1430,7 +1646,7 @@ class OrderDB:
                     row['student_id'] for row in cursor.execute(
                         f'''SELECT DISTINCT student_id FROM orders o
                             WHERE o.payment_status = 'succeeded'
-                            AND datetime(o.created_at) BETWEEN datetime(?) AND datetime(?)'''
+                            AND o.created_at_ms BETWEEN {epoch_ms_sql('?')} AND {epoch_ms_sql('?')}'''
                         + (f' AND {scope_clause}' if scope_clause else ''),
                         [start_str, end_str, *scope_params]
                     ).fetchall()
@@ -1443,7 +1659,7 @@ class OrderDB:
                     row['student_id'] for row in cursor.execute(
                         f'''SELECT DISTINCT student_id FROM orders o
                             WHERE o.payment_status = 'succeeded'
-                            AND datetime(o.created_at) BETWEEN datetime(?) AND datetime(?)'''
+                            AND o.created_at_ms BETWEEN {epoch_ms_sql('?')} AND {epoch_ms_sql('?')}'''
                         + (f' AND {scope_clause}' if scope_clause else ''),
                         [prev_start_str, prev_end_str, *scope_params]
                     ).fetchall()
@@ -1569,10 +1785,10 @@ class OrderDB:
                     clauses.append(scope_clause)
                     params.extend(scope_args)
                 if cycle_start:
-                    clauses.append(f'datetime({alias}.created_at) >= datetime(?)')
+                    clauses.append(f"{alias}.created_at_ms >= {epoch_ms_sql('?')}")
                     params.append(cycle_start)
                 if cycle_end:
-                    clauses.append(f'datetime({alias}.created_at) <= datetime(?)')
+                    clauses.append(f"{alias}.created_at_ms <= {epoch_ms_sql('?')}")
                     params.append(cycle_end)
                 if extra_clause:
                     clauses.append(extra_clause)
@@ -1600,66 +1816,92 @@ class OrderDB:
                 return start_local, end_local, span_days
 
             def build_local_time_filter(alias: str, start_local: datetime, end_local: datetime) -> Tuple[str, List[Any]]:
-                start_str = start_local.strftime("%Y-%m-%d %H:%M:%S")
-                end_str = end_local.strftime("%Y-%m-%d %H:%M:%S")
-                clause = (
-                    f"datetime({alias}.created_at, '{shift_modifier}') >= datetime(?) "
-                    f"AND datetime({alias}.created_at, '{shift_modifier}') <= datetime(?)"
-                )
-                return clause, [start_str, end_str]
+                # 本地时间边界（精确到秒）换算为 UTC 毫秒时间戳，直接比较 created_at_ms
+                start_utc = start_local.replace(microsecond=0) + timedelta(minutes=tz_offset_minutes)
+                end_utc = end_local.replace(microsecond=0) + timedelta(minutes=tz_offset_minutes)
+                clause = f"{alias}.created_at_ms >= ? AND {alias}.created_at_ms <= ?"
+                return clause, [_epoch_ms(start_utc), _epoch_ms(end_utc)]
 
             current_start_local, current_end_local, period_days = build_local_period_range(period, reference_end_local)
             prev_start_local = current_start_local - timedelta(days=period_days)
             prev_end_local = current_end_local - timedelta(days=period_days)
 
             time_filter, time_filter_params = build_local_time_filter('orders', current_start_local, current_end_local)
-            prev_time_filter, prev_time_filter_params = build_local_time_filter('orders', prev_start_local, prev_end_local)
-            time_filter_o, time_filter_o_params = build_local_time_filter('o', current_start_local, current_end_local)
-            prev_time_filter_o, prev_time_filter_o_params = build_local_time_filter('o', prev_start_local, prev_end_local)
+
+            # 销售额、订单数、净利润与热销商品均读取按小时预聚合的 sales_rollup，
+            # 时间窗口先换算为 UTC 并与周期范围取交集
+            rollup_scope_clause, rollup_scope_params = OrderDB._build_scope_filter(
+                agent_id, address_ids, building_ids, table_alias='r', filter_admin_orders=filter_admin_orders
+            )
+
+            def to_utc_range(start_local: Optional[datetime], end_local: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+                start_utc = start_local + timedelta(minutes=tz_offset_minutes) if start_local else None
+                end_utc = end_local + timedelta(minutes=tz_offset_minutes) if end_local else None
+                if cycle_start_dt and (start_utc is None or cycle_start_dt > start_utc):
+                    start_utc = cycle_start_dt
+                if cycle_end_dt and (end_utc is None or cycle_end_dt < end_utc):
+                    end_utc = cycle_end_dt
+                return start_utc, end_utc
+
+            def rollup_totals(start_local: Optional[datetime], end_local: Optional[datetime], group: Optional[str] = None) -> Dict[Optional[str], Dict[str, float]]:
+                start_utc, end_utc = to_utc_range(start_local, end_local)
+                return SalesRollupDB.period_totals(
+                    cursor,
+                    start_utc,
+                    end_utc,
+                    scope_clause=rollup_scope_clause,
+                    scope_params=rollup_scope_params,
+                    group=group,
+                    tz_offset_minutes=tz_offset_minutes,
+                )
+
+            def rollup_products(start_local: Optional[datetime], end_local: Optional[datetime]) -> List[Dict[str, Any]]:
+                start_utc, end_utc = to_utc_range(start_local, end_local)
+                return SalesRollupDB.product_totals(
+                    cursor,
+                    start_utc,
+                    end_utc,
+                    scope_clause=rollup_scope_clause,
+                    scope_params=rollup_scope_params,
+                    tz_offset_minutes=tz_offset_minutes,
+                )
+
+            def period_rows(totals: Dict[Optional[str], Dict[str, float]]) -> List[Dict[str, Any]]:
+                return [
+                    {'period': key, 'revenue': round(value['revenue'], 2), 'orders': value['orders']}
+                    for key, value in sorted((k, v) for k, v in totals.items() if k)
+                ]
 
             # 按时间段统计销售额
             if period == 'day':
                 group_by = f"strftime('%Y-%m-%d %H:00:00', datetime(created_at, '{shift_modifier}'))"
+                rollup_group = 'hour'
                 date_format = "周期内当日" if cycle_view_enabled else "今日各小时"
             elif period == 'week':
                 group_by = f"date(datetime(created_at, '{shift_modifier}'))"
+                rollup_group = 'day'
                 date_format = "周期内7天" if cycle_view_enabled else "近7天"
             else:  # month
                 group_by = f"date(datetime(created_at, '{shift_modifier}'))"
+                rollup_group = 'day'
                 date_format = "周期内30天" if cycle_view_enabled else "近30天"
 
             if period == 'day':
                 chart_time_filter = "1=1"
                 chart_time_params: List[Any] = []
-                chart_time_filter_o = chart_time_filter
-                chart_time_params_o: List[Any] = []
+                chart_start_local: Optional[datetime] = None
+                chart_end_local: Optional[datetime] = None
                 chart_window_config: Dict[str, Any] = {'window_size': 24, 'step': 24}
             else:
                 # 周/月视图增加到730天历史数据
                 chart_start_local = reference_end_local - timedelta(days=730)
                 chart_end_local = reference_end_local
                 chart_time_filter, chart_time_params = build_local_time_filter('orders', chart_start_local, chart_end_local)
-                chart_time_filter_o, chart_time_params_o = build_local_time_filter('o', chart_start_local, chart_end_local)
                 chart_window_config = {'window_size': 7, 'step': 7} if period == 'week' else {'window_size': 30, 'step': 30}
 
             # 当前时间段销售额（仅统计 待配送 / 配送中 / 已完成 的订单）
-            revenue_clause = OrderDB._revenue_filter_clause('orders')
-            where_clause, params = build_where(
-                f"({time_filter}) AND {revenue_clause}", time_filter_params
-            )
-            cursor.execute(f'''
-                SELECT {group_by} as period,
-                       COALESCE(SUM(total_amount), 0) as revenue,
-                       COUNT(*) as orders
-                FROM orders
-                {where_clause}
-                GROUP BY {group_by}
-                ORDER BY period
-            ''', params)
-            current_period_data = [
-                {'period': row[0], 'revenue': round(row[1], 2), 'orders': row[2]}
-                for row in cursor.fetchall()
-            ]
+            current_totals = rollup_totals(current_start_local, current_end_local, rollup_group)
+            current_period_data = period_rows(current_totals)
 
             def fetch_users_by_period(filter_clause: str, filter_params: List[Any]) -> Dict[str, List[str]]:
                 where_clause_users, params_users = build_where(filter_clause, filter_params)
@@ -1686,136 +1928,24 @@ class OrderDB:
                 period_key = data_point.get('period')
                 data_point['user_ids'] = current_users_by_period.get(period_key, [])
 
-            chart_where, chart_params = build_where(
-                f"({chart_time_filter}) AND {revenue_clause}", chart_time_params
-            )
-            cursor.execute(f'''
-                SELECT {group_by} as period,
-                       COALESCE(SUM(total_amount), 0) as revenue,
-                       COUNT(*) as orders
-                FROM orders
-                {chart_where}
-                GROUP BY {group_by}
-                ORDER BY period
-            ''', chart_params)
-            chart_data = [
-                {'period': row[0], 'revenue': round(row[1], 2), 'orders': row[2]}
-                for row in cursor.fetchall()
-            ]
+            chart_totals = rollup_totals(chart_start_local, chart_end_local, rollup_group)
+            chart_data = period_rows(chart_totals)
             chart_users_by_period = fetch_users_by_period(chart_time_filter, chart_time_params)
             for data_point in chart_data:
                 period_key = data_point.get('period')
                 data_point['user_ids'] = chart_users_by_period.get(period_key, [])
 
-            # 计算净利润数据 - 使用新算法：订单总额减去成本总和
-            def calculate_profit_for_period(time_filter_clause: str, time_filter_params: Optional[List[Any]] = None) -> Tuple[float, Dict[str, float]]:
-                where_clause_profit, params_profit = build_where(
-                    f"({time_filter_clause})", time_filter_params, alias='o'
-                )
-                extra_clause = OrderDB._revenue_filter_clause('o')
-                if where_clause_profit:
-                    where_clause_profit = where_clause_profit + ' AND ' + extra_clause
-                else:
-                    where_clause_profit = ' WHERE ' + extra_clause
-                cursor.execute(f'''
-                    SELECT o.items, o.created_at, o.total_amount
-                    FROM orders o 
-                    {where_clause_profit}
-                ''', params_profit)
-                
-                total_profit = 0.0
-                profit_by_period: Dict[str, float] = {}
-                
-                for row in cursor.fetchall():
-                    try:
-                        items_json = json.loads(row[0])
-                        created_at = row[1]
-                        order_total_amount = float(row[2]) if row[2] else 0.0
-                        
-                        total_cost = 0.0  # 商品成本总和
-                        fallback_gift_count = 0    # 赠品数量（兼容旧数据）
-
-                        for item in items_json:
-                            product_id = item.get('product_id')
-                            quantity = int(item.get('quantity', 0))
-                            is_lottery = item.get('is_lottery', False)
-                            is_auto_gift = item.get('is_auto_gift', False)
-
-                            if is_lottery:
-                                # 新逻辑：优先使用记录的抽奖奖品实际价值；兼容旧订单按1元计
-                                prize_unit_price = None
-                                try:
-                                    prize_unit_price = float(item.get('lottery_unit_price'))
-                                except Exception:
-                                    prize_unit_price = None
-                                if prize_unit_price is not None and prize_unit_price > 0:
-                                    total_cost += prize_unit_price * quantity
-                                else:
-                                    fallback_gift_count += quantity
-                                continue
-                                
-                            # 获取商品成本，如果没有设置成本则默认为0
-                            # 包括普通商品和满赠商品（is_auto_gift=True）都需要计算实际成本
-                            cursor.execute('SELECT cost FROM products WHERE id = ?', (product_id,))
-                            cost_row = cursor.fetchone()
-                            cost = 0.0
-                            if cost_row and cost_row[0] is not None and cost_row[0] != '':
-                                try:
-                                    cost = float(cost_row[0])
-                                except (ValueError, TypeError):
-                                    cost = 0.0
-                            
-                            # 累计商品成本：成本 × 数量
-                            # 满赠商品（is_auto_gift）和普通商品都按实际成本计算
-                            total_cost += cost * quantity
-                        
-                        # 新算法：净利润 = 订单总额 - 商品成本总和 - 赠品数量×1（兼容旧数据）
-                        final_order_profit = order_total_amount - total_cost - fallback_gift_count
-                        total_profit += final_order_profit
-                        
-                        # 按时间段分组，使用与销售额查询一致的时区偏移转换
-                        if period == 'day':
-                            # 使用SQLite时区偏移转换，确保与销售额查询的period格式一致
-                            created_at = row[1]
-                            if created_at:
-                                # 查询SQLite转换后的本地时间格式，与销售额查询保持一致
-                                cursor.execute('''
-                                    SELECT strftime('%Y-%m-%d %H:00:00', ?, ?)
-                                ''', (created_at, shift_modifier))
-                                sqlite_result = cursor.fetchone()
-                                period_key = sqlite_result[0] if sqlite_result else ''
-                            else:
-                                period_key = ''
-                        else:
-                            # 对于周/月，使用SQLite的日期转换
-                            created_at = row[1]
-                            if created_at:
-                                cursor.execute('''
-                                    SELECT date(?, ?)
-                                ''', (created_at, shift_modifier))
-                                sqlite_result = cursor.fetchone()
-                                period_key = sqlite_result[0] if sqlite_result else ''
-                            else:
-                                period_key = ''
-                        
-                        if period_key:
-                            profit_by_period[period_key] = profit_by_period.get(period_key, 0) + final_order_profit
-                            
-                    except (json.JSONDecodeError, KeyError, ValueError, TypeError):
-                        continue
-                
-                return total_profit, profit_by_period
+            # 净利润 = 订单总额 - 商品成本总和；抽奖奖品按记录的实际价值计（缺失时按 1 元/件），
+            # 普通商品与满赠商品按商品当前成本计，由汇总表中的商品销量现算
+            current_profit = sum(value['profit'] for value in current_totals.values())
+            current_profit_by_period = {key: value['profit'] for key, value in current_totals.items() if key}
+            chart_profit_by_period = {key: value['profit'] for key, value in chart_totals.items() if key}
 
-            # 计算当前时间段净利润
-            current_profit, current_profit_by_period = calculate_profit_for_period(time_filter_o, time_filter_o_params)
-            # 计算图表所需的历史净利润数据
-            _, chart_profit_by_period = calculate_profit_for_period(chart_time_filter_o, chart_time_params_o)
-            
             # 为current_period_data添加净利润数据
             for data_point in current_period_data:
                 period_value = data_point['period']
 
-                # 处理时间格式转换，确保与calculate_profit_for_period中的格式一致
+                # 处理时间格式转换，确保与汇总表的周期键格式一致
                 if period == 'day':
                     # period_value格式是 "YYYY-MM-DD HH:00:00"，直接使用完整格式匹配
                     period_key = str(period_value)
@@ -1932,33 +2062,14 @@ class OrderDB:
                 chart_data = filled_chart
             
             # 对比时间段销售额和净利润（仅统计 待配送 / 配送中 / 已完成 的订单）
-            prev_where, prev_params = build_where(
-                f"({prev_time_filter}) AND {revenue_clause}", prev_time_filter_params
-            )
-            cursor.execute(f'''
-                SELECT COALESCE(SUM(total_amount), 0) as revenue, COUNT(*) as orders
-                FROM orders
-                {prev_where}
-            ''', prev_params)
-            prev_data = cursor.fetchone()
-            prev_revenue = round(prev_data[0], 2) if prev_data else 0
-            prev_orders = prev_data[1] if prev_data else 0
-
-            # 计算对比时间段净利润
-            prev_profit, _ = calculate_profit_for_period(prev_time_filter_o, prev_time_filter_o_params)
+            prev_data = rollup_totals(prev_start_local, prev_end_local).get(None, {})
+            prev_revenue = round(prev_data.get('revenue', 0.0), 2)
+            prev_orders = int(prev_data.get('orders', 0))
+            prev_profit = prev_data.get('profit', 0.0)
 
             # 当前时间段总计（仅统计 待配送 / 配送中 / 已完成 的订单）
-            current_where, current_params = build_where(
-                f"({time_filter}) AND {revenue_clause}", time_filter_params
-            )
-            cursor.execute(f'''
-                SELECT COALESCE(SUM(total_amount), 0) as revenue, COUNT(*) as orders
-                FROM orders
-                {current_where}
-            ''', current_params)
-            current_data = cursor.fetchone()
-            current_revenue = round(current_data[0], 2) if current_data else 0
-            current_orders = current_data[1] if current_data else 0
+            current_revenue = round(sum(value['revenue'] for value in current_totals.values()), 2)
+            current_orders = sum(int(value['orders']) for value in current_totals.values())
             
             # 计算增长率
             revenue_growth = 0.0
@@ -1971,7 +2082,7 @@ class OrderDB:
             if prev_profit > 0:
                 profit_growth = round(((current_profit - prev_profit) / prev_profit) * 100, 1)
             
-            # 最热门商品统计（从订单JSON中解析）- 根据period参数动态调整时间范围，支持自定义范围
+            # 最热门商品统计（读取销售汇总）- 根据period参数动态调整时间范围，支持自定义范围
             def parse_datetime_str(value: Optional[str]) -> Optional[datetime]:
                 if not value:
                     return None
@@ -1981,109 +2092,43 @@ class OrderDB:
                     except ValueError:
                         continue
                 try:
-                    return datetime.fromisoformat(value)
+                    return datetime.fromisoformat(value).replace(tzinfo=None)
                 except Exception:
                     return None
 
             custom_top_start = parse_datetime_str(top_range_start)
             custom_top_end = parse_datetime_str(top_range_end)
-            top_time_params: List[Any] = list(time_filter_o_params)
-            prev_top_time_params: List[Any] = list(prev_time_filter_o_params)
 
             if custom_top_start and custom_top_end and custom_top_start > custom_top_end:
                 custom_top_start, custom_top_end = custom_top_end, custom_top_start
 
-            # 允许自定义范围过滤热销榜单
-            top_time_clause = f'({time_filter_o})'
-            prev_top_time_clause = f'({prev_time_filter_o})'
+            # 允许自定义范围过滤热销榜单（自定义范围为本地时间）
+            top_start_local, top_end_local = current_start_local, current_end_local
+            prev_top_start_local, prev_top_end_local = prev_start_local, prev_end_local
             if custom_top_start and custom_top_end:
-                start_str = custom_top_start.strftime('%Y-%m-%d %H:%M:%S')
-                end_str = custom_top_end.strftime('%Y-%m-%d %H:%M:%S')
-                # 直接使用本地时间字符串进行比较，避免重复偏移导致跨日
-                top_time_clause = f"datetime(o.created_at, '{shift_modifier}') >= ? AND datetime(o.created_at, '{shift_modifier}') <= ?"
-                top_time_params = [start_str, end_str]
-
+                top_start_local, top_end_local = custom_top_start, custom_top_end
                 range_delta = custom_top_end - custom_top_start
-                prev_end = custom_top_start - timedelta(seconds=1)
-                prev_start = prev_end - range_delta
-                prev_top_time_clause = f"datetime(o.created_at, '{shift_modifier}') >= ? AND datetime(o.created_at, '{shift_modifier}') <= ?"
-                prev_top_time_params = [
-                    prev_start.strftime('%Y-%m-%d %H:%M:%S'),
-                    prev_end.strftime('%Y-%m-%d %H:%M:%S')
-                ]
+                prev_top_end_local = custom_top_start - timedelta(seconds=1)
+                prev_top_start_local = prev_top_end_local - range_delta
 
-            # 当前期商品销量统计（仅统计 待配送 / 配送中 / 已完成 的订单）
-            top_revenue_clause = OrderDB._revenue_filter_clause('o')
-            where_clause_orders, params_orders = build_where(top_time_clause, top_time_params, alias='o')
-            if where_clause_orders:
-                where_clause_orders = where_clause_orders + " AND " + top_revenue_clause
-            else:
-                where_clause_orders = " WHERE " + top_revenue_clause
-            cursor.execute(f'''
-                SELECT o.items, o.created_at
-                FROM orders o 
-                {where_clause_orders}
-            ''', params_orders)
-            
-            # 统计当前期商品销量
+            # 当前期商品销量统计（仅统计 待配送 / 配送中 / 已完成 的订单，排除抽奖和赠品商品）
             product_stats: Dict[str, Dict[str, Any]] = {}
-            for row in cursor.fetchall():
-                try:
-                    items_json = json.loads(row[0])
-                    for item in items_json:
-                        # 排除抽奖和赠品商品
-                        if item.get('is_lottery') or item.get('is_auto_gift'):
-                            continue
-                        
-                        product_id = item.get('product_id')
-                        product_name = item.get('name', '未知商品')
-                        quantity = int(item.get('quantity', 0))
-                        price = float(item.get('price', 0))
-                        
-                        if product_id not in product_stats:
-                            product_stats[product_id] = {
-                                'name': product_name,
-                                'sold': 0,
-                                'revenue': 0
-                            }
-                        
-                        product_stats[product_id]['sold'] += quantity
-                        product_stats[product_id]['revenue'] += quantity * price
-                except (json.JSONDecodeError, KeyError, ValueError):
+            for row in rollup_products(top_start_local, top_end_local):
+                if not row['sold_quantity']:
                     continue
-            
-            # 上一期商品销量统计（仅统计 待配送 / 配送中 / 已完成 的订单）
-            prev_where_clause_orders, prev_params_orders = build_where(prev_top_time_clause, prev_top_time_params, alias='o')
-            if prev_where_clause_orders:
-                prev_where_clause_orders = prev_where_clause_orders + " AND " + top_revenue_clause
-            else:
-                prev_where_clause_orders = " WHERE " + top_revenue_clause
-            cursor.execute(f'''
-                SELECT o.items, o.created_at
-                FROM orders o 
-                {prev_where_clause_orders}
-            ''', prev_params_orders)
-            
-            # 统计上一期商品销量
-            prev_product_stats: Dict[str, int] = {}
-            for row in cursor.fetchall():
-                try:
-                    items_json = json.loads(row[0])
-                    for item in items_json:
-                        # 排除抽奖和赠品商品
-                        if item.get('is_lottery') or item.get('is_auto_gift'):
-                            continue
-                        
-                        product_id = item.get('product_id')
-                        quantity = int(item.get('quantity', 0))
-                        
-                        if product_id not in prev_product_stats:
-                            prev_product_stats[product_id] = 0
-                        
-                        prev_product_stats[product_id] += quantity
-                except (json.JSONDecodeError, KeyError, ValueError):
-                    continue
-            
+                product_stats[row['product_id']] = {
+                    'name': row['sold_name'] or '未知商品',
+                    'sold': int(row['sold_quantity'] or 0),
+                    'revenue': float(row['sold_revenue'] or 0),
+                }
+
+            # 上一期商品销量统计
+            prev_product_stats: Dict[str, int] = {
+                row['product_id']: int(row['sold_quantity'] or 0)
+                for row in rollup_products(prev_top_start_local, prev_top_end_local)
+                if row['sold_quantity']
+            }
+
             # 按销量排序，取前10，并计算与上一期的对比
             top_products = []
             for product_id, stats in product_stats.items():
@@ -2202,10 +2247,9 @@ class OrderDB:
                 users_growth = round(((current_period_users - prev_period_users) / prev_period_users) * 100, 1)
             
             # 计算总净利润和今日净利润
-            total_profit, _ = calculate_profit_for_period("o.payment_status = 'succeeded'")
+            total_profit = rollup_totals(None, None).get(None, {}).get('profit', 0.0)
             today_start_local = reference_end_local.replace(hour=0, minute=0, second=0, microsecond=0)
-            today_clause, today_params = build_local_time_filter('o', today_start_local, reference_end_local)
-            today_profit, _ = calculate_profit_for_period(today_clause, today_params)
+            today_profit = rollup_totals(today_start_local, reference_end_local).get(None, {}).get('profit', 0.0)
             
             return {
                 **basic_stats,
@@ -2262,10 +2306,10 @@ class OrderDB:
             if scope_clause:
                 where_parts.append(scope_clause)
             if cycle_start:
-                where_parts.append("datetime(o.created_at) >= datetime(?)")
+                where_parts.append(f"o.created_at_ms >= {epoch_ms_sql('?')}")
                 params.append(cycle_start)
             if cycle_end:
-                where_parts.append("datetime(o.created_at) <= datetime(?)")
+                where_parts.append(f"o.created_at_ms <= {epoch_ms_sql('?')}")
                 params.append(cycle_end)
             where_sql = ' WHERE ' + ' AND '.join(where_parts)
 
@@ -1,10 +1,40 @@
 import sqlite3
+import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
+from .cache import bump_cache_version
 from .config import logger
 from .connection import get_db_connection
 
+# 商品、规格及库存变化时递增的缓存命名空间
+CATALOG_CACHE_NAMESPACE = 'catalog'
+
+# 单条 IN 查询的参数上限，低于 SQLite 默认的变量数限制
+_IN_QUERY_CHUNK_SIZE = 500
+
+# 批量修改允许写入的商品字段
+BULK_UPDATE_FIELDS = ('category', 'price', 'stock', 'discount', 'is_active')
+
+
+# trigram 分词至少需要 3 个字符，更短的关键词退回 LIKE 匹配
+_FTS_MIN_TERM_LENGTH = 3
+# bm25 列权重：名称 > 分类 > 描述
+_FTS_BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def _unique_ids(ids) -> List[str]:
+    return list(dict.fromkeys(i for i in (ids or []) if i))
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
 
 class ProductDB:
     @staticmethod
@@ -44,7 +74,8 @@ class ProductDB:
                 product_data.get('reservation_note', '')
             ))
             conn.commit()
-            return product_id
+        bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return product_id
 
     @staticmethod
     def _safe_float(value, default: float = 0.0) -> float:
@@ -153,6 +184,35 @@ class ProductDB:
             rows = [dict(row) for row in cursor.fetchall()]
             return ProductDB._sort_products_for_display(rows)
 
+    @staticmethod
+    def get_many(
+        product_ids: List[str],
+        owner_ids: Optional[List[str]] = None,
+        include_unassigned: bool = True
+    ) -> Dict[str, Dict]:
+        """按ID批量获取商品（可按归属过滤），返回 {product_id: product}。"""
+        ids = _unique_ids(product_ids)
+        if not ids:
+            return {}
+        where_sql, owner_params = ProductDB._build_owner_filter(owner_ids, include_unassigned)
+        if where_sql == '1=0':
+            return {}
+
+        result: Dict[str, Dict] = {}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), _IN_QUERY_CHUNK_SIZE):
+                chunk = ids[start:start + _IN_QUERY_CHUNK_SIZE]
+                sql = f"SELECT * FROM products WHERE id IN ({','.join('?' * len(chunk))})"
+                params: List[Any] = list(chunk)
+                if where_sql:
+                    sql += f' AND ({where_sql})'
+                    params.extend(owner_params)
+                cursor.execute(sql, params)
+                for row in cursor.fetchall():
+                    result[row['id']] = dict(row)
+        return result
+
     @staticmethod
     def get_products_by_category(
         category: str,
@@ -183,35 +243,95 @@ class ProductDB:
             return ProductDB._sort_products_for_display(rows)
 
     @staticmethod
-    def search_products(query: str, active_only: bool = False, owner_ids: Optional[List[str]] = None, include_unassigned: bool = True) -> List[Dict]:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            where_sql, params = ProductDB._build_owner_filter(owner_ids, include_unassigned)
+    def _term_match_sql(term: str, use_fts: bool) -> Tuple[str, str, List[Any], str, List[Any]]:
+        """返回单个关键词的 (FROM 子句, 匹配条件, 条件参数, 排序分值表达式, 分值参数)，分值越小越相关。"""
+        if use_fts and len(term) >= _FTS_MIN_TERM_LENGTH:
+            weights = ', '.join(str(w) for w in _FTS_BM25_WEIGHTS)
+            return (
+                'products_fts JOIN products p ON p.rowid = products_fts.rowid',
+                'products_fts MATCH ?',
+                [_fts_phrase(term)],
+                f'bm25(products_fts, {weights})',
+                [],
+            )
+        pattern = _like_pattern(term)
+        return (
+            'products p',
+            "(p.name LIKE ? ESCAPE '\\' OR p.category LIKE ? ESCAPE '\\' OR p.description LIKE ? ESCAPE '\\')",
+            [pattern, pattern, pattern],
+            "(CASE WHEN p.name LIKE ? ESCAPE '\\' THEN -3 WHEN p.category LIKE ? ESCAPE '\\' THEN -2 ELSE -1 END)",
+            [pattern, pattern],
+        )
 
-            def build_base_sql(active_filter: bool) -> Tuple[str, List[Any]]:
-                base_params = [f'%{query}%', f'%{query}%', f'%{query}%']
-                base_conditions = '(name LIKE ? OR category LIKE ? OR description LIKE ?)'
-                if where_sql and owner_ids is not None:
-                    base_conditions = f'{base_conditions} AND ({where_sql})'
-                    base_params.extend(params)
-                sql = f'SELECT * FROM products WHERE {base_conditions}'
-                if active_filter:
-                    sql += ' AND (is_active = 1)'
-                sql += ' ORDER BY created_at DESC'
-                return sql, base_params
-
-            if active_only:
-                if owner_ids is not None and where_sql == '1=0':
-                    return []
-                sql, sql_params = build_base_sql(True)
-                cursor.execute(sql, sql_params)
-            else:
-                if owner_ids is not None and where_sql == '1=0':
-                    return []
-                sql, sql_params = build_base_sql(False)
-                cursor.execute(sql, sql_params)
-            rows = [dict(row) for row in cursor.fetchall()]
-            return ProductDB._sort_products_for_display(rows)
+    @staticmethod
+    def search_ranked(
+        terms: List[str],
+        owner_ids: Optional[List[str]] = None,
+        include_unassigned: bool = True,
+        *,
+        active_only: bool = False,
+        limit: Optional[int] = None
+    ) -> Dict[str, List[str]]:
+        """批量全文检索：一条 SQL 返回 {关键词: 按相关性排序的商品ID列表}。
+
+        3 个字符及以上的关键词走 FTS5 trigram 索引并按 bm25 排序；更短的关键词按 LIKE 匹配，
+        名称命中优先于分类、描述命中。
+        """
+        normalized = list(dict.fromkeys((t or '').strip() for t in (terms or []) if (t or '').strip()))
+        results: Dict[str, List[str]] = {term: [] for term in normalized}
+        if not normalized:
+            return results
+
+        where_sql, owner_params = ProductDB._build_owner_filter(owner_ids, include_unassigned)
+        if owner_ids is not None and where_sql == '1=0':
+            return results
+
+        def run(use_fts: bool) -> List[sqlite3.Row]:
+            parts: List[str] = []
+            params: List[Any] = []
+            for index, term in enumerate(normalized):
+                from_sql, condition, condition_params, score, score_params = ProductDB._term_match_sql(term, use_fts)
+                clauses = [condition]
+                params.extend(score_params)
+                params.extend(condition_params)
+                if where_sql:
+                    clauses.append(f'({where_sql})')
+                    params.extend(owner_params)
+                if active_only:
+                    clauses.append('p.is_active = 1')
+                sql = (
+                    f'SELECT {index} AS term_index, p.id AS id, {score} AS score, p.created_at AS created_at '
+                    f'FROM {from_sql} WHERE {" AND ".join(clauses)} '
+                    'ORDER BY score ASC, created_at DESC'
+                )
+                if limit is not None:
+                    sql += ' LIMIT ?'
+                    params.append(int(limit))
+                parts.append(f'SELECT * FROM ({sql})')
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(' UNION ALL '.join(parts), params)
+                return cursor.fetchall()
+
+        try:
+            rows = run(True)
+        except sqlite3.OperationalError as exc:
+            logger.warning("FTS product search failed, falling back to LIKE: %s", exc)
+            rows = run(False)
+
+        for row in rows:
+            results[normalized[row['term_index']]].append(row['id'])
+        return results
+
+    @staticmethod
+    def search_products(query: str, active_only: bool = False, owner_ids: Optional[List[str]] = None, include_unassigned: bool = True) -> List[Dict]:
+        term = (query or '').strip()
+        if not term:
+            return []
+        ids = ProductDB.search_ranked([term], owner_ids, include_unassigned, active_only=active_only).get(term, [])
+        products = ProductDB.get_many(ids)
+        # 保持 search_ranked 的相关度顺序（bm25，其次按创建时间倒序）
+        return [products[pid] for pid in ids if pid in products]
 
     @staticmethod
     def get_product_by_id(product_id: str) -> Optional[Dict]:
@@ -268,7 +388,9 @@ class ProductDB:
                     pass
 
             conn.commit()
-            return success
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
 
     @staticmethod
     def update_stock(product_id: str, new_stock: int) -> bool:
@@ -282,7 +404,78 @@ class ProductDB:
 
             success = cursor.rowcount > 0
             conn.commit()
-            return success
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
+
+    @staticmethod
+    def bulk_update(
+        product_updates: List[Tuple[str, Dict[str, Any]]],
+        variant_stocks: Optional[List[Tuple[str, int]]] = None,
+    ) -> int:
+        """在一个事务中批量修改商品字段（BULK_UPDATE_FIELDS）与规格库存，返回实际更新的行数。
+
+        字段组合相同的商品共用一条 executemany；不存在的分类自动创建，分类变化后清理空分类，
+        提交后统一失效一次商品目录缓存。
+        """
+        groups: Dict[Tuple[str, ...], List[List[Any]]] = {}
+        categories: List[str] = []
+        for product_id, fields in product_updates:
+            columns = tuple(field for field in BULK_UPDATE_FIELDS if field in fields)
+            if not product_id or not columns:
+                continue
+            groups.setdefault(columns, []).append([fields[column] for column in columns] + [product_id])
+            if 'category' in fields:
+                categories.append(fields['category'])
+        variant_rows = [(int(stock), variant_id) for variant_id, stock in (variant_stocks or []) if variant_id]
+        if not groups and not variant_rows:
+            return 0
+
+        categories = _unique_ids(categories)
+        updated = 0
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if categories:
+                    cursor.execute(
+                        f"SELECT name FROM categories WHERE name IN ({','.join('?' * len(categories))})",
+                        categories,
+                    )
+                    existing = {row[0] for row in cursor.fetchall()}
+                    # 同名分类可能已被并发创建（name 唯一），忽略冲突；id 用 uuid 避免同一秒内重复
+                    cursor.executemany(
+                        'INSERT OR IGNORE INTO categories (id, name, description) VALUES (?, ?, ?)',
+                        [
+                            (f"cat_{uuid.uuid4().hex}", name, f"自动创建的分类：{name}")
+                            for name in categories if name not in existing
+                        ],
+                    )
+                for columns, rows in groups.items():
+                    assignments = ', '.join(f'{column} = ?' for column in columns)
+                    cursor.executemany(
+                        f'UPDATE products SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                        rows,
+                    )
+                    updated += max(cursor.rowcount, 0)
+                if variant_rows:
+                    cursor.executemany(
+                        'UPDATE product_variants SET stock = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                        variant_rows,
+                    )
+                    updated += max(cursor.rowcount, 0)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        if categories:
+            try:
+                CategoryDB.cleanup_orphan_categories()
+            except Exception:
+                pass
+        if updated:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return updated
 
     @staticmethod
     def update_image_path(product_id: str, new_img_path: str) -> bool:
@@ -295,7 +488,9 @@ class ProductDB:
             ''', (new_img_path, product_id))
             ok = cursor.rowcount > 0
             conn.commit()
-            return ok
+        if ok:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return ok
 
     @staticmethod
     def delete_product(product_id: str) -> bool:
@@ -318,7 +513,9 @@ class ProductDB:
                     pass
 
             conn.commit()
-            return success
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
 
     @staticmethod
     def batch_delete_products(product_ids: List[str]) -> Dict[str, Any]:
@@ -344,11 +541,13 @@ class ProductDB:
                     pass
 
             conn.commit()
-            return {
-                "success": success,
-                "deleted_count": deleted_count,
-                "message": f"成功删除 {deleted_count} 个商品" if success else "删除失败"
-            }
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return {
+            "success": success,
+            "deleted_count": deleted_count,
+            "message": f"成功删除 {deleted_count} 个商品" if success else "删除失败"
+        }
 
 
 class VariantDB:
@@ -381,6 +580,25 @@ class VariantDB:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    @staticmethod
+    def get_many(variant_ids: List[str]) -> Dict[str, Dict]:
+        """按ID批量获取规格，返回 {variant_id: variant}。"""
+        ids = _unique_ids(variant_ids)
+        if not ids:
+            return {}
+        result: Dict[str, Dict] = {}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), _IN_QUERY_CHUNK_SIZE):
+                chunk = ids[start:start + _IN_QUERY_CHUNK_SIZE]
+                cursor.execute(
+                    f"SELECT * FROM product_variants WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for row in cursor.fetchall():
+                    result[row['id']] = dict(row)
+        return result
+
     @staticmethod
     def create_variant(product_id: str, name: str, stock: int) -> str:
         vid = f"var_{int(datetime.now().timestamp()*1000)}"
@@ -391,7 +609,8 @@ class VariantDB:
                 VALUES (?, ?, ?, ?)
             ''', (vid, product_id, name, int(stock or 0)))
             conn.commit()
-            return vid
+        bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return vid
 
     @staticmethod
     def update_variant(variant_id: str, name: Optional[str] = None, stock: Optional[int] = None) -> bool:
@@ -411,16 +630,22 @@ class VariantDB:
             vals.append(variant_id)
             sql = f"UPDATE product_variants SET {', '.join(fields)} WHERE id = ?"
             cursor.execute(sql, vals)
+            success = cursor.rowcount > 0
             conn.commit()
-            return cursor.rowcount > 0
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
 
     @staticmethod
     def delete_variant(variant_id: str) -> bool:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM product_variants WHERE id = ?', (variant_id,))
+            success = cursor.rowcount > 0
             conn.commit()
-            return cursor.rowcount > 0
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
 
 
 class CategoryDB:
@@ -508,9 +733,10 @@ class CategoryDB:
                     VALUES (?, ?, ?)
                 ''', (category_id, name, description))
                 conn.commit()
-                return category_id
             except sqlite3.IntegrityError:
                 return ""
+        bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return category_id
 
     @staticmethod
     def update_category(category_id: str, name: str = None, description: str = None) -> bool:
@@ -539,9 +765,11 @@ class CategoryDB:
                 cursor.execute(sql, values)
                 success = cursor.rowcount > 0
                 conn.commit()
-                return success
             except sqlite3.IntegrityError:
                 return False
+        if success:
+            bump_cache_version(CATALOG_CACHE_NAMESPACE)
+        return success
 
     @staticmethod
     def delete_category(category_id: str) -> bool:
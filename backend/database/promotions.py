@@ -1,8 +1,10 @@
 import sqlite3
 import uuid
+from bisect import bisect_right
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+from .cache import VersionedCache, bump_cache_version
 from .config import logger
 from .connection import get_db_connection
 from .users import UserDB
@@ -18,6 +20,13 @@ def _format_display_name(product_name: Optional[str], variant_name: Optional[str
     return f'{base_name}（{variant_label}）' if variant_label else base_name
 
 
+# 按归属 owner 缓存的促销配置；礼品门槛包含商品库存与价格，同时依赖商品目录版本。
+# 门槛缓存的是编译后的只读规则集，不做深拷贝，由 GiftThresholdDB 复制后再返回
+_lottery_config_cache = VersionedCache('lottery_config')
+_delivery_settings_cache = VersionedCache('delivery_settings')
+_gift_threshold_cache = VersionedCache('gift_thresholds', depends_on=('catalog',), copy_values=False)
+
+
 class LotteryConfigDB:
     """管理抽奖全局配置（如抽奖门槛）。"""
 
@@ -29,25 +38,33 @@ class LotteryConfigDB:
         value = (owner_id or '').strip()
         return value or 'admin'
 
+    @staticmethod
+    def _get_row(normalized: str) -> Optional[Dict[str, Any]]:
+        def load() -> Optional[Dict[str, Any]]:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT threshold_amount, is_enabled FROM lottery_configs WHERE owner_id = ?',
+                    (normalized,)
+                )
+                row = cursor.fetchone()
+                return dict(row) if row else None
+
+        return _lottery_config_cache.get(normalized, load)
+
     @staticmethod
     def get_threshold(owner_id: Optional[str]) -> float:
         normalized = LotteryConfigDB.normalize_owner(owner_id)
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT threshold_amount FROM lottery_configs WHERE owner_id = ?',
-                (normalized,)
-            )
-            row = cursor.fetchone()
-            if not row or row[0] is None:
-                return LotteryConfigDB.DEFAULT_THRESHOLD
-            try:
-                value = float(row[0])
-            except (TypeError, ValueError):
-                return LotteryConfigDB.DEFAULT_THRESHOLD
-            if value < LotteryConfigDB.MIN_THRESHOLD:
-                return LotteryConfigDB.DEFAULT_THRESHOLD
-            return round(value, 2)
+        row = LotteryConfigDB._get_row(normalized)
+        if not row or row.get('threshold_amount') is None:
+            return LotteryConfigDB.DEFAULT_THRESHOLD
+        try:
+            value = float(row['threshold_amount'])
+        except (TypeError, ValueError):
+            return LotteryConfigDB.DEFAULT_THRESHOLD
+        if value < LotteryConfigDB.MIN_THRESHOLD:
+            return LotteryConfigDB.DEFAULT_THRESHOLD
+        return round(value, 2)
 
     @staticmethod
     def set_threshold(owner_id: Optional[str], threshold_amount: float) -> float:
@@ -76,6 +93,7 @@ class LotteryConfigDB:
             )
             conn.commit()
 
+        bump_cache_version('lottery_config')
         return value
 
     @staticmethod
@@ -92,16 +110,10 @@ class LotteryConfigDB:
     @staticmethod
     def get_enabled(owner_id: Optional[str]) -> bool:
         normalized = LotteryConfigDB.normalize_owner(owner_id)
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT is_enabled FROM lottery_configs WHERE owner_id = ?',
-                (normalized,)
-            )
-            row = cursor.fetchone()
-            if not row or row[0] is None:
-                return True
-            return bool(row[0])
+        row = LotteryConfigDB._get_row(normalized)
+        if not row or row.get('is_enabled') is None:
+            return True
+        return bool(row['is_enabled'])
 
     @staticmethod
     def set_enabled(owner_id: Optional[str], is_enabled: bool) -> bool:
@@ -122,6 +134,7 @@ class LotteryConfigDB:
             )
             conn.commit()
 
+        bump_cache_version('lottery_config')
         return is_enabled
 
 
@@ -1164,6 +1177,10 @@ class DeliverySettingsDB:
 
     @staticmethod
     def get_settings(owner_id: Optional[str]) -> Dict[str, Any]:
+        return _delivery_settings_cache.get(owner_id, lambda: DeliverySettingsDB._load_settings(owner_id))
+
+    @staticmethod
+    def _load_settings(owner_id: Optional[str]) -> Dict[str, Any]:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             where_clauses = ['is_active = 1']
@@ -1244,7 +1261,9 @@ class DeliverySettingsDB:
                 ''', (setting_id, delivery_fee, normalized_threshold, owner_id))
 
             conn.commit()
-            return setting_id
+
+        bump_cache_version('delivery_settings')
+        return setting_id
 
     @staticmethod
     def get_delivery_config(owner_id: Optional[str]) -> Dict[str, Any]:
@@ -1256,93 +1275,121 @@ class DeliverySettingsDB:
         }
 
 
+def _compile_gift_item(item_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """把门槛赠品行（含商品/规格的库存与价格）整理为对外字段。"""
+    if item_dict.get('variant_id'):
+        stock = int(item_dict.get('variant_stock') or 0)
+    else:
+        stock = int(item_dict.get('stock') or 0)
+
+    try:
+        base_price = float(item_dict.get('product_price') or 0)
+        discount = float(item_dict.get('discount') or 10.0)
+        retail_price = round(base_price * (discount / 10.0), 2)
+    except (TypeError, ValueError):
+        retail_price = 0.0
+    try:
+        cost_price = float(item_dict.get('product_cost') or 0)
+    except (TypeError, ValueError):
+        cost_price = 0.0
+
+    raw_is_active = item_dict.get('is_active')
+    if raw_is_active is None:
+        is_active = True
+    else:
+        is_active = int(raw_is_active) == 1
+
+    item_dict['is_active'] = is_active
+    item_dict['available'] = is_active and stock > 0
+    item_dict['stock'] = stock
+    item_dict['price'] = retail_price
+    item_dict['retail_price'] = retail_price
+    item_dict['sale_price'] = retail_price
+    item_dict['cost'] = round(cost_price, 2)
+    item_dict['display_name'] = _format_display_name(
+        item_dict.get('product_name'),
+        item_dict.get('variant_name'),
+    )
+    item_dict['full_product_name'] = item_dict.get('display_name')
+    return item_dict
+
+
+def _copy_threshold(threshold: Dict[str, Any]) -> Dict[str, Any]:
+    """门槛与赠品的字段都是标量，两层浅拷贝即可隔离调用方的修改。"""
+    copied = {key: value for key, value in threshold.items() if key != '_best_gift'}
+    copied['items'] = [dict(item) for item in threshold.get('items', [])]
+    return copied
+
+
+class _GiftThresholdRuleset:
+    """某个 owner 的满额门槛规则：按门槛金额排序的档位、按 ID 索引，以及每档库存最多的可用赠品。
+
+    由 GiftThresholdDB 编译后整体缓存、只读共享；对外返回的门槛一律经 _copy_threshold 复制。
+    """
+
+    __slots__ = ('thresholds', 'active', 'active_amounts', 'by_id')
+
+    def __init__(self, thresholds: List[Dict[str, Any]]):
+        self.thresholds = thresholds
+        self.by_id = {threshold['id']: threshold for threshold in thresholds}
+        # 查询已按 threshold_amount 升序返回，启用档位保持该顺序以便二分定位
+        self.active = [threshold for threshold in thresholds if int(threshold.get('is_active') or 0) == 1]
+        self.active_amounts = [float(threshold.get('threshold_amount') or 0) for threshold in self.active]
+        for threshold in thresholds:
+            available = [item for item in threshold['items'] if item.get('available')]
+            # 库存相同时保持赠品的添加顺序（与原先的稳定排序一致）
+            threshold['_best_gift'] = max(available, key=lambda item: item.get('stock', 0), default=None)
+
+
 class GiftThresholdDB:
     @staticmethod
-    def list_all(owner_id: Optional[str], include_inactive: bool = False) -> List[Dict[str, Any]]:
+    def _ruleset(owner_id: Optional[str]) -> _GiftThresholdRuleset:
+        return _gift_threshold_cache.get(owner_id, lambda: GiftThresholdDB._compile_ruleset(owner_id))
+
+    @staticmethod
+    def _compile_ruleset(owner_id: Optional[str]) -> _GiftThresholdRuleset:
+        """一次读出 owner 的全部门槛，再用一条 IN 查询取回所有档位的赠品。"""
+        owner_condition = 'owner_id IS NULL' if owner_id is None else 'owner_id = ?'
+        owner_params: List[Any] = [] if owner_id is None else [owner_id]
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            where_clauses: List[str] = []
-            params: List[Any] = []
-            if not include_inactive:
-                where_clauses.append('is_active = 1')
-            if owner_id is None:
-                where_clauses.append('owner_id IS NULL')
-            else:
-                where_clauses.append('owner_id = ?')
-                params.append(owner_id)
-
-            query = 'SELECT * FROM gift_thresholds'
-            if where_clauses:
-                query += ' WHERE ' + ' AND '.join(where_clauses)
-            query += ' ORDER BY threshold_amount ASC, sort_order ASC'
-
-            cursor.execute(query, params)
-            rows = cursor.fetchall() or []
-
-            thresholds = []
-            for row in rows:
-                threshold_dict = dict(row)
-                threshold_id = threshold_dict['id']
-                cursor.execute('''
+            cursor.execute(
+                f'SELECT * FROM gift_thresholds WHERE {owner_condition} '
+                'ORDER BY threshold_amount ASC, sort_order ASC',
+                owner_params,
+            )
+            thresholds = [dict(row) for row in cursor.fetchall() or []]
+            items_by_threshold: Dict[str, List[Dict[str, Any]]] = {t['id']: [] for t in thresholds}
+            if thresholds:
+                cursor.execute(f'''
                     SELECT gti.*, p.name as product_name, p.img_path, p.category, p.stock, p.is_active, p.price as product_price, p.discount, p.cost as product_cost,
                            pv.name as variant_name, pv.stock as variant_stock
                     FROM gift_threshold_items gti
                     LEFT JOIN products p ON gti.product_id = p.id
                     LEFT JOIN product_variants pv ON gti.variant_id = pv.id
-                    WHERE gti.threshold_id = ?
+                    WHERE gti.threshold_id IN (SELECT id FROM gift_thresholds WHERE {owner_condition})
                     ORDER BY gti.created_at ASC
-                ''', (threshold_id,))
-
-                items_rows = cursor.fetchall() or []
-                items = []
-                for item_row in items_rows:
+                ''', owner_params)
+                for item_row in cursor.fetchall() or []:
                     item_dict = dict(item_row)
+                    bucket = items_by_threshold.get(item_dict.get('threshold_id'))
+                    if bucket is not None:
+                        bucket.append(_compile_gift_item(item_dict))
 
-                    if item_dict.get('variant_id'):
-                        stock = int(item_dict.get('variant_stock') or 0)
-                    else:
-                        stock = int(item_dict.get('stock') or 0)
-
-                    try:
-                        base_price = float(item_dict.get('product_price') or 0)
-                        discount = float(item_dict.get('discount') or 10.0)
-                        retail_price = round(base_price * (discount / 10.0), 2)
-                    except (TypeError, ValueError):
-                        retail_price = 0.0
-                    try:
-                        cost_price = float(item_dict.get('product_cost') or 0)
-                    except (TypeError, ValueError):
-                        cost_price = 0.0
+        for threshold in thresholds:
+            threshold['items'] = items_by_threshold[threshold['id']]
+        return _GiftThresholdRuleset(thresholds)
 
-                    raw_is_active = item_dict.get('is_active')
-                    if raw_is_active is None:
-                        is_active = True
-                    else:
-                        is_active = int(raw_is_active) == 1
-
-                    item_dict['is_active'] = is_active
-                    item_dict['available'] = is_active and stock > 0
-                    item_dict['stock'] = stock
-                    item_dict['price'] = retail_price
-                    item_dict['retail_price'] = retail_price
-                    item_dict['sale_price'] = retail_price
-                    item_dict['cost'] = round(cost_price, 2)
-                    item_dict['display_name'] = _format_display_name(
-                        item_dict.get('product_name'),
-                        item_dict.get('variant_name'),
-                    )
-                    item_dict['full_product_name'] = item_dict.get('display_name')
-                    items.append(item_dict)
-
-                threshold_dict['items'] = items
-                thresholds.append(threshold_dict)
-
-            return thresholds
+    @staticmethod
+    def list_all(owner_id: Optional[str], include_inactive: bool = False) -> List[Dict[str, Any]]:
+        ruleset = GiftThresholdDB._ruleset(owner_id)
+        thresholds = ruleset.thresholds if include_inactive else ruleset.active
+        return [_copy_threshold(threshold) for threshold in thresholds]
 
     @staticmethod
     def get_by_id(threshold_id: str, owner_id: Optional[str]) -> Optional[Dict[str, Any]]:
-        thresholds = GiftThresholdDB.list_all(owner_id=owner_id, include_inactive=True)
-        return next((t for t in thresholds if t.get('id') == threshold_id), None)
+        threshold = GiftThresholdDB._ruleset(owner_id).by_id.get(threshold_id)
+        return _copy_threshold(threshold) if threshold else None
 
     @staticmethod
     def create_threshold(
@@ -1373,6 +1420,7 @@ class GiftThresholdDB:
             ))
             conn.commit()
 
+        bump_cache_version('gift_thresholds')
         return threshold_id
 
     @staticmethod
@@ -1429,6 +1477,7 @@ class GiftThresholdDB:
                 cursor.execute(sql, [*params, owner_id])
             conn.commit()
 
+        bump_cache_version('gift_thresholds')
         return cursor.rowcount > 0
 
     @staticmethod
@@ -1450,6 +1499,7 @@ class GiftThresholdDB:
             )
             conn.commit()
 
+        bump_cache_version('gift_thresholds')
         return cursor.rowcount > 0
 
     @staticmethod
@@ -1482,14 +1532,16 @@ class GiftThresholdDB:
 
             conn.commit()
 
+        bump_cache_version('gift_thresholds')
         return True
 
     @staticmethod
     def get_applicable_thresholds(amount: float, owner_id: Optional[str]) -> List[Dict[str, Any]]:
-        thresholds = GiftThresholdDB.list_all(owner_id=owner_id)
+        ruleset = GiftThresholdDB._ruleset(owner_id)
         applicable = []
 
-        for threshold in thresholds:
+        # 启用档位按金额升序，金额超过订单额的档位之后都不适用
+        for threshold in ruleset.active[:bisect_right(ruleset.active_amounts, amount)]:
             threshold_amount = float(threshold.get('threshold_amount', 0))
             if threshold_amount > 0 and amount >= threshold_amount:
                 times = int(amount // threshold_amount)
@@ -1500,6 +1552,7 @@ class GiftThresholdDB:
                     per_order_limit_int = None
                 if per_order_limit_int is not None and per_order_limit_int > 0:
                     times = min(times, per_order_limit_int)
+                threshold = _copy_threshold(threshold)
                 threshold['applicable_times'] = times
                 applicable.append(threshold)
 
@@ -1514,17 +1567,11 @@ class GiftThresholdDB:
         if count <= 0:
             return []
 
-        threshold = GiftThresholdDB.get_by_id(threshold_id, owner_id)
-        if not threshold:
+        threshold = GiftThresholdDB._ruleset(owner_id).by_id.get(threshold_id)
+        chosen = threshold.get('_best_gift') if threshold else None
+        if not chosen:
             return []
 
-        available_items = [item for item in threshold.get('items', []) if item.get('available')]
-        if not available_items:
-            return []
-
-        available_items.sort(key=lambda x: x.get('stock', 0), reverse=True)
-        chosen = available_items[0]
-
         available_stock = chosen.get('stock', 0)
         actual_count = min(count, available_stock)
 
@@ -0,0 +1,299 @@
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import logger
+from .connection import get_db_connection
+
+# 汇总表按 UTC 整点分桶；首尾不足一小时的区间现算，按分钟分桶以便换算到任意本地时区
+HOUR_BUCKET = '%Y-%m-%d %H:00:00'
+MINUTE_BUCKET = '%Y-%m-%d %H:%M:00'
+
+# 计入销售额的订单：已支付成功且未取消，与 OrderDB._revenue_filter_clause 保持一致；
+# 一元 + 阻止规划器选用 payment_status 索引，使首尾余量按 created_at 范围检索
+_REVENUE_FILTER = "+o.payment_status = 'succeeded' AND (o.status IS NULL OR o.status != 'cancelled')"
+
+_ORDER_ROLLUP_SELECT = f'''
+    SELECT strftime(?, o.created_at) AS bucket_hour,
+           o.agent_id, o.address_id, o.building_id,
+           COUNT(*) AS order_count,
+           COALESCE(SUM(o.total_amount), 0) AS revenue,
+           COALESCE(SUM(o.discount_amount), 0) AS discount_amount,
+           COALESCE(SUM((
+               SELECT SUM(CASE WHEN oi.lottery_unit_price > 0 THEN oi.lottery_unit_price ELSE 1 END * oi.quantity)
+               FROM order_items oi
+               WHERE oi.order_id = o.id AND oi.is_lottery = 1
+           )), 0) AS lottery_cost
+    FROM orders o
+    WHERE {_REVENUE_FILTER} {{range}}
+    GROUP BY 1, o.agent_id, o.address_id, o.building_id
+'''
+
+_PRODUCT_ROLLUP_SELECT = f'''
+    SELECT strftime(?, o.created_at) AS bucket_hour,
+           o.agent_id, o.address_id, o.building_id, oi.product_id,
+           SUM(oi.quantity) AS quantity,
+           SUM(CASE WHEN oi.is_lottery = 1 THEN oi.quantity ELSE 0 END) AS lottery_quantity,
+           SUM(CASE WHEN oi.unit_price IS NOT NULL THEN oi.quantity * oi.unit_price ELSE 0 END) AS priced_amount,
+           SUM(CASE WHEN oi.unit_price IS NULL THEN oi.quantity ELSE 0 END) AS unpriced_quantity,
+           SUM(CASE WHEN oi.is_lottery = 0 AND oi.is_auto_gift = 0 THEN oi.quantity ELSE 0 END) AS sold_quantity,
+           SUM(CASE WHEN oi.is_lottery = 0 AND oi.is_auto_gift = 0
+                    THEN oi.quantity * COALESCE(oi.unit_price, 0) ELSE 0 END) AS sold_revenue,
+           MIN(CASE WHEN oi.is_lottery = 0 AND oi.is_auto_gift = 0 THEN oi.name END) AS sold_name
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    WHERE {_REVENUE_FILTER} {{range}}
+    GROUP BY 1, o.agent_id, o.address_id, o.building_id, oi.product_id
+'''
+
+_ORDER_COLUMNS = 'bucket_hour, agent_id, address_id, building_id, order_count, revenue, discount_amount, lottery_cost'
+_PRODUCT_COLUMNS = (
+    'bucket_hour, agent_id, address_id, building_id, product_id, quantity, lottery_quantity, '
+    'priced_amount, unpriced_quantity, sold_quantity, sold_revenue, sold_name'
+)
+
+_TABLES = {
+    'orders': ('sales_rollup', _ORDER_ROLLUP_SELECT, _ORDER_COLUMNS),
+    'products': ('sales_product_rollup', _PRODUCT_ROLLUP_SELECT, _PRODUCT_COLUMNS),
+}
+
+
+def _format_dt(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floored = _floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
+
+
+def _shift_modifier(tz_offset_minutes: int) -> str:
+    shift_minutes = -int(tz_offset_minutes or 0)
+    shift_sign = '+' if shift_minutes >= 0 else ''
+    return f"{shift_sign}{shift_minutes} minutes"
+
+
+class SalesRollupDB:
+    """按 (UTC 小时, 代理, 地址, 楼栋[, 商品]) 预聚合的销售汇总，随订单写入同步维护。"""
+
+    @staticmethod
+    def refresh_hours(cursor: sqlite3.Cursor, hours: Iterable[Optional[str]]) -> None:
+        """在调用方事务中按原始订单重算指定 UTC 小时桶。"""
+        for hour in sorted({h for h in hours if h}):
+            try:
+                start = datetime.strptime(hour, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+            bounds = (_format_dt(start), _format_dt(start + timedelta(hours=1)))
+            for table, select_sql, columns in _TABLES.values():
+                cursor.execute(f'DELETE FROM {table} WHERE bucket_hour = ?', (hour,))
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) '
+                    + select_sql.format(range='AND o.created_at >= ? AND o.created_at < ?'),
+                    (HOUR_BUCKET, *bounds),
+                )
+
+    @staticmethod
+    def order_hours(cursor: sqlite3.Cursor, order_ids: Iterable[str]) -> List[str]:
+        """返回订单所在的 UTC 小时桶；删除订单前先取出，删除后再刷新。"""
+        ids = [oid for oid in dict.fromkeys(order_ids) if oid]
+        hours: List[str] = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT DISTINCT strftime(?, created_at) FROM orders WHERE id IN ({placeholders})',
+                (HOUR_BUCKET, *chunk),
+            )
+            hours.extend(row[0] for row in cursor.fetchall() if row[0])
+        return hours
+
+    @staticmethod
+    def refresh_orders(cursor: sqlite3.Cursor, order_ids: Iterable[str]) -> None:
+        SalesRollupDB.refresh_hours(cursor, SalesRollupDB.order_hours(cursor, order_ids))
+
+    @staticmethod
+    def rebuild(conn: Optional[sqlite3.Connection] = None) -> int:
+        """按全部订单重建汇总表，返回写入的订单级汇总行数。"""
+        if conn is None:
+            with get_db_connection() as own_conn:
+                return SalesRollupDB.rebuild(own_conn)
+        cursor = conn.cursor()
+        try:
+            for table, select_sql, columns in _TABLES.values():
+                cursor.execute(f'DELETE FROM {table}')
+                cursor.execute(f'INSERT INTO {table} ({columns}) ' + select_sql.format(range=''), (HOUR_BUCKET,))
+            cursor.execute('SELECT COUNT(*) FROM sales_rollup')
+            rows = cursor.fetchone()[0] or 0
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Sales rollup rebuilt: %s hourly rows", rows)
+        return rows
+
+    @staticmethod
+    def _source_sql(
+        kind: str,
+        start_utc: Optional[datetime],
+        end_utc: Optional[datetime],
+        use_rollup: bool,
+    ) -> Tuple[str, List[Any]]:
+        """组合 [start, end]（UTC，含两端，精确到秒）区间的汇总行：整点小时读汇总表，首尾余量现算。"""
+        table, select_sql, columns = _TABLES[kind]
+        end_exclusive = end_utc + timedelta(seconds=1) if end_utc else None
+        parts: List[str] = []
+        params: List[Any] = []
+
+        def add_raw(lower: Optional[datetime], upper: Optional[datetime]) -> None:
+            clauses = []
+            params.append(MINUTE_BUCKET)
+            if lower is not None:
+                clauses.append('AND o.created_at >= ?')
+                params.append(_format_dt(lower))
+            if upper is not None:
+                clauses.append('AND o.created_at < ?')
+                params.append(_format_dt(upper))
+            parts.append(select_sql.format(range=' '.join(clauses)))
+
+        if not use_rollup:
+            add_raw(start_utc, end_exclusive)
+            return ' UNION ALL '.join(parts), params
+
+        full_start = _ceil_hour(start_utc) if start_utc else None
+        full_end = _floor_hour(end_exclusive) if end_exclusive else None
+        if full_start is not None and full_end is not None and full_start >= full_end:
+            add_raw(start_utc, end_exclusive)
+            return ' UNION ALL '.join(parts), params
+
+        if start_utc is not None and start_utc < full_start:
+            add_raw(start_utc, full_start)
+        rollup_clauses = []
+        if full_start is not None:
+            rollup_clauses.append('bucket_hour >= ?')
+            params.append(_format_dt(full_start))
+        if full_end is not None:
+            rollup_clauses.append('bucket_hour < ?')
+            params.append(_format_dt(full_end))
+        where_sql = ' WHERE ' + ' AND '.join(rollup_clauses) if rollup_clauses else ''
+        parts.append(f'SELECT {columns} FROM {table}{where_sql}')
+        if end_exclusive is not None and full_end < end_exclusive:
+            add_raw(full_end, end_exclusive)
+        return ' UNION ALL '.join(parts), params
+
+    @staticmethod
+    def _period_expr(group: Optional[str], tz_offset_minutes: int) -> Tuple[str, List[Any]]:
+        if group == 'hour':
+            return "strftime('%Y-%m-%d %H:00:00', r.bucket_hour, ?)", [_shift_modifier(tz_offset_minutes)]
+        if group == 'day':
+            return "date(r.bucket_hour, ?)", [_shift_modifier(tz_offset_minutes)]
+        return "NULL", []
+
+    @staticmethod
+    def period_totals(
+        cursor: sqlite3.Cursor,
+        start_utc: Optional[datetime],
+        end_utc: Optional[datetime],
+        *,
+        scope_clause: str = '',
+        scope_params: Optional[List[Any]] = None,
+        group: Optional[str] = None,
+        tz_offset_minutes: int = 0,
+    ) -> Dict[Optional[str], Dict[str, float]]:
+        """按周期（本地小时/本地日期/不分组）汇总订单数、销售额与成本。
+
+        ``scope_clause`` 需以别名 ``r`` 书写（参见 OrderDB._build_scope_filter）。
+        返回的 ``cost`` 为仪表盘口径（抽奖奖品按记录价值，其余按商品成本），
+        ``item_cost`` 为所有明细均按商品成本计的口径。
+        """
+        use_rollup = int(tz_offset_minutes or 0) % 60 == 0
+        period_sql, period_params = SalesRollupDB._period_expr(group, tz_offset_minutes)
+        scope_sql = f'WHERE {scope_clause}' if scope_clause else ''
+        scope_args = list(scope_params or [])
+
+        totals: Dict[Optional[str], Dict[str, float]] = {}
+
+        def bucket(key: Optional[str]) -> Dict[str, float]:
+            return totals.setdefault(key, {
+                'orders': 0, 'revenue': 0.0, 'discount': 0.0, 'cost': 0.0, 'item_cost': 0.0,
+            })
+
+        source_sql, source_params = SalesRollupDB._source_sql('orders', start_utc, end_utc, use_rollup)
+        cursor.execute(f'''
+            WITH r AS ({source_sql})
+            SELECT {period_sql} AS period,
+                   SUM(r.order_count), SUM(r.revenue), SUM(r.discount_amount), SUM(r.lottery_cost)
+            FROM r
+            {scope_sql}
+            GROUP BY 1
+        ''', [*source_params, *period_params, *scope_args])
+        for period, order_count, revenue, discount, lottery_cost in cursor.fetchall():
+            entry = bucket(period)
+            entry['orders'] += int(order_count or 0)
+            entry['revenue'] += float(revenue or 0.0)
+            entry['discount'] += float(discount or 0.0)
+            entry['cost'] += float(lottery_cost or 0.0)
+
+        source_sql, source_params = SalesRollupDB._source_sql('products', start_utc, end_utc, use_rollup)
+        # 先按 (周期, 商品) 归并数量，再逐商品乘以当前成本，避免逐行关联商品表
+        cursor.execute(f'''
+            WITH r AS ({source_sql}),
+            q AS (
+                SELECT {period_sql} AS period, r.product_id,
+                       SUM(r.quantity) AS quantity, SUM(r.lottery_quantity) AS lottery_quantity
+                FROM r
+                {scope_sql}
+                GROUP BY 1, 2
+            )
+            SELECT q.period,
+                   SUM((q.quantity - q.lottery_quantity) * COALESCE(CAST(NULLIF(p.cost, '') AS REAL), 0)),
+                   SUM(q.quantity * COALESCE(p.cost, 0))
+            FROM q
+            LEFT JOIN products p ON p.id = q.product_id
+            GROUP BY 1
+        ''', [*source_params, *period_params, *scope_args])
+        for period, cost, item_cost in cursor.fetchall():
+            entry = bucket(period)
+            entry['cost'] += float(cost or 0.0)
+            entry['item_cost'] += float(item_cost or 0.0)
+
+        for entry in totals.values():
+            entry['profit'] = entry['revenue'] - entry['cost']
+        return totals
+
+    @staticmethod
+    def product_totals(
+        cursor: sqlite3.Cursor,
+        start_utc: Optional[datetime],
+        end_utc: Optional[datetime],
+        *,
+        scope_clause: str = '',
+        scope_params: Optional[List[Any]] = None,
+        tz_offset_minutes: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """按商品汇总区间内销量，附带当前商品名称与售价（商品已删除时为 None）。"""
+        use_rollup = int(tz_offset_minutes or 0) % 60 == 0
+        source_sql, source_params = SalesRollupDB._source_sql('products', start_utc, end_utc, use_rollup)
+        scope_sql = f'WHERE {scope_clause}' if scope_clause else ''
+        cursor.execute(f'''
+            WITH r AS ({source_sql})
+            SELECT r.product_id AS product_id,
+                   SUM(r.quantity) AS quantity,
+                   SUM(r.priced_amount) AS priced_amount,
+                   SUM(r.unpriced_quantity) AS unpriced_quantity,
+                   SUM(r.sold_quantity) AS sold_quantity,
+                   SUM(r.sold_revenue) AS sold_revenue,
+                   MIN(r.sold_name) AS sold_name,
+                   p.id AS current_id,
+                   p.name AS current_name,
+                   p.price AS current_price
+            FROM r
+            LEFT JOIN products p ON p.id = r.product_id
+            {scope_sql}
+            GROUP BY r.product_id
+        ''', [*source_params, *list(scope_params or [])])
+        return [dict(row) for row in cursor.fetchall()]
@@ -1,15 +1,23 @@
+import asyncio
 import hashlib
-from typing import Optional
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from passlib.hash import bcrypt
 
-from .config import logger
+from .config import logger, settings
 
+_BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2x$', '$2y$')
 
-def hash_password(password: str) -> str:
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """使用 SHA-256 + bcrypt 加密密码。"""
     sha256_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-    return bcrypt.hash(sha256_hash)
+    return bcrypt.using(rounds=rounds or settings.password_hash_rounds).hash(sha256_hash)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -26,4 +34,235 @@ def is_password_hashed(password: Optional[str]) -> bool:
     """检测密码是否为 bcrypt 哈希格式。"""
     if not password or len(password) != 60:
         return False
-    return password.startswith(('$2a$', '$2b$', '$2x$', '$2y$'))
+    return password.startswith(_BCRYPT_PREFIXES)
+
+
+def password_needs_rehash(hashed_password: Optional[str]) -> bool:
+    """哈希的 bcrypt 成本与当前配置不一致时返回 True（登录成功后按新成本重新哈希）。"""
+    if not is_password_hashed(hashed_password):
+        return False
+    try:
+        return int(hashed_password[4:6]) != settings.password_hash_rounds
+    except ValueError:
+        return False
+
+
+def _warm_up() -> bool:
+    return True
+
+
+def _timed_call(func: Callable[..., Any], *args: Any) -> Tuple[Any, float]:
+    """在工作进程中执行并返回 (结果, 计算耗时毫秒)，用于区分排队与计算时间。"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000.0
+
+
+class PasswordHasher:
+    """bcrypt 计算专用的有界进程池，避免 CPU 密集的哈希阻塞事件循环或占用 GIL。
+
+    并发上限为进程数，超出的请求排队等待；进程池不可用时退回线程池。
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, int(max_workers))
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "queue_ms_total": 0.0,
+            "queue_ms_max": 0.0,
+            "run_ms_total": 0.0,
+            "run_ms_max": 0.0,
+        }
+        self.mode = "process"
+        try:
+            # 使用 spawn 启动子进程，避免在多线程的服务进程中 fork
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        except Exception as exc:
+            self._fallback_to_threads(exc)
+
+    def _fallback_to_threads(self, reason: BaseException) -> None:
+        with self._lock:
+            if self.mode == "thread":
+                return
+            logger.warning("Password hashing process pool unavailable, falling back to threads: %s", reason)
+            self.mode = "thread"
+            broken = getattr(self, "_executor", None)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        """提交任务，返回的 Future 结果为 func 的返回值。"""
+        with self._lock:
+            self._in_flight += 1
+            self._stats["submitted"] += 1
+            depth = self._in_flight - self.max_workers
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        result: Future = Future()
+        try:
+            self._dispatch(result, func, args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._stats["failed"] += 1
+            raise
+        return result
+
+    def _dispatch(self, result: Future, func: Callable[..., Any], args: Tuple[Any, ...]) -> None:
+        submitted_at = time.perf_counter()
+        try:
+            inner = self._executor.submit(_timed_call, func, *args)
+        except BrokenProcessPool as exc:
+            self._fallback_to_threads(exc)
+            inner = self._executor.submit(_timed_call, func, *args)
+        inner.add_done_callback(lambda done: self._complete(done, result, submitted_at, func, args))
+
+    def _complete(
+        self,
+        inner: Future,
+        result: Future,
+        submitted_at: float,
+        func: Callable[..., Any],
+        args: Tuple[Any, ...],
+    ) -> None:
+        exc = inner.exception() if not inner.cancelled() else None
+        if isinstance(exc, BrokenProcessPool):
+            # 工作进程异常退出（如无法导入主模块）时改用线程池并重新执行该任务
+            self._fallback_to_threads(exc)
+            try:
+                self._dispatch(result, func, args)
+                return
+            except Exception as retry_exc:
+                exc = retry_exc
+        elapsed_ms = (time.perf_counter() - submitted_at) * 1000.0
+        with self._lock:
+            self._in_flight -= 1
+            if inner.cancelled() or exc is not None:
+                self._stats["failed"] += 1
+            else:
+                run_ms = inner.result()[1]
+                queue_ms = max(0.0, elapsed_ms - run_ms)
+                self._stats["completed"] += 1
+                self._stats["run_ms_total"] += run_ms
+                self._stats["run_ms_max"] = max(self._stats["run_ms_max"], run_ms)
+                self._stats["queue_ms_total"] += queue_ms
+                self._stats["queue_ms_max"] = max(self._stats["queue_ms_max"], queue_ms)
+        if exc is not None:
+            result.set_exception(exc)
+        elif inner.cancelled():
+            result.cancel()
+        else:
+            result.set_result(inner.result()[0])
+
+    def call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """同步提交并等待结果，供数据库线程等非事件循环线程使用。"""
+        return self.submit(func, *args).result()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def warm_up(self) -> None:
+        """预先启动全部工作进程，避免首个登录请求承担进程启动耗时。"""
+        futures = [self.submit(_warm_up) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            completed = int(self._stats["completed"])
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.max_workers),
+                "saturation": round(self._in_flight / self.max_workers, 3),
+                "submitted": int(self._stats["submitted"]),
+                "completed": int(self._stats["completed"]),
+                "failed": int(self._stats["failed"]),
+                "max_queue_depth": int(self._stats["max_queue_depth"]),
+                "queue_ms_avg": round(self._stats["queue_ms_total"] / completed, 3) if completed else 0.0,
+                "queue_ms_max": round(self._stats["queue_ms_max"], 3),
+                "run_ms_avg": round(self._stats["run_ms_total"] / completed, 3) if completed else 0.0,
+                "run_ms_max": round(self._stats["run_ms_max"], 3),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """获取（必要时创建）当前进程的密码哈希进程池。"""
+    global _hasher
+    hasher = _hasher
+    if hasher is not None:
+        return hasher
+    with _hasher_lock:
+        if _hasher is None:
+            _hasher = PasswordHasher(settings.password_hash_workers)
+        return _hasher
+
+
+def shutdown_password_hasher(wait: bool = True) -> None:
+    global _hasher
+    with _hasher_lock:
+        hasher, _hasher = _hasher, None
+    if hasher is not None:
+        hasher.shutdown(wait=wait)
+
+
+def get_password_hash_stats() -> Dict[str, Any]:
+    """返回密码哈希进程池的排队深度与耗时指标。"""
+    return get_password_hasher().stats()
+
+
+def hash_password_pooled(password: str) -> str:
+    """在进程池中哈希密码并等待结果（阻塞调用线程，不占用本进程 GIL）。"""
+    return get_password_hasher().call(hash_password, password, settings.password_hash_rounds)
+
+
+def verify_password_pooled(plain_password: str, hashed_password: str) -> bool:
+    return get_password_hasher().call(verify_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await get_password_hasher().run(hash_password, password, settings.password_hash_rounds)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await get_password_hasher().run(verify_password, plain_password, hashed_password)
+
+
+def prepare_password(password: str) -> str:
+    """按配置返回待存储的密码：启用加密且尚未哈希时在进程池中哈希。"""
+    if settings.enable_password_hash and not is_password_hashed(password):
+        return hash_password_pooled(password)
+    return password
+
+
+async def prepare_password_async(password: str) -> str:
+    """prepare_password 的异步版本，供事件循环中的登录/注册流程使用。"""
+    if settings.enable_password_hash and not is_password_hashed(password):
+        return await hash_password_async(password)
+    return password
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """批量哈希（用于迁移），由进程池并行计算，结果顺序与输入一致。"""
+    if not passwords:
+        return []
+    hasher = get_password_hasher()
+    futures = [hasher.submit(hash_password, password, settings.password_hash_rounds) for password in passwords]
+    return [future.result() for future in futures]
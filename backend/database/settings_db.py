@@ -1,17 +1,27 @@
+from .cache import VersionedCache, bump_cache_version
 from .connection import get_db_connection
 from .config import logger
 
+# 整张 settings 表一次性缓存为字典，值均为字符串，无需拷贝
+_settings_cache = VersionedCache('settings', copy_values=False)
+
 
 class SettingsDB:
     """简单的键值设置存取。"""
 
     @staticmethod
-    def get(key: str, default=None):
+    def _load_all():
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            row = cursor.fetchone()
-            return row[0] if row else default
+            cursor.execute('SELECT key, value FROM settings')
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    @staticmethod
+    def get(key: str, default=None):
+        values = _settings_cache.get('all', SettingsDB._load_all)
+        if key in values:
+            return values[key]
+        return default
 
     @staticmethod
     def set(key: str, value: str) -> bool:
@@ -23,8 +33,9 @@ class SettingsDB:
                     (key, value)
                 )
                 conn.commit()
-                return True
             except Exception as exc:
                 logger.error("Failed to save setting: %s", exc)
                 conn.rollback()
                 return False
+        bump_cache_version('settings')
+        return True
@@ -1,10 +1,10 @@
 import uuid
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from .config import logger
 from .connection import get_db_connection
-from .migrations import ensure_table_columns
+from .migrations import ensure_staff_chat_schema, schema_is_current
 
 
 class StaffChatLogDB:
@@ -17,44 +17,9 @@ class StaffChatLogDB:
 
     @staticmethod
     def _ensure_schema(conn):
-        """确保工作人员聊天相关的表结构存在。"""
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS staff_chat_threads (
-                id TEXT PRIMARY KEY,
-                staff_account_id TEXT NOT NULL,
-                title TEXT,
-                first_message_preview TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_message_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_archived INTEGER DEFAULT 0
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_threads_account ON staff_chat_threads(staff_account_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_threads_last ON staff_chat_threads(last_message_at DESC)')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS staff_chat_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                staff_account_id TEXT NOT NULL,
-                thread_id TEXT,
-                tool_call_id TEXT,
-                role TEXT NOT NULL,
-                content TEXT,
-                thinking_content TEXT,
-                thinking_duration REAL,
-                is_thinking_stopped INTEGER DEFAULT 0,
-                is_error INTEGER DEFAULT 0,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_account ON staff_chat_logs(staff_account_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_thread ON staff_chat_logs(thread_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_chat_logs_tool_call ON staff_chat_logs(tool_call_id)')
-
-        conn.commit()
+        """确保工作人员聊天相关的表结构存在；启动时已登记结构版本则直接返回，不执行 DDL。"""
+        if not schema_is_current(conn):
+            ensure_staff_chat_schema(conn)
 
     @staticmethod
     def _normalize_preview(text: Optional[str]) -> Optional[str]:
@@ -145,17 +110,12 @@ class StaffChatLogDB:
             return [dict(row) for row in cursor.fetchall()]
 
     @staticmethod
-    def add_log(
-        staff_account_id: str,
+    def _prepare_log_entry(
         role: str,
         content: str,
-        thread_id: Optional[str] = None,
-        tool_call_id: Optional[str] = None,
         thinking_content: Optional[str] = None,
-        thinking_duration: Optional[float] = None,
-        is_thinking_stopped: bool = False,
-        is_error: bool = False
-    ):
+    ) -> Tuple[str, Optional[str]]:
+        """返回 (写入的 content, thinking_content)。"""
         # 如果content是JSON格式且role是assistant，尝试提取thinking信息
         actual_content = content
         if role == "assistant" and content and content.strip():
@@ -171,52 +131,86 @@ class StaffChatLogDB:
                         actual_content = parsed.get("content", "")
             except (json.JSONDecodeError, ValueError):
                 pass
+        return actual_content, thinking_content
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            StaffChatLogDB._ensure_schema(conn)
-
-            if thread_id:
-                cursor.execute('''
-                    SELECT id FROM staff_chat_threads
-                    WHERE id = ? AND staff_account_id = ?
-                ''', (thread_id, staff_account_id))
-                if not cursor.fetchone():
-                    raise ValueError("会话不存在或无权限访问")
+    @staticmethod
+    def add_log(
+        staff_account_id: str,
+        role: str,
+        content: str,
+        thread_id: Optional[str] = None,
+        tool_call_id: Optional[str] = None,
+        thinking_content: Optional[str] = None,
+        thinking_duration: Optional[float] = None,
+        is_thinking_stopped: bool = False,
+        is_error: bool = False
+    ):
+        StaffChatLogDB.add_logs(staff_account_id, [{
+            "role": role,
+            "content": content,
+            "tool_call_id": tool_call_id,
+            "thinking_content": thinking_content,
+            "thinking_duration": thinking_duration,
+            "is_thinking_stopped": is_thinking_stopped,
+            "is_error": is_error,
+        }], thread_id=thread_id)
 
-            cursor.execute('''
-                INSERT INTO staff_chat_logs (staff_account_id, thread_id, tool_call_id, role, content, thinking_content, thinking_duration, is_thinking_stopped, is_error)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+    @staticmethod
+    def add_logs(
+        staff_account_id: str,
+        entries: List[Dict[str, Any]],
+        thread_id: Optional[str] = None,
+    ):
+        """在一个事务中写入多条聊天记录，并用一条 UPDATE 完成会话归属校验、活跃时间与预览更新。
+
+        entries 中每项的键与 add_log 的参数一致（role、content 必填）。
+        """
+        if not entries:
+            return
+        rows = []
+        preview = None
+        for entry in entries:
+            role = entry["role"]
+            content = entry.get("content")
+            actual_content, thinking_content = StaffChatLogDB._prepare_log_entry(
+                role, content, entry.get("thinking_content")
+            )
+            if preview is None and role == 'user':
+                preview = StaffChatLogDB._normalize_preview(content)
+            rows.append((
                 staff_account_id,
                 thread_id,
-                tool_call_id,
+                entry.get("tool_call_id"),
                 role,
                 actual_content,
                 thinking_content,
-                thinking_duration,
-                1 if is_thinking_stopped else 0,
-                1 if is_error else 0
+                entry.get("thinking_duration"),
+                1 if entry.get("is_thinking_stopped") else 0,
+                1 if entry.get("is_error") else 0
             ))
 
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            StaffChatLogDB._ensure_schema(conn)
+
             if thread_id:
                 cursor.execute('''
                     UPDATE staff_chat_threads
                     SET updated_at = CURRENT_TIMESTAMP,
-                        last_message_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (thread_id,))
-                if role == 'user':
-                    preview = StaffChatLogDB._normalize_preview(content)
-                    if preview:
-                        cursor.execute('''
-                            UPDATE staff_chat_threads
-                            SET first_message_preview = CASE
-                                WHEN first_message_preview IS NULL OR TRIM(first_message_preview) = '' THEN ?
-                                ELSE first_message_preview
-                            END
-                            WHERE id = ?
-                        ''', (preview, thread_id))
+                        last_message_at = CURRENT_TIMESTAMP,
+                        first_message_preview = CASE
+                            WHEN ? IS NOT NULL AND (first_message_preview IS NULL OR TRIM(first_message_preview) = '') THEN ?
+                            ELSE first_message_preview
+                        END
+                    WHERE id = ? AND staff_account_id = ?
+                ''', (preview, preview, thread_id, staff_account_id))
+                if cursor.rowcount == 0:
+                    raise ValueError("会话不存在或无权限访问")
+
+            cursor.executemany('''
+                INSERT INTO staff_chat_logs (staff_account_id, thread_id, tool_call_id, role, content, thinking_content, thinking_duration, is_thinking_stopped, is_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
             conn.commit()
 
     @staticmethod
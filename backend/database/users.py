@@ -1,10 +1,25 @@
 import sqlite3
 from typing import Any, Dict, List, Optional, Union
 
+from .cache import VersionedCache
+from .chat_summary import ChatUserSummaryDB
 from .config import logger, settings
 from .connection import get_db_connection
+from .executor import run_in_db_executor
 from .migrations import ensure_table_columns
-from .security import hash_password, is_password_hashed, verify_password
+from .security import (
+    hash_password_async,
+    is_password_hashed,
+    password_needs_rehash,
+    prepare_password,
+    verify_password_async,
+    verify_password_pooled,
+)
+
+# 用户配送资料（决定购物范围），按用户缓存。资料写入后只丢弃本进程内该用户的条目，
+# 不写共享的 cache_versions，其他 worker 依靠较短的 TTL 在短时间内看到变化
+SHIPPING_CACHE_TTL_SECONDS = 30
+_shipping_cache = VersionedCache('user_shipping', ttl=SHIPPING_CACHE_TTL_SECONDS)
 
 
 class UserDB:
@@ -18,8 +33,7 @@ class UserDB:
         id_status: int = 0
     ) -> bool:
         """创建新用户。"""
-        if settings.enable_password_hash and not is_password_hashed(password):
-            password = hash_password(password)
+        password = prepare_password(password)
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -126,26 +140,60 @@ class UserDB:
         stored_password = user['password']
         if settings.enable_password_hash:
             if is_password_hashed(stored_password):
-                if verify_password(password, stored_password):
+                if verify_password_pooled(password, stored_password):
+                    if password_needs_rehash(stored_password):
+                        UserDB._upgrade_password(student_id, prepare_password(password))
                     return user
             else:
                 if stored_password == password:
-                    try:
-                        hashed = hash_password(password)
-                        UserDB.update_user_password(student_id, hashed)
-                        logger.info("User password auto-upgraded to hash format: %s", student_id)
-                    except Exception as exc:
-                        logger.error("Failed to auto-upgrade user password for %s: %s", student_id, exc)
+                    UserDB._upgrade_password(student_id, prepare_password(password))
                     return user
         else:
             if stored_password == password:
                 return user
         return None
 
+    @staticmethod
+    async def verify_user_async(student_id: str, password: str, user: Optional[Dict] = None) -> Optional[Dict]:
+        """异步校验用户密码：查询与回写走数据库线程池，bcrypt 计算交给密码哈希进程池。
+
+        调用方已查到用户记录时可通过 user 传入，避免重复查询。
+        """
+        if user is None:
+            user = await run_in_db_executor(UserDB.get_user, student_id)
+        if not user:
+            return None
+
+        stored_password = user['password']
+        if settings.enable_password_hash:
+            if is_password_hashed(stored_password):
+                if await verify_password_async(password, stored_password):
+                    if password_needs_rehash(stored_password):
+                        hashed = await hash_password_async(password)
+                        await run_in_db_executor(UserDB._upgrade_password, student_id, hashed)
+                    return user
+            else:
+                if stored_password == password:
+                    hashed = await hash_password_async(password)
+                    await run_in_db_executor(UserDB._upgrade_password, student_id, hashed)
+                    return user
+        else:
+            if stored_password == password:
+                return user
+        return None
+
+    @staticmethod
+    def _upgrade_password(student_id: str, hashed: str) -> None:
+        """登录成功后回写明文密码的哈希或按当前成本重新哈希的结果，失败不影响登录。"""
+        try:
+            UserDB.update_user_password(student_id, hashed)
+            logger.info("User password hash upgraded: %s", student_id)
+        except Exception as exc:
+            logger.error("Failed to auto-upgrade user password for %s: %s", student_id, exc)
+
     @staticmethod
     def update_user_password(student_id: str, new_password: str) -> bool:
-        if settings.enable_password_hash and not is_password_hashed(new_password):
-            new_password = hash_password(new_password)
+        new_password = prepare_password(new_password)
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -171,6 +219,7 @@ class UserDB:
                     (new_name, student_id)
                 )
                 success = cursor.rowcount > 0
+                ChatUserSummaryDB.refresh_users(cursor, [student_id])
                 conn.commit()
                 return success
             except Exception as exc:
@@ -337,12 +386,14 @@ class UserProfileDB:
                 sql = f"UPDATE user_profiles SET {', '.join(fields)} WHERE student_id = ?"
                 cursor.execute(sql, values)
                 success = cursor.rowcount > 0
+                ChatUserSummaryDB.refresh_users(cursor, [student_id])
                 conn.commit()
-                return success
             except Exception as exc:
                 logger.error("Failed to update user profile: %s", exc)
                 conn.rollback()
                 return False
+        _shipping_cache.invalidate(student_id)
+        return success
 
     @staticmethod
     def update_agent(student_id: str, agent_id: Optional[str]) -> bool:
@@ -355,11 +406,13 @@ class UserProfileDB:
                     WHERE student_id = ?
                 ''', (agent_id, student_id))
                 conn.commit()
-                return cursor.rowcount > 0
+                success = cursor.rowcount > 0
             except Exception as exc:
                 logger.error("Failed to update user agent mapping: %s", exc)
                 conn.rollback()
                 return False
+        _shipping_cache.invalidate(student_id)
+        return success
 
     @staticmethod
     def upsert_profile(student_id: str, profile: Dict[str, Any]) -> bool:
@@ -389,12 +442,14 @@ class UserProfileDB:
                         {', '.join(updates)}
                 '''
                 cursor.execute(sql, values)
+                ChatUserSummaryDB.refresh_users(cursor, [student_id])
                 conn.commit()
-                return True
             except Exception as exc:
                 logger.error("Failed to save user profile: %s", exc)
                 conn.rollback()
                 return False
+        _shipping_cache.invalidate(student_id)
+        return True
 
     @staticmethod
     def list_profiles_by_agent(agent_id: str) -> List[Dict[str, Any]]:
@@ -417,6 +472,10 @@ class UserProfileDB:
     @staticmethod
     def get_shipping(user_identifier: Union[str, int]) -> Optional[Dict[str, Any]]:
         """获取用户配送信息。"""
+        return _shipping_cache.get(user_identifier, lambda: UserProfileDB._load_shipping(user_identifier))
+
+    @staticmethod
+    def _load_shipping(user_identifier: Union[str, int]) -> Optional[Dict[str, Any]]:
         user_ref = UserProfileDB._resolve_user_identifier(user_identifier)
         if not user_ref:
             return None
@@ -506,5 +565,7 @@ class UserProfileDB:
                     WHERE user_id = ?
                 ''', (student_id, name, phone, dormitory, building, room, full_address, address_id, building_id, agent_id, user_id))
 
+            ChatUserSummaryDB.refresh_users(cursor, [student_id])
             conn.commit()
-            return True
+        _shipping_cache.invalidate(student_id, user_id)
+        return True
@@ -0,0 +1,215 @@
+# /backend/http_clients.py
+"""应用级共享的上游 HTTP 客户端：每个上游一个连接池，跨请求复用 keep-alive 连接。"""
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 上游名称
+LLM_UPSTREAM = "llm"
+LOGIN_UPSTREAM = "login"
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    """单个上游的连接池与超时配置。"""
+
+    timeout: httpx.Timeout
+    max_connections: int
+    max_keepalive_connections: int
+    http2: bool = False
+    follow_redirects: bool = False
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _default_upstreams() -> Dict[str, UpstreamConfig]:
+    llm_http2 = settings.llm_http2
+    if llm_http2 and not _http2_available():
+        logger.warning("LLM_HTTP2 is enabled but the h2 package is missing; falling back to HTTP/1.1")
+        llm_http2 = False
+    return {
+        # 流式生成可能持续数分钟，读超时放宽
+        LLM_UPSTREAM: UpstreamConfig(
+            timeout=httpx.Timeout(300.0, connect=30.0),
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            http2=llm_http2,
+        ),
+        LOGIN_UPSTREAM: UpstreamConfig(
+            timeout=httpx.Timeout(10.0),
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            follow_redirects=True,
+        ),
+    }
+
+
+def _pool_connection_counts(transport: httpx.AsyncHTTPTransport) -> Tuple[Optional[int], Optional[int]]:
+    """读取 transport 底层 httpcore 连接池的 (连接数, 空闲数)。
+
+    依赖 httpx/httpcore 的私有属性，版本变化导致无法读取时返回 (None, None)。
+    """
+    try:
+        connections = list(getattr(getattr(transport, "_pool", None), "connections"))
+        idle = sum(1 for conn in connections if conn.is_idle())
+    except Exception:
+        return None, None
+    return len(connections), idle
+
+
+class HttpClientRegistry:
+    """按上游名称懒加载 httpx.AsyncClient，并记录请求数与连接池状态。
+
+    客户端绑定创建它的事件循环；在其他事件循环中获取时会为该循环重新创建。
+    """
+
+    def __init__(self, upstreams: Dict[str, UpstreamConfig]):
+        self._upstreams = upstreams
+        self._lock = threading.Lock()
+        self._clients: Dict[str, Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport, asyncio.AbstractEventLoop]] = {}
+        # 因事件循环切换被替换、但其所属循环已不在运行的客户端，留到 aclose() 时关闭
+        self._retired: List[httpx.AsyncClient] = []
+        self._requests: Dict[str, int] = {name: 0 for name in upstreams}
+        self._created: Dict[str, int] = {name: 0 for name in upstreams}
+
+    def _build(self, name: str) -> Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport]:
+        config = self._upstreams[name]
+        transport = httpx.AsyncHTTPTransport(
+            http2=config.http2,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry_seconds,
+            ),
+        )
+
+        async def _count_request(request: httpx.Request) -> None:
+            with self._lock:
+                self._requests[name] += 1
+
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=config.timeout,
+            follow_redirects=config.follow_redirects,
+            event_hooks={"request": [_count_request]},
+        )
+        return client, transport
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """获取指定上游的共享客户端（需在事件循环中调用）。调用方不得关闭该客户端。"""
+        if name not in self._upstreams:
+            raise KeyError(f"Unknown upstream: {name}")
+        loop = asyncio.get_running_loop()
+        replaced: Optional[Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = None
+        with self._lock:
+            entry = self._clients.get(name)
+            if entry is not None and entry[2] is loop and not entry[0].is_closed:
+                return entry[0]
+            if entry is not None and entry[2] is not loop:
+                logger.debug("Recreating HTTP client %s for a different event loop", name)
+                if not entry[0].is_closed:
+                    replaced = (entry[0], entry[2])
+            client, transport = self._build(name)
+            self._clients[name] = (client, transport, loop)
+            self._created[name] += 1
+        if replaced is not None:
+            self._retire(*replaced)
+        return client
+
+    def _retire(self, client: httpx.AsyncClient, owner_loop: asyncio.AbstractEventLoop) -> None:
+        """关闭被替换的客户端：原事件循环仍在运行时交给它关闭，否则留到 aclose() 处理。"""
+        if owner_loop.is_running() and not owner_loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), owner_loop)
+                return
+            except RuntimeError:
+                pass
+        with self._lock:
+            self._retired.append(client)
+
+    def start(self) -> None:
+        for name in self._upstreams:
+            self.get(name)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环创建的全部客户端以及之前被替换的客户端（应用关闭时调用）。"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            closing = [entry[0] for entry in self._clients.values() if entry[2] is loop]
+            self._clients = {name: entry for name, entry in self._clients.items() if entry[2] is not loop}
+            closing.extend(self._retired)
+            self._retired = []
+        for client in closing:
+            try:
+                await client.aclose()
+            except Exception as exc:
+                logger.warning("Failed to close HTTP client: %s", exc)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = dict(self._clients)
+            requests = dict(self._requests)
+            created = dict(self._created)
+        result: List[Dict[str, Any]] = []
+        for name, config in self._upstreams.items():
+            entry = entries.get(name)
+            total, idle = _pool_connection_counts(entry[1]) if entry is not None else (0, 0)
+            result.append({
+                "upstream": name,
+                "http2": config.http2,
+                "max_connections": config.max_connections,
+                "max_keepalive_connections": config.max_keepalive_connections,
+                "clients_created": created.get(name, 0),
+                "requests": requests.get(name, 0),
+                "connections": total,
+                "active": None if total is None else total - idle,
+                "idle": idle,
+            })
+        return result
+
+
+_registry: Optional[HttpClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def _get_registry() -> HttpClientRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = HttpClientRegistry(_default_upstreams())
+        return _registry
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """获取共享的上游 HTTP 客户端，例如 ``get_http_client(LLM_UPSTREAM)``。"""
+    return _get_registry().get(name)
+
+
+def start_http_clients() -> None:
+    """在应用启动时预先创建各上游客户端。"""
+    _get_registry().start()
+
+
+async def close_http_clients() -> None:
+    await _get_registry().aclose()
+
+
+def get_http_client_stats() -> List[Dict[str, Any]]:
+    """返回各上游连接池的请求数与连接数。"""
+    return _get_registry().stats()
@@ -0,0 +1,123 @@
+"""仪表盘统计基准：在临时数据库中生成指定数量的订单，测量 get_dashboard_stats 耗时。
+
+用法（在 backend 目录下）：
+    python scripts/bench_dashboard.py --orders 10000 100000
+
+除 DB_PATH 外的配置沿用 .env；DB_PATH 固定指向临时目录，不会触碰正式数据库。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _prepare_env(workdir: str) -> None:
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def _insert_orders(conn, batch) -> None:
+    from database import OrderDB
+
+    conn.executemany(
+        "INSERT INTO orders (id, student_id, status, payment_status, total_amount, shipping_info, items, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        batch,
+    )
+    cursor = conn.cursor()
+    for row in batch:
+        OrderDB._replace_order_items(cursor, row[0], json.loads(row[6]))
+
+
+def _seed(get_db_connection, order_count: int, product_count: int, items_per_order: int) -> None:
+    rng = random.Random(20240601)
+    now = datetime.utcnow()
+    with get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO products (id, name, category, price, stock, cost, owner_id, is_active) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'admin', 1)",
+            [
+                (f"bench_p{i}", f"商品{i}", f"分类{i % 10}", 5.0 + i % 20, 1000, round(1.0 + (i % 20) * 0.2, 2))
+                for i in range(product_count)
+            ],
+        )
+        batch = []
+        for n in range(order_count):
+            items = []
+            for _ in range(rng.randint(1, items_per_order)):
+                pid = f"bench_p{rng.randrange(product_count)}"
+                items.append({"product_id": pid, "name": pid, "quantity": rng.randint(1, 3), "price": 6.0, "subtotal": 6.0})
+            roll = rng.random()
+            if roll < 0.05:
+                items.append({"product_id": "bench_p0", "quantity": 1, "is_lottery": True, "lottery_unit_price": 2.5})
+            elif roll < 0.08:
+                items.append({"product_id": "bench_p1", "quantity": 1, "is_lottery": True})
+            elif roll < 0.12:
+                items.append({"product_id": "bench_p2", "quantity": 1, "is_auto_gift": True})
+            created = now - timedelta(minutes=rng.randrange(60 * 24 * 90))
+            batch.append((
+                f"bench_o{n}", "bench_user", "completed", "succeeded",
+                round(sum(i.get("subtotal", 0) for i in items), 2),
+                json.dumps({"name": "bench"}), json.dumps(items, ensure_ascii=False),
+                created.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+            if len(batch) >= 5000:
+                _insert_orders(conn, batch)
+                batch.clear()
+        if batch:
+            _insert_orders(conn, batch)
+        conn.commit()
+
+    # 直接写入的订单绕过了汇总维护，需整体重建
+    from database import SalesRollupDB
+
+    SalesRollupDB.rebuild()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--items-per-order", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--period", default="week", choices=["day", "week", "month"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_dashboard_") as workdir:
+        _prepare_env(workdir)
+        from database import OrderDB, get_db_connection, init_database
+
+        init_database()
+        seeded = 0
+        for target in sorted(args.orders):
+            with get_db_connection() as conn:
+                conn.execute("DELETE FROM orders")
+                conn.execute("DELETE FROM order_items")
+                conn.execute("DELETE FROM products WHERE id LIKE 'bench_p%'")
+                conn.commit()
+            _seed(get_db_connection, target, args.products, args.items_per_order)
+            seeded = target
+
+            timings = []
+            stats = None
+            for _ in range(max(1, args.repeat)):
+                started = time.perf_counter()
+                stats = OrderDB.get_dashboard_stats(period=args.period)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            profit = stats.get("profit_stats", {}).get("total_profit") if stats else None
+            print(
+                f"orders={seeded:>7} period={args.period} "
+                f"best={min(timings):8.1f}ms avg={sum(timings) / len(timings):8.1f}ms total_profit={profit}"
+            )
+
+
+if __name__ == "__main__":
+    main()
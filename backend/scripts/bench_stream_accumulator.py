@@ -0,0 +1,91 @@
+"""流式累加基准：模拟一次 20k token 的模型输出，对比逐增量拼接与累加器 + 增量合并的耗时和 SSE 帧数。
+
+用法（在 backend 目录下）：
+    python scripts/bench_stream_accumulator.py --tokens 20000 --per-read 8
+
+--per-read 表示每批网络数据中包含的增量个数（上游越快，单批越多）。
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def _make_tokens(count: int):
+    return [f"词{i % 97}" for i in range(count)]
+
+
+async def _baseline(tokens, per_read: int):
+    """旧实现：每个增量都重新拼接完整文本并单独发送一帧。"""
+    frames = []
+    parts = []
+    partial_state = {}
+
+    async def send(chunk: bytes) -> None:
+        frames.append(chunk)
+
+    for token in tokens:
+        parts.append(token)
+        partial_state["reasoning_output"] = "".join(parts)
+        data = {"type": "reasoning", "delta": token, "role": "assistant"}
+        await send(f"event: message\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+    return "".join(parts), len(frames)
+
+
+async def _accumulator(tokens, per_read: int):
+    from ai_chat import DeltaCoalescer, StreamTextBuffer
+
+    frames = []
+
+    async def send(chunk: bytes) -> None:
+        frames.append(chunk)
+
+    buffer = StreamTextBuffer()
+    deltas = DeltaCoalescer(send)
+    partial_state = {"reasoning_output": buffer}
+    for index, token in enumerate(tokens, 1):
+        buffer.append(token)
+        await deltas.push("reasoning", token)
+        if index % per_read == 0:
+            await deltas.flush()
+    await deltas.flush()
+    return str(partial_state["reasoning_output"]), len(frames)
+
+
+def _measure(func, tokens, per_read: int, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = asyncio.run(func(tokens, per_read))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--per-read", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokens = _make_tokens(args.tokens)
+    base_time, (base_text, base_frames) = _measure(_baseline, tokens, args.per_read, args.repeat)
+    new_time, (new_text, new_frames) = _measure(_accumulator, tokens, args.per_read, args.repeat)
+    if base_text != new_text:
+        raise SystemExit("accumulated text mismatch")
+
+    print(f"tokens={args.tokens} per_read={args.per_read} chars={len(new_text)}")
+    print(f"  join-per-delta : {base_time * 1000:9.1f} ms  frames={base_frames}")
+    print(f"  accumulator    : {new_time * 1000:9.1f} ms  frames={new_frames}")
+    print(f"  speedup        : {base_time / new_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
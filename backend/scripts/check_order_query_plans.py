@@ -0,0 +1,127 @@
+"""订单时间过滤的查询计划回归检查：记录订单查询实际执行的 SQL，逐条 EXPLAIN QUERY PLAN，
+确认按 created_at_ms 过滤的语句都通过索引访问 orders，而不是全表扫描。
+
+用法（在 backend 目录下）：
+    python scripts/check_order_query_plans.py [-v]
+
+存在全表扫描时以非零状态退出。除 DB_PATH 外的配置沿用 .env；DB_PATH 固定指向临时目录，不会触碰正式数据库。
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# 预先取出连接池的全部连接挂载语句跟踪，之后的查询都复用这些连接
+POOL_SIZE = 4
+
+# 访问 orders 表（含别名）却没有使用索引的计划行
+_FULL_SCAN = re.compile(r"^SCAN (orders|o|o2)\b(?!.*USING (COVERING )?INDEX)")
+
+
+def _prepare_env(workdir: str) -> None:
+    os.environ["DB_PATH"] = os.path.join(workdir, "plans.db")
+    os.environ["DB_POOL_SIZE"] = str(POOL_SIZE)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def _seed(get_db_connection, order_count: int) -> None:
+    now = datetime.utcnow()
+    rows = []
+    for n in range(order_count):
+        created = now - timedelta(minutes=n * 7)
+        rows.append((
+            f"plan_o{n}",
+            f"user{n % 50}",
+            "completed",
+            "succeeded" if n % 5 else "pending",
+            10.0,
+            "{}",
+            "[]",
+            f"agent{n % 4}" if n % 3 else None,
+            f"addr{n % 6}",
+            f"bld{n % 12}",
+            created.strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+    with get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO orders (id, student_id, status, payment_status, total_amount, shipping_info, items, "
+            "agent_id, address_id, building_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+
+
+def _run_queries(OrderDB) -> None:
+    now = datetime.utcnow()
+    start = (now - timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S")
+    end = now.strftime("%Y-%m-%d %H:%M:%S")
+    start_ms = (now - timedelta(days=3)).timestamp() * 1000
+    scopes = (
+        {},
+        {"agent_id": "agent1", "building_ids": ["bld1", "bld2"], "address_ids": ["addr1"]},
+        {"filter_admin_orders": True},
+    )
+    for scope in scopes:
+        OrderDB.get_orders_paginated(start_time_ms=start_ms, cycle_start=start, cycle_end=end, **scope)
+        OrderDB.get_sales_summary(start_time=start, end_time=end, **scope)
+        OrderDB.get_order_stats(cycle_start=start, cycle_end=end, reference_end=end, **scope)
+        OrderDB.get_today_stats(**scope)
+        OrderDB.get_profit_summary(days=7, **scope)
+        OrderDB.get_dashboard_stats(period="week", cycle_start=start, cycle_end=end, **scope)
+        OrderDB.get_customers_with_purchases(cycle_start=start, cycle_end=end, **scope)
+    OrderDB.get_orders_by_student("user1")
+    OrderDB.purge_expired_unpaid_orders(expire_minutes=60 * 24 * 365)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印每条语句的查询计划")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="order_plans_") as workdir:
+        _prepare_env(workdir)
+        from database import OrderDB, UserDB, get_db_connection, init_database
+
+        init_database()
+        _seed(get_db_connection, args.orders)
+        UserDB.create_user("user1", "pw", "plan user")
+
+        statements = []
+        with ExitStack() as stack:
+            for _ in range(POOL_SIZE):
+                stack.enter_context(get_db_connection()).set_trace_callback(statements.append)
+        _run_queries(OrderDB)
+
+        checked = 0
+        failures = []
+        plan_conn = sqlite3.connect(os.environ["DB_PATH"])
+        for sql in dict.fromkeys(statements):
+            if "created_at_ms" not in sql or not re.search(r"\bFROM\s+orders\b", sql):
+                continue
+            plan = [row[3] for row in plan_conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            checked += 1
+            scans = [line for line in plan if _FULL_SCAN.match(line)]
+            if scans:
+                failures.append((sql, plan))
+            if args.verbose or scans:
+                print("-" * 72)
+                print(" ".join(sql.split())[:400])
+                for line in plan:
+                    print(f"    {line}")
+        plan_conn.close()
+
+        print(f"checked {checked} order statements filtered by created_at_ms, full scans: {len(failures)}")
+        if checked == 0 or failures:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""按全部订单重建 sales_rollup / sales_product_rollup。
+
+用法（在 backend 目录下，使用与服务相同的 .env / 环境变量）：
+    python scripts/rebuild_sales_rollup.py
+
+汇总表平时由订单写入路径增量维护，仅在直接修改过数据库或怀疑汇总不一致时需要运行。
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main() -> None:
+    from database import SalesRollupDB, init_database
+
+    init_database()
+    started = time.perf_counter()
+    rows = SalesRollupDB.rebuild()
+    print(f"sales rollup rebuilt: {rows} hourly rows in {(time.perf_counter() - started) * 1000.0:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""库存并发压测：多进程、多线程同时确认收款（扣减）并取消部分订单（回补），校验不会超卖且库存账目一致。
+
+用法（在 backend 目录下）：
+    python scripts/stress_inventory.py --orders 400 --stock 150 --processes 4 --threads 8
+
+热门商品与规格的初始库存远小于订单总需求，预期部分订单因库存不足确认失败；
+结束时每个库存目标都应满足：剩余库存 = 初始库存 - 已扣减订单的数量之和，且不小于 0。
+除 DB_PATH 外的配置沿用 .env；DB_PATH 固定指向临时目录，不会触碰正式数据库。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+PRODUCT_ID = "stress_p"
+VARIANT_PRODUCT_ID = "stress_vp"
+VARIANT_ID = "stress_v"
+
+
+def _prepare_env(workdir: str) -> None:
+    os.environ["DB_PATH"] = os.path.join(workdir, "stress.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def _seed(order_count: int, stock: int, seed: int):
+    from database import OrderDB, SalesRollupDB, get_db_connection
+
+    rng = random.Random(seed)
+    with get_db_connection() as conn:
+        conn.execute(
+            "INSERT INTO products (id, name, category, price, stock, owner_id, is_active) "
+            "VALUES (?, '热门商品', '压测', 5.0, ?, 'admin', 1)",
+            (PRODUCT_ID, stock),
+        )
+        conn.execute(
+            "INSERT INTO products (id, name, category, price, stock, owner_id, is_active) "
+            "VALUES (?, '热门规格商品', '压测', 8.0, 0, 'admin', 1)",
+            (VARIANT_PRODUCT_ID,),
+        )
+        conn.execute(
+            "INSERT INTO product_variants (id, product_id, name, stock) VALUES (?, ?, '大杯', ?)",
+            (VARIANT_ID, VARIANT_PRODUCT_ID, stock),
+        )
+        cursor = conn.cursor()
+        order_ids = []
+        for n in range(order_count):
+            items = []
+            roll = rng.random()
+            if roll < 0.7:
+                items.append({"product_id": PRODUCT_ID, "name": "热门商品", "quantity": rng.randint(1, 3), "price": 5.0})
+            if roll > 0.4:
+                items.append({
+                    "product_id": VARIANT_PRODUCT_ID,
+                    "variant_id": VARIANT_ID,
+                    "name": "热门规格商品",
+                    "variant_name": "大杯",
+                    "quantity": rng.randint(1, 3),
+                    "price": 8.0,
+                })
+            order_id = f"stress_o{n}"
+            cursor.execute(
+                "INSERT INTO orders (id, student_id, status, payment_status, total_amount, shipping_info, items, stock_deducted) "
+                "VALUES (?, 'stress_user', 'pending', 'processing', 0, '{}', ?, 0)",
+                (order_id, json.dumps(items, ensure_ascii=False)),
+            )
+            OrderDB._replace_order_items(cursor, order_id, items)
+            order_ids.append(order_id)
+        conn.commit()
+    SalesRollupDB.rebuild()
+    return order_ids
+
+
+def _process_order(order_id: str, cancel_ratio: float) -> str:
+    from database import OrderDB
+
+    ok, _missing = OrderDB.complete_payment_and_update_stock(order_id)
+    if not ok:
+        return "rejected"
+    if random.random() < cancel_ratio:
+        cancelled, _missing = OrderDB.update_order_status_with_inventory(order_id, "cancelled")
+        return "cancelled" if cancelled else "error"
+    return "paid"
+
+
+def _worker(order_ids, threads: int, cancel_ratio: float):
+    counts = {}
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for outcome in pool.map(lambda order_id: _process_order(order_id, cancel_ratio), order_ids):
+            counts[outcome] = counts.get(outcome, 0) + 1
+    return counts
+
+
+def _verify(stock: int) -> bool:
+    from database import get_db_connection
+
+    ok = True
+    with get_db_connection() as conn:
+        for label, table, target_id, column in (
+            ("product", "products", PRODUCT_ID, "stock_product_id"),
+            ("variant", "product_variants", VARIANT_ID, "stock_variant_id"),
+        ):
+            remaining = conn.execute(f"SELECT stock FROM {table} WHERE id = ?", (target_id,)).fetchone()[0]
+            if column == "stock_product_id":
+                condition = "oi.stock_product_id = ? AND oi.stock_variant_id IS NULL"
+            else:
+                condition = "oi.stock_variant_id = ?"
+            deducted = conn.execute(
+                f"SELECT COALESCE(SUM(oi.quantity), 0) FROM order_items oi JOIN orders o ON o.id = oi.order_id "
+                f"WHERE o.stock_deducted = 1 AND {condition}",
+                (target_id,),
+            ).fetchone()[0]
+            consistent = remaining == stock - deducted and remaining >= 0
+            ok = ok and consistent
+            print(
+                f"  {label:<7} initial={stock} deducted={deducted} remaining={remaining} "
+                f"{'OK' if consistent else 'MISMATCH'}"
+            )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=400)
+    parser.add_argument("--stock", type=int, default=150)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--cancel-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=20240601)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="stress_inventory_") as workdir:
+        _prepare_env(workdir)
+        from database import init_database
+
+        init_database()
+        order_ids = _seed(args.orders, args.stock, args.seed)
+        random.Random(args.seed).shuffle(order_ids)
+        chunks = [order_ids[index::args.processes] for index in range(args.processes)]
+
+        started = time.perf_counter()
+        totals = {}
+        with ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for counts in pool.map(_worker, chunks, [args.threads] * len(chunks), [args.cancel_ratio] * len(chunks)):
+                for outcome, count in counts.items():
+                    totals[outcome] = totals.get(outcome, 0) + count
+        elapsed = time.perf_counter() - started
+
+        print(
+            f"orders={args.orders} processes={args.processes} threads={args.threads} "
+            f"elapsed={elapsed * 1000:.1f}ms outcomes={dict(sorted(totals.items()))}"
+        )
+        if not _verify(args.stock):
+            raise SystemExit("inventory mismatch: oversold or lost updates detected")
+
+
+if __name__ == "__main__":
+    main()
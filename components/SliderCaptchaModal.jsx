@@ -38,7 +38,7 @@ const normalizeImageUrl = (url) => {
   const text = String(url || "").trim();
   if (!text) return "";
   if (/^https?:\/\//i.test(text)) return text;
-  if (text.startsWith("/public/")) {
+  if (text.startsWith("/public/") || text.startsWith("/auth/")) {
     return `${getApiBaseUrl()}${text}`;
   }
   return text;
@@ -351,7 +351,7 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
   const [users, setUsers] = useState([]);
   const [usersLoading, setUsersLoading] = useState(false);
   const [usersTotal, setUsersTotal] = useState(0);
-  const [usersOffset, setUsersOffset] = useState(0);
+  const [usersCursor, setUsersCursor] = useState(null);
   const [searchQuery, setSearchQuery] = useState('');
   const [debouncedQuery, setDebouncedQuery] = useState('');
   const [staffAddressIds, setStaffAddressIds] = useState([]);
@@ -393,11 +393,12 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
   }, [isAdmin, apiRequest]);
 
   // ---- Load users ----
-  const loadUsers = useCallback(async (offset = 0, append = false) => {
+  const loadUsers = useCallback(async (cursor = null, append = false) => {
     if (!append) setUsersLoading(true);
     try {
       const q = encodeURIComponent(debouncedQuery);
-      const r = await apiRequest(`/admin/chat-audit/users?q=${q}&offset=${offset}&limit=${PAGE_SIZE}`);
+      const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+      const r = await apiRequest(`/admin/chat-audit/users?q=${q}&limit=${PAGE_SIZE}${cursorParam}`);
       if (r?.data) {
         const newUsers = r.data.users || [];
         if (append) {
@@ -406,7 +407,7 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
           setUsers(newUsers);
         }
         setUsersTotal(r.data.total || 0);
-        setUsersOffset(offset);
+        setUsersCursor(r.data.next_cursor || null);
         if (r.data.staff_address_ids) {
           setStaffAddressIds(r.data.staff_address_ids);
         }
@@ -424,7 +425,7 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
     setThreads([]);
     setSelectedThread(null);
     setMessages([]);
-    loadUsers(0, false);
+    loadUsers(null, false);
   }, [debouncedQuery, loadUsers]);
 
   // ---- Group users by region ----
@@ -479,13 +480,13 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
   const handleUserListScroll = useCallback(() => {
     const el = userListRef.current;
     if (!el || loadingMoreRef.current) return;
-    const hasMore = users.length < usersTotal;
+    const hasMore = users.length < usersTotal && !!usersCursor;
     if (!hasMore) return;
     if (el.scrollTop + el.clientHeight >= el.scrollHeight - 50) {
       loadingMoreRef.current = true;
-      loadUsers(usersOffset + PAGE_SIZE, true);
+      loadUsers(usersCursor, true);
     }
-  }, [users.length, usersTotal, usersOffset, loadUsers]);
+  }, [users.length, usersTotal, usersCursor, loadUsers]);
 
   // ---- Load threads for selected user ----
   useEffect(() => {
@@ -577,7 +578,7 @@ export function ChatAuditPanel({ apiRequest, isAdmin }) {
     setSelectedThreadInfo(null);
   };
 
-  const hasMore = users.length < usersTotal;
+  const hasMore = users.length < usersTotal && !!usersCursor;
 
   // ---- Shared: user list content with region grouping ----
   const renderUserList = () => {
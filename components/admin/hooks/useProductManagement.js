@@ -461,6 +461,23 @@ export function useProductManagement({
     }
   };
 
+  // 批量接口按行返回结果：未成功的行恢复为原状态，并返回失败说明
+  const revertFailedBulkRows = (response, originalProducts) => {
+    const failedRows = (response?.data?.results || []).filter(row => row.status !== 'updated');
+    if (failedRows.length === 0) {
+      return [];
+    }
+    const failedIds = new Set(failedRows.map(row => row.product_id));
+    const originalById = new Map(originalProducts.map(p => [p.id, p]));
+    setProducts(prev => prev.map(p =>
+      failedIds.has(p.id) && originalById.has(p.id) ? originalById.get(p.id) : p
+    ));
+    return failedRows.map(row => {
+      const name = originalById.get(row.product_id)?.name || row.product_id;
+      return `${name}：${row.message || '更新失败'}`;
+    });
+  };
+
   const handleBatchUpdateDiscount = async (productIds, zhe) => {
     if (!productIds || productIds.length === 0) { alert('请选择要设置折扣的商品'); return; }
 
@@ -471,11 +488,15 @@ export function useProductManagement({
     setProducts(updatedProducts);
 
     try {
-      await apiRequest(`${staffPrefix}/products`, {
+      const response = await apiRequest(`${staffPrefix}/products`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ product_ids: productIds, discount: zhe })
       });
+      const failures = revertFailedBulkRows(response, originalProducts);
+      if (failures.length > 0) {
+        alert(`以下 ${failures.length} 件商品未能设置折扣：\n\n${failures.join('\n')}`);
+      }
     } catch (e) {
       setProducts(originalProducts);
       alert(e.message || '批量设置折扣失败');
@@ -757,21 +778,22 @@ export function useProductManagement({
 
     try {
       setIsSubmitting(true);
-      const promises = productIds.map(productId =>
-        apiRequest(`${staffPrefix}/products/${productId}`, {
-          method: 'PUT',
-          headers: {
-            'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ is_active: isActive })
-        })
-      );
-
-      await Promise.all(promises);
+      const response = await apiRequest(`${staffPrefix}/products`, {
+        method: 'PUT',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ product_ids: productIds, is_active: !!isActive })
+      });
+      const failures = revertFailedBulkRows(response, originalProducts);
       safeRefreshAllWarnings().catch(err => console.error('Failed to refresh warning state:', err));
+      if (failures.length > 0) {
+        alert(`以下 ${failures.length} 件商品未能更新上下架状态：\n\n${failures.join('\n')}`);
+      }
     } catch (err) {
       setProducts(originalProducts);
       console.error('Batch operation failed:', err);
+      alert(err.message || '批量更新上下架状态失败');
     } finally {
       setIsSubmitting(false);
     }